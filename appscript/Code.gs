@@ -1,6 +1,11 @@
 /** ===================== CONFIG ===================== **/
 const SHEET_ID = '1plZ1LzHu2W2TrbV7wXPueWsO2g4dFRyUdpxXIUE5ns8';
 const WS_NAME  = 'precios_supermercados';
+const INDEX_NAME = WS_NAME + '_indice';  // índice de fragmentos (SHEETS_ROLLOVER en el pipeline)
+// Resúmenes que el pipeline recalcula en cada ingesta (SUMMARY_SHEETS): si están, el tablero no lee el histórico
+const DAILY_NAME   = WS_NAME + '_resumen_diario';
+const LATEST_NAME  = WS_NAME + '_ultimo_precio';
+const FILTERS_NAME = WS_NAME + '_filtros';
 
 /**
  * EXCLUSIONES: términos o formatos que NO deben considerarse “canasta básica”
@@ -35,14 +40,146 @@ const toISO = (d) => {
 };
 
 /** ===================== DATA API ===================== **/
-function getData(filters = {}) {
+/**
+ * Filas de datos (encabezado primero). Con rollover lee sólo los fragmentos del índice cuyo
+ * rango [Desde, Hasta] toca las fechas pedidas (pueden estar en otros libros); si no hay
+ * índice, la hoja única (expandida a una fila por día si el pipeline la escribe en intervalos).
+ */
+function readRows_(fechaIniISO, fechaFinISO) {
   const ss = SpreadsheetApp.openById(SHEET_ID);
-  const ws = ss.getSheetByName(WS_NAME);
-  if (!ws) {
-    return { data: [], uniqueValues: { supermercados: [], grupos: [], subgrupos: [], productos: [] } };
+  const idx = ss.getSheetByName(INDEX_NAME);
+  if (!idx) {
+    const ws = ss.getSheetByName(WS_NAME);
+    return ws ? expandIntervals_(ws.getDataRange().getValues(), fechaIniISO, fechaFinISO) : [];
+  }
+  const [head, ...frags] = idx.getDataRange().getValues();
+  const c = Object.fromEntries(head.map((h, i) => [String(h), i]));
+  const libros = { [SHEET_ID]: ss };
+  let out = [];
+  for (const f of frags) {
+    const desde = toISO(f[c['Desde']]);
+    const hasta = toISO(f[c['Hasta']]);
+    if (fechaIniISO && hasta && hasta < fechaIniISO) continue;
+    if (fechaFinISO && desde && desde > fechaFinISO) continue;
+    const id = String(f[c['Libro']]);
+    const libro = libros[id] || (libros[id] = SpreadsheetApp.openById(id));
+    const ws = libro.getSheetByName(String(f[c['Hoja']]));
+    if (!ws) continue;
+    const vals = ws.getDataRange().getValues();
+    out = out.length ? out.concat(vals.slice(1)) : vals;
+  }
+  return out;
+}
+
+/**
+ * Hoja en intervalos (SHEET_DELTA en el pipeline: valid_from/valid_to en vez de FechaConsulta) →
+ * una fila por día dentro de [fechaIniISO, fechaFinISO], con FechaConsulta. Otras hojas, sin cambios.
+ */
+function expandIntervals_(values, fechaIniISO, fechaFinISO) {
+  if (!values.length) return values;
+  const head = values[0].map(String);
+  const iDesde = head.indexOf('valid_from');
+  const iHasta = head.indexOf('valid_to');
+  if (iDesde < 0 || iHasta < 0) return values;
+  const keep = head.map((_, i) => i).filter(i => i !== iDesde && i !== iHasta);
+  const out = [keep.map(i => head[i]).concat('FechaConsulta')];
+  for (let r = 1; r < values.length; r++) {
+    let desde = toISO(values[r][iDesde]);
+    let hasta = toISO(values[r][iHasta]);
+    if (!desde || !hasta) continue;
+    if (fechaIniISO && desde < fechaIniISO) desde = fechaIniISO;
+    if (fechaFinISO && hasta > fechaFinISO) hasta = fechaFinISO;
+    const base = keep.map(i => values[r][i]);
+    const [y, m, d] = desde.split('-').map(Number);
+    for (let dia = new Date(y, m - 1, d); toISO(dia) <= hasta; dia.setDate(dia.getDate() + 1)) {
+      out.push(base.concat(new Date(dia)));
+    }
+  }
+  return out;
+}
+
+/** Filtros normalizados */
+function parseFilters_(filters) {
+  return {
+    filtroSuper: (filters.supermercado || '').trim(),
+    filtroGrupo: (filters.grupo || '').trim(),
+    filtroSub:   (filters.subgrupo || '').trim(),
+    filtroProd:  (filters.producto || '').trim().toLowerCase(),
+    fechaIniISO: (filters.fechaInicio || '').trim(),
+    fechaFinISO: (filters.fechaFin || '').trim(),
+    soloCB:      !!filters.soloCanastaBasica,
+  };
+}
+
+/** Hoja de resumen como objetos (encabezado → valor), o null si el pipeline todavía no la publicó. */
+function readSummary_(name) {
+  const ws = SpreadsheetApp.openById(SHEET_ID).getSheetByName(name);
+  if (!ws) return null;
+  const [head, ...rows] = ws.getDataRange().getValues();
+  return rows.map(r => Object.fromEntries(head.map((h, i) => [String(h), r[i]])));
+}
+
+/**
+ * Sin rango de fechas: último precio de cada producto (hoja de último precio) y listas de filtros
+ * en cascada (hoja de filtros), unas miles de celdas. Con fechas, o sin resúmenes, el detalle del
+ * histórico (readRows_).
+ */
+function getData(filters = {}) {
+  const f = parseFilters_(filters);
+  if (!f.fechaIniISO && !f.fechaFinISO) {
+    const ultimo = readSummary_(LATEST_NAME);
+    const combos = ultimo && readSummary_(FILTERS_NAME);
+    if (combos) return latestData_(f, ultimo, combos);
+  }
+  return rawData_(f);
+}
+
+function latestData_(f, ultimo, combos) {
+  const str = (v) => String(v == null ? '' : v).trim();
+  const data = [];
+  const productos = new Set();
+  for (const r of ultimo) {
+    const item = {
+      Supermercado: str(r.Supermercado), Grupo: str(r.Grupo), Subgrupo: str(r.Subgrupo),
+      Producto: str(r.Producto), Precio: typeof r.Precio === 'number' && isFinite(r.Precio) ? r.Precio : null,
+      FechaConsulta: toISO(r.FechaConsulta),
+    };
+    if (f.filtroSuper && item.Supermercado !== f.filtroSuper) continue;
+    if (f.filtroGrupo && item.Grupo !== f.filtroGrupo) continue;
+    if (f.filtroSub   && item.Subgrupo !== f.filtroSub) continue;
+    if (f.filtroProd  && !item.Producto.toLowerCase().includes(f.filtroProd)) continue;
+    if (f.soloCB) {
+      const exclusion = EXCLUSIONES[item.Grupo];
+      if (exclusion && exclusion.test(item.Producto)) continue;
+    }
+    if (item.Producto) productos.add(item.Producto);
+    data.push(item);
+  }
+  // Listas en cascada: cada filtro elegido acota las de los demás, como al filtrar el detalle
+  const listas = { supermercados: new Set(), grupos: new Set(), subgrupos: new Set() };
+  for (const c of combos) {
+    const s = str(c.Supermercado), g = str(c.Grupo), sg = str(c.Subgrupo);
+    if (f.filtroSuper && s !== f.filtroSuper) continue;
+    if (f.filtroGrupo && g !== f.filtroGrupo) continue;
+    if (f.filtroSub   && sg !== f.filtroSub) continue;
+    if (s)  listas.supermercados.add(s);
+    if (g)  listas.grupos.add(g);
+    if (sg) listas.subgrupos.add(sg);
   }
+  return {
+    data,
+    uniqueValues: {
+      supermercados: Array.from(listas.supermercados).sort(),
+      grupos:        Array.from(listas.grupos).sort(),
+      subgrupos:     Array.from(listas.subgrupos).sort(),
+      productos:     Array.from(productos).sort(),
+    },
+  };
+}
 
-  const values = ws.getDataRange().getValues();
+function rawData_(f) {
+  const { filtroSuper, filtroGrupo, filtroSub, filtroProd, fechaIniISO, fechaFinISO, soloCB } = f;
+  const values = readRows_(fechaIniISO, fechaFinISO);
   if (!values.length) {
     return { data: [], uniqueValues: { supermercados: [], grupos: [], subgrupos: [], productos: [] } };
   }
@@ -50,15 +187,6 @@ function getData(filters = {}) {
   const headers = values.shift().map(String);
   const col = Object.fromEntries(headers.map((h, i) => [h, i]));
 
-  // Filtros normalizados
-  const filtroSuper = (filters.supermercado || '').trim();
-  const filtroGrupo = (filters.grupo || '').trim();
-  const filtroSub   = (filters.subgrupo || '').trim();
-  const filtroProd  = (filters.producto || '').trim().toLowerCase();
-  const fechaIniISO = (filters.fechaInicio || '').trim();
-  const fechaFinISO = (filters.fechaFin || '').trim();
-  const soloCB      = !!filters.soloCanastaBasica;
-
   const uniques = {
     supermercados: new Set(),
     grupos: new Set(),
@@ -130,34 +258,47 @@ function getData(filters = {}) {
 }
 
 function getTimeSeriesData(filters = {}) {
-  const payload = getData(filters);
-  const data = payload.data || [];
-  if (!data.length) return { timeSeries: {}, categories: [], dates: [] };
-
   const categoryField = (filters.timeSeriesCategory === 'Subgrupo')
     ? 'Subgrupo'
     : (filters.timeSeriesCategory === 'Producto')
       ? 'Producto'
       : 'Grupo';
+  const f = parseFilters_(filters);
 
   // date ISO -> category -> {sum, count}
   const grouped = {};
   const dateSet = new Set();
   const catSet  = new Set();
-
-  for (const item of data) {
-    if (item.Precio == null || !item.FechaConsulta) continue;
-    const d   = item.FechaConsulta;
-    const cat = item[categoryField] || 'Sin categoría';
+  const add = (d, cat, sum, count) => {
     dateSet.add(d);
     catSet.add(cat);
-
     if (!grouped[d]) grouped[d] = {};
     if (!grouped[d][cat]) grouped[d][cat] = { sum: 0, count: 0 };
+    grouped[d][cat].sum   += sum;
+    grouped[d][cat].count += count;
+  };
 
-    grouped[d][cat].sum   += item.Precio;
-    grouped[d][cat].count += 1;
+  // Por Grupo/Subgrupo sin filtro de producto: promedio de cada día ponderado por sus productos con
+  // precio, desde el resumen diario (el del detalle, salvo el redondeo a 2 decimales, sin leerlo)
+  const diario = (categoryField !== 'Producto' && !f.filtroProd && !f.soloCB) ? readSummary_(DAILY_NAME) : null;
+  if (diario) {
+    for (const r of diario) {
+      const d = toISO(r.FechaConsulta);
+      if (!d || !r.Productos || typeof r.PrecioPromedio !== 'number') continue;
+      if (f.filtroSuper && String(r.Supermercado) !== f.filtroSuper) continue;
+      if (f.filtroGrupo && String(r.Grupo) !== f.filtroGrupo) continue;
+      if (f.filtroSub   && String(r.Subgrupo) !== f.filtroSub) continue;
+      if (f.fechaIniISO && d < f.fechaIniISO) continue;
+      if (f.fechaFinISO && d > f.fechaFinISO) continue;
+      add(d, String(r[categoryField] || '') || 'Sin categoría', r.PrecioPromedio * r.Productos, r.Productos);
+    }
+  } else {
+    for (const item of rawData_(f).data) {
+      if (item.Precio == null || !item.FechaConsulta) continue;
+      add(item.FechaConsulta, item[categoryField] || 'Sin categoría', item.Precio, 1);
+    }
   }
+  if (!dateSet.size) return { timeSeries: {}, categories: [], dates: [] };
 
   const dates = Array.from(dateSet).sort();
   let categories = Array.from(catSet);
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline del límite adaptativo por host (AIMD + token bucket + Retry-After).
+
+Compara ADAPTIVE_LIMIT=0 (concurrencia fija en MAX_WORKERS) contra el límite adaptativo en:
+  - sitio sano: latencia fija; el límite sube y el scrape termina antes
+  - sitio frágil: con más de --frágil requests en curso responde 429 + Retry-After;
+    el límite baja a lo que el sitio aguanta y deja de recibir 429
+Reporta tiempo, filas, 429 recibidos, pico de requests simultáneos y el límite final.
+
+Uso:
+    python benchmarks/bench_adaptive.py [--categorias 300] [--latencia 0.1] [--frágil 4] [--motor threads|async]
+"""
+
+from __future__ import annotations
+import argparse, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_adaptive_"))
+for _var in ("HTTP_CACHE", "PAGE_CACHE"):
+    os.environ.setdefault(_var, "0")
+
+import pipeline_ingesta as pi  # noqa: E402
+from local_server import LocalSiteServer  # noqa: E402
+from bench_http_engines import LocalStock, build_route  # noqa: E402
+
+def correr(srv, adaptive: bool, motor: str):
+    pi.ADAPTIVE_LIMIT, pi.HTTP_ENGINE = adaptive, motor
+    pi.HOST_LIMITS = pi.HostLimits()
+    srv.reset_counters()
+    t0 = time.perf_counter()
+    rows = LocalStock(srv.url).scrape()
+    dt = time.perf_counter() - t0
+    lim = next(iter(pi.HOST_LIMITS._by_host.values()))
+    return dt, len(rows), srv.throttled, srv.peak_inflight, lim
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--categorias", type=int, default=300)
+    ap.add_argument("--productos", type=int, default=10)
+    ap.add_argument("--latencia", type=float, default=0.1)
+    ap.add_argument("--frágil", dest="fragil", type=int, default=4, help="requests simultáneos que aguanta el sitio frágil")
+    ap.add_argument("--retry-after", type=int, default=1)
+    ap.add_argument("--motor", default="threads", choices=["threads", "async"])
+    args = ap.parse_args()
+
+    print(f"{args.categorias} categorías, latencia {args.latencia * 1000:.0f} ms, motor {args.motor}")
+    print(f"{'sitio':<8} {'límite':<10} {'seg':>7} {'filas':>6} {'429':>5} {'pico':>5}  límite final")
+    esperado = args.categorias * args.productos
+    for sitio, kw in (("sano", {}), ("frágil", {"max_inflight": args.fragil, "retry_after": args.retry_after})):
+        with LocalSiteServer(build_route(args.categorias, args.productos), latency=args.latencia, **kw) as srv:
+            for adaptive in (False, True):
+                dt, n, n429, pico, lim = correr(srv, adaptive, args.motor)
+                falta = f" (faltan {esperado - n})" if n < esperado else ""
+                print(f"{sitio:<8} {'adaptivo' if adaptive else 'fijo':<10} {dt:>7.2f} {n:>6} {n429:>5} {pico:>5}  "
+                      f"{lim.limit:.0f} (rango {lim.stats['min']:.0f}–{lim.stats['max']:.0f}){falta}")
+
+if __name__ == "__main__":
+    main()
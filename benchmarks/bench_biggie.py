@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de BiggieScraper: paginación paralela vs. el recorrido secuencial original.
+
+Servidor local que imita /api/articles (take/skip/classificationName → {"items", "count"})
+con latencia inyectada. Verifica fila por fila que ambas versiones devuelvan lo mismo,
+también con una página que falla a mitad de un grupo (el recorrido corta ahí).
+
+Uso:
+    python benchmarks/bench_biggie.py [--count 1200] [--take 100] [--latencia 0.1] [--workers 8]
+"""
+
+from __future__ import annotations
+import argparse, json, os, sys, tempfile, time
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_biggie_"))
+os.environ.setdefault("HTTP_CACHE", "0")
+
+import pipeline_ingesta as pi  # noqa: E402
+from local_server import LocalSiteServer  # noqa: E402
+
+NOMBRES = ["CARNE VACUNA {i} 1 KG", "PAN LACTAL {i} 500 G", "HUEVOS {i} 30 U", "LECHE ENTERA {i} 1 L",
+           "SHAMPOO {i} 400 ML", "QUESO PARAGUAY {i}", "GALLETITA {i} 6X100 G"]
+
+def build_route(counts: dict, fallas: set):
+    """counts: grupo → total de artículos; fallas: {(grupo, skip)} que responden 404."""
+    def route(path):
+        u = urlparse(path)
+        if u.path != "/api/articles": return None
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        grp, take, skip = q.get("classificationName", ""), int(q.get("take", 100)), int(q.get("skip", 0))
+        if (grp, skip) in fallas: return None
+        total = counts.get(grp, 0)
+        items = [{"name": NOMBRES[(i + len(grp)) % len(NOMBRES)].format(i=f"{grp[:3]}{i}"), "price": 1000 + i * 3}
+                 for i in range(skip, min(skip + take, total))]
+        return 200, json.dumps({"items": items, "count": total}).encode(), {"Content-Type": "application/json"}
+    return route
+
+def legacy_scrape(sc):
+    """BiggieScraper.scrape() original: grupos y páginas uno tras otro, una sola sesión."""
+    session = pi._build_session()
+    fecha = "fija"
+    rows = []
+    for grp in sc.GROUPS:
+        skip = 0
+        while True:
+            try:
+                js = session.get(sc.API, params=dict(take=sc.TAKE, skip=skip, classificationName=grp),
+                                 timeout=pi.REQ_TIMEOUT).json()
+            except Exception:
+                break
+            for it in js.get("items", []):
+                nombre = it.get("name", "")
+                excluido, grupo = pi.ENRICH_CACHE.classify(nombre)
+                if excluido: continue
+                rows.append({"Supermercado": "Biggie", "CategoríaURL": grp, "Producto": nombre.upper(),
+                             "Precio": pi.norm_price(it.get("price", 0)), "Grupo": grupo or grp.capitalize(),
+                             "FechaConsulta": fecha})
+            skip += sc.TAKE
+            if skip >= js.get("count", 0): break
+    return rows
+
+def sin_fecha(rows):
+    return [{k: v for k, v in r.items() if k != "FechaConsulta"} for r in rows]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--count", type=int, default=1200, help="artículos por grupo")
+    ap.add_argument("--take", type=int, default=100)
+    ap.add_argument("--latencia", type=float, default=0.1)
+    ap.add_argument("--workers", type=int, default=pi.BIGGIE_WORKERS)
+    args = ap.parse_args()
+
+    class LocalBiggie(pi.BiggieScraper):
+        TAKE, WORKERS = args.take, args.workers
+        sessions = pi.SessionPool(args.workers, label="biggie")
+
+    counts = {g: args.count + 37 * i for i, g in enumerate(pi.BiggieScraper.GROUPS)}
+    casos = [("completo", set()), ("página 3 de huevos falla", {("huevos", 3 * args.take)})]
+    distintos = 0
+    for etiqueta, fallas in casos:
+        with LocalSiteServer(build_route(counts, fallas), latency=args.latencia) as srv:
+            LocalBiggie.API = f"{srv.url}/api/articles"
+            sc = LocalBiggie()
+            t0 = time.perf_counter(); ref = legacy_scrape(sc); t_seq = time.perf_counter() - t0
+            n_seq = srv.requests; srv.reset_counters()
+            t0 = time.perf_counter(); rows = sc.scrape(); t_par = time.perf_counter() - t0
+            igual = sin_fecha(rows) == sin_fecha(ref)
+            distintos += not igual
+            print(f"[{etiqueta}] {len(ref):,} filas, take={args.take}, latencia {args.latencia * 1000:.0f} ms")
+            print(f"  secuencial : {t_seq:>6.2f} s  {n_seq:>4} requests")
+            print(f"  paralelo   : {t_par:>6.2f} s  {srv.requests:>4} requests  (x{t_seq / t_par:.1f}, "
+                  f"{args.workers} en vuelo)  filas idénticas: {igual}")
+    if distintos:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
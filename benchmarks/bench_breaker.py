@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline del circuito por host (BREAKER_FAILURES / BREAKER_COOLDOWN_S) con un sitio caído.
+
+Los seis sitios de fixture_sites (con --latencia por request), pero en --caido la portada responde y
+todas las categorías fallan (como cuando las URLs de categorías vienen de la caché de páginas y el
+sitio está caído): --modo timeout (no responden antes de --timeout, que reemplaza a REQ_TIMEOUT) o
+--modo 500 (responden 500 al instante). Cada variante corre `main(["scrape"])` en un proceso aparte:
+  - sin circuito : BREAKER_FAILURES=0 (cada categoría gasta sus timeouts y reintentos)
+  - circuito     : BREAKER_FAILURES por defecto
+Reporta duración de la corrida y del sitio caído, requests que le llegaron y fallas por motivo.
+Exige las mismas filas en los sitios sanos (sin circuitos abiertos en sus hosts), que con circuito
+el sitio caído cueste menos requests y segundos, figure `⚡ CAÍDO` y cada URL perdida tenga motivo y
+detalle (también las que estaban reintentando cuando se abrió). Después, contra un servidor que cae y vuelve (BREAKER_COOLDOWN_S=--enfriamiento): el
+circuito se abre, corta sin salir, deja pasar un solo request de prueba al vencer el enfriamiento,
+se cierra si responde y se vuelve a abrir si la prueba falla.
+
+Uso:
+    python benchmarks/bench_breaker.py [--modo timeout|500] [--caido salemma] [--timeout 3] [--latencia 0.05]
+"""
+
+from __future__ import annotations
+import argparse, contextlib, io, json, os, subprocess, sys, tempfile, time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+VARIANTES = {"sin circuito": {"BREAKER_FAILURES": "0"}, "circuito": {}}
+
+def variante(args):
+    """En el proceso hijo: scrape contra los fixtures con un sitio caído; imprime el resumen en JSON."""
+    import pipeline_ingesta as pi
+    from fixture_sites import FixtureSites
+    pi.REQ_TIMEOUT = args.timeout
+    with FixtureSites(latency=args.latencia) as sitios:
+        srv = sitios.servers[args.caido]
+        ruta = srv.route
+        def caida(path):  # la portada responde; las categorías no
+            if urlparse(path).path in ("", "/"): return ruta(path)
+            if args.modo == "500": return 500, b"internal error", {}
+            time.sleep(args.timeout + 2)
+            return ruta(path)
+        srv.route = caida
+        pi.SCRAPERS = sitios.scrapers()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            pi.main(["scrape"])
+        dt = time.perf_counter() - t0  # sin el cierre de los servidores locales (espera a los colgados)
+        pedidos = srv.requests
+    reportes = sorted(f for f in os.listdir(pi.RUN_REPORT_DIR) if f.startswith("corrida_"))
+    with open(os.path.join(pi.RUN_REPORT_DIR, reportes[-1]), encoding="utf-8") as fh:
+        rep = json.load(fh)
+    host = urlparse(srv.url).netloc
+    print(json.dumps({"segundos": dt, "pedidos": pedidos, "sitios": rep["sitios"],
+                      "circuitos": {h: v["circuito"] for h, v in rep["hosts"].items() if "circuito" in v},
+                      "host": host, "motivos": {f["motivo"]: f["fallas"] for f in rep["fallas_por_motivo"]
+                                                if f["sitio"] == args.caido},
+                      "fallas": [f for f in rep["fallas"] if f["sitio"] == args.caido],
+                      "linea": next((l for l in log.getvalue().splitlines() if l.startswith(f"• {args.caido}")), "")}))
+
+def recuperacion(args):
+    """En el proceso hijo: un host que cae, vuelve y vuelve a caer; requests de a uno con una sesión del pipeline
+    (una URL distinta por paso: los reintentos de una misma URL cuentan una sola falla para el circuito)."""
+    import pipeline_ingesta as pi
+    from local_server import LocalSiteServer
+    caido = {"si": True}
+    ruta = lambda path: (500, b"caido", {}) if caido["si"] else (200, b"ok", {})
+    pasos, log = [], io.StringIO()
+    with LocalSiteServer(ruta) as srv, contextlib.redirect_stdout(log):
+        s = pi._build_session(label="prueba")
+        br = pi.HOST_LIMITS.get(srv.url).breaker
+        def pedir(paso):
+            antes, t0 = srv.requests, time.perf_counter()
+            try:
+                r = s.get(f"{srv.url}/x{len(pasos)}", timeout=pi.REQ_TIMEOUT).status_code
+            except pi.CircuitOpen:
+                r = "cortado"
+            pasos.append({"paso": paso, "resultado": r, "llegaron": srv.requests - antes,
+                          "ms": round((time.perf_counter() - t0) * 1000), "estado": br.state})
+        while br.state == "cerrado" and len(pasos) < 10: pedir("cae")
+        pedir("abierto")
+        caido["si"] = False
+        time.sleep(args.enfriamiento)
+        pedir("prueba")
+        pedir("cerrado")
+        caido["si"] = True
+        while br.state == "cerrado" and len(pasos) < 20: pedir("cae otra vez")
+        time.sleep(args.enfriamiento)
+        pedir("prueba")
+        pedir("abierto")
+    print(json.dumps({"pasos": pasos, "stats": br.stats, "log": log.getvalue()}))
+
+def _hijo(extra: list, env: dict) -> dict:
+    p = subprocess.run([sys.executable, __file__, *extra], capture_output=True, text=True, env=env,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+    if p.returncode:
+        sys.exit(f"{' '.join(extra)} falló:\n{p.stderr[-3000:]}")
+    return json.loads(p.stdout.strip().splitlines()[-1])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modo", choices=("timeout", "500"), default="timeout", help="cómo falla el sitio caído")
+    ap.add_argument("--caido", default="salemma", help="sitio con todas las categorías caídas")
+    ap.add_argument("--timeout", type=float, default=3.0, help="REQ_TIMEOUT de las variantes (s)")
+    ap.add_argument("--latencia", type=float, default=0.05, help="segundos por request en todos los sitios")
+    ap.add_argument("--enfriamiento", type=float, default=1.0, help="BREAKER_COOLDOWN_S de la prueba de recuperación")
+    ap.add_argument("--_variante", help=argparse.SUPPRESS)
+    ap.add_argument("--_recuperacion", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args._variante:
+        return variante(args)
+    if args._recuperacion:
+        return recuperacion(args)
+    print(f"6 sitios, {args.latencia * 1000:.0f} ms/request; {args.caido}: categorías caídas "
+          f"({'sin respuesta' if args.modo == 'timeout' else '500'}), REQ_TIMEOUT {args.timeout:g} s")
+    print(f"  {'variante':<13} {'seg':>6} {'caído s':>8} {'pedidos':>8}  fallas de {args.caido} por motivo")
+    base = {**os.environ, "HTTP_CACHE": "0", "PAGE_CACHE": "0", "SCRAPE_DEADLINE_S": "0"}
+    res, problemas = {}, []
+    for nombre, env in VARIANTES.items():
+        env = {**base, "OUT_DIR": tempfile.mkdtemp(prefix="bench_circuito_"), **env}
+        r = res[nombre] = _hijo(["--_variante", nombre, "--modo", args.modo, "--caido", args.caido,
+                                 "--timeout", str(args.timeout), "--latencia", str(args.latencia)], env)
+        motivos = ", ".join(f"{m}×{n}" for m, n in sorted(r["motivos"].items()))
+        print(f"  {nombre:<13} {r['segundos']:>6.1f} {r['sitios'][args.caido]['segundos']:>8.1f} "
+              f"{r['pedidos']:>8}  {motivos or '—'}")
+        print(f"    {r['linea']}")
+
+    sin, con = res["sin circuito"], res["circuito"]
+    sanos = lambda r: {s: v["filas"] for s, v in r["sitios"].items() if s != args.caido}
+    if sanos(sin) != sanos(con) or not all(sanos(con).values()):
+        problemas.append("los sitios sanos no dan las mismas filas con y sin circuito")
+    if set(con["circuitos"]) != {con["host"]} or sin["circuitos"]:
+        problemas.append(f"circuitos abiertos: {con['circuitos'] or '—'} con circuito, {sin['circuitos'] or '—'} sin")
+    if con["pedidos"] >= sin["pedidos"] or con["sitios"][args.caido]["segundos"] >= sin["sitios"][args.caido]["segundos"]:
+        problemas.append("el circuito no ahorró requests ni segundos en el sitio caído")
+    if "⚡ CAÍDO" not in con["linea"] or not con["motivos"].get("circuito_abierto"):
+        problemas.append("con circuito, el sitio caído no figura como CAÍDO con URLs cortadas")
+    if any(not f.get("motivo") or not f.get("detalle") for f in con["fallas"] + sin["fallas"]):
+        problemas.append("hay fallas sin motivo o sin detalle")
+    print(f"  sitio caído: {sin['sitios'][args.caido]['segundos'] / max(con['sitios'][args.caido]['segundos'], 1e-3):.1f}× "
+          f"menos segundos de hilos, {sin['pedidos'] - con['pedidos']} requests evitados; "
+          f"corrida {sin['segundos']:.1f} → {con['segundos']:.1f} s")
+
+    env = {**base, "OUT_DIR": tempfile.mkdtemp(prefix="bench_circuito_"), "BREAKER_COOLDOWN_S": str(args.enfriamiento)}
+    r = _hijo(["--_recuperacion", "--enfriamiento", str(args.enfriamiento)], env)
+    print("  recuperación (un request por paso):")
+    for p in r["pasos"]:
+        print(f"    {p['paso']:<13} → {p['resultado']!s:<8} {p['llegaron']} al servidor, {p['ms']:>5} ms, circuito {p['estado']}")
+    pasos = r["pasos"]
+    abierto, prueba, cerrado = (next(p for p in pasos if p["paso"] == n) for n in ("abierto", "prueba", "cerrado"))
+    prueba2, abierto2 = [p for p in pasos if p["paso"] == "prueba"][-1], pasos[-1]
+    if abierto["resultado"] != "cortado" or abierto["llegaron"]:
+        problemas.append("con el circuito abierto, el request salió")
+    if prueba["resultado"] != 200 or prueba["llegaron"] != 1 or cerrado["resultado"] != 200 or cerrado["estado"] != "cerrado":
+        problemas.append("el request de prueba no cerró el circuito")
+    if prueba2["llegaron"] != 1 or prueba2["estado"] != "abierto" or abierto2["resultado"] != "cortado" or abierto2["llegaron"]:
+        problemas.append("una prueba fallida no volvió a abrir el circuito")
+    if problemas:
+        sys.exit("; ".join(problemas))
+
+if __name__ == "__main__":
+    main()
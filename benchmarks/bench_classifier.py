@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del clasificador de productos: reglas compiladas (ProductClassifier)
+vs. el loop original de re.search por patrón.
+
+Genera N nombres sintéticos (por defecto 1.000.000, con repetición como en el
+histórico real), verifica que exclusión, Grupo y Subgrupo coincidan con la
+implementación original en todos los nombres distintos y mide:
+  - legacy   : funciones originales, nombre por nombre
+  - compilado: ProductClassifier nombre por nombre (camino de los scrapers)
+  - batch    : *_series sobre la Serie completa (camino de main())
+
+Uso:
+    python benchmarks/bench_classifier.py [--n 1000000] [--distintos 50000]
+"""
+
+from __future__ import annotations
+import argparse, os, random, re, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_clf_"))
+
+import pandas as pd  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+
+# --- Implementación original (referencia) ---
+def legacy_is_excluded(name):
+    return any(tok in pi.EXCLUDE_SET for tok in pi.tokenize(name))
+
+def legacy_assign_group(name):
+    if not name: return None
+    s = name.lower()
+    for cat in pi.CATEGORY_RULES:
+        if any(re.search(ex, s) for ex in cat.get("exclude", [])):
+            continue
+        if any(re.search(p, s) for p in cat["include"]):
+            return cat["name"]
+    return None
+
+def legacy_assign_subgroup(name, group):
+    if not group or not name: return None
+    s = name.lower()
+    for pat, lbl in pi.SUBGROUP_RULES.get(group, []):
+        if re.search(pat, s):
+            return lbl
+    return None
+
+# --- Nombres sintéticos ---
+VOCAB = [
+    "leche", "LECHE", "yogur", "queso", "Quesillo", "manteca", "crema", "dulce de leche", "flan", "postre",
+    "carne", "vacuno", "cerdo", "pollo", "Pechuga", "muslo", "chorizo", "hamburguesa", "merluza", "salmón",
+    "pan", "galleta", "pizza", "prepizza", "chipa", "torta", "masa", "huevo", "huevos", "HUEVOS",
+    "tomate", "cebolla", "limón", "limon", "banana", "papa", "ajo", "palta",
+    "pañal", "PAÑALES", "panal", "shampoo", "crema facial", "jabón", "locion", "lociÓn", "detergente",
+    "chocolate", "pascua", "kinder", "conserva", "lata", "salsa", "congelado", "molde", "plástico",
+    "entera", "descremada", "natural", "frutilla", "premium", "x", "pack", "clásico", "light",
+    "1 kg", "500 g", "1 L", "900 ml", "6x1 l", "30 u", "bola de lomo", "costilla",
+]
+
+def synthetic_names(n: int, distintos: int, seed: int = 7):
+    rnd = random.Random(seed)
+    base = [" ".join(rnd.choice(VOCAB) for _ in range(rnd.randint(1, 5))) for _ in range(distintos)]
+    base += ["", "PAN-LACTAL", "pan2", "HUEVO/PASCUA", "carne(vacuno)"]
+    return pd.Series([rnd.choice(base) for _ in range(n)], dtype=object), base
+
+def timed(label, fn, n):
+    t0 = time.perf_counter()
+    res = fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<28} {dt:>8.2f} s   {n / dt:>12,.0f} nombres/s")
+    return res, dt
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=1_000_000)
+    ap.add_argument("--distintos", type=int, default=50_000)
+    ap.add_argument("--legacy-n", type=int, default=100_000,
+                    help="filas para medir el loop original (se extrapola a --n)")
+    args = ap.parse_args()
+
+    names, distintos = synthetic_names(args.n, args.distintos)
+    clf = pi.CLASSIFIER
+
+    # 1) Equivalencia exacta en todos los nombres distintos
+    bad = 0
+    for nm in distintos:
+        g = legacy_assign_group(nm)
+        ok = (legacy_is_excluded(nm) == clf.is_excluded(nm) and g == clf.group(nm))
+        for grp in list(pi.SUBGROUP_RULES) + [g, "", None]:
+            ok &= legacy_assign_subgroup(nm, grp) == clf.subgroup(nm, grp)
+        bad += not ok
+    print(f"Equivalencia por nombre: {len(distintos) - bad}/{len(distintos)} nombres distintos idénticos")
+
+    # 2) Tiempos
+    sample = names.iloc[:args.legacy_n]
+    def legacy():
+        out = []
+        for nm in sample:
+            g = legacy_assign_group(nm)
+            out.append((legacy_is_excluded(nm), g, legacy_assign_subgroup(nm, g)))
+        return out
+    _, dt_legacy = timed(f"legacy ({len(sample):,})", legacy, len(sample))
+    print(f"{'  → extrapolado a ' + format(args.n, ','):<28} {dt_legacy * args.n / len(sample):>8.2f} s")
+
+    def compiled():
+        out = []
+        for nm in names:
+            g = clf.group(nm)
+            out.append((clf.is_excluded(nm), g, clf.subgroup(nm, g)))
+        return out
+    per_name, _ = timed(f"compilado ({args.n:,})", compiled, args.n)
+
+    def batch():
+        exc = clf.excluded_series(names)
+        grp = clf.group_series(names)
+        sub = clf.subgroup_series(names, grp)
+        return exc, grp, sub
+    (exc, grp, sub), _ = timed(f"batch *_series ({args.n:,})", batch, args.n)
+
+    same = list(zip(exc.tolist(), grp.tolist(), sub.tolist())) == per_name
+    print(f"Batch == por nombre en las {args.n:,} filas: {same}")
+    if bad or not same:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de la hoja en intervalos de precio (SHEET_DELTA).
+
+Corre main() día por día en dos entornos con los mismos datos (scrapers falsos donde cada precio
+cambia con probabilidad --cambio por día, histórico local real, libro en memoria de fake_sheets):
+hoja diaria (una fila por producto y día) vs. hoja en intervalos. Compara filas y celdas de la hoja
+(lo que lee el tablero) y celdas escritas por corrida. Exige que la hoja en intervalos, expandida con
+expand_intervals, sea la hoja diaria (salvo el ID, que es el del primer día del tramo), también
+después de ingerir tarde un día viejo (se regenera), y que la hoja incremental sea idéntica a la que
+deja --full-rebuild.
+
+Uso:
+    python benchmarks/bench_delta.py [--dias 120] [--productos 400] [--cambio 0.05]
+"""
+
+from __future__ import annotations
+import argparse, collections, contextlib, io, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_delta_"))
+os.environ.setdefault("HISTORY_STORE", "1")
+os.environ.setdefault("COMPACT_AFTER_DAYS", "-1")
+
+from datetime import date, timedelta  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+from fake_sheets import FakeSpreadsheet  # noqa: E402
+
+PRODUCTOS = [("Lácteos", "LECHE ENTERA {} 1 L"), ("Lácteos", "YOGUR FRUTILLA {} 500 G"),
+             ("Verdulería", "TOMATE {} KG"), ("Carnicería", "CARNE MOLIDA {} KG"), ("Panadería", "PAN FELIPE {} UN")]
+
+class Scraper:
+    """Scraper falso: `productos` filas por sitio y día; cada precio cambia con prob. `cambio` y a veces falta un día."""
+    dia = None
+
+    def __init__(self, nombre, productos, cambio, rnd, precios):
+        self.nombre, self.productos, self.cambio, self.rnd, self.precios = nombre, productos, cambio, rnd, precios
+
+    def stream(self):
+        for i in range(self.productos):
+            if self.rnd.random() < self.cambio or (self.nombre, i) not in self.precios:
+                self.precios[self.nombre, i] = self.rnd.randint(5_000, 30_000) if i % 50 else None
+            if self.rnd.random() < 0.02: continue  # sin stock hoy: el tramo se corta
+            grupo, nombre = PRODUCTOS[i % len(PRODUCTOS)]
+            yield {"Supermercado": self.nombre.title(), "CategoríaURL": f"https://{self.nombre}.com.py/{grupo}",
+                   "Producto": nombre.format(i), "Precio": self.precios[self.nombre, i],
+                   "Grupo": grupo, "FechaConsulta": f"{Scraper.dia} 09:00:00"}
+
+    def csv_name(self):
+        return f"{self.nombre}_canasta_{Scraper.dia.replace('-', '')}_090000.csv"
+
+class Entorno:
+    """Libro en memoria + OUT_DIR propio (hoja diaria o en intervalos); registra celdas escritas en la hoja."""
+    def __init__(self, args, delta):
+        self.delta = delta
+        self.out = tempfile.mkdtemp(prefix="intervalos_" if delta else "diaria_", dir=os.environ["OUT_DIR"])
+        self.sh = FakeSpreadsheet(sheet_id="principal")
+        self.sh.add_worksheet(pi.WORKSHEET_NAME, rows=1000, cols=20)
+        self.escritas = 0
+        orig = self.sh.values_batch_update
+        def registrar(body=None):
+            for d in (body or {}).get("data", []):
+                if d["range"].split("!")[0].strip("'") == pi.WORKSHEET_NAME:
+                    self.escritas += sum(len(f) for f in d["values"])
+            return orig(body=body)
+        self.sh.values_batch_update = registrar
+        rnd, precios = random.Random(7), {}  # misma semilla en los dos entornos: mismos datos
+        self.scrapers = {s: (lambda s=s: Scraper(s, args.productos, args.cambio, rnd, precios))
+                         for s in ("stock", "biggie")}
+
+    @contextlib.contextmanager
+    def activo(self):
+        """Parchea el módulo para este entorno (OUT_DIR, libro, scrapers, SHEET_DELTA) y lo restaura al salir."""
+        previo = {k: getattr(pi, k) for k in ("OUT_DIR", "PATTERN_DAILY", "MANIFEST_PATH", "COMPACT_DIR", "HISTORY_DIR",
+                                              "KEY_INDEX_PATH", "DELTA_INDEX_PATH", "SHEETS_CHECKPOINT_PATH",
+                                              "SHEET_WINDOW_DAYS", "SHEET_DELTA", "RUN_REPORT_DIR", "SUMMARY_SHEETS",
+                                              "SCRAPERS", "_open_spreadsheet")}
+        pi.OUT_DIR = self.out
+        pi.PATTERN_DAILY = os.path.join(self.out, "*_canasta_*.csv")
+        pi.MANIFEST_PATH = os.path.join(self.out, ".manifiesto_csv.json")
+        pi.COMPACT_DIR = os.path.join(self.out, "compactado")
+        pi.HISTORY_DIR = os.path.join(self.out, "historico")
+        pi.KEY_INDEX_PATH = os.path.join(self.out, ".indice_claves")
+        pi.DELTA_INDEX_PATH = os.path.join(self.out, ".indice_intervalos.pkl")
+        pi.SHEETS_CHECKPOINT_PATH = os.path.join(self.out, ".subida_sheets")
+        pi.RUN_REPORT_DIR = os.path.join(self.out, "reportes")
+        pi.SHEET_WINDOW_DAYS, pi.SUMMARY_SHEETS, pi.SHEET_DELTA = 0, False, self.delta
+        pi._open_spreadsheet = self.abrir
+        try:
+            yield
+        finally:
+            for k, v in previo.items(): setattr(pi, k, v)
+
+    def abrir(self):
+        pi.SheetsPlanner._books.clear()  # cada corrida lee los metadatos de nuevo, como en producción
+        return self.sh, self.sh.worksheet(pi.WORKSHEET_NAME)
+
+    def correr(self, dia, flags=()):
+        Scraper.dia = dia
+        self.escritas = 0
+        pi.SCRAPERS = self.scrapers
+        with self.activo(), contextlib.redirect_stdout(io.StringIO()) as out:
+            pi.main(list(flags))
+        return out.getvalue()
+
+    def hoja(self):
+        s = self.sh._by_title(pi.WORKSHEET_NAME)
+        return s.values(1, 1, s.rows, s.cols)
+
+    def filas(self):
+        """Filas de datos (la grilla puede tener filas vacías de más)."""
+        return sum(1 for f in self.hoja()[1:] if f)
+
+    def diaria(self):
+        """La hoja como la lee la carga inicial (_read_history: expandida si está en intervalos), sin ID."""
+        with self.activo():
+            df = pi._read_history(self.sh.worksheet(pi.WORKSHEET_NAME))
+        orden = ["FechaConsulta", "Supermercado", "CategoríaURL", "Producto"]
+        df = df.drop(columns="ID").astype(str)
+        return df.sort_values(orden, ignore_index=True)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dias", type=int, default=120)
+    ap.add_argument("--productos", type=int, default=400, help="productos por sitio (2 sitios)")
+    ap.add_argument("--cambio", type=float, default=0.05, help="probabilidad diaria de que cambie un precio")
+    args = ap.parse_args()
+    inicio = date(2026, 6, 1)
+    dias = [(inicio + timedelta(days=d)).isoformat() for d in range(args.dias + 1)]
+    tarde = dias.pop(len(dias) // 2)  # este día llega tarde: se ingiere al final
+    print(f"{args.dias} días × 2 sitios × {args.productos} productos, {args.cambio:.0%} de precios cambian por día")
+    diaria, delta = Entorno(args, False), Entorno(args, True)
+    oks = []
+
+    escritas, segundos = {False: [], True: []}, {False: [], True: []}
+    salidas = collections.Counter()
+    iguales = True
+    for i, d in enumerate(dias):
+        for ent in (diaria, delta):
+            t0 = time.perf_counter()
+            salida = ent.correr(d)
+            segundos[ent.delta].append(time.perf_counter() - t0)
+            if i:  # la primera corrida crea la hoja
+                escritas[ent.delta].append(ent.escritas)
+            if ent.delta:
+                salidas["incremental" if "vigentes" in salida else "regenerada"] += 1
+        if i % 10 == 0 or i == len(dias) - 1:
+            iguales &= diaria.diaria().equals(delta.diaria())
+    med = lambda xs: sorted(xs)[len(xs) // 2]
+    fd, fi = diaria.filas(), delta.filas()
+    cd, ci = fd * len(pi.TARGET_COLS), fi * len(pi.DELTA_COLS)
+    print(f"  hoja (lo que lee el tablero): diaria {fd:,} filas / {cd:,} celdas → intervalos {fi:,} filas / "
+          f"{ci:,} celdas ({fd / max(fi, 1):.1f}× menos filas, {cd / max(ci, 1):.1f}× menos celdas)")
+    print(f"  por corrida: celdas escritas mediana diaria {med(escritas[False]):,} | intervalos {med(escritas[True]):,} | "
+          f"main() mediana {med(segundos[False]) * 1000:.0f} / {med(segundos[True]) * 1000:.0f} ms")
+    print(f"  corridas en intervalos: {salidas['incremental']} incrementales, {salidas['regenerada']} regeneradas")
+    print(f"  expand_intervals(hoja en intervalos) == hoja diaria: {iguales}")
+    oks += [iguales, salidas["incremental"] == len(dias) - 1]
+
+    # un día viejo que llega tarde: la hoja en intervalos se regenera
+    for ent in (diaria, delta):
+        salida = ent.correr(tarde)
+    ok = "regenerada" in salida and diaria.diaria().equals(delta.diaria())
+    print(f"  día atrasado ({tarde}): regenerada e igual a la diaria: {ok}")
+    oks.append(ok)
+
+    # sigue incremental al día siguiente, y --full-rebuild deja exactamente la misma hoja
+    siguiente = (date.fromisoformat(dias[-1]) + timedelta(days=1)).isoformat()
+    salida = delta.correr(siguiente)
+    antes = delta.hoja()
+    delta.correr(siguiente, flags=["ingest", "--full-rebuild"])  # sin scrapear: mismo histórico
+    ok = "vigentes" in salida and antes == delta.hoja()
+    print(f"  incremental == --full-rebuild: {ok}")
+    oks.append(ok)
+    if not all(oks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de memoria de la etapa de consolidación + de-duplicación (CSVs → base final).
+
+Genera --filas filas repartidas en CSVs diarios (6 sitios × --dias días) y corre, cada variante
+en un proceso aparte:
+  - antes: concat object/str, Grupo por fila, strftime por fila, drop_duplicates sobre KEY_COLS
+    y las copias de main() (_prepare_new, df_new.copy())
+  - después: DICT_COLS categóricas desde la lectura, fechas como clave diaria categórica y
+    de-duplicación por el hash 64-bit de KEY_COLS
+Reporta pico de RSS (VmHWM, incluye buffers de pyarrow), memoria final del frame y tiempo,
+y exige que ambas variantes den las mismas filas y que _finalize_base no modifique su entrada
+(_ingest_incremental le pasa df_new sin copiarlo).
+
+Uso:
+    python benchmarks/bench_frames.py [--filas 1000000] [--dias 30]
+"""
+
+from __future__ import annotations
+import argparse, hashlib, json, os, subprocess, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_frames_"))
+os.environ.setdefault("ENRICH_CACHE", "0")
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+
+SITIOS = ["Stock", "Superseis", "Salemma", "Arete", "Los Jardines", "Biggie"]
+NOMBRES = ["LECHE ENTERA {i} 1 L", "CARNE VACUNA {i} 1 KG", "PAN LACTAL {i} 500 G", "HUEVOS {i} 30 U",
+           "QUESO PARAGUAY {i}", "TOMATE {i} X KG", "YOGUR {i} 900 ML", "GALLETITA {i} 6X100 G"]
+GRUPOS = ["Lácteos", "Carnicería", "Panadería", "Huevos", "Frutas y Verduras"]
+
+def generar(filas: int, dias: int) -> list:
+    rnd = np.random.default_rng(5)
+    por_csv = max(filas // (dias * len(SITIOS)), 1)
+    rutas = []
+    for d in range(dias):
+        for s in SITIOS:
+            idx = rnd.integers(0, por_csv * 2, por_csv)  # con repetidos dentro del día
+            df = pd.DataFrame({
+                "Supermercado": s, "CategoríaURL": [f"https://{s.lower()}.com.py/category/{i % 40}" for i in idx],
+                "Producto": [NOMBRES[i % len(NOMBRES)].format(i=i) for i in idx],
+                "Precio": rnd.integers(2_000, 90_000, por_csv).astype(float),
+                "Grupo": [GRUPOS[i % len(GRUPOS)] for i in idx],
+                "FechaConsulta": f"2026-09-{d % 28 + 1:02d} {8 + d // 28:02d}:15:00",
+            })
+            ruta = os.path.join(pi.OUT_DIR, f"{s.lower().replace(' ', '')}_canasta_202609{d % 28 + 1:02d}_{d:06d}.csv")
+            df.to_csv(ruta, index=False)
+            rutas.append(ruta)
+    return rutas
+
+# ───────── etapa tal como estaba antes de las representaciones compactas ─────────
+def legacy_finalize(base: pd.DataFrame) -> pd.DataFrame:
+    base["FechaConsulta"] = pi._parse_fecha(base["FechaConsulta"])
+    base.sort_values("FechaConsulta", kind="mergesort", inplace=True)
+    base["FechaConsulta"] = base["FechaConsulta"].dt.strftime("%Y-%m-%d")
+    base.drop_duplicates(pi.KEY_COLS, keep="first", inplace=True)
+    base.drop(columns=["ID"], inplace=True, errors="ignore")
+    for c, nd in (("Precio", 2), ("cantidad_unidades", 3), ("precio_unidad", 3)):
+        base[c] = pd.to_numeric(base[c], errors="coerce").round(nd)
+    return base
+
+def legacy(rutas):
+    df_all = pd.concat([pd.read_csv(f, dtype=str) for f in rutas], ignore_index=True, sort=False)
+    grupos = df_all["Grupo"].dropna().unique()
+    df_all["Grupo"] = df_all["Grupo"].map({g: pi.strip_accents(str(g)) for g in grupos}).fillna("")
+    df_all["Precio"] = pd.to_numeric(df_all["Precio"], errors="coerce")
+    enr = pi.ENRICH_CACHE.lookup(df_all["Producto"])
+    enr = enr.astype({c: object for c in ("Grupo", "Subgrupo", "Unidad", "etiquetaunidad")})  # como antes: por fila
+    grupo_csv = df_all["Grupo"]
+    grupo_enr = enr["Grupo"].map({g: pi.strip_accents(g) for g in enr["Grupo"].dropna().unique()}).fillna("")
+    df_all["Subgrupo"] = enr["Subgrupo"]
+    otro = (grupo_csv != grupo_enr).to_numpy()
+    if otro.any():
+        df_all.loc[otro, "Subgrupo"] = pi.CLASSIFIER.subgroup_series(df_all["Producto"][otro], grupo_csv[otro]).to_numpy()
+    df_all = pi.enrich_unit_cols(df_all, units=enr)
+    for c in pi.TARGET_COLS:
+        if c not in df_all.columns: df_all[c] = np.nan
+    df_new = df_all[pi.TARGET_COLS]
+    del df_all, enr
+    base = legacy_finalize(df_new.copy())
+    return base, pi._key_hashes(base)
+
+def actual(rutas):
+    man = pi.IngestManifest()
+    df_new, _ = pi._enrich_frame(man.read([os.path.relpath(r, pi.OUT_DIR) for r in rutas]))
+    base = pi._finalize_base(df_new)
+    return base, pi._key_hashes(base)
+
+# ───────── medición en proceso aparte ─────────
+def _status_kb(campo: str) -> int:
+    with open("/proc/self/status") as fh:
+        for linea in fh:
+            if linea.startswith(campo): return int(linea.split()[1])
+    return 0
+
+def _variante(nombre, rutas_json):
+    rutas = json.load(open(rutas_json))
+    fn = legacy if nombre == "antes" else actual
+    try:
+        with open("/proc/self/clear_refs", "w") as fh: fh.write("5")  # reinicia VmHWM
+    except OSError:
+        pass
+    base0 = _status_kb("VmRSS:")
+    t0 = time.perf_counter()
+    base, h = fn(rutas)
+    dt = time.perf_counter() - t0
+    frame_mb = base.memory_usage(deep=True).sum() / 2**20
+    pico = (_status_kb("VmHWM:") - base0) / 1024
+    filas = pi._df_to_values(base[pi.TARGET_COLS[1:]].iloc[np.argsort(h, kind="stable")])  # como llegan a la hoja
+    firma = hashlib.sha1(json.dumps(filas, ensure_ascii=False).encode()).hexdigest()
+    print(json.dumps({"seg": dt, "pico_mb": pico, "frame_mb": frame_mb, "filas": len(base), "firma": firma}))
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--_variante":
+        return _variante(sys.argv[2], sys.argv[3])
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--filas", type=int, default=1_000_000)
+    ap.add_argument("--dias", type=int, default=30)
+    args = ap.parse_args()
+    if not os.path.exists("/proc/self/status"):
+        sys.exit("Este benchmark mide VmHWM en /proc (Linux)")
+
+    rutas = generar(args.filas, args.dias)
+    lista = os.path.join(pi.OUT_DIR, "rutas.json")
+    json.dump(rutas, open(lista, "w"))
+    res = {}
+    for nombre in ("antes", "después"):
+        out = subprocess.run([sys.executable, __file__, "--_variante", nombre, lista],
+                             capture_output=True, text=True, check=True, env=os.environ)
+        res[nombre] = json.loads(out.stdout.strip().splitlines()[-1])
+    print(f"{args.filas:,} filas en {len(rutas)} CSV")
+    for nombre, r in res.items():
+        print(f"  {nombre:<8}: pico {r['pico_mb']:>7.0f} MB  frame final {r['frame_mb']:>6.0f} MB  "
+              f"{r['seg']:>6.2f} s  {r['filas']:,} filas")
+    igual = res["antes"]["firma"] == res["después"]["firma"] and res["antes"]["filas"] == res["después"]["filas"]
+    df_new, _ = pi._enrich_frame(pi.IngestManifest().read([os.path.relpath(rutas[0], pi.OUT_DIR)]))
+    antes = df_new.copy(deep=True)
+    pi._finalize_base(df_new)
+    intacto = df_new.equals(antes) and (df_new.dtypes == antes.dtypes).all()
+    print(f"  filas idénticas: {igual} | _finalize_base deja su entrada intacta: {intacto}")
+    if not (igual and intacto):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
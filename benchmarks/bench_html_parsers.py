@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de backends HTML sobre fixtures grabados (benchmarks/fixtures/<sitio>/).
+
+Para cada scraper HTML y cada backend (html.parser, html.parser + HTML_RESTRICT, lxml):
+  - verifica que las URLs de categorías y las filas sean idénticas a html.parser completo
+  - mide ms por página de extract_rows (parseo + selección; mediana de --repeticiones)
+  - memoria: pico de heap Python durante extract_rows (tracemalloc) y RSS que ocupa el árbol
+    de una página (proceso aparte que retiene --arboles árboles; incluye la memoria C de libxml2)
+
+Uso:
+    python benchmarks/bench_html_parsers.py [--repeticiones 30]
+    python benchmarks/bench_html_parsers.py --grabar      # reemplaza los fixtures con páginas reales (y la API de Biggie)
+"""
+
+from __future__ import annotations
+import argparse, json, os, statistics, subprocess, sys, tempfile, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_html_"))
+os.environ.setdefault("ENRICH_CACHE", "0")
+
+import pipeline_ingesta as pi  # noqa: E402
+from make_fixtures import FIXTURES  # noqa: E402
+
+SITIOS = ["stock", "superseis", "salemma", "arete", "losjardines"]
+BACKENDS = [("html.parser", False), ("html.parser", True), ("lxml", False)]
+
+def grabar():
+    """Descarga portada + primera categoría de cada sitio con los propios scrapers."""
+    for name in SITIOS:
+        sc = pi.SCRAPERS[name]()
+        r = sc.session.get(sc.base_url, timeout=pi.REQ_TIMEOUT); r.raise_for_status()
+        urls = sorted(sc.extract_category_urls(r.text))
+        if not urls:
+            print(f"{name}: sin categorías, se mantiene el fixture"); continue
+        c = sc.session.get(urls[0], timeout=pi.REQ_TIMEOUT); c.raise_for_status()
+        d = os.path.join(FIXTURES, name); os.makedirs(d, exist_ok=True)
+        for fn, body in (("portada.html", r.content), ("categoria.html", c.content)):
+            with open(os.path.join(d, fn), "wb") as fh: fh.write(body)
+        print(f"{name}: {urls[0]} grabada")
+    sc, grupos = pi.BiggieScraper(), {}  # Biggie: todos los artículos de cada grupo (fixture_sites los pagina)
+    for g in sc.GROUPS:
+        js, skip, grupos[g] = sc.fetch_page(g, 0), 0, []
+        while js is not None:
+            grupos[g] += [{"name": it.get("name", ""), "price": it.get("price")} for it in js.get("items", [])]
+            skip += sc.TAKE
+            js = sc.fetch_page(g, skip) if skip < js.get("count", 0) else None
+    if any(grupos.values()):
+        os.makedirs(os.path.join(FIXTURES, "biggie"), exist_ok=True)
+        with open(os.path.join(FIXTURES, "biggie", "articulos.json"), "w", encoding="utf-8") as fh:
+            json.dump(grupos, fh, ensure_ascii=False)
+        print(f"biggie: {sum(map(len, grupos.values()))} artículos grabados")
+
+def cargar(name):
+    d = os.path.join(FIXTURES, name)
+    with open(os.path.join(d, "portada.html"), "rb") as fh: home = fh.read()
+    with open(os.path.join(d, "categoria.html"), "rb") as fh: cat = fh.read()
+    return home, cat
+
+def usar(parser, restrict):
+    pi.HTML_PARSER, pi.HTML_RESTRICT = parser, restrict
+
+def extraer(sc, home, cat):
+    urls = sorted(sc.extract_category_urls(home.decode("utf-8", errors="replace")))
+    return urls, sc.extract_rows("https://fixture/categoria", cat)
+
+def medir(fn, reps):
+    tiempos = []
+    for _ in range(reps):
+        t0 = time.perf_counter(); fn(); tiempos.append(time.perf_counter() - t0)
+    tracemalloc.start(); fn(); _, pico = tracemalloc.get_traced_memory(); tracemalloc.stop()
+    return statistics.median(tiempos) * 1000, pico / 1024
+
+def _rss_kb() -> float:
+    with open("/proc/self/statm") as fh:
+        return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024
+
+def memoria_arbol(name, parser, restrict, arboles):
+    """Subproceso: RSS por árbol retenido (KB). Devuelve None fuera de Linux."""
+    if not os.path.exists("/proc/self/statm"): return None
+    out = subprocess.run([sys.executable, __file__, "--_arbol", name, parser, str(int(restrict)), str(arboles)],
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip())
+
+def _arbol(name, parser, restrict, arboles):
+    usar(parser, restrict == "1")
+    sc = pi.SCRAPERS[name]()
+    _, cat = cargar(name)
+    pi._parse_html(cat, sc.LIST_ONLY)  # calienta imports/cachés
+    antes, vivos = _rss_kb(), [pi._parse_html(cat, sc.LIST_ONLY) for _ in range(int(arboles))]
+    print((_rss_kb() - antes) / len(vivos))
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--_arbol":
+        return _arbol(*sys.argv[2:6])
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeticiones", type=int, default=30)
+    ap.add_argument("--arboles", type=int, default=50, help="árboles retenidos para medir RSS")
+    ap.add_argument("--grabar", action="store_true")
+    args = ap.parse_args()
+    if args.grabar:
+        return grabar()
+    if not os.path.exists(os.path.join(FIXTURES, SITIOS[0], "categoria.html")):
+        sys.exit("Faltan fixtures: python benchmarks/make_fixtures.py")
+    if pi.lx_html is None:
+        sys.exit("Este benchmark requiere lxml (pip install lxml)")
+
+    distintos = 0
+    print(f"{'sitio':<12} {'backend':<26} {'filas':>5} {'ms/pág':>8} {'heap KB':>8} {'RSS KB':>8} {'idéntico':>9}")
+    for name in SITIOS:
+        sc = pi.SCRAPERS[name]()
+        home, cat = cargar(name)
+        ref = None
+        for parser, restrict in BACKENDS:
+            usar(parser, restrict)
+            res = extraer(sc, home, cat)
+            ref = ref or res
+            ok = res == ref
+            distintos += not ok
+            ms, kb = medir(lambda: sc.extract_rows("https://fixture/categoria", cat), args.repeticiones)
+            rss = memoria_arbol(name, parser, restrict, args.arboles)
+            etiqueta = parser + (" + HTML_RESTRICT" if restrict else "")
+            rss_txt = f"{rss:>8.0f}" if rss is not None else f"{'—':>8}"
+            print(f"{name:<12} {etiqueta:<26} {len(res[1]):>5} {ms:>8.2f} {kb:>8.0f} {rss_txt} {str(ok):>9}")
+    usar("html.parser", False)
+    if distintos:
+        sys.exit(f"{distintos} combinaciones con filas distintas a html.parser")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de la caché HTTP condicional + reutilización de filas por huella de página.
+
+Servidor local estilo Stock con ETag (responde 304 a If-None-Match vigentes). Se corren
+tres pasadas con cachés persistidas en disco entre ellas (como dos corridas del workflow):
+  1) en frío: todo se baja y se parsea
+  2) sin cambios: 304 en todas las categorías, cero parseo, categorías desde el TTL
+  3) con --cambios categorías modificadas: sólo esas se bajan y se re-parsean
+En cada pasada exige filas idénticas (salvo FechaConsulta) a un scrape sin cachés.
+
+Uso:
+    python benchmarks/bench_http_cache.py [--categorias 200] [--productos 40] [--latencia 0.05]
+"""
+
+from __future__ import annotations
+import argparse, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_cache_"))
+
+import pipeline_ingesta as pi  # noqa: E402
+from local_server import LocalSiteServer  # noqa: E402
+from bench_http_engines import PRODUCTOS, LocalStock  # noqa: E402
+
+def build_route(n_cat: int, n_prod: int, cambiadas: set):
+    links = "".join(f'<a href="/category/carnes-{i}">Carnes {i}</a>' for i in range(n_cat))
+    home = f"<html><body><nav>{links}</nav></body></html>".encode()
+
+    def page(i):
+        items = "".join(
+            f'<div class="product-item"><h2 class="product-title">{PRODUCTOS[j % len(PRODUCTOS)].format(i=j)}</h2>'
+            f'<span class="price">Gs. {10_000 + j * 7 + (500 if i in cambiadas else 0):,}</span></div>'.replace(",", ".")
+            for j in range(n_prod)
+        )
+        return f"<html><body><div class='products'>{items}</div></body></html>".encode()
+
+    def route(path):
+        if path in ("/", ""): return 200, home, {}
+        if path.startswith("/category/carnes-"): return 200, page(int(path.rsplit("-", 1)[1])), {}
+        return None
+    return route
+
+def clave(rows):
+    return sorted((r["CategoríaURL"], r["Producto"], r["Precio"], r["Grupo"]) for r in rows)
+
+def nuevas_cachés(enabled: bool):
+    """Recarga desde disco como lo haría un proceso nuevo."""
+    pi.HTTP_CACHE = pi.HttpCache(enabled=enabled)
+    pi.SCRAPE_CACHE = pi.ScrapeCache(enabled=enabled)
+
+def pasada(srv, etiqueta, enabled=True):
+    nuevas_cachés(enabled)
+    sc = LocalStock(srv.url)
+    srv.reset_counters()
+    t0 = time.perf_counter()
+    rows = sc.scrape()
+    dt = time.perf_counter() - t0
+    pi.SCRAPE_CACHE.save()
+    if enabled:
+        print(f"{etiqueta:<14} {dt:>7.2f} s {len(rows):>6} filas {srv.requests:>5} req {srv.not_modified:>5} 304 | "
+              f"{pi._cache_report('stock')}")
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--categorias", type=int, default=200)
+    ap.add_argument("--productos", type=int, default=40)
+    ap.add_argument("--latencia", type=float, default=0.05)
+    ap.add_argument("--cambios", type=int, default=10, help="categorías modificadas en la 3ª pasada")
+    args = ap.parse_args()
+
+    cambiadas: set = set()
+    distintas = 0
+    with LocalSiteServer(build_route(args.categorias, args.productos, cambiadas),
+                         latency=args.latencia, conditional=True) as srv:
+        print(f"{args.categorias} categorías × {args.productos} productos, latencia {args.latencia * 1000:.0f} ms")
+        for etiqueta in ("1) en frío", "2) sin cambios", "3) con cambios"):
+            if etiqueta.startswith("3"): cambiadas.update(range(args.cambios))
+            rows = pasada(srv, etiqueta)
+            ref = pasada(srv, "", enabled=False)  # referencia sin cachés
+            if clave(rows) != clave(ref):
+                distintas += 1
+                print("  ⚠️ filas distintas al scrape sin caché")
+    if distintas:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline: motor threads (ThreadPoolExecutor + requests) vs motor async (aiohttp).
+
+Levanta un servidor local que imita la portada y las categorías de Stock con
+latencia inyectada y mide, para cada motor: tiempo total, filas y conexiones
+TCP abiertas (keep-alive ⇒ pocas conexiones).
+
+Uso:
+    python benchmarks/bench_http_engines.py [--categorias 200] [--latencia 0.2]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_http_"))
+for _var in ("HTTP_CACHE", "PAGE_CACHE"):  # se mide el motor, no las cachés entre corridas
+    os.environ.setdefault(_var, "0")
+
+import pipeline_ingesta as pi  # noqa: E402
+from local_server import LocalSiteServer  # noqa: E402
+
+PRODUCTOS = ["CARNE VACUNA {i} 1 KG", "LECHE ENTERA {i} 1 L", "PAN LACTAL {i} 500 G",
+             "HUEVOS BLANCOS {i} 30 U", "QUESO PARAGUAY {i} 1 KG", "TOMATE {i} 1 KG"]
+
+def build_route(n_cat: int, n_prod: int):
+    links = "".join(f'<a href="/category/carnes-{i}">Carnes {i}</a>' for i in range(n_cat))
+    home = f"<html><body><nav>{links}</nav></body></html>".encode()
+    items = "".join(
+        f'<div class="product-item"><h2 class="product-title">{PRODUCTOS[j % len(PRODUCTOS)].format(i=j)}</h2>'
+        f'<span class="price">Gs. {10_000 + j * 7:,}</span></div>'.replace(",", ".")
+        for j in range(n_prod)
+    )
+    page = f"<html><body><div class='products'>{items}</div></body></html>".encode()
+
+    def route(path):
+        if path in ("/", ""): return 200, home, {}
+        if path.startswith("/category/"): return 200, page, {}
+        return None
+    return route
+
+class LocalStock(pi.StockScraper):
+    def __init__(self, base):
+        super().__init__()
+        self.base_url = base
+
+def run_threads(base, workers):
+    pi.HTTP_ENGINE, pi.MAX_WORKERS = "threads", workers
+    sc = LocalStock(base)
+    sc.session = pi._build_session(pool_size=workers)
+    return sc.scrape()
+
+def run_async(base, concurrency):
+    async def _go():
+        async with pi.AsyncFetcher(concurrency=concurrency) as f:
+            return await LocalStock(base).scrape_async(f)
+    return asyncio.run(_go())
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--categorias", type=int, default=200)
+    ap.add_argument("--productos", type=int, default=20)
+    ap.add_argument("--latencia", type=float, default=0.2, help="segundos por request")
+    ap.add_argument("--workers", type=int, default=pi.MAX_WORKERS)
+    ap.add_argument("--concurrencias", default="64,256")
+    args = ap.parse_args()
+    if pi.aiohttp is None:
+        sys.exit("Este benchmark requiere aiohttp (pip install aiohttp)")
+
+    casos = [("threads", args.workers, run_threads)]
+    casos += [("async", int(c), run_async) for c in args.concurrencias.split(",")]
+
+    with LocalSiteServer(build_route(args.categorias, args.productos), latency=args.latencia) as srv:
+        print(f"{args.categorias} categorías × {args.productos} productos, latencia {args.latencia*1000:.0f} ms")
+        print(f"{'motor':<8} {'conc':>5} {'seg':>8} {'filas':>7} {'req':>6} {'conexiones':>11}")
+        ref = None
+        for nombre, conc, fn in casos:
+            srv.reset_counters()
+            t0 = time.perf_counter()
+            rows = fn(srv.url, conc)
+            dt = time.perf_counter() - t0
+            print(f"{nombre:<8} {conc:>5} {dt:>8.2f} {len(rows):>7} {srv.requests:>6} {srv.connections:>11}")
+            key = sorted((r["CategoríaURL"], r["Producto"], r["Precio"]) for r in rows)
+            if ref is None: ref = key
+            elif key != ref: print("  ⚠️ filas distintas al motor threads")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Arranque en frío: tiempo de `import pipeline_ingesta` y qué dependencias carga cada subcomando.
+
+Cada medición corre en un proceso nuevo (nada queda en sys.modules entre corridas):
+  - import: `import pipeline_ingesta` pelado (mediana de --repeticiones); debe entrar en
+    --presupuesto segundos y no cargar ninguna dependencia pesada
+  - antes : lo mismo importando primero las dependencias que el módulo cargaba al importarse
+  - scrape: import + main(["scrape"]) contra los seis sitios de fixture_sites; no debe cargar pandas, numpy,
+    pyarrow, gspread ni google-auth
+  - ingest: import + main(["ingest"]) sobre los CSV de ese scrape, con Sheets en memoria (fake_sheets); no
+    debe cargar aiohttp, bs4, soupsieve ni lxml, y tiene que ingerir todas las filas scrapeadas
+Sale con 1 si se pasa del presupuesto o si algún subcomando carga lo que no necesita.
+
+Uso:
+    python benchmarks/bench_import.py [--repeticiones 7] [--presupuesto 0.5]
+"""
+
+from __future__ import annotations
+import argparse, contextlib, io, json, os, statistics, subprocess, sys, tempfile, time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PESADAS = ["pandas", "numpy", "pyarrow", "gspread", "google.auth", "aiohttp", "bs4", "soupsieve", "lxml"]
+ANTES = ["numpy", "pandas", "soupsieve", "bs4", "aiohttp", "lxml.etree", "lxml.html", "pyarrow", "pyarrow.dataset",
+         "pyarrow.parquet", "gspread", "gspread_dataframe", "google.oauth2.service_account", "gspread.utils"]
+PROHIBIDAS = {"import": PESADAS,
+              "scrape": ["pandas", "numpy", "pyarrow", "gspread", "google.auth"],
+              "ingest": ["aiohttp", "bs4", "soupsieve", "lxml"]}
+
+def _cargadas() -> list:
+    return [m for m in PESADAS if m in sys.modules]
+
+# ───────── pasos (cada uno en su proceso) ─────────
+def importar(previas: bool):
+    t0 = time.perf_counter()
+    if previas:
+        import importlib
+        for m in ANTES: importlib.import_module(m)
+    import pipeline_ingesta  # noqa: F401
+    print(json.dumps({"segundos": time.perf_counter() - t0, "cargadas": _cargadas()}))
+
+def scrape():
+    t0 = time.perf_counter()
+    import pipeline_ingesta as pi
+    from fixture_sites import FixtureSites
+    with FixtureSites() as sitios:
+        pi.SCRAPERS = sitios.scrapers()
+        with contextlib.redirect_stdout(io.StringIO()):
+            pi.main(["scrape"])
+        dt = time.perf_counter() - t0  # sin el cierre de los servidores locales
+    print(json.dumps({"segundos": dt, "cargadas": _cargadas(), "filas": sum(pi.METRICS.sitios.values())}))
+
+def ingest():
+    t0 = time.perf_counter()
+    import pipeline_ingesta as pi
+    from gspread.utils import extract_id_from_url
+    from fake_sheets import FakeClient, FakeSpreadsheet
+    sh = FakeSpreadsheet(sheet_id=extract_id_from_url(pi.SPREADSHEET_URL))
+    pi._gspread_client = lambda: FakeClient(sh)
+    with contextlib.redirect_stdout(io.StringIO()):
+        pi.main(["ingest"])
+    # fake_sheets importa gspread/google-auth por su cuenta: sólo cuentan las prohibidas para ingest
+    print(json.dumps({"segundos": time.perf_counter() - t0, "cargadas": _cargadas(),
+                      "filas": pi.METRICS.datos.get("filas_leidas", 0)}))
+
+def _hijo(paso: str, env: dict) -> dict:
+    out = subprocess.run([sys.executable, __file__, "--_paso", paso], capture_output=True, text=True, env=env,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    if out.returncode:
+        sys.exit(f"El paso '{paso}' falló:\n{out.stderr[-3000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--_paso":
+        sys.path.insert(0, RAIZ)
+        paso = sys.argv[2]
+        return importar(paso == "antes") if paso in ("import", "antes") else globals()[paso]()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeticiones", type=int, default=7)
+    ap.add_argument("--presupuesto", type=float, default=0.5, help="segundos máximos para `import pipeline_ingesta`")
+    args = ap.parse_args()
+    env = dict(os.environ, OUT_DIR=tempfile.mkdtemp(prefix="bench_import_"), HTTP_CACHE="0", PAGE_CACHE="0",
+               SHEETS_WRITE_RPM="0")
+    problemas = []
+    med = {}
+    for paso in ("antes", "import"):
+        res = [_hijo(paso, env) for _ in range(args.repeticiones)]
+        med[paso] = statistics.median(r["segundos"] for r in res)
+        print(f"  {paso:<7} import: {med[paso] * 1000:>7.0f} ms (mediana de {len(res)}) | cargadas: "
+              f"{', '.join(res[-1]['cargadas']) or '—'}")
+    print(f"  import {med['antes'] / med['import']:.1f}× más rápido (presupuesto {args.presupuesto * 1000:.0f} ms)")
+    if med["import"] > args.presupuesto:
+        problemas.append(f"import en {med['import']:.2f} s > presupuesto {args.presupuesto:.2f} s")
+    filas = {}
+    for paso in ("import", "scrape", "ingest"):
+        r = res[-1] if paso == "import" else _hijo(paso, env)
+        if paso != "import":
+            filas[paso] = r["filas"]
+            print(f"  {paso:<7} {r['segundos']:>6.2f} s | {r['filas']:,} filas | cargadas: {', '.join(r['cargadas']) or '—'}")
+        de_mas = [m for m in PROHIBIDAS[paso] if m in r["cargadas"]]
+        if de_mas: problemas.append(f"{paso} carga {', '.join(de_mas)}")
+    if filas["scrape"] != filas["ingest"] or not filas["scrape"]:
+        problemas.append(f"ingest leyó {filas['ingest']} filas de {filas['scrape']} scrapeadas")
+    if problemas:
+        sys.exit("; ".join(problemas))
+
+if __name__ == "__main__":
+    main()
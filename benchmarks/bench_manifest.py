@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de la carga de CSVs diarios antes de enriquecer: releer todo vs. manifiesto.
+
+Genera --dias días de historia (un CSV por sitio y día, como los deja save_csv) y mide la
+corrida del día siguiente:
+  - antes: glob de todos los *_canasta_*.csv + concat + enriquecimiento de todo
+  - manifiesto: sólo los CSV nuevos (el resto ya registrado y compactado por mes)
+También verifica que compactar no pierda filas (particiones .csv.gz == CSV originales) y que
+--reprocess (HistoryStore.replace) vuelva a correr sobre los duplicados que deja uno cortado.
+
+Uso:
+    python benchmarks/bench_manifest.py [--dias 365] [--filas 1500]
+"""
+
+from __future__ import annotations
+import argparse, glob, os, sys, tempfile, time, tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_manifest_"))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+
+SITIOS = ["Stock", "Superseis", "Salemma", "Arete", "Losjardines", "Biggie"]
+NOMBRES = ["LECHE ENTERA {i} 1 L", "CARNE VACUNA {i} 1 KG", "PAN LACTAL {i} 500 G", "HUEVOS {i} 30 U",
+           "QUESO PARAGUAY {i}", "TOMATE {i} X KG", "YOGUR {i} 900 ML", "GALLETITA {i} 6X100 G"]
+
+def escribir_dia(dia: datetime, filas: int, rnd: np.random.Generator):
+    for s in SITIOS:
+        idx = rnd.choice(filas * 2, filas, replace=False)
+        df = pd.DataFrame({
+            "Supermercado": s, "CategoríaURL": f"https://{s.lower()}/cat",
+            "Producto": [NOMBRES[i % len(NOMBRES)].format(i=i) for i in idx],
+            "Precio": rnd.integers(2_000, 90_000, filas).astype(float), "Grupo": "Lacteos",
+            "FechaConsulta": f"{dia:%Y-%m-%d} 12:15:00",
+        })
+        df.to_csv(os.path.join(pi.OUT_DIR, f"{s.lower()}_canasta_{dia:%Y%m%d}_121500.csv"), index=False)
+
+def enriquecer(df: pd.DataFrame) -> int:
+    df["Precio"] = pd.to_numeric(df["Precio"], errors="coerce")
+    enr = pi.ENRICH_CACHE.lookup(df["Producto"])
+    return len(pi.enrich_unit_cols(df, units=enr))
+
+def medir(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter(); n = fn(); dt = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory(); tracemalloc.stop()
+    return dt, pico / 2**20, n
+
+def chequeo_replace_cortado(df: pd.DataFrame) -> bool:
+    """append, el mismo lote escrito otra vez (replace cortado antes de borrar) y replace de nuevo."""
+    st = pi.HistoryStore(tempfile.mkdtemp(prefix="bench_replace_"))
+    base = pi._finalize_base(df)
+    st.append(base)
+    st._write(st.read())
+    filas = st.replace(base)
+    leido = st.read()
+    ok = (len(leido) == st.rows == len(base) and len(set(pi._key_hashes(leido))) == len(leido)
+          and sorted(leido["ID"]) == sorted(filas["ID"]) == list(range(1, len(base) + 1)))
+    print(f"  --reprocess tras un replace cortado: {len(base) * 2:,} filas con duplicados → {st.rows:,}, "
+          f"IDs originales: {ok}")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dias", type=int, default=365)
+    ap.add_argument("--filas", type=int, default=1500, help="filas por sitio y día")
+    args = ap.parse_args()
+
+    rnd = np.random.default_rng(11)
+    hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for d in range(args.dias, 0, -1):
+        escribir_dia(hoy - timedelta(days=d), args.filas, rnd)
+    total = len(glob.glob(pi.PATTERN_DAILY))
+    print(f"{args.dias} días × {len(SITIOS)} sitios × {args.filas} filas ({total} CSV)")
+
+    # antes: todo el histórico de CSVs en cada corrida
+    escribir_dia(hoy, args.filas, rnd)
+    antes = medir(lambda: enriquecer(pd.concat([pd.read_csv(f, dtype=str) for f in glob.glob(pi.PATTERN_DAILY)],
+                                               ignore_index=True, sort=False)))
+
+    # manifiesto: registrar y compactar la historia previa, y luego la corrida del día
+    for f in glob.glob(os.path.join(pi.OUT_DIR, f"*_canasta_{hoy:%Y%m%d}_*.csv")): os.remove(f)
+    man = pi.IngestManifest()
+    ref = man.read(man.pending())
+    man.commit(pi.ENRICH_CACHE.fingerprint)
+    t0 = time.perf_counter(); print(man.compact() or "[Compactación] nada que compactar")
+    t_comp = time.perf_counter() - t0
+    compactado = pi.IngestManifest().read(pi.IngestManifest().sources(), stage=False)
+    clave = lambda df: df.reindex(columns=pi.CSV_COLS).sort_values(pi.CSV_COLS).reset_index(drop=True)
+    igual = clave(compactado).equals(clave(ref))
+    tam = sum(os.path.getsize(f) for f in glob.glob(os.path.join(pi.COMPACT_DIR, "*.csv.gz")))
+    print(f"  compactación: {t_comp:.2f} s, {tam / 2**20:.1f} MB en {len(os.listdir(pi.COMPACT_DIR))} particiones, "
+          f"filas idénticas: {igual}")
+
+    escribir_dia(hoy, args.filas, rnd)
+    man = pi.IngestManifest()
+    despues = medir(lambda: enriquecer(man.read(man.pending())))
+    for etiqueta, (dt, mb, n) in (("releer todo", antes), ("manifiesto", despues)):
+        print(f"  {etiqueta:<12}: {dt:>7.2f} s  pico {mb:>7.1f} MB  {n:>9,} filas enriquecidas")
+    replace_ok = chequeo_replace_cortado(pi._enrich_frame(ref.head(args.filas * len(SITIOS)).copy())[0])
+    if not (igual and replace_ok):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
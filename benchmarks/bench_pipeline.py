@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Harness de punta a punta: main() completo, sin red, a distintos tamaños de histórico.
+
+Para cada tamaño (--filas) arma un OUT_DIR propio con un histórico local sintético de ese
+tamaño (--filas-dia filas por día hasta ayer) y corre, cada paso en un proceso aparte:
+  - sembrar : escribe el histórico (no es parte de main(), sólo prepara el tamaño)
+  - arranque: main() con la hoja vacía → proyecta la ventana (--ventana días) y crea los resúmenes
+  - diaria  : main() del día siguiente → agrega lo scrapeado al histórico, la hoja y los resúmenes
+Los seis scrapers reales bajan de fixture_sites (servidores locales con --latencia y --errores),
+Sheets es el libro en memoria de fake_sheets detrás de _open_spreadsheet/_open_sheet (se guarda
+entre procesos) y el reloj del pipeline se corre a cada día simulado. De cada corrida toma el
+reporte JSON (RUN_REPORT_DIR): duración, filas/s, pico de RSS y segundos por etapa.
+
+--guardar deja los resultados en JSON; --comparar contra uno anterior sale con 1 si la duración,
+el pico de memoria o alguna etapa de ≥ 1 s empeoró más que --tolerancia. Las variables de entorno
+del pipeline pasan a las corridas (p.ej. HTML_PARSER=lxml o HTTP_ENGINE=async para comparar).
+
+Uso:
+    python benchmarks/bench_pipeline.py [--filas 10000,1000000,5000000] [--filas-dia 5000] [--ventana 30]
+                                        [--latencia 0.02] [--errores 0.01] [--guardar base.json]
+    python benchmarks/bench_pipeline.py --filas 10000,1000000 --comparar base.json [--tolerancia 0.25]
+"""
+
+from __future__ import annotations
+import argparse, contextlib, io, json, math, os, shutil, subprocess, sys, tempfile, time
+from datetime import date, timedelta
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+HOY = date(2026, 7, 1)  # primer día simulado (arranque); el histórico sintético termina el día anterior
+SITIOS = ["Stock", "Superseis", "Salemma", "Arete", "Los Jardines", "Biggie"]
+NOMBRES = ["LECHE ENTERA {i} 1 L", "CARNE VACUNA {i} 1 KG", "PAN LACTAL {i} 500 G", "HUEVOS {i} 30 U",
+           "QUESO PARAGUAY {i} X KG", "TOMATE {i} X KG", "YOGUR {i} 900 ML", "GALLETITA {i} 6X100 G"]
+GRUPOS = ["Lácteos", "Carnicería", "Panadería", "Huevos", "Lácteos", "Frutas y Verduras", "Lácteos", "Panadería"]
+
+def _entorno(out: str, args) -> dict:
+    env = dict(os.environ, OUT_DIR=out, HISTORY_STORE="1", SHEET_WINDOW_DAYS=str(args.ventana))
+    for k, v in (("HTTP_CACHE", "0"), ("PAGE_CACHE", "0"),  # cada corrida baja todo: tiempos comparables
+                 ("SHEETS_WRITE_RPM", "0"),                  # el libro en memoria no tiene cuota
+                 ("COMPACT_AFTER_DAYS", "-1")):
+        env.setdefault(k, v)
+    return env
+
+# ───────── pasos (cada uno en su proceso) ─────────
+def sembrar(out: str, filas: int, filas_dia: int):
+    """Histórico sintético de `filas` filas: el mismo catálogo (enriquecido por el pipeline) cada día."""
+    import numpy as np
+    import pandas as pd
+    import pipeline_ingesta as pi
+    por_sitio = max(filas_dia // len(SITIOS), 1)
+    crudo = pd.DataFrame([{"Supermercado": s, "CategoríaURL": f"https://{s.lower().replace(' ', '')}.com.py/category/{i % 40}",
+                           "Producto": NOMBRES[i % len(NOMBRES)].format(i=i), "Precio": 1000.0 + i,
+                           "Grupo": GRUPOS[i % len(GRUPOS)], "FechaConsulta": f"{HOY} 09:00:00"}
+                          for s in SITIOS for i in range(por_sitio)])
+    with contextlib.redirect_stdout(io.StringIO()):
+        catalogo, _ = pi._enrich_frame(crudo)
+        catalogo = pi._finalize_base(catalogo).reset_index(drop=True)
+    store, rnd = pi.HistoryStore(), np.random.default_rng(11)
+    dias = math.ceil(filas / len(catalogo))
+    t0, escritas, lote = time.perf_counter(), 0, max(200_000 // len(catalogo), 1)
+    for d0 in range(0, dias, lote):
+        k = min(lote, dias - d0)
+        df = catalogo.iloc[np.tile(np.arange(len(catalogo)), k)].reset_index(drop=True)
+        df = df.iloc[:filas - escritas]
+        fechas = [(HOY - timedelta(days=dias - d0 - j)).isoformat() for j in range(k)]
+        df["FechaConsulta"] = np.repeat(fechas, len(catalogo))[:len(df)]
+        factor = rnd.uniform(0.9, 1.1, len(df))
+        df["Precio"] = (df["Precio"].to_numpy() * factor).round(2)
+        df["precio_unidad"] = (df["precio_unidad"].to_numpy() * factor).round(3)
+        df.insert(0, "ID", np.arange(escritas + 1, escritas + len(df) + 1))
+        store._write(df)
+        escritas += len(df)
+    print(json.dumps({"filas": store.rows, "dias": dias, "segundos": round(time.perf_counter() - t0, 2),
+                      "pico_rss_mb": pi._peak_rss_mb()}))
+
+def correr(out: str, dia: str, latencia: float, errores: float, latencia_sheets: float):
+    """Un main() completo en el día `dia`: scrapers reales contra fixtures, libro en memoria persistido en out."""
+    import datetime as dt
+    import pipeline_ingesta as pi
+    from gspread.utils import extract_id_from_url
+    from fake_sheets import FakeClient, FakeSpreadsheet
+    from fixture_sites import FixtureSites
+
+    desfase = date.fromisoformat(dia) - date.today()
+    class Reloj(dt.datetime):  # now() en el día simulado, con la hora real
+        @classmethod
+        def now(cls, tz=None): return dt.datetime.now(tz) + desfase
+    pi.datetime = Reloj
+
+    ruta = os.path.join(out, "libro.pkl")
+    sh = (FakeSpreadsheet.load(ruta, latency=latencia_sheets) if os.path.exists(ruta)
+          else FakeSpreadsheet(sheet_id=extract_id_from_url(pi.SPREADSHEET_URL), latency=latencia_sheets))
+    pi._gspread_client = lambda: FakeClient(sh)
+    with FixtureSites(latency=latencia, error_rate=errores) as sitios:
+        pi.SCRAPERS = sitios.scrapers()
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            pi.main([])
+        errores_srv = sum(sitios.errors().values())
+    sh.save(ruta)
+    reportes = sorted(f for f in os.listdir(pi.RUN_REPORT_DIR) if f.startswith("corrida_"))
+    with open(os.path.join(pi.RUN_REPORT_DIR, reportes[-1]), encoding="utf-8") as fh:
+        rep = json.load(fh)
+    etapas = {}
+    for e in rep["etapas"]:
+        if e["etapa"] not in pi.RunMetrics.EN_HILOS:  # las de los hilos se suman entre hilos: no son de reloj
+            etapas[e["etapa"]] = round(etapas.get(e["etapa"], 0.0) + e["segundos"], 3)
+    hoja = sh._by_title(pi.WORKSHEET_NAME)
+    print(json.dumps({"duracion_s": rep["duracion_s"], "resultado": rep["resultado"], "pico_rss_mb": rep["pico_rss_mb"],
+                      "filas": rep.get("filas_leidas", 0), "filas_s": round(rep.get("filas_leidas", 0) / rep["duracion_s"], 1),
+                      "historico": pi.HistoryStore().rows, "filas_hoja": len(hoja.data), "errores_500": errores_srv,
+                      "fallas": len(rep["fallas"]), "etapas": etapas, "log": log.getvalue()[-2000:]}))
+
+def _hijo(paso: str, env: dict, *params) -> dict:
+    out = subprocess.run([sys.executable, __file__, "--_paso", paso, *map(str, params)],
+                         capture_output=True, text=True, env=env, cwd=RAIZ)
+    if out.returncode:
+        sys.exit(f"El paso '{paso}' falló:\n{out.stderr[-3000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+# ───────── comparación contra resultados guardados ─────────
+def comparar(res: dict, base: dict, tol: float) -> list:
+    """Regresiones (texto) de duración, pico de RSS y etapas de ≥ 1 s respecto de `base`."""
+    peores = []
+    def chequear(donde, nuevo, viejo, holgura):
+        if viejo is not None and nuevo is not None and nuevo > viejo * (1 + tol) + holgura:
+            peores.append(f"{donde}: {viejo:g} → {nuevo:g} (+{(nuevo / max(viejo, 1e-9) - 1):.0%})")
+    for n, corridas in res.items():
+        for corrida, r in corridas.items():
+            b = base.get("resultados", {}).get(n, {}).get(corrida)
+            if not b or corrida == "sembrar": continue
+            chequear(f"{n} {corrida} duración s", r["duracion_s"], b["duracion_s"], 0.5)
+            chequear(f"{n} {corrida} pico RSS MB", r["pico_rss_mb"], b["pico_rss_mb"], 20)
+            for e, s in b["etapas"].items():
+                if s >= 1.0: chequear(f"{n} {corrida} etapa {e} s", r["etapas"].get(e, 0.0), s, 0.25)
+    return peores
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--_paso":
+        sys.path[:0] = [RAIZ, os.path.dirname(os.path.abspath(__file__))]
+        paso, params = sys.argv[2], sys.argv[3:]
+        if paso == "sembrar": return sembrar(params[0], int(params[1]), int(params[2]))
+        return correr(params[0], params[1], *map(float, params[2:5]))
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--filas", default="10000,1000000,5000000", help="tamaños del histórico, separados por coma")
+    ap.add_argument("--filas-dia", type=int, default=5000, help="filas por día del histórico sintético")
+    ap.add_argument("--ventana", type=int, default=30, help="SHEET_WINDOW_DAYS: días proyectados en la hoja")
+    ap.add_argument("--latencia", type=float, default=0.02, help="segundos por request a los sitios")
+    ap.add_argument("--errores", type=float, default=0.01, help="fracción de requests que responden 500")
+    ap.add_argument("--latencia-sheets", type=float, default=0.0, help="segundos por request al libro en memoria")
+    ap.add_argument("--guardar", help="escribe los resultados en este JSON")
+    ap.add_argument("--comparar", help="JSON de una corrida anterior (--guardar): sale con 1 si hay regresiones")
+    ap.add_argument("--tolerancia", type=float, default=0.25, help="empeoramiento relativo tolerado")
+    ap.add_argument("--conservar", action="store_true", help="no borra los OUT_DIR temporales")
+    args = ap.parse_args()
+    tamaños = [int(float(x)) for x in args.filas.split(",") if x.strip()]
+
+    raiz, res = tempfile.mkdtemp(prefix="bench_pipeline_"), {}
+    print(f"histórico a {args.filas_dia:,} filas/día, ventana de {args.ventana} días, sitios con "
+          f"{args.latencia * 1000:.0f} ms/request y {args.errores:.0%} de 500")
+    for n in tamaños:
+        out = os.path.join(raiz, f"h{n}")
+        os.makedirs(out)
+        env = _entorno(out, args)
+        r = res[str(n)] = {"sembrar": _hijo("sembrar", env, out, n, args.filas_dia)}
+        print(f"{n:,} filas de histórico ({r['sembrar']['dias']} días): sembrado en {r['sembrar']['segundos']:.1f} s")
+        for corrida, dia in (("arranque", HOY), ("diaria", HOY + timedelta(days=1))):
+            c = r[corrida] = _hijo("correr", env, out, dia.isoformat(), args.latencia, args.errores, args.latencia_sheets)
+            if c["resultado"] != "ok":
+                sys.exit(f"  {corrida}: {c['resultado']}\n{c['log']}")
+            etapas = ", ".join(f"{e} {s:.2f}" for e, s in sorted(c["etapas"].items(), key=lambda kv: -kv[1])[:6])
+            print(f"  {corrida:<8}: main() {c['duracion_s']:6.2f} s | {c['filas']:,} filas → {c['filas_s']:,.0f} filas/s | "
+                  f"pico RSS {c['pico_rss_mb']:,.0f} MB | hoja {c['filas_hoja']:,} filas, histórico {c['historico']:,} | "
+                  f"{c['errores_500']} 500 inyectados, {c['fallas']} fallas")
+            print(f"            etapas (s): {etapas}")
+        for c in ("arranque", "diaria"): r[c].pop("log")
+        if not args.conservar: shutil.rmtree(out, ignore_errors=True)
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as fh:
+            json.dump({"version": 1, "parametros": {k: v for k, v in vars(args).items()
+                                                    if k not in ("guardar", "comparar", "conservar")},
+                       "resultados": res}, fh, ensure_ascii=False, indent=1)
+        print(f"resultados en {args.guardar}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as fh:
+            peores = comparar(res, json.load(fh), args.tolerancia)
+        print(f"comparación con {args.comparar} (tolerancia {args.tolerancia:.0%}): "
+              + ("sin regresiones" if not peores else f"{len(peores)} regresiones"))
+        for p in peores: print(f"  {p}")
+        if peores:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Chequeo offline del reporte de corrida (RUN_REPORT_DIR / PROM_TEXTFILE).
+
+Corre main() contra un servidor local estilo Stock donde algunas categorías responden 404,
+otras 500 (se reintentan y se pierden) y un segundo sitio apunta a un puerto cerrado, con el
+libro en memoria de fake_sheets y el histórico local. Exige que el reporte JSON:
+  - tenga todas las etapas (categorías, descarga, parseo, clasificación, unidades, CSV,
+    lectura/escritura de Sheets, dedupe, histórico);
+  - cuente por host lo mismo que vio el servidor (intentos, 404/500, reintentos, bytes);
+  - liste exactamente las categorías perdidas con su motivo (http_404, http_500, conexion);
+y que el textfile de Prometheus sea consistente con el JSON, que una corrida que falla también
+deje su reporte y cuánto cuesta instrumentar (µs por etapa × llamadas de la corrida).
+
+Uso:
+    python benchmarks/bench_report.py [--categorias 120] [--productos 20] [--motor threads|async]
+"""
+
+from __future__ import annotations
+import argparse, json, os, re, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+for _var in ("HTTP_CACHE", "PAGE_CACHE"):  # cada corrida baja todo: los conteos por host son exactos
+    os.environ.setdefault(_var, "0")
+from bench_summaries import Entorno  # noqa: E402  (OUT_DIR propio, libro en memoria, histórico local)
+
+import pipeline_ingesta as pi  # noqa: E402
+from local_server import LocalSiteServer  # noqa: E402
+from bench_http_engines import LocalStock, build_route  # noqa: E402
+
+# lectura_csv sólo aparece con CSV pendientes de corridas anteriores: los de esta corrida no se releen
+ETAPAS = {"scrape", "categorias", "descarga", "parseo", "csv", "clasificacion", "unidades",
+          "ingesta", "lectura_sheets", "dedupe", "historico", "escritura_sheets", "resumenes"}
+
+def ruta_con_fallas(n_cat, n_prod):
+    base = build_route(n_cat, n_prod)
+    rotas = {f"/category/carnes-{i}": 404 for i in range(0, n_cat, 17)}
+    rotas.update({f"/category/carnes-{i}": 500 for i in range(5, n_cat, 23)})
+
+    def route(path):
+        if path in rotas: return rotas[path], b"error", {}
+        return base(path)
+    return route, rotas
+
+def ultimo_reporte(ent):
+    d = os.path.join(ent.out, "reportes")
+    with open(os.path.join(d, sorted(os.listdir(d))[-1]), encoding="utf-8") as fh:
+        return json.load(fh)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--categorias", type=int, default=120)
+    ap.add_argument("--productos", type=int, default=20)
+    ap.add_argument("--motor", default="threads", choices=["threads", "async"])
+    args = ap.parse_args()
+    if args.motor == "async" and pi.aiohttp is None:
+        sys.exit("--motor async requiere aiohttp (pip install aiohttp)")
+    oks = []
+
+    ent = Entorno(argparse.Namespace(productos=0))
+    route, rotas = ruta_con_fallas(args.categorias, args.productos)
+    with ent.activo(), LocalSiteServer(route) as srv:
+        pi.HTTP_ENGINE, pi.RETRY_BACKOFF = args.motor, 0.01
+        pi.HOST_LIMITS = pi.HostLimits()
+        pi.PROM_TEXTFILE = os.path.join(ent.out, "preciossuper.prom")
+        def caido():  # otro sitio, en un puerto cerrado: conexión rechazada
+            sc = LocalStock("http://127.0.0.1:9")
+            sc.name = "superseis"
+            return sc
+        ent.scrapers = {"stock": lambda: LocalStock(srv.url), "superseis": caido}
+        t0 = time.perf_counter()
+        salida = ent.correr("hoy")
+        dt = time.perf_counter() - t0
+        rep = ultimo_reporte(ent)
+        print(f"{args.categorias} categorías × {args.productos} productos, motor {args.motor}: main() {dt:.2f} s")
+        print("  " + next(l for l in salida.splitlines() if l.startswith("[Métricas]")))
+
+        etapas = {e["etapa"] for e in rep["etapas"]}
+        ok = ETAPAS <= etapas and rep["resultado"] == "ok"
+        print(f"  etapas presentes: {ok}" + ("" if ok else f" (faltan {sorted(ETAPAS - etapas)})"))
+        oks.append(ok)
+
+        host = rep["hosts"][srv.url.split("//")[1]]
+        n404 = sum(1 for s in rotas.values() if s == 404)
+        n500 = sum(1 for s in rotas.values() if s == 500)
+        esperado_500 = n500 * (pi.RETRY_TOTAL + 1)
+        ok = (host["intentos"] == srv.requests and host["status"].get("404") == n404
+              and host["status"].get("500") == esperado_500 and host["reintentos"] == n500 * pi.RETRY_TOTAL
+              and host["bytes"] > 0 and sum(host["latencia_s"]["buckets"].values()) > 0)
+        print(f"  host local: {host['intentos']} intentos (servidor: {srv.requests}), status {host['status']}, "
+              f"{host['reintentos']} reintentos, {host['bytes']:,} bytes, p50 {host['latencia_s']['p50'] * 1000:.1f} ms: {ok}")
+        oks.append(ok)
+
+        perdidas = {(f["url"].replace(srv.url, ""), f["motivo"]) for f in rep["fallas"] if f["sitio"] == "stock"}
+        esperadas = {(u, f"http_{s}") for u, s in rotas.items()}
+        muerto_ok = any(f["sitio"] == "superseis" and f["etapa"] == "categorias" and f["motivo"] == "conexion"
+                        for f in rep["fallas"])
+        filas = rep["sitios"]["stock"]["filas"] == (args.categorias - len(rotas)) * args.productos
+        ok = perdidas == esperadas and muerto_ok and filas
+        print(f"  fallas por URL == categorías rotas ({len(rotas)}) + sitio caído (conexion), filas del resto: {ok}")
+        oks.append(ok)
+
+        prom = open(pi.PROM_TEXTFILE, encoding="utf-8").read()
+        linea = re.compile(r'^(# (HELP|TYPE) .+|[a-z_]+(\{[^}]*\})? -?[0-9.e+]+(inf)?)$')
+        cuenta = re.search(r'preciossuper_http_latency_seconds_count\{host="%s"\} (\d+)' % re.escape(srv.url.split("//")[1]), prom)
+        ok = all(linea.match(l) for l in prom.splitlines()) and cuenta and int(cuenta.group(1)) == host["intentos"]
+        print(f"  textfile Prometheus ({len(prom.splitlines())} líneas) válido y == JSON: {bool(ok)}")
+        oks.append(bool(ok))
+
+        # una corrida que falla también deja su reporte (con el error)
+        abrir = ent.abrir
+        def roto():
+            raise RuntimeError("Sheets caído")
+        pi._open_spreadsheet = roto
+        try:
+            ent.correr("hoy")
+        except RuntimeError:
+            pass
+        pi._open_spreadsheet = abrir
+        rep2 = ultimo_reporte(ent)
+        ok = rep2["resultado"].startswith("error: RuntimeError") and rep2["sitios"]
+        print(f"  corrida fallida con reporte: {bool(ok)} ({rep2['resultado']})")
+        oks.append(bool(ok))
+
+        # costo de instrumentar: una etapa vacía × las llamadas de la corrida
+        m, n = pi.RunMetrics(), 100_000
+        t0 = time.perf_counter()
+        for _ in range(n):
+            with m.stage("x", "sitio"): pass
+        por_etapa = (time.perf_counter() - t0) / n
+        t0 = time.perf_counter()
+        for _ in range(n): m.request("h", 0.1, 200)
+        por_intento = (time.perf_counter() - t0) / n
+        llamadas = sum(e["llamadas"] for e in rep["etapas"])
+        costo = llamadas * por_etapa + host["intentos"] * por_intento
+        print(f"  overhead: {por_etapa * 1e6:.1f} µs/etapa, {por_intento * 1e6:.1f} µs/intento → "
+              f"{costo * 1000:.1f} ms en esta corrida ({costo / dt:.2%} de main())")
+    if not all(oks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
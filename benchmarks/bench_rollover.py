@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline del rollover de la proyección a Sheets (SHEETS_ROLLOVER) vs. la hoja única.
+
+Corre main() día por día (scrapers falsos, histórico local real, libros en memoria de
+fake_sheets con un límite de celdas chico para que se llenen) y compara:
+  - hoja única: al no entrar, la proyección se recorta y las filas viejas dejan de estar en Sheets
+  - rollover: fragmentos por período en el libro principal y en libros hermanos + hoja índice;
+    exige que la unión de los fragmentos sea exactamente el histórico (ninguna fila recortada),
+    que el índice coincida con cada fragmento y que cada corrida diaria escriba sólo el
+    fragmento activo y el índice
+También migra la hoja única existente, repara un fragmento editado a mano (regenera sólo su
+período), verifica que --full-rebuild deje lo mismo, que cambiar de período rehaga los
+fragmentos y que --dry-run no escriba.
+
+Uso:
+    python benchmarks/bench_rollover.py [--dias 90] [--productos 300] [--limite 400000]
+"""
+
+from __future__ import annotations
+import argparse, collections, contextlib, io, os, random, sys, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_rollover_"))
+os.environ.setdefault("HISTORY_STORE", "1")
+os.environ.setdefault("COMPACT_AFTER_DAYS", "-1")
+
+from datetime import date, timedelta  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+from fake_sheets import FakeSpreadsheet  # noqa: E402
+
+URL = "https://docs.google.com/spreadsheets/d/{}/edit"
+
+class Scraper:
+    """Scraper falso: `productos` filas por sitio y día, con precios que cambian."""
+    dia = None
+
+    def __init__(self, nombre, productos, rnd):
+        self.nombre, self.productos, self.rnd = nombre, productos, rnd
+
+    def stream(self):
+        return ({"Supermercado": self.nombre.title(), "CategoríaURL": f"https://{self.nombre}.com.py/lacteos",
+                 "Producto": f"LECHE ENTERA {i} 1 L", "Precio": self.rnd.randint(5_000, 9_000), "Grupo": "Lácteos",
+                 "FechaConsulta": f"{Scraper.dia} 09:00:00"} for i in range(self.productos))
+
+    def csv_name(self):
+        return f"{self.nombre}_canasta_{Scraper.dia.replace('-', '')}_090000.csv"
+
+class Entorno:
+    """Libros en memoria + OUT_DIR propio; registra qué hojas recibe cada values.batchUpdate."""
+    def __init__(self, args, hermanos=2, rollover=""):
+        self.out = tempfile.mkdtemp(prefix="rollover_", dir=os.environ["OUT_DIR"])
+        self.libros = {k: FakeSpreadsheet(sheet_id=k) for k in ["principal"] + [f"hermano{i}" for i in range(1, hermanos + 1)]}
+        self.escritas = collections.Counter()
+        for sh in self.libros.values():
+            orig = sh.values_batch_update
+            def registrar(body=None, _orig=orig, _sh=sh):
+                for d in (body or {}).get("data", []):
+                    self.escritas[(_sh.id, d["range"].split("!")[0].strip("'"))] += sum(len(f) for f in d["values"])
+                return _orig(body=body)
+            sh.values_batch_update = registrar
+        self.sh = self.libros["principal"]
+        self.sh.add_worksheet(pi.WORKSHEET_NAME, rows=1000, cols=20)
+        self.args, self.rollover = args, rollover
+        rnd = random.Random(3)
+        self.scrapers = {s: (lambda s=s: Scraper(s, args.productos, rnd)) for s in ("stock", "biggie")}
+
+    @contextlib.contextmanager
+    def activo(self):
+        """Parchea el módulo para este entorno (OUT_DIR, libros, límites) y lo restaura al salir."""
+        previo = {k: getattr(pi, k) for k in ("OUT_DIR", "PATTERN_DAILY", "MANIFEST_PATH", "COMPACT_DIR", "HISTORY_DIR",
+                                              "KEY_INDEX_PATH", "SHEETS_CHECKPOINT_PATH", "SHEETS_CELL_LIMIT",
+                                              "SHEETS_ROLLOVER", "SHEETS_ROLLOVER_BOOKS", "SHEET_WINDOW_DAYS",
+                                              "SUMMARY_SHEETS", "SCRAPERS", "_open_spreadsheet", "_open_book")}
+        pi.OUT_DIR = self.out
+        pi.PATTERN_DAILY = os.path.join(self.out, "*_canasta_*.csv")
+        pi.MANIFEST_PATH = os.path.join(self.out, ".manifiesto_csv.json")
+        pi.COMPACT_DIR = os.path.join(self.out, "compactado")
+        pi.HISTORY_DIR = os.path.join(self.out, "historico")
+        pi.KEY_INDEX_PATH = os.path.join(self.out, ".indice_claves")
+        pi.SHEETS_CHECKPOINT_PATH = os.path.join(self.out, ".subida_sheets")
+        pi.SHEETS_CELL_LIMIT, pi.SHEET_WINDOW_DAYS = self.args.limite, 0
+        pi.SHEETS_ROLLOVER, pi.SUMMARY_SHEETS = self.rollover, False  # resúmenes: bench_summaries.py
+        pi.SHEETS_ROLLOVER_BOOKS = [URL.format(k) for k in self.libros if k != "principal"]
+        pi.SCRAPERS = self.scrapers
+        pi._open_spreadsheet = self.abrir
+        pi._open_book = lambda key: self.libros[key]
+        try:
+            yield
+        finally:
+            for k, v in previo.items(): setattr(pi, k, v)
+
+    def abrir(self):
+        pi.SheetsPlanner._books.clear()  # cada corrida lee los metadatos de nuevo, como en producción
+        titulos = {s.props["title"] for s in self.sh._sheets.values()}
+        if pi.WORKSHEET_NAME not in titulos and pi._rollover_enabled():
+            return self.sh, None
+        return self.sh, self.sh.worksheet(pi.WORKSHEET_NAME)
+
+    def correr(self, dia=None, flags=()):
+        Scraper.dia = dia
+        self.escritas.clear()
+        for sh in self.libros.values(): sh.calls.clear()
+        pi.SCRAPERS = self.scrapers if dia else {}
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            pi.main(list(flags))
+        return out.getvalue()
+
+    def hoja(self, key, title):
+        s = self.libros[key]._by_title(title)
+        return s.values(1, 1, s.rows, s.cols)
+
+    def filas_en_sheets(self):
+        """Filas de datos publicadas: la hoja única o la unión de los fragmentos del índice."""
+        titulos = {s.props["title"] for s in self.sh._sheets.values()}
+        if pi.SHARD_INDEX_NAME not in titulos:
+            return self.hoja("principal", pi.WORKSHEET_NAME)[1:] if pi.WORKSHEET_NAME in titulos else []
+        indice = self.indice()
+        return [f for e in indice for f in self.hoja(e["Libro"], e["Hoja"])[1:]]
+
+    def indice(self):
+        vals = self.hoja("principal", pi.SHARD_INDEX_NAME)
+        return [dict(zip(vals[0], f)) for f in vals[1:]]
+
+    def esperado(self):
+        """El histórico local completo tal como se escribiría a Sheets."""
+        df = pi.HistoryStore(os.path.join(self.out, "historico")).read()
+        return pi._df_to_values(df[pi.TARGET_COLS])
+
+def por_id(filas):
+    return sorted(filas, key=lambda f: f[0])
+
+def indice_ok(ent):
+    ok = True
+    for e in ent.indice():
+        datos = ent.hoja(e["Libro"], e["Hoja"])[1:]
+        fechas = [f[pi.TARGET_COLS.index("FechaConsulta")] for f in datos]
+        ok &= (len(datos) == e["Filas"] and datos[0][0] == e["PrimerID"] and datos[-1][0] == e["UltimoID"]
+               and min(fechas) == e["Desde"] and max(fechas) == e["Hasta"]
+               and {pi._shard_period(d) for d in fechas} == {str(e["Periodo"])})
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dias", type=int, default=90)
+    ap.add_argument("--productos", type=int, default=300, help="filas por sitio y día (2 sitios)")
+    ap.add_argument("--limite", type=int, default=400_000, help="celdas por libro (SHEETS_CELL_LIMIT)")
+    ap.add_argument("--periodo", default="month", choices=["month", "quarter", "year"])
+    args = ap.parse_args()
+    inicio = date(2026, 7, 1)
+    dias = [(inicio + timedelta(days=d)).isoformat() for d in range(args.dias)]
+    mitad = len(dias) // 3
+    print(f"{args.dias} días × 2 sitios × {args.productos} filas; {args.limite:,} celdas por libro "
+          f"({args.limite // len(pi.TARGET_COLS):,} filas), rollover por {args.periodo}")
+    oks = []
+
+    # hoja única: recorta
+    unica = Entorno(args, hermanos=0)
+    with unica.activo():
+        for d in dias: unica.correr(d)
+        en_hoja, total = len(unica.filas_en_sheets()), len(unica.esperado())
+    print(f"  hoja única : {en_hoja:>7,} de {total:,} filas en Sheets ({total - en_hoja:,} recortadas)")
+
+    # rollover: primero hoja única (migración), después fragmentos
+    ent = Entorno(args, hermanos=2)
+    with ent.activo():
+        for d in dias[:mitad]: ent.correr(d)
+        pi.SHEETS_ROLLOVER = args.periodo
+        salida = ent.correr(dias[mitad])
+        migrada = pi.WORKSHEET_NAME not in {s.props["title"] for s in ent.sh._sheets.values()}
+        resumen = next((l for l in salida.splitlines() if l.startswith("✅")), "")
+        print(f"  migración  : hoja única borrada: {migrada} | {resumen}")
+        oks.append(migrada)
+        celdas_dia, solo_activo = [], True
+        for d in dias[mitad + 1:]:
+            ent.correr(d)
+            activo = pi._shard_title(pi._shard_period(d), 1)
+            hojas = {t for _, t in ent.escritas}
+            solo_activo &= hojas <= {pi.SHARD_INDEX_NAME} | {t for t in hojas if t.startswith(activo)}
+            celdas_dia.append(sum(ent.escritas.values()))
+        completo = por_id(ent.filas_en_sheets()) == por_id(ent.esperado())
+        indice = ent.indice()
+        libros = sorted({e["Libro"] for e in indice})
+        print(f"  rollover   : {len(ent.filas_en_sheets()):>7,} de {len(ent.esperado()):,} filas en Sheets | "
+              f"{len(indice)} fragmentos en {len(libros)} libros ({', '.join(libros)})")
+        print(f"               unión de fragmentos == histórico: {completo} | índice coincide: {indice_ok(ent)} | "
+              f"sólo fragmento activo + índice por corrida: {solo_activo} | "
+              f"celdas escritas por corrida: mediana {sorted(celdas_dia)[len(celdas_dia) // 2]:,}")
+        oks += [completo, indice_ok(ent), solo_activo]
+
+        # fragmento editado a mano → se regenera sólo su período
+        e = ent.indice()[-1]
+        hoja = ent.libros[e["Libro"]]._by_title(e["Hoja"])
+        hoja.resize(rows=hoja.rows + 1)
+        hoja.write(hoja.rows, 1, [[999_999]])
+        ent.correr((date.fromisoformat(dias[-1]) + timedelta(days=1)).isoformat())
+        hojas = {t for _, t in ent.escritas}
+        reparado = (por_id(ent.filas_en_sheets()) == por_id(ent.esperado()) and indice_ok(ent)
+                    and all(t == pi.SHARD_INDEX_NAME or t.startswith(pi._shard_title(str(e["Periodo"]), 1)) for t in hojas))
+        print(f"  reparación : fragmento editado regenerado (sólo su período): {reparado}")
+        oks.append(reparado)
+
+        # --full-rebuild deja exactamente lo mismo
+        antes = {(k, s.props["title"]): s.values(1, 1, s.rows, s.cols) for k, sh in ent.libros.items() for s in sh._sheets.values()}
+        ent.correr(flags=["--full-rebuild"])
+        despues = {(k, s.props["title"]): s.values(1, 1, s.rows, s.cols) for k, sh in ent.libros.items() for s in sh._sheets.values()}
+        print(f"  --full-rebuild: mismas hojas y celdas: {antes == despues}")
+        oks.append(antes == despues)
+
+        # --dry-run no escribe
+        ent.correr((date.fromisoformat(dias[-1]) + timedelta(days=2)).isoformat(), flags=["--dry-run"])
+        pi.SHEETS_DRY_RUN = False  # main() lo deja activado en el módulo
+        sin_escribir = not ent.escritas and all(c in ("fetch_sheet_metadata", "values_get") for sh in ent.libros.values() for c in sh.calls)
+        print(f"  --dry-run  : sin escribir: {sin_escribir}")
+        oks.append(sin_escribir)
+
+        # cambio de período → se rehacen los fragmentos en la corrida siguiente
+        pi.SHEETS_ROLLOVER = "quarter" if args.periodo != "quarter" else "month"
+        ent.correr((date.fromisoformat(dias[-1]) + timedelta(days=3)).isoformat())
+        rehecho = por_id(ent.filas_en_sheets()) == por_id(ent.esperado()) and indice_ok(ent)
+        print(f"  cambio a {pi.SHEETS_ROLLOVER:<8}: {len(ent.indice())} fragmentos, unión == histórico e índice ok: {rehecho}")
+        oks.append(rehecho)
+
+    # un solo libro: la hoja única ocupa el lugar que necesitan los fragmentos
+    cap = int(args.limite * pi.SHEETS_SHARD_FILL) // len(pi.TARGET_COLS)
+    cabe = max(cap * 3 // 4 // (2 * args.productos), 1)  # días que entran en un libro pero no dos veces
+    solo = Entorno(args, hermanos=0)
+    with solo.activo():
+        for d in dias[:cabe]: solo.correr(d)
+        pi.SHEETS_ROLLOVER = args.periodo
+        salida = solo.correr(dias[cabe])
+        ok = ("se borra" in salida and pi.WORKSHEET_NAME not in {s.props["title"] for s in solo.sh._sheets.values()}
+              and por_id(solo.filas_en_sheets()) == por_id(solo.esperado()) and indice_ok(solo))
+        print(f"  un libro, hoja única ocupando el lugar ({cabe} días): se borra antes y todo pasa a fragmentos: {ok}")
+        oks.append(ok)
+    lleno = Entorno(args, hermanos=0)
+    with lleno.activo():
+        for d in dias: lleno.correr(d)
+        antes = lleno.hoja("principal", pi.WORKSHEET_NAME)
+        pi.SHEETS_ROLLOVER = args.periodo
+        try:
+            lleno.correr((date.fromisoformat(dias[-1]) + timedelta(days=1)).isoformat())
+            error = None
+        except RuntimeError as e:
+            error = e
+        ok = error is not None and lleno.hoja("principal", pi.WORKSHEET_NAME) == antes and not lleno.escritas
+        print(f"  un libro, histórico que no entra: error antes de escribir y hoja única intacta: {ok}")
+        oks.append(ok)
+    if not all(oks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de la corrida de scrape con todos los sitios a la vez, presupuesto común y plazo.
+
+Los seis sitios de fixture_sites (con --latencia por request), pero en --colgado la mitad de las
+categorías tarda --cuelga segundos (más que REQ_TIMEOUT: timeout + reintentos, hasta que se abre el
+circuito del host). Cada variante corre `main(["scrape"])` en un proceso aparte:
+  - antes      : un sitio detrás de otro, sin tope global ni plazo (SCRAPE_SITES_PARALLEL=1)
+  - a la vez   : todos los sitios a la vez, SCRAPE_CONCURRENCY requests en vuelo entre todos
+  - plazo      : lo mismo con SCRAPE_DEADLINE_S=--plazo
+  - plazo, 4   : plazo y sólo 4 requests en vuelo entre todos los sitios
+Reporta duración, cuándo quedaron listos los sitios sanos, filas y estado por sitio y el pico de
+requests en vuelo. Exige que los sitios sanos den las mismas filas sin tope chico (con 4 cupos, los
+requests colgados los ocupan y el plazo puede cortar también a otros: quedan marcados), que con plazo
+la corrida termine dentro de --plazo + --margen con el sitio colgado marcado incompleto y las filas
+de sus categorías sanas conservadas, y que el pico en vuelo no pase el tope.
+
+Uso:
+    python benchmarks/bench_scheduler.py [--latencia 0.1] [--colgado salemma] [--cuelga 12] [--plazo 6]
+"""
+
+from __future__ import annotations
+import argparse, contextlib, io, json, os, subprocess, sys, tempfile, time, zlib
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+VARIANTES = {"antes": {"SCRAPE_SITES_PARALLEL": "1", "SCRAPE_CONCURRENCY": "0", "SCRAPE_DEADLINE_S": "0"},
+             "a la vez": {"SCRAPE_SITES_PARALLEL": "0", "SCRAPE_DEADLINE_S": "0"},
+             "plazo": {"SCRAPE_SITES_PARALLEL": "0"},
+             "plazo, 4": {"SCRAPE_SITES_PARALLEL": "0", "SCRAPE_CONCURRENCY": "4"}}
+
+def variante(args):
+    """En el proceso hijo: scrape contra los fixtures con un sitio colgado; imprime el resumen en JSON."""
+    import pipeline_ingesta as pi
+    from fixture_sites import FixtureSites
+    with FixtureSites(latency=args.latencia) as sitios:
+        srv = sitios.servers[args.colgado]
+        ruta = srv.route
+        def colgada(path):  # la mitad de las categorías (fija, por URL) no responde a tiempo
+            if urlparse(path).path not in ("", "/") and zlib.crc32(path.encode()) % 2: time.sleep(args.cuelga)
+            return ruta(path)
+        srv.route = colgada
+        pi.SCRAPERS = sitios.scrapers()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            pi.main(["scrape"])
+        dt = time.perf_counter() - t0  # sin el cierre de los servidores locales (espera a los colgados)
+    reportes = sorted(f for f in os.listdir(pi.RUN_REPORT_DIR) if f.startswith("corrida_"))
+    with open(os.path.join(pi.RUN_REPORT_DIR, reportes[-1]), encoding="utf-8") as fh:
+        rep = json.load(fh)
+    print(json.dumps({"segundos": dt, "sitios": rep["sitios"], "scrape": rep.get("scrape", {}),
+                      "deadline": sum(f["fallas"] for f in rep["fallas_por_motivo"] if f["motivo"] == "deadline"),
+                      "log": log.getvalue()[-1500:]}))
+
+def _sanos_listos(r: dict, colgado: str, uno_por_uno: bool) -> float:
+    """Segundos hasta que terminó el último sitio sano (uno por uno: suma en orden de corrida)."""
+    if not uno_por_uno:
+        return max(v["segundos"] for s, v in r["sitios"].items() if s != colgado)
+    t = listo = 0.0
+    for s, v in r["sitios"].items():  # el reporte los lista en el orden en que terminaron
+        t += v["segundos"]
+        if s != colgado: listo = t
+    return listo
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latencia", type=float, default=0.1, help="segundos por request en todos los sitios")
+    ap.add_argument("--colgado", default="salemma", help="sitio con la mitad de las categorías colgadas")
+    ap.add_argument("--cuelga", type=float, default=12.0, help="segundos que tarda cada categoría colgada")
+    ap.add_argument("--plazo", type=float, default=6.0, help="SCRAPE_DEADLINE_S de las variantes con plazo")
+    ap.add_argument("--margen", type=float, default=2.0, help="segundos tolerados después del plazo")
+    ap.add_argument("--_variante", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args._variante:
+        return variante(args)
+    print(f"6 sitios, {args.latencia * 1000:.0f} ms/request; {args.colgado}: la mitad de las categorías tarda "
+          f"{args.cuelga:.0f} s (REQ_TIMEOUT 10 s); plazo {args.plazo:.0f} s")
+    print(f"  {'variante':<10} {'seg':>6} {'sanos':>6} {'pico':>5} {'tope':>5} {'deadline':>9}  filas por sitio (* = incompleto)")
+    res, problemas = {}, []
+    for nombre, env in VARIANTES.items():
+        env = {**os.environ, "OUT_DIR": tempfile.mkdtemp(prefix="bench_corrida_"), "HTTP_CACHE": "0", "PAGE_CACHE": "0",
+               "SCRAPE_DEADLINE_S": str(args.plazo), **env}
+        p = subprocess.run([sys.executable, __file__, "--_variante", nombre, "--latencia", str(args.latencia),
+                            "--colgado", args.colgado, "--cuelga", str(args.cuelga)],
+                           capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if p.returncode:
+            sys.exit(f"La variante '{nombre}' falló:\n{p.stderr[-3000:]}")
+        r = res[nombre] = json.loads(p.stdout.strip().splitlines()[-1])
+        filas = " ".join(f"{s}={v['filas']}{'' if v['completo'] else '*'}" for s, v in r["sitios"].items())
+        sc = r["scrape"]
+        r["sanos"] = _sanos_listos(r, args.colgado, env["SCRAPE_SITES_PARALLEL"] == "1")
+        print(f"  {nombre:<10} {r['segundos']:>6.1f} {r['sanos']:>6.1f} {sc.get('pico_en_vuelo', 0):>5} "
+              f"{sc.get('tope') or '—':>5} {r['deadline']:>9}  {filas}")
+        if sc.get("tope") and sc["pico_en_vuelo"] > sc["tope"]:
+            problemas.append(f"{nombre}: pico {sc['pico_en_vuelo']} > tope {sc['tope']}")
+
+    sanos = lambda r: {s: v["filas"] for s, v in r["sitios"].items() if s != args.colgado}
+    if any(sanos(res[n]) != sanos(res["antes"]) or not all(sanos(res[n]).values()) for n in ("a la vez", "plazo")):
+        problemas.append("los sitios sanos no dan las mismas filas en todas las variantes")
+    completo = res["antes"]["sitios"][args.colgado]["filas"]
+    for nombre in ("plazo", "plazo, 4"):
+        r = res[nombre]
+        col = r["sitios"][args.colgado]
+        if r["segundos"] > args.plazo + args.margen:
+            problemas.append(f"{nombre}: {r['segundos']:.1f} s > plazo {args.plazo:.0f} s + {args.margen:.0f} s")
+        if col["completo"] or not 0 < col["filas"] <= completo:
+            problemas.append(f"{nombre}: {args.colgado} debería quedar incompleto con filas parciales "
+                             f"({col['filas']} de {completo})")
+    if any(not v["completo"] for s, v in res["plazo"]["sitios"].items() if s != args.colgado):
+        problemas.append("plazo: un sitio sano quedó incompleto")
+    print(f"  sitios sanos listos {res['antes']['sanos'] / res['a la vez']['sanos']:.1f}× antes a la vez que uno por uno; "
+          f"corrida con plazo {res['antes']['segundos'] / res['plazo']['segundos']:.1f}× más corta "
+          f"({res['plazo']['sitios'][args.colgado]['filas']} de {completo} filas de {args.colgado} conservadas)")
+    if problemas:
+        sys.exit("; ".join(problemas))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline del scrape por etapas (PagePipeline): descarga en hilos → parseo en procesos → merge.
+
+Servidor local estilo Stock con --categorias páginas (la categoría de benchmarks/fixtures/stock, la
+más pesada de parsear) en dos escenarios: sitio lento (--latencia: manda la red) y sitio instantáneo
+(manda el parseo). Para cada uno compara el scrape anterior (cada hilo descarga y parsea, bajo el GIL)
+con el de etapas sin pool (PARSE_WORKERS=0) y con --procesos procesos. Exige filas idénticas, que
+las esperas del reporte identifiquen qué limita cada escenario (red / CPU) y que la caché de
+enriquecimiento (clasificación al scrapear) termine igual con y sin pool: mismos hits/misses y los
+mismos nombres guardados por ENRICH_CACHE.save().
+
+Uso:
+    python benchmarks/bench_scrape_stages.py [--categorias 80] [--latencia 2.0] [--procesos 2,4]
+"""
+
+from __future__ import annotations
+import argparse, os, pickle, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_etapas_"))
+for _var in ("HTTP_CACHE", "PAGE_CACHE"):  # cada variante parsea todas las páginas
+    os.environ.setdefault(_var, "0")
+os.environ.setdefault("ADAPTIVE_LIMIT", "0")  # MAX_WORKERS descargas fijas: con latencia, manda la red
+
+import pipeline_ingesta as pi  # noqa: E402
+from local_server import LocalSiteServer  # noqa: E402
+from make_fixtures import FIXTURES  # noqa: E402
+
+def build_route(n_cat: int):
+    links = "".join(f'<a href="/category/carnes-{i}">Carnes {i}</a>' for i in range(n_cat))
+    home = f"<html><body><nav>{links}</nav></body></html>".encode()
+    with open(os.path.join(FIXTURES, "stock", "categoria.html"), "rb") as fh:
+        page = fh.read()
+    def route(path):
+        if path in ("/", ""): return 200, home, {}
+        if path.startswith("/category/"): return 200, page, {}
+        return None
+    return route
+
+class LocalStock(pi.StockScraper):
+    def __init__(self, base):
+        super().__init__()
+        self.base_url = base
+
+def legacy_scrape(sc):
+    """HtmlSiteScraper.scrape() anterior: cada hilo descarga y parsea su categoría."""
+    fecha, out = "fija", []
+    with ThreadPoolExecutor(pi._thread_workers()) as pool:
+        for f in as_completed([pool.submit(sc.parse_category, u) for u in sc.category_urls()]):
+            for row in f.result():
+                row["FechaConsulta"] = fecha
+                out.append(row)
+    return out
+
+def correr(base, procesos):
+    pi.METRICS = pi.RunMetrics()
+    sc = LocalStock(base)
+    if procesos is None:
+        return legacy_scrape(sc), None
+    pi._close_parse_pool()
+    pi.PARSE_WORKERS = procesos
+    rows = sc.scrape()
+    pi._close_parse_pool()
+    return rows, pi.METRICS.pipelines[sc.name]
+
+def cache_nueva() -> str:
+    """Caché de enriquecimiento vacía (en el proceso principal) para una variante; devuelve su ruta."""
+    path = tempfile.mktemp(suffix=".pkl", dir=os.environ["OUT_DIR"])
+    pi.ENRICH_CACHE = pi.EnrichmentCache(path=path)
+    return path
+
+def cache_guardada(path: str) -> tuple:
+    """(hits, misses, nombres guardados) después de ENRICH_CACHE.save()."""
+    pi.ENRICH_CACHE.save()
+    with open(path, "rb") as fh:
+        nombres = frozenset(pickle.load(fh)["items"])
+    return pi.ENRICH_CACHE.hits, pi.ENRICH_CACHE.misses, nombres
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--categorias", type=int, default=80)
+    ap.add_argument("--latencia", type=float, default=2.0, help="segundos por request en el escenario lento")
+    ap.add_argument("--procesos", default="2,4", help="tamaños del pool de parseo a comparar")
+    args = ap.parse_args()
+    if not os.path.exists(os.path.join(FIXTURES, "stock", "categoria.html")):
+        sys.exit("Faltan fixtures: python benchmarks/make_fixtures.py")
+    variantes = [("antes (hilos parsean)", None), ("etapas, sin pool", 0)]
+    variantes += [(f"etapas, {p} procesos", int(p)) for p in args.procesos.split(",")]
+    print(f"{args.categorias} categorías, {os.cpu_count()} CPU, cola de {pi.FETCH_QUEUE_PAGES} páginas")
+    oks = []
+    for escenario, latencia, esperado in (("sitio lento", args.latencia, "red"), ("sitio instantáneo", 0.0, "cpu")):
+        print(f"[{escenario}: {latencia * 1000:.0f} ms/request]")
+        print(f"  {'variante':<24} {'seg':>7} {'filas':>6} {'espera red':>11} {'espera parseo':>14} {'cola máx':>9}  "
+              f"limita  caché enr. (hits/misses)")
+        ref = ref_cache = None
+        with LocalSiteServer(build_route(args.categorias), latency=latencia) as srv:
+            for nombre, procesos in variantes:
+                path = cache_nueva()
+                t0 = time.perf_counter()
+                rows, st = correr(srv.url, procesos)
+                dt = time.perf_counter() - t0
+                cache = cache_guardada(path)
+                key = sorted((r["CategoríaURL"], r["Producto"], r["Precio"], r["Grupo"]) for r in rows)
+                ref, ref_cache = ref or key, ref_cache or cache
+                ok = key == ref and cache == ref_cache and cache[2] and (st is None or st["limita"] == esperado)
+                oks.append(ok)
+                extra = (f"{st['espera_red_s']:>10.2f}s {st['espera_cpu_s']:>13.2f}s {st['cola_max']:>9}  {st['limita']:<6}"
+                         if st else f"{'—':>11} {'—':>14} {'—':>9}  {'—':<6}")
+                print(f"  {nombre:<24} {dt:>7.2f} {len(rows):>6} {extra}  {cache[0]}/{cache[1]} ({len(cache[2])} nombres)"
+                      + ("" if ok else "  ⚠️"))
+    if not all(oks):
+        sys.exit("filas distintas, caché de enriquecimiento distinta o diagnóstico red/CPU incorrecto")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de la escritura a Sheets: verificación de capacidad + escritura de antes vs.
+SheetsPlanner (una lectura de metadatos, plan offline, ≤ 2 requests por escritura).
+
+Corre sobre el libro en memoria de fake_sheets (cuenta requests por endpoint) los casos:
+  - hoja inflada (se compacta), hoja chica (crece), límite global (recorta por tail),
+    agregar al final (crece) y agregar sin lugar (desiste → reconstrucción)
+En cada caso exige la misma grilla final y las mismas celdas del libro que el flujo anterior,
+y reporta requests y el tiempo estimado con --latencia segundos por request.
+También verifica que _df_to_values dé lo mismo que _cellrepr de gspread_dataframe y que el
+dry-run no escriba nada y proyecte las mismas celdas que la escritura real; con el histórico local,
+que el dry-run (lote nuevo y --reprocess) no toque particiones ni _meta.json y que la corrida real
+siguiente siga agregando sólo las filas nuevas a la hoja.
+
+Uso:
+    python benchmarks/bench_sheets_plan.py [--filas 20000] [--latencia 0.3]
+"""
+
+from __future__ import annotations
+import argparse, collections, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_sheets_plan_"))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from gspread.utils import rowcol_to_a1  # noqa: E402
+from gspread_dataframe import _cellrepr, set_with_dataframe  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+from fake_sheets import FakeSpreadsheet  # noqa: E402
+
+# ───────── flujo tal como estaba antes del planificador ─────────
+def legacy_audit(sh) -> int:
+    return int(sum(w.row_count * w.col_count for w in sh.worksheets()))
+
+def legacy_fits(sh, ws, need_rows, need_cols):
+    curr_rows, curr_cols = ws.row_count, ws.col_count
+    legacy_audit(sh)
+    shrink_rows, shrink_cols = min(curr_rows, max(need_rows, 1)), min(curr_cols, max(need_cols, 1))
+    if shrink_rows < curr_rows or shrink_cols < curr_cols:
+        ws.resize(rows=shrink_rows, cols=shrink_cols)
+    curr_rows, curr_cols = ws.row_count, ws.col_count
+    total_now = legacy_audit(sh)
+    if curr_rows >= need_rows and curr_cols >= need_cols:
+        return True, "Cabe tras compactar hoja destino"
+    add_rows, add_cols = max(0, need_rows - curr_rows), max(0, need_cols - curr_cols)
+    projected = total_now + add_rows * curr_cols + add_cols * max(need_rows, curr_rows + add_rows)
+    if projected <= pi.SHEETS_CELL_LIMIT:
+        return False, "Requiere crecer pero no supera límite (permitido)"
+    return False, "Requiere crecer y superaría el límite global"
+
+def legacy_grow(ws, nrows, ncols):
+    if nrows > ws.row_count: ws.add_rows(nrows - ws.row_count)
+    if ncols > ws.col_count: ws.add_cols(ncols - ws.col_count)
+
+def legacy_write(ws, sh, df):
+    nrows, ncols = max(len(df) + 1, 1), max(len(df.columns), 1)
+    cabe, motivo = legacy_fits(sh, ws, nrows, ncols)
+    if not cabe and "no supera límite" in motivo:
+        legacy_grow(ws, nrows, ncols)
+    elif not cabe:
+        target_rows, target_cols = max(min(nrows, ws.row_count), 1), max(min(ncols, ws.col_count), 1)
+        keep_n = max(target_rows - 1, 0)
+        if keep_n < len(df): df = df.tail(keep_n).reset_index(drop=True)
+        if len(df.columns) > target_cols: df = df.iloc[:, :target_cols]
+        nrows, ncols = max(len(df) + 1, 1), max(len(df.columns), 1)
+        ws.resize(rows=nrows, cols=ncols)
+    ws.batch_clear([f"A1:{rowcol_to_a1(nrows, ncols)}"])
+    set_with_dataframe(ws, df, include_index=False, resize=False)
+    return df
+
+def legacy_values(df):
+    arr = df.astype(object).where(df.notna(), "").to_numpy(object)
+    return [[v.item() if isinstance(v, np.generic) else v for v in row] for row in arr]
+
+def legacy_append(sh, ws, filas_hoja, nuevos) -> bool:
+    nrows, ncols = filas_hoja + 1 + len(nuevos), len(pi.TARGET_COLS)
+    cabe, motivo = legacy_fits(sh, ws, nrows, ncols)
+    if not cabe and "superaría el límite" in motivo: return False
+    if not cabe: legacy_grow(ws, nrows, ncols)
+    ws.update(range_name=f"A{filas_hoja + 2}", values=legacy_values(nuevos[pi.TARGET_COLS]), value_input_option="USER_ENTERED")
+    return True
+
+def actual_append(sh, ws, filas_hoja, nuevos) -> bool:
+    planner = pi.SheetsPlanner.of(sh)
+    plan = planner.plan_append(ws, filas_hoja + 2, pi._df_to_values(nuevos[pi.TARGET_COLS]), len(pi.TARGET_COLS))
+    if plan is None: return False
+    planner.execute(plan)
+    return True
+
+# ───────── datos y casos ─────────
+def frame(n: int, desde_id: int = 1, apostrofo: bool = True) -> pd.DataFrame:
+    rnd = np.random.default_rng(n + desde_id)
+    sitios = np.array(["Stock", "Superseis", "Salemma", "Arete", "Los Jardines", "Biggie"])
+    df = pd.DataFrame({
+        "ID": np.arange(desde_id, desde_id + n),
+        "Supermercado": sitios[rnd.integers(0, len(sitios), n)],
+        "Producto": [f"PRODUCTO {i} 1 KG" for i in rnd.integers(0, 10 * n, n)],
+        "Precio": rnd.integers(2_000, 90_000, n).astype(float),
+        "Unidad": np.where(rnd.random(n) < 0.3, None, "KG"),
+        "Grupo": "Carnes", "Subgrupo": np.where(rnd.random(n) < 0.5, "", "Vacuna"),
+        "FechaConsulta": "2026-10-01", "unidad_corregido": "KG", "etiquetaunidad": "1 KG",
+        "cantidad_unidades": np.where(rnd.random(n) < 0.2, np.nan, 1.0),
+        "precio_unidad": rnd.random(n).round(3) * 1000,
+        "CategoríaURL": "https://stock.com.py/category/carnes",
+    })
+    if apostrofo and n:
+        df.loc[0, "Producto"] = "'7 DÍAS' ALFAJOR"  # USER_ENTERED se comería el apóstrofo sin escapar
+    return pi._compact_frame(df)[pi.TARGET_COLS]
+
+def libro(hoja_rows: int, hoja_cols: int, otras: int = 0, previas: pd.DataFrame = None):
+    sh = FakeSpreadsheet()
+    ws = sh.add_worksheet(pi.WORKSHEET_NAME, rows=hoja_rows, cols=hoja_cols)
+    if otras: sh.add_worksheet("otra", rows=otras, cols=1)
+    if previas is not None:
+        ws.update(range_name="A1", values=[pi.TARGET_COLS] + legacy_values(previas))
+    sh.calls.clear()
+    return sh, ws
+
+def caso(nombre, hoja, df, limite=None, append=None, latencia=0.3):
+    """hoja: (rows, cols, otras, previas); append: filas de datos ya en la hoja (o None = reescritura)."""
+    limite_orig = pi.SHEETS_CELL_LIMIT
+    pi.SHEETS_CELL_LIMIT = limite or limite_orig
+    res = {}
+    try:
+        for variante in ("antes", "después"):
+            sh, ws = libro(*hoja)
+            t0 = time.perf_counter()
+            if append is not None:
+                ok = (legacy_append if variante == "antes" else actual_append)(sh, ws, append, df)
+            else:
+                ok = True
+                if variante == "antes": legacy_write(ws, sh, df)
+                else: pi._write_sheet(ws, sh, df)
+            celdas = legacy_audit(sh) if variante == "antes" else pi.SheetsPlanner.of(sh).total_cells
+            dt = time.perf_counter() - t0
+            res[variante] = (ok, ws.grid(), sh.total_cells(), celdas, list(sh.calls), dt)
+    finally:
+        pi.SHEETS_CELL_LIMIT = limite_orig
+    (ok0, g0, c0, a0, calls0, dt0), (ok1, g1, c1, a1, calls1, dt1) = res["antes"], res["después"]
+    igual = ok0 == ok1 and g0 == g1 and c0 == c1 == a1 == a0
+    print(f"[{nombre}]")
+    for etiqueta, calls, dt in (("antes", calls0, dt0), ("después", calls1, dt1)):
+        por = ", ".join(f"{k}×{v}" for k, v in collections.Counter(calls).items())
+        print(f"  {etiqueta:<8}: {len(calls):>2} requests ({por})  CPU {dt:.2f} s  "
+              f"≈ {dt + len(calls) * latencia:.2f} s con {latencia * 1000:.0f} ms/request")
+    print(f"  celdas del libro {c1:,} | {'agregó' if ok1 else 'no entra (→ reconstrucción)'} | grilla idéntica: {igual}")
+    return igual
+
+def chequeo_valores() -> bool:
+    df = frame(300)
+    df.loc[1, "Producto"] = "=1+1"
+    df.loc[2, "Producto"] = "'"
+    ref = [[_cellrepr(v, True, "default") for v in fila] for fila in df.to_numpy("object")]
+    ref = [[v.item() if isinstance(v, np.generic) else v for v in fila] for fila in ref]
+    igual = pi._df_to_values(df) == ref
+    print(f"[valores] _df_to_values == _cellrepr de set_with_dataframe: {igual}")
+    return igual
+
+def chequeo_dry_run(n: int) -> bool:
+    previas = frame(n // 2, apostrofo=False)
+    sh, ws = libro(max(5_000, n // 2 + 1), 60, 0, previas)
+    antes = ws.grid()
+    pi.SHEETS_DRY_RUN = True
+    try:
+        pi._write_sheet(ws, sh, frame(n))
+        proyectadas = pi.SheetsPlanner.of(sh).total_cells
+    finally:
+        pi.SHEETS_DRY_RUN = False
+    sin_escribir = ws.grid() == antes and sh.calls == ["fetch_sheet_metadata"]
+    sh2, ws2 = libro(max(5_000, n // 2 + 1), 60, 0, previas)
+    pi._write_sheet(ws2, sh2, frame(n))
+    ok = sin_escribir and proyectadas == sh2.total_cells()
+    print(f"[dry-run] sin escribir: {sin_escribir} | celdas proyectadas {proyectadas:,} = reales {sh2.total_cells():,}: "
+          f"{proyectadas == sh2.total_cells()}")
+    return ok
+
+def _disco(root: str) -> dict:
+    """Archivos del histórico (ruta → bytes) para comparar antes y después."""
+    out = {}
+    for d, _, fs in os.walk(root):
+        for f in fs:
+            with open(os.path.join(d, f), "rb") as fh:
+                out[os.path.relpath(os.path.join(d, f), root)] = fh.read()
+    return out
+
+def chequeo_dry_run_store(n: int) -> bool:
+    root = tempfile.mkdtemp(prefix="bench_store_")
+    previas, lote = frame(n // 2, apostrofo=False), frame(n // 10, desde_id=10 * n, apostrofo=False)
+    sh, ws = libro(n + 1, len(pi.TARGET_COLS), 0, previas)
+    pi._ingest_with_store(sh, ws, previas.drop(columns="ID"), pi.HistoryStore(root))  # carga inicial + índice
+    disco, grilla = _disco(root), ws.grid()
+    pi.SHEETS_DRY_RUN = True
+    try:
+        seco = pi.HistoryStore(root)
+        msg_seco = pi._ingest_with_store(sh, ws, lote.drop(columns="ID"), seco)
+        visto = len(seco.read())
+        pi._ingest_with_store(sh, ws, lote.drop(columns="ID"), pi.HistoryStore(root), reprocess=True)
+    finally:
+        pi.SHEETS_DRY_RUN = False
+    intacto = _disco(root) == disco and ws.grid() == grilla
+    real = pi.HistoryStore(root)
+    last = real.last_id
+    msg_real = pi._ingest_with_store(sh, ws, lote.drop(columns="ID"), real)
+    ok = intacto and msg_seco == msg_real and msg_real.endswith("agregadas") and visto == real.rows \
+        and real.last_id == last + int(msg_real.split()[0])
+    print(f"[dry-run histórico] disco y hoja intactos: {intacto} | dry-run: «{msg_seco}» | "
+          f"real después: «{msg_real}» (last_id {last:,} → {real.last_id:,}): {ok}")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--filas", type=int, default=20_000)
+    ap.add_argument("--latencia", type=float, default=0.3, help="segundos por request a la API de Sheets")
+    args = ap.parse_args()
+    n, ncol = args.filas, len(pi.TARGET_COLS)
+    previas = frame(n, apostrofo=False)
+    nuevos = frame(n // 10, desde_id=n + 1, apostrofo=False)
+    ok = [chequeo_valores()]
+    ok.append(caso("hoja inflada (compacta)", (n * 3, 60, 0, None), frame(n), latencia=args.latencia))
+    ok.append(caso("hoja chica (crece)", (1000, 10, 0, None), frame(n), latencia=args.latencia))
+    ok.append(caso("límite global (recorta)", (1000, ncol, 0, None), frame(n),
+                   limite=(n // 2) * ncol + 5_000, latencia=args.latencia))
+    ok.append(caso("límite global (otra hoja)", (1000, 60, (n // 2) * ncol, None), frame(n),
+                   limite=n * ncol, latencia=args.latencia))
+    ok.append(caso("agregar al final (crece)", (n + 1, ncol, 0, previas), nuevos, append=n, latencia=args.latencia))
+    ok.append(caso("agregar sin lugar", (n + 1, ncol, 0, previas), nuevos, limite=(n + 1) * ncol + 10,
+                   append=n, latencia=args.latencia))
+    ok.append(chequeo_dry_run(n))
+    ok.append(chequeo_dry_run_store(n))
+    if not all(ok):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
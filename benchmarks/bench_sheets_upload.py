@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de la subida por tramos a Sheets (SheetUpload) sobre el libro en memoria.
+
+El fake cobra --latencia por request + --latencia-celda por celda escrita, rechaza payloads de
+más de --max-celdas (400, como un request demasiado grande) y responde 429 por encima de
+--max-rps. Casos, todos contra la misma grilla esperada:
+  - un solo request (como set_with_dataframe): falla por tamaño si supera --max-celdas
+  - tramos secuenciales vs. en paralelo (SHEETS_UPLOAD_WORKERS) con ritmo SHEETS_WRITE_RPM
+  - en paralelo sin ritmo: aparecen 429, el límite baja y todo se sube igual
+  - corte a mitad (400 en un tramo): la hoja publicada queda intacta (staging) y la corrida
+    siguiente retoma desde el checkpoint sin resubir lo ya escrito
+En todos, la hoja publicada conserva su sheetId (gid) y su posición: la staging sólo le copia valores.
+  - agregar al final por tramos (en el lugar) y un 503 transitorio que se reintenta
+
+Uso:
+    python benchmarks/bench_sheets_upload.py [--filas 100000] [--tramo 10000] [--workers 4]
+"""
+
+from __future__ import annotations
+import argparse, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_sheets_upload_"))
+
+import pipeline_ingesta as pi  # noqa: E402
+from fake_sheets import FakeSpreadsheet  # noqa: E402
+from bench_sheets_plan import frame  # noqa: E402
+
+def libro(args, previas=None, **kw):
+    opciones = dict(latency=args.latencia, cell_latency=args.latencia_celda, max_cells=args.max_celdas, max_rps=args.max_rps)
+    opciones.update(kw)
+    max_rps = opciones.pop("max_rps")  # la cuota se aplica desde que arranca la corrida medida
+    sh = FakeSpreadsheet(**opciones)
+    ws = sh.add_worksheet(pi.WORKSHEET_NAME, rows=1000, cols=20)
+    sh.add_worksheet("Resumen", rows=100, cols=10)
+    if previas is not None:  # contenido publicado de antes, sin costo ni límites
+        guardado = sh.max_cells, sh.latency, sh.cell_latency, pi.SHEETS_CHUNK_ROWS
+        sh.max_cells, sh.latency, sh.cell_latency = None, 0.0, 0.0
+        pi.SHEETS_CHUNK_ROWS = 10 ** 9
+        pi._write_sheet(ws, sh, previas)
+        sh.max_cells, sh.latency, sh.cell_latency, pi.SHEETS_CHUNK_ROWS = guardado
+    pi.SheetsPlanner._books.clear()  # cada corrida del pipeline arranca con un planificador nuevo
+    ws = sh.worksheet(pi.WORKSHEET_NAME)
+    sh.calls.clear()
+    sh._recent.clear()
+    sh.max_rps = max_rps
+    return sh, ws
+
+def correr(etiqueta, args, df, esperado, previas, tramo, workers, rpm, **kw):
+    pi.SHEETS_CHUNK_ROWS, pi.SHEETS_UPLOAD_WORKERS, pi.SHEETS_WRITE_RPM = tramo, workers, rpm
+    sh, ws = libro(args, previas, **kw)
+    gid = ws.id
+    sh.calls.clear()
+    t0 = time.perf_counter()
+    try:
+        pi._write_sheet(ws, sh, df)
+        error = None
+    except Exception as e:  # noqa: BLE001 — se reporta abajo
+        error = e
+    dt = time.perf_counter() - t0
+    ok = error is None and ws.grid() == esperado and ws.id == gid and \
+        [(w.title, w.id) for w in sh.worksheets()] == [(pi.WORKSHEET_NAME, gid), ("Resumen", gid + 1)]
+    n = sh.calls.count("values_batch_update")
+    estado = f"error {getattr(error, 'code', error)}" if error else f"grilla idéntica: {ok}"
+    print(f"  {etiqueta:<34} {dt:>6.2f} s {n:>4} req de valores {sh.throttled:>3}× 429 | {estado}")
+    return sh, ws, ok, error
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--filas", type=int, default=100_000)
+    ap.add_argument("--tramo", type=int, default=10_000, help="SHEETS_CHUNK_ROWS")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--latencia", type=float, default=0.3)
+    ap.add_argument("--latencia-celda", type=float, default=2e-6)
+    ap.add_argument("--max-celdas", type=int, default=500_000)
+    ap.add_argument("--max-rps", type=float, default=5)
+    args = ap.parse_args()
+    previas = frame(args.filas // 2, apostrofo=False)
+    df = frame(args.filas)
+    ref_sh, ref_ws = libro(args, max_cells=None, latency=0, cell_latency=0, max_rps=None)
+    pi.SHEETS_CHUNK_ROWS = 10 ** 9
+    pi._write_sheet(ref_ws, ref_sh, df)
+    esperado = ref_ws.grid()
+    rpm = args.max_rps * 60 * 0.8
+    print(f"{args.filas:,} filas × {len(pi.TARGET_COLS)} columnas, tramos de {args.tramo:,} filas, "
+          f"{args.latencia * 1000:.0f} ms/request + {args.latencia_celda * 1e6:.0f} µs/celda, "
+          f"máx {args.max_celdas:,} celdas y {args.max_rps:g} req/s")
+    oks = []
+    _, ws, ok, err = correr("un solo request", args, df, esperado, previas, 10 ** 9, 1, 0)
+    grande = (len(df) + 1) * len(pi.TARGET_COLS) > args.max_celdas
+    oks.append(err is not None and ws.grid() != esperado if grande else ok)
+    for etiqueta, w, r in (("tramos secuenciales", 1, rpm), (f"tramos ×{args.workers} con ritmo", args.workers, rpm),
+                           (f"tramos ×{args.workers * 2} sin ritmo", args.workers * 2, 0)):
+        oks.append(correr(etiqueta, args, df, esperado, previas, args.tramo, w, r)[2])
+
+    # corte a mitad + retomar en una "corrida" nueva
+    corte = max(args.filas // args.tramo // 2, 1)
+    sh, ws, _, err = correr(f"corte en el tramo {corte + 1}", args, df, esperado, previas, args.tramo, 1, rpm,
+                            fail=lambda nombre, n: 400 if nombre == "values_batch_update" and n == corte + 1 else None)
+    intacta = ws.grid() == libro(args, previas, max_cells=None, latency=0, cell_latency=0, max_rps=None)[1].grid()
+    hechos = len(pi.SheetUpload.load(pi.SheetsPlanner.of(sh)).state["done"])
+    sh.fail = None
+    pi.SheetsPlanner._books.clear()
+    sh.calls.clear()
+    ws2 = sh.worksheet(pi.WORKSHEET_NAME)
+    retomo = pi.SheetsPlanner.of(sh).resume(ws2)
+    resubidos = sh.calls.count("values_batch_update")
+    gid_ok = ws2.id == ws.id and [(w.title, w.id) for w in sh.worksheets()] == [(pi.WORKSHEET_NAME, ws.id), ("Resumen", ws.id + 1)]
+    ok_resume = (err is not None and intacta and retomo and ws2.grid() == esperado and gid_ok
+                 and resubidos == -(-len(esperado) // args.tramo) - hechos
+                 and not os.path.exists(pi.SHEETS_CHECKPOINT_PATH + ".json"))
+    print(f"    hoja publicada intacta tras el corte: {intacta} | retomada: {resubidos} tramos nuevos "
+          f"({hechos} ya escritos) | grilla idéntica: {ws2.grid() == esperado} | mismo gid: {gid_ok}")
+    oks.append(ok_resume)
+
+    # agregar al final por tramos + un 503 transitorio
+    pi.SHEETS_CHUNK_ROWS, pi.SHEETS_UPLOAD_WORKERS, pi.SHEETS_WRITE_RPM = args.tramo, args.workers, rpm
+    sh, ws = libro(args, previas, fail=lambda nombre, n: 503 if nombre == "values_batch_update" and n == 2 else None)
+    nuevos = frame(args.filas // 2, desde_id=args.filas // 2 + 1, apostrofo=False)
+    planner = pi.SheetsPlanner.of(sh)
+    plan = planner.plan_append(ws, len(previas) + 2, pi._df_to_values(nuevos), len(pi.TARGET_COLS))
+    planner.execute(plan)
+    ref_sh, ref_ws = libro(args, pi.pd.concat([previas, nuevos], ignore_index=True), max_cells=None, latency=0,
+                           cell_latency=0, max_rps=None)
+    ok_append = ws.grid() == ref_ws.grid()
+    print(f"  agregar {len(nuevos):,} filas por tramos (503 transitorio): grilla idéntica: {ok_append}")
+    oks.append(ok_append)
+    if not all(oks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de la exportación estática para GitHub Pages (STATIC_EXPORT_DIR).
+
+Corre main() día por día (los mismos scrapers falsos y libro en memoria que bench_summaries)
+con la exportación activada y mide cuántos bytes escribe cada corrida frente al tamaño total
+del paquete, y el tamaño de un mes (crudo y gzip) frente al CSV y a JSON por filas. Decodifica
+el paquete como lo haría el cliente (docs/datos.js) y exige que sea exactamente el histórico
+local y que el índice de productos coincida con recalcularlo; también al ingerir tarde un día
+viejo (sólo se rehace su mes), con --full-rebuild y si falta un archivo (se regenera todo).
+
+Uso:
+    python benchmarks/bench_static_export.py [--dias 100] [--productos 400]
+"""
+
+from __future__ import annotations
+import argparse, gzip, json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_summaries import Entorno  # noqa: E402  (mismo entorno: OUT_DIR propio, libro en memoria)
+
+from datetime import date, timedelta  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+
+def archivos(root):
+    return {f: os.path.getsize(os.path.join(root, f)) for f in os.listdir(root)}
+
+def leer(root, nombre):
+    with open(os.path.join(root, nombre), encoding="utf-8") as fh:
+        return json.load(fh)
+
+def decodificar(root):
+    """Filas (Supermercado, Producto, Grupo, Subgrupo, fecha, precio, pu) + índice, como el cliente."""
+    m = leer(root, "manifest.json")
+    d = leer(root, m["diccionarios"])
+    filas = []
+    for mes, e in m["meses"].items():
+        j = leer(root, e["archivo"])
+        filas += [(d["s"][s], d["p"][p], d["g"][g], d["sg"][sg], f"{mes}-{dia:02d}", pr, pu)
+                  for dia, s, p, g, sg, pr, pu in zip(j["dia"], j["s"], j["p"], j["g"], j["sg"], j["precio"], j["pu"])]
+    ix = leer(root, m["productos"])
+    indice = {(d["s"][s], d["p"][p]): (d["g"][g], d["sg"][sg], pr, f, tuple(ms))
+              for s, p, g, sg, pr, f, ms in zip(ix["s"], ix["p"], ix["g"], ix["sg"], ix["precio"], ix["fecha"], ix["meses"])}
+    return sorted(filas, key=repr), indice
+
+def esperado(ent):
+    df = pi.HistoryStore(os.path.join(ent.out, "historico")).read(columns=pi.StaticExport.SOURCE)
+    df = pi._text_cols(df, ["Supermercado", "Producto", "Grupo", "Subgrupo"])
+    filas = sorted(zip(df["Supermercado"], df["Producto"], df["Grupo"], df["Subgrupo"], df["FechaConsulta"],
+                       pi._json_nums(df["Precio"]), pi._json_nums(df["precio_unidad"])), key=repr)
+    ult = pi._latest_prices(df)
+    meses = df.assign(mes=df["FechaConsulta"].str.slice(0, 7)).groupby(["Supermercado", "Producto"])["mes"].unique()
+    indice = {(s, p): (g, sg, pr, f, tuple(sorted(meses[(s, p)])))
+              for s, p, g, sg, pr, f in zip(ult["Supermercado"], ult["Producto"], ult["Grupo"], ult["Subgrupo"],
+                                            pi._json_nums(ult["Precio"]), ult["FechaConsulta"])}
+    return filas, indice
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dias", type=int, default=100)
+    ap.add_argument("--productos", type=int, default=400, help="productos por sitio (2 sitios)")
+    args = ap.parse_args()
+    inicio = date(2026, 6, 1)
+    dias = [(inicio + timedelta(days=d)).isoformat() for d in range(args.dias + 1)]
+    tarde = dias.pop(len(dias) // 2)  # este día llega tarde: se ingiere al final
+    print(f"{args.dias} días × 2 sitios × {args.productos} productos")
+    oks = []
+
+    ent = Entorno(args)
+    with ent.activo():
+        pi.STATIC_EXPORT_DIR = root = os.path.join(ent.out, "docs_data")
+        pi.SUMMARY_SHEETS = False
+        siempre_igual, escritos, solo_mes, segundos = True, [], True, []
+        for i, d in enumerate(dias):
+            antes = archivos(root) if os.path.isdir(root) else {}
+            t0 = time.perf_counter()
+            ent.correr(d)
+            segundos.append(time.perf_counter() - t0)
+            despues = archivos(root)
+            nuevos = {f for f in despues if f not in antes or f == "manifest.json"}
+            if i:
+                escritos.append(sum(despues[f] for f in nuevos))
+                solo_mes &= all(f == "manifest.json" or f.startswith((d[:7], "diccionarios", "productos")) for f in nuevos)
+            if i % 10 == 0 or i == len(dias) - 1:
+                siempre_igual &= decodificar(root) == esperado(ent)
+        total = sum(archivos(root).values())
+        print(f"  paquete: {total:,} bytes en {len(archivos(root))} archivos | por corrida se escriben mediana "
+              f"{sorted(escritos)[len(escritos) // 2]:,} bytes | main() mediana {sorted(segundos)[len(segundos) // 2] * 1000:.0f} ms")
+        print(f"  paquete == histórico + índice recalculado: {siempre_igual} | "
+              f"cada corrida escribe sólo su mes + índice/diccionarios/manifiesto: {solo_mes}")
+        oks += [siempre_igual, solo_mes]
+
+        m = leer(root, "manifest.json")
+        mes, e = sorted(m["meses"].items())[0]
+        crudo = open(os.path.join(root, e["archivo"]), "rb").read()
+        df = pi.HistoryStore(os.path.join(ent.out, "historico")).read(since=e["desde"], until=e["hasta"])
+        csv = df.to_csv(index=False).encode()
+        registros = df.to_json(orient="records", force_ascii=False).encode()
+        print(f"  mes {mes} ({e['filas']:,} filas): columnar {len(crudo):,} B / gzip {len(gzip.compress(crudo)):,} B | "
+              f"CSV {len(csv):,} / gzip {len(gzip.compress(csv)):,} B | JSON por filas {len(registros):,} / "
+              f"gzip {len(gzip.compress(registros)):,} B")
+
+        # día atrasado: se rehace sólo su mes
+        antes = archivos(root)
+        ent.correr(tarde)
+        nuevos = {f for f in archivos(root) if f not in antes and f != "manifest.json"}
+        ok = (decodificar(root) == esperado(ent)
+              and all(f.startswith((tarde[:7], "diccionarios", "productos")) for f in nuevos))
+        print(f"  día atrasado ({tarde}): sólo su mes rehecho y paquete == histórico: {ok}")
+        oks.append(ok)
+
+        # --full-rebuild: mismo contenido (los códigos pueden cambiar de orden)
+        antes = decodificar(root)
+        ent.correr((date.fromisoformat(dias[-1]) + timedelta(days=1)).isoformat(), flags=["--full-rebuild"])
+        ok = decodificar(root) == esperado(ent) and set(antes[0]) <= set(decodificar(root)[0])
+        print(f"  --full-rebuild: paquete == histórico: {ok}")
+        oks.append(ok)
+
+        # falta un mes (p.ej. borrado a mano) → se regenera todo
+        os.remove(os.path.join(root, sorted(leer(root, "manifest.json")["meses"].values(), key=lambda e: e["archivo"])[0]["archivo"]))
+        ent.correr((date.fromisoformat(dias[-1]) + timedelta(days=2)).isoformat())
+        ok = decodificar(root) == esperado(ent)
+        print(f"  archivo faltante: regenerado y paquete == histórico: {ok}")
+        oks.append(ok)
+        m = leer(root, "manifest.json")
+        vigentes = {"manifest.json", m["diccionarios"], m["productos"]} | {e["archivo"] for e in m["meses"].values()}
+        huerfanos = [f for f in archivos(root) if f not in vigentes]
+        print(f"  sin archivos huérfanos: {not huerfanos}")
+        oks.append(not huerfanos)
+    if not all(oks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
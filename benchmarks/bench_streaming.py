@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline del camino scraper → CSV diario → enriquecimiento, con listas vs. en streaming.
+
+--sitios scrapers sintéticos producen --filas filas en total, por páginas de --por-pagina filas (con
+--latencia segundos por página, como si bajaran de la red). Cada variante corre en un proceso aparte:
+  - antes: scrape() junta la lista de dicts de cada sitio, save_csv la vuelca con pd.DataFrame(rows),
+    main() acumula todo en `registros` y después se releen los CSV (IngestManifest.read) y se enriquecen
+  - streaming: el generador de cada sitio va por DailyCsvWriter (lotes de CSV_BATCH_ROWS) que escribe
+    el CSV y enriquece cada lote mientras el sitio sigue produciendo (los lotes esperan en disco hasta
+    que la ingesta los pide con take_frames)
+Reporta tiempo, pico de RSS al terminar el scrape y en total, y cuándo hubo filas enriquecidas listas
+para la ingesta, y exige CSVs byte a byte iguales y el mismo frame de ingesta. Aparte, un sitio cuyas
+filas traen una clave nueva recién en el segundo lote: el CSV debe quedar igual al de pd.DataFrame.
+
+Uso:
+    python benchmarks/bench_streaming.py [--filas 300000] [--sitios 6] [--latencia 0.0]
+"""
+
+from __future__ import annotations
+import argparse, hashlib, json, os, subprocess, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_streaming_"))
+os.environ.setdefault("ENRICH_CACHE", "0")
+
+import pandas as pd  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+
+NOMBRES = ["LECHE ENTERA {i} 1 L", "CARNE VACUNA {i} 1 KG", "PAN LACTAL {i} 500 G", "HUEVOS {i} 30 U",
+           "QUESO PARAGUAY {i}", "TOMATE {i} X KG", "YOGUR {i} 900 ML", "GALLETITA {i} 6X100 G"]
+GRUPOS = ["Lácteos", "Carnicería", "Panadería", "Huevos", "Frutas y Verduras"]
+
+class Sintetico:
+    """Scraper falso con la interfaz de los reales: stream() por páginas, scrape() = lista completa."""
+    def __init__(self, nombre, filas, por_pagina, latencia, base=0):
+        self.name, self.filas, self.por_pagina, self.latencia = nombre, filas, por_pagina, latencia
+        self.base = base  # cada sitio nombra distinto a sus productos (cada nombre aparece 3 veces)
+
+    def stream(self):
+        for p in range(0, self.filas, self.por_pagina):
+            if self.latencia: time.sleep(self.latencia)
+            for i in range(p, min(p + self.por_pagina, self.filas)):
+                yield {"Supermercado": self.name.title(), "CategoríaURL": f"https://{self.name}.com.py/category/{i % 40}",
+                       "Producto": NOMBRES[i % len(NOMBRES)].format(i=self.base + i // 3), "Precio": 2_000 + (i * 37) % 88_000,
+                       "Grupo": GRUPOS[i % len(GRUPOS)], "FechaConsulta": "2026-10-17 09:00:00"}
+
+    def scrape(self):
+        return list(self.stream())
+
+    def csv_name(self):
+        return f"{self.name}_canasta_20261017_090000.csv"
+
+class Cronometrado(pi.DailyCsvWriter):
+    """Anota cuándo quedó listo el primer lote enriquecido de la corrida."""
+    primero = None
+    def _write_batch(self, lote):
+        super()._write_batch(lote)
+        if Cronometrado.primero is None and self._spool: Cronometrado.primero = time.perf_counter()
+
+def _peak_rss_mb() -> float:
+    with open("/proc/self/status") as fh:
+        return next(int(l.split()[1]) for l in fh if l.startswith("VmHWM")) / 1024
+
+def _sitios(args):
+    n = args.filas // args.sitios
+    return [Sintetico(f"sitio{k}", n, args.por_pagina, args.latencia, base=k * n) for k in range(args.sitios)]
+
+def variante(nombre, args, out_dir):
+    pi.OUT_DIR, pi.PATTERN_DAILY = out_dir, os.path.join(out_dir, "*_canasta_*.csv")
+    manifest = pi.IngestManifest(os.path.join(out_dir, ".manifiesto.json"))
+    t0, primer_lote = time.perf_counter(), None
+    if nombre == "antes":
+        registros = []
+        for sc in _sitios(args):
+            filas = sc.scrape()
+            pd.DataFrame(filas).to_csv(os.path.join(out_dir, sc.csv_name()), index=False)
+            registros.extend(filas)
+        fin_scrape, pico_scrape = time.perf_counter() - t0, _peak_rss_mb()
+        df_new = pi._enrich_frame(manifest.read(manifest.pending()))[0]
+        primer_lote = time.perf_counter() - t0
+    else:
+        escritores = []
+        for sc in _sitios(args):
+            csv = Cronometrado(manifest, sc.csv_name(), site=sc.name)
+            csv.write(sc.stream())
+            escritores.append(csv)
+        primer_lote = Cronometrado.primero - t0
+        fin_scrape, pico_scrape = time.perf_counter() - t0, _peak_rss_mb()
+        lotes = [df for w in escritores for df in w.take_frames()]
+        df_new = pi._compact_frame(pd.concat(lotes, ignore_index=True, sort=False))
+    total = time.perf_counter() - t0
+    df_new.astype(object).to_pickle(os.path.join(out_dir, "df_new.pkl"))
+    csvs = {}
+    for fn in sorted(os.listdir(out_dir)):
+        if fn.endswith(".csv"):
+            with open(os.path.join(out_dir, fn), "rb") as fh: csvs[fn] = hashlib.sha256(fh.read()).hexdigest()
+    return {"seg": total, "fin_scrape": fin_scrape, "primer_lote": primer_lote, "pico_mb": _peak_rss_mb(),
+            "pico_scrape_mb": pico_scrape,
+            "filas": len(df_new), "csvs": csvs}
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--_variante":
+        args = argparse.Namespace(**json.loads(sys.argv[3]))
+        print(json.dumps(variante(sys.argv[2], args, sys.argv[4])))
+        return
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--filas", type=int, default=300_000)
+    ap.add_argument("--sitios", type=int, default=6)
+    ap.add_argument("--por-pagina", type=int, default=50)
+    ap.add_argument("--latencia", type=float, default=0.0, help="segundos por página en cada sitio")
+    args = ap.parse_args()
+    print(f"{args.filas:,} filas en {args.sitios} sitios, páginas de {args.por_pagina}, "
+          f"lotes de {pi.CSV_BATCH_ROWS:,} filas, {args.latencia * 1000:.0f} ms/página")
+    res = {}
+    for nombre in ("antes", "streaming"):
+        out = tempfile.mkdtemp(prefix=f"{nombre}_", dir=os.environ["OUT_DIR"])
+        p = subprocess.run([sys.executable, __file__, "--_variante", nombre, json.dumps(vars(args)), out],
+                           capture_output=True, text=True)
+        if p.returncode:
+            sys.exit(p.stderr)
+        r = res[nombre] = {**json.loads(p.stdout.strip().splitlines()[-1]), "out": out}
+        print(f"  {nombre:<10} {r['seg']:>6.2f} s | pico RSS {r['pico_scrape_mb']:>5.0f} MB al terminar el scrape, "
+              f"{r['pico_mb']:>5.0f} MB en total | {r['filas']:,} filas | "
+              f"primeras filas enriquecidas a los {r['primer_lote']:.2f} s (scrape termina a los {r['fin_scrape']:.2f} s)")
+    a, b = res["antes"], res["streaming"]
+    csv_ok = a["csvs"] == b["csvs"]
+    fa, fb = (pd.read_pickle(os.path.join(r["out"], "df_new.pkl")) for r in (a, b))
+    try:
+        pd.testing.assert_frame_equal(fa, fb)
+        frame_ok = True
+    except AssertionError as e:
+        print(e)
+        frame_ok = False
+    print(f"  CSV idénticos: {csv_ok} | frame de ingesta idéntico: {frame_ok} | "
+          f"pico RSS {a['pico_mb'] / b['pico_mb']:.1f}× menor")
+    tardias_ok = chequeo_claves_tardias()
+    if not (csv_ok and frame_ok and tardias_ok):
+        sys.exit("streaming distinto de antes")
+
+def chequeo_claves_tardias() -> bool:
+    """Lotes de 3 filas; la clave "Marca" aparece recién en el segundo: se amplía el encabezado."""
+    out = tempfile.mkdtemp(prefix="tardias_", dir=os.environ["OUT_DIR"])
+    pi.OUT_DIR, lote_orig, pi.CSV_BATCH_ROWS = out, pi.CSV_BATCH_ROWS, 3
+    try:
+        filas = list(Sintetico("tardio", 8, 8, 0.0).stream())
+        for i, f in enumerate(filas[4:], 4):
+            f["Marca"] = f"MARCA {i}, S.A." if i % 2 else None
+        w = pi.DailyCsvWriter(pi.IngestManifest(os.path.join(out, ".manifiesto.json")), "tardio.csv", site="tardio")
+        w.write(iter(filas))
+        lotes = list(w.take_frames())
+    finally:
+        pi.CSV_BATCH_ROWS = lote_orig
+    with open(os.path.join(out, "tardio.csv"), "rb") as fh:
+        csv_ok = fh.read() == pd.DataFrame(filas).to_csv(index=False).encode("utf-8")
+    ok = csv_ok and sum(map(len, lotes)) == len(filas)
+    print(f"  clave nueva en el segundo lote: encabezado ampliado y CSV igual al de pd.DataFrame: {ok}")
+    return ok
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark offline de las hojas de resumen para el tablero (SUMMARY_SHEETS).
+
+Corre main() día por día (scrapers falsos, histórico local real, libro en memoria de
+fake_sheets) y compara lo que tendría que leer el tablero (la hoja completa vs. las tres hojas
+de resumen) y lo que escribe cada corrida para mantener los resúmenes. Exige que, después de
+cada corrida incremental, las tres hojas sean idénticas a recalcularlas desde cero con el
+histórico completo, también al ingerir tarde un día viejo (se reescribe desde ese día), con
+--full-rebuild, si se borra una hoja a mano (se recalcula todo) y que --dry-run no escriba.
+
+Uso:
+    python benchmarks/bench_summaries.py [--dias 120] [--productos 400]
+"""
+
+from __future__ import annotations
+import argparse, collections, contextlib, io, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_resumenes_"))
+os.environ.setdefault("HISTORY_STORE", "1")
+os.environ.setdefault("COMPACT_AFTER_DAYS", "-1")
+
+from datetime import date, timedelta  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+from fake_sheets import FakeSpreadsheet  # noqa: E402
+
+HOJAS = [pi.DAILY_SUMMARY_NAME, pi.LATEST_PRICE_NAME, pi.FILTERS_NAME]
+PRODUCTOS = [("Lácteos", "LECHE ENTERA {} 1 L"), ("Lácteos", "YOGUR FRUTILLA {} 500 G"),
+             ("Verdulería", "TOMATE {} KG"), ("Carnicería", "CARNE MOLIDA {} KG"), ("Panadería", "PAN FELIPE {} UN")]
+
+class Scraper:
+    """Scraper falso: `productos` filas por sitio y día en varios grupos; algunos productos faltan algunos días."""
+    dia = None
+
+    def __init__(self, nombre, productos, rnd):
+        self.nombre, self.productos, self.rnd = nombre, productos, rnd
+
+    def stream(self):
+        for i in range(self.productos):
+            if self.rnd.random() < 0.1: continue  # sin stock hoy: su último precio queda en un día anterior
+            grupo, nombre = PRODUCTOS[i % len(PRODUCTOS)]
+            yield {"Supermercado": self.nombre.title(), "CategoríaURL": f"https://{self.nombre}.com.py/{grupo}",
+                   "Producto": nombre.format(i), "Precio": self.rnd.randint(5_000, 30_000) if i % 50 else None,
+                   "Grupo": grupo, "FechaConsulta": f"{Scraper.dia} 09:00:00"}
+
+    def csv_name(self):
+        return f"{self.nombre}_canasta_{Scraper.dia.replace('-', '')}_090000.csv"
+
+class Entorno:
+    """Libro en memoria + OUT_DIR propio; registra celdas escritas por hoja en cada corrida."""
+    def __init__(self, args):
+        self.out = tempfile.mkdtemp(prefix="resumenes_", dir=os.environ["OUT_DIR"])
+        self.sh = FakeSpreadsheet(sheet_id="principal")
+        self.sh.add_worksheet(pi.WORKSHEET_NAME, rows=1000, cols=20)
+        self.escritas = collections.Counter()
+        orig = self.sh.values_batch_update
+        def registrar(body=None):
+            for d in (body or {}).get("data", []):
+                self.escritas[d["range"].split("!")[0].strip("'")] += sum(len(f) for f in d["values"])
+            return orig(body=body)
+        self.sh.values_batch_update = registrar
+        rnd = random.Random(7)
+        self.scrapers = {s: (lambda s=s: Scraper(s, args.productos, rnd)) for s in ("stock", "biggie")}
+
+    @contextlib.contextmanager
+    def activo(self):
+        """Parchea el módulo para este entorno (OUT_DIR, libro, scrapers) y lo restaura al salir."""
+        previo = {k: getattr(pi, k) for k in ("OUT_DIR", "PATTERN_DAILY", "MANIFEST_PATH", "COMPACT_DIR", "HISTORY_DIR",
+                                              "KEY_INDEX_PATH", "SHEETS_CHECKPOINT_PATH", "SHEET_WINDOW_DAYS",
+                                              "RUN_REPORT_DIR", "SUMMARY_SHEETS", "SCRAPERS", "_open_spreadsheet")}
+        pi.OUT_DIR = self.out
+        pi.PATTERN_DAILY = os.path.join(self.out, "*_canasta_*.csv")
+        pi.MANIFEST_PATH = os.path.join(self.out, ".manifiesto_csv.json")
+        pi.COMPACT_DIR = os.path.join(self.out, "compactado")
+        pi.HISTORY_DIR = os.path.join(self.out, "historico")
+        pi.KEY_INDEX_PATH = os.path.join(self.out, ".indice_claves")
+        pi.SHEETS_CHECKPOINT_PATH = os.path.join(self.out, ".subida_sheets")
+        pi.RUN_REPORT_DIR = os.path.join(self.out, "reportes")
+        pi.SHEET_WINDOW_DAYS, pi.SUMMARY_SHEETS = 0, True
+        pi._open_spreadsheet = self.abrir
+        try:
+            yield
+        finally:
+            for k, v in previo.items(): setattr(pi, k, v)
+
+    def abrir(self):
+        pi.SheetsPlanner._books.clear()  # cada corrida lee los metadatos de nuevo, como en producción
+        return self.sh, self.sh.worksheet(pi.WORKSHEET_NAME)
+
+    def correr(self, dia=None, flags=()):
+        Scraper.dia = dia
+        self.escritas.clear()
+        self.sh.calls.clear()
+        pi.SCRAPERS = self.scrapers if dia else {}
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            pi.main(list(flags))
+        return out.getvalue()
+
+    def hoja(self, title):
+        s = self.sh._by_title(title)
+        return s.values(1, 1, s.rows, s.cols)
+
+    def celdas(self, title):
+        s = self.sh._by_title(title)
+        return s.rows * s.cols
+
+    def esperado(self):
+        """Las tres hojas recalculadas desde cero con el histórico completo, tal como se escribirían."""
+        df = pi.HistoryStore(os.path.join(self.out, "historico")).read(columns=pi.DashboardSummaries.SOURCE)
+        ultimo = pi._latest_prices(df)
+        return {t: [cols] + pi._df_to_values(v[cols])
+                for t, cols, v in [(pi.DAILY_SUMMARY_NAME, pi.SUMMARY_COLS, pi._daily_summary(df)),
+                                   (pi.LATEST_PRICE_NAME, pi.LATEST_COLS, ultimo),
+                                   (pi.FILTERS_NAME, pi.FILTER_COLS, pi._filter_lists(ultimo))]}
+
+    def iguales(self):
+        def sin_vacios(f):  # values.get no devuelve las celdas vacías del final de cada fila
+            while f and f[-1] == "": f = f[:-1]
+            return f
+        return all(self.hoja(t) == [sin_vacios(f) for f in v] for t, v in self.esperado().items())
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dias", type=int, default=120)
+    ap.add_argument("--productos", type=int, default=400, help="productos por sitio (2 sitios)")
+    args = ap.parse_args()
+    inicio = date(2026, 6, 1)
+    dias = [(inicio + timedelta(days=d)).isoformat() for d in range(args.dias + 1)]
+    tarde = dias.pop(len(dias) // 2)  # este día llega tarde: se ingiere al final
+    print(f"{args.dias} días × 2 sitios × {args.productos} productos")
+    oks = []
+
+    ent = Entorno(args)
+    with ent.activo():
+        siempre_igual, celdas, requests, segundos = True, [], [], []
+        for i, d in enumerate(dias):
+            t0 = time.perf_counter()
+            salida = ent.correr(d)
+            segundos.append(time.perf_counter() - t0)
+            if i:  # la primera corrida crea las hojas
+                celdas.append(sum(v for t, v in ent.escritas.items() if t in HOJAS))
+                requests.append(sum(1 for c in ent.sh.calls if c != "fetch_sheet_metadata"))
+            if i % 10 == 0 or i == len(dias) - 1:
+                siempre_igual &= ent.iguales()
+        linea = next((l for l in salida.splitlines() if l.startswith("[Resúmenes]")), "")
+        hoja = ent.celdas(pi.WORKSHEET_NAME)
+        resumenes = sum(ent.celdas(t) for t in HOJAS)
+        filtros_y_ultimo = ent.celdas(pi.FILTERS_NAME) + ent.celdas(pi.LATEST_PRICE_NAME)
+        print(f"  tablero sin filtros lee: hoja completa {hoja:,} celdas → último precio + filtros {filtros_y_ultimo:,} "
+              f"({hoja / max(filtros_y_ultimo, 1):.0f}× menos); las 3 hojas de resumen ocupan {resumenes:,}")
+        print(f"  por corrida: celdas escritas en resúmenes mediana {sorted(celdas)[len(celdas) // 2]:,} | "
+              f"requests a Sheets (sin metadatos) mediana {sorted(requests)[len(requests) // 2]} | "
+              f"main() mediana {sorted(segundos)[len(segundos) // 2] * 1000:.0f} ms")
+        print(f"  {linea}")
+        print(f"  incremental == recalcular desde cero: {siempre_igual}")
+        oks.append(siempre_igual)
+
+        # un día viejo que llega tarde: el resumen diario se reescribe desde ese día
+        filas_antes = len(ent.hoja(pi.DAILY_SUMMARY_NAME))
+        salida = ent.correr(tarde)
+        linea = next((l for l in salida.splitlines() if l.startswith("[Resúmenes]")), "")
+        ok = ent.iguales() and len(ent.hoja(pi.DAILY_SUMMARY_NAME)) > filas_antes
+        print(f"  día atrasado ({tarde}): igual a recalcular: {ok} | {linea}")
+        oks.append(ok)
+
+        # --full-rebuild deja exactamente lo mismo
+        ent.correr((date.fromisoformat(dias[-1]) + timedelta(days=1)).isoformat(), flags=["--full-rebuild"])
+        ok = ent.iguales()
+        print(f"  --full-rebuild: igual a recalcular: {ok}")
+        oks.append(ok)
+
+        # hoja de filtros borrada a mano → se recalculan las tres
+        s = ent.sh._by_title(pi.FILTERS_NAME)
+        ent.sh.batch_update({"requests": [{"deleteSheet": {"sheetId": s.props["sheetId"]}}]})
+        salida = ent.correr((date.fromisoformat(dias[-1]) + timedelta(days=2)).isoformat())
+        ok = ent.iguales() and "recalculados" in salida
+        print(f"  hoja borrada: recalculadas e iguales: {ok}")
+        oks.append(ok)
+
+        # --dry-run no escribe
+        antes = {t: ent.hoja(t) for t in HOJAS}
+        ent.correr((date.fromisoformat(dias[-1]) + timedelta(days=3)).isoformat(), flags=["--dry-run"])
+        pi.SHEETS_DRY_RUN = False  # main() lo deja activado en el módulo
+        ok = not ent.escritas and antes == {t: ent.hoja(t) for t in HOJAS}
+        print(f"  --dry-run  : sin escribir: {ok}")
+        oks.append(ok)
+    if not all(oks):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
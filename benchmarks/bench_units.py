@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Equivalencia + throughput de la extracción de unidades por lotes.
+
+1) Chequeo tipo propiedad: genera nombres aleatorios combinando cantidades
+   (enteros, decimales con coma/punto, dígitos Unicode), packs (6x, 12 ×),
+   unidades y alias en mayúsculas/acentuados, y exige que parse_units_batch
+   devuelva exactamente lo mismo que parse_units_from_text fila por fila.
+2) Throughput: enrich_unit_cols por lotes vs. el loop original fila a fila.
+
+Uso:
+    python benchmarks/bench_units.py [--casos 200000] [--n 1000000] [--distintos 50000]
+"""
+
+from __future__ import annotations
+import argparse, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OUT_DIR", tempfile.mkdtemp(prefix="bench_units_"))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import pipeline_ingesta as pi  # noqa: E402
+
+UNITS = ["kg", "KG", "Kilo", "gr", "g", "G", "l", "L", "lt", "Lt", "litro", "litros", "LITROS", "ml", "ML",
+         "cc", "cm3", "u", "U", "unid", "unidad", "unidades", "UNIDADES", "und", "uds", "udss", "kgs", "grs", "m"]
+WORDS = ["leche", "LECHE ENTERA", "pañal", "Azúcar", "pack", "x", "×", "de", "-", "/", "(", ")", "", "úñ",
+         "huevos", "AGUA", "c/u", "promo", "2x1"]
+DIGITS = "0123456789"
+
+def rnd_number(r: random.Random) -> str:
+    k = r.random()
+    if k < 0.05: return "٣"  # dígito árabe-índico (\d de Python lo acepta)
+    n = "".join(r.choice(DIGITS) for _ in range(r.randint(1, 4)))
+    if k < 0.35: n += r.choice([",", "."]) + "".join(r.choice(DIGITS) for _ in range(r.randint(1, 3)))
+    return n
+
+def rnd_name(r: random.Random) -> str:
+    parts = []
+    for _ in range(r.randint(0, 4)):
+        c = r.random()
+        if c < 0.4: parts.append(r.choice(WORDS))
+        elif c < 0.7: parts.append(rnd_number(r) + r.choice(["", " ", "  "]) + r.choice(UNITS))
+        elif c < 0.85: parts.append(f"{rnd_number(r)}{r.choice(['x', ' x ', '×', ' X '])}{rnd_number(r)}{r.choice(['', ' '])}{r.choice(UNITS)}")
+        else: parts.append(rnd_number(r))
+    return r.choice([" ", "", "  "]).join(parts)
+
+def legacy_enrich(df: pd.DataFrame) -> pd.DataFrame:
+    unidad_raw, etiqueta, cantidad = [], [], []
+    for nombre in df["Producto"].fillna(""):
+        raw, etq, qty = pi.parse_units_from_text(nombre)
+        unidad_raw.append(raw); etiqueta.append(etq); cantidad.append(qty)
+    df["Unidad"] = unidad_raw
+    df["unidad_corregido"] = etiqueta
+    df["etiquetaunidad"] = etiqueta
+    df["cantidad_unidades"] = cantidad
+    df["Precio"] = pd.to_numeric(df.get("Precio"), errors="coerce")
+    df["precio_unidad"] = np.where(
+        (pd.to_numeric(df["cantidad_unidades"], errors="coerce").fillna(0) > 0),
+        df["Precio"] / df["cantidad_unidades"].replace(0, np.nan),
+        np.nan
+    )
+    return df
+
+def check_equivalence(casos: int, seed: int = 11) -> int:
+    r = random.Random(seed)
+    names = pd.Series([rnd_name(r) for _ in range(casos)] + [None, "", "6x1,5 L", "12 UNIDADES", "1 kgs"], dtype=object)
+    batch = pi.parse_units_batch(names)
+    bad = 0
+    for i, nm in enumerate(names.fillna("")):
+        exp = pi.parse_units_from_text(nm)
+        got = (batch["Unidad"].iat[i], batch["etiquetaunidad"].iat[i], batch["cantidad_unidades"].iat[i])
+        if got != exp:
+            bad += 1
+            if bad <= 5: print(f"  ≠ {nm!r}: batch={got} esperado={exp}")
+    print(f"Equivalencia: {len(names) - bad}/{len(names)} casos idénticos")
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--casos", type=int, default=200_000)
+    ap.add_argument("--n", type=int, default=1_000_000)
+    ap.add_argument("--distintos", type=int, default=50_000)
+    args = ap.parse_args()
+
+    bad = check_equivalence(args.casos)
+
+    r = random.Random(3)
+    distintos = [rnd_name(r) for _ in range(args.distintos)]
+    df = pd.DataFrame({
+        "Producto": [r.choice(distintos) for _ in range(args.n)],
+        "Precio": [str(r.randint(1_000, 90_000)) for _ in range(args.n)],
+    })
+    t0 = time.perf_counter(); a = legacy_enrich(df.copy()); t_old = time.perf_counter() - t0
+    t0 = time.perf_counter(); b = pi.enrich_unit_cols(df.copy()); t_new = time.perf_counter() - t0
+    cols = ["Unidad", "etiquetaunidad", "unidad_corregido", "cantidad_unidades", "precio_unidad"]
+    same = all(a[c].astype(object).equals(b[c].astype(object)) for c in cols)
+    print(f"enrich_unit_cols sobre {args.n:,} filas ({args.distintos:,} nombres distintos)")
+    print(f"  loop original : {t_old:>7.2f} s   {args.n / t_old:>12,.0f} filas/s")
+    print(f"  por lotes     : {t_new:>7.2f} s   {args.n / t_new:>12,.0f} filas/s   (x{t_old / t_new:.1f})")
+    print(f"  columnas idénticas: {same}")
+    if bad or not same:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+Libro de Google Sheets en memoria con la superficie de gspread que usa el pipeline.
+
+Como en la API real, los datos y el tamaño de cada hoja viven "del lado del servidor"
+(por sheetId) y los FakeWorksheet sólo cachean sus propiedades, igual que gspread.Worksheet.
+Cada método que en gspread es un request HTTP se registra en `FakeSpreadsheet.calls`
+(nombre del endpoint), así los benchmarks comparan requests por corrida sin red. Opcionales:
+`latency` (segundos por request) + `cell_latency` (segundos por celda escrita), `max_cells`
+(payload más grande → 400, como "request too large"), `max_rps` (más requests por segundo →
+429 + Retry-After) y `fail(nombre, n)` → código HTTP para fallar el n-ésimo request de ese endpoint.
+Las celdas se guardan tal como llegan (USER_ENTERED no se interpreta) y no hay formatos:
+copyPaste copia valores (PASTE_FORMAT no hace nada). `save(path)` /
+`FakeSpreadsheet.load(path)` llevan el libro de un proceso a otro, y `FakeClient` reemplaza
+al cliente de gspread (`pi._gspread_client = lambda: FakeClient(sh)`) para que corran
+_open_spreadsheet / _open_book / _open_sheet tal cual.
+
+    sh = FakeSpreadsheet()
+    ws = sh.add_worksheet("precios_supermercados", rows=1000, cols=60)
+    ...
+    sh.calls      # ['fetch_sheet_metadata', 'batch_update', 'values_batch_update']
+    ws.grid()     # valores como los devolvería values.get (sin vacíos al final)
+"""
+
+from __future__ import annotations
+import collections, json, pickle, re, threading, time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from gspread.http_client import HTTPClient
+from gspread.utils import a1_to_rowcol, extract_id_from_url
+
+def _split_range(rng: str) -> Tuple[Optional[str], str]:
+    """"'hoja'!A1:B" → ("hoja", "A1:B"); "'hoja'" → ("hoja", ""); "A1" → (None, "A1")."""
+    if "!" in rng:
+        title, a1 = rng.rsplit("!", 1)
+    elif re.fullmatch(r"[A-Za-z]{0,3}\d*(:[A-Za-z]{0,3}\d*)?", rng) and re.search(r"[\d:]", rng):
+        return None, rng
+    else:
+        title, a1 = rng, ""
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, a1
+
+def _api_error(status: int, retry_after: Optional[float] = None) -> APIError:
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps({"error": {"code": status, "message": "fake", "status": "FAKE"}}).encode()
+    if retry_after is not None:
+        resp.headers["Retry-After"] = str(int(retry_after))
+    return APIError(resp)
+
+class _Sheet:
+    """Estado de una hoja en el "servidor": propiedades y celdas, por fila (lista desde la columna A
+    sin vacíos al final): una hoja de millones de celdas ocupa ~8 bytes por celda además de los valores."""
+    def __init__(self, sheet_id: int, title: str, index: int, rows: int, cols: int):
+        self.props = {"sheetId": sheet_id, "title": title, "index": index,
+                      "gridProperties": {"rowCount": int(rows), "columnCount": int(cols)}}
+        self.data: Dict[int, list] = {}
+
+    @property
+    def rows(self) -> int:
+        return self.props["gridProperties"]["rowCount"]
+
+    @property
+    def cols(self) -> int:
+        return self.props["gridProperties"]["columnCount"]
+
+    def bounds(self, a1: str) -> Tuple[int, int, int, int]:
+        """A1 / A1:B / A2:A → (r1, c1, r2, c2), abiertos hasta el borde de la grilla."""
+        def part(x, default_row):
+            letras, num = re.match(r"([A-Za-z]*)(\d*)", x).groups()
+            col = a1_to_rowcol(letras.upper() + "1")[1] if letras else None
+            return (int(num) if num else default_row), col
+        if not a1:
+            return 1, 1, self.rows, self.cols
+        if ":" not in a1:
+            r, c = part(a1, 1)
+            return r, c or 1, r, c or 1
+        a, b = a1.split(":")
+        r1, c1 = part(a, 1)
+        r2, c2 = part(b, self.rows)
+        return r1, c1 or 1, r2, c2 or self.cols
+
+    def _set(self, r: int, fila: list):
+        while fila and fila[-1] == "": fila.pop()
+        if fila: self.data[r] = fila
+        else: self.data.pop(r, None)
+
+    def resize(self, rows: Optional[int] = None, cols: Optional[int] = None):
+        g = self.props["gridProperties"]
+        if rows is not None: g["rowCount"] = int(rows)
+        if cols is not None: g["columnCount"] = int(cols)
+        for r in [r for r in self.data if r > self.rows]: del self.data[r]
+        for r, fila in list(self.data.items()):
+            if len(fila) > self.cols: self._set(r, fila[:self.cols])
+
+    def write(self, r: int, c: int, values: List[list]):
+        if any(fila and (r + i > self.rows or c + len(fila) - 1 > self.cols) for i, fila in enumerate(values)):
+            raise _api_error(400)  # "exceeds grid limits"
+        for i, fila in enumerate(values):
+            if not fila: continue
+            dst = self.data.get(r + i, [])
+            if len(dst) < c - 1 + len(fila): dst.extend([""] * (c - 1 + len(fila) - len(dst)))
+            dst[c - 1:c - 1 + len(fila)] = ["" if v is None else v for v in fila]
+            self._set(r + i, dst)
+
+    def clear(self, r1: int, c1: int, r2: int, c2: int):
+        for r in [r for r in self.data if r1 <= r <= r2]:
+            fila = self.data[r]
+            fila[c1 - 1:c2] = [""] * len(fila[c1 - 1:c2])
+            self._set(r, fila)
+
+    def values(self, r1: int, c1: int, r2: int, c2: int) -> List[list]:
+        out, vacia = [], []
+        for r in range(r1, min(r2, self.rows) + 1):
+            fila = self.data.get(r, vacia)[c1 - 1:min(c2, self.cols)]
+            while fila and fila[-1] == "": fila.pop()
+            out.append(fila)
+        while out and not out[-1]: out.pop()
+        return out
+
+class FakeWorksheet:
+    def __init__(self, sh: "FakeSpreadsheet", props: dict):
+        self.spreadsheet = sh
+        self._properties = json.loads(json.dumps(props))  # copia, como la caché de gspread
+
+    id = property(lambda self: self._properties["sheetId"])
+    title = property(lambda self: self._properties["title"])
+    index = property(lambda self: self._properties["index"])
+    row_count = property(lambda self: self._properties["gridProperties"]["rowCount"])
+    col_count = property(lambda self: self._properties["gridProperties"]["columnCount"])
+
+    def _sheet(self) -> _Sheet:
+        return self.spreadsheet._sheets[self.id]
+
+    def grid(self) -> List[list]:
+        """Contenido actual en el servidor (sin request)."""
+        s = self._sheet()
+        return s.values(1, 1, s.rows, s.cols)
+
+    # ── API (un request cada uno) ──
+    def get(self, range_name: str = "A1", **kw) -> List[list]:
+        self.spreadsheet._request("values_get")
+        s = self._sheet()
+        return s.values(*s.bounds(range_name))
+
+    def row_values(self, row: int, **kw) -> list:
+        self.spreadsheet._request("values_get")
+        vals = self._sheet().values(row, 1, row, self._sheet().cols)
+        return vals[0] if vals else []
+
+    def update(self, range_name: str = "A1", values: List[list] = None, **kw):
+        self.spreadsheet._request("values_update", sum(len(f) for f in values or []))
+        r, c = a1_to_rowcol(range_name.split(":")[0])
+        self._sheet().write(r, c, values or [])
+
+    def update_cells(self, cell_list, value_input_option: str = "RAW"):
+        self.spreadsheet._request("values_update", len(cell_list))
+        for cell in cell_list:
+            self._sheet().write(cell.row, cell.col, [[cell.value]])
+
+    def batch_clear(self, ranges: List[str]):
+        self.spreadsheet._request("values_batch_clear")
+        s = self._sheet()
+        for rng in ranges:
+            s.clear(*s.bounds(_split_range(rng)[1]))
+
+    def resize(self, rows: Optional[int] = None, cols: Optional[int] = None):
+        self.spreadsheet._request("batch_update")
+        self._sheet().resize(rows, cols)
+        g = self._properties["gridProperties"]
+        if rows is not None: g["rowCount"] = int(rows)
+        if cols is not None: g["columnCount"] = int(cols)
+
+    def add_rows(self, rows: int):
+        self.resize(rows=self.row_count + rows)
+
+    def add_cols(self, cols: int):
+        self.resize(cols=self.col_count + cols)
+
+class FakeSpreadsheet:
+    def __init__(self, sheet_id: str = "fake", latency: float = 0.0, cell_latency: float = 0.0,
+                 max_cells: Optional[int] = None, max_rps: Optional[float] = None,
+                 fail: Optional[Callable[[str, int], Optional[int]]] = None):
+        self.id = sheet_id
+        self.client = object.__new__(HTTPClient)  # sin sesión: sólo para armar gspread.Worksheet(sh, props, ...)
+        self.latency, self.cell_latency, self.max_cells = latency, cell_latency, max_cells
+        self.max_rps, self.fail = max_rps, fail
+        self.calls: List[str] = []
+        self.throttled = 0
+        self._sheets: Dict[int, _Sheet] = {}
+        self._next_id = 1
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    def _request(self, nombre: str, cells: int = 0):
+        with self._lock:
+            self.calls.append(nombre)
+            n = self.calls.count(nombre)
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1.0: self._recent.popleft()
+            self._recent.append(now)
+            rafaga = self.max_rps is not None and len(self._recent) > self.max_rps
+            if rafaga: self.throttled += 1
+        if self.latency or self.cell_latency: time.sleep(self.latency + cells * self.cell_latency)
+        if self.max_cells is not None and cells > self.max_cells:
+            raise _api_error(400)
+        if rafaga:
+            raise _api_error(429, retry_after=1)
+        status = self.fail(nombre, n) if self.fail else None
+        if status:
+            raise _api_error(status)
+
+    def _by_title(self, title: Optional[str]) -> _Sheet:
+        if title is None:
+            return min(self._sheets.values(), key=lambda s: s.props["index"])
+        for s in self._sheets.values():
+            if s.props["title"] == title: return s
+        raise _api_error(400)  # "Unable to parse range"
+
+    def _add(self, title: str, rows: int, cols: int) -> _Sheet:
+        if any(s.props["title"] == title for s in self._sheets.values()):
+            raise _api_error(400)  # "A sheet with the name ... already exists"
+        s = _Sheet(self._next_id, title, len(self._sheets), rows, cols)
+        self._sheets[s.props["sheetId"]] = s
+        self._next_id += 1
+        return s
+
+    def total_cells(self) -> int:
+        return sum(s.rows * s.cols for s in self._sheets.values())
+
+    def save(self, path: str):
+        """Guarda el contenido "del servidor" (hojas y celdas) para retomarlo en otro proceso."""
+        with open(path, "wb") as fh:
+            pickle.dump({"id": self.id, "sheets": self._sheets, "next_id": self._next_id}, fh, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str, **kw) -> "FakeSpreadsheet":
+        """Libro guardado con save(); `kw` son las opciones del constructor (latency, max_rps, ...)."""
+        with open(path, "rb") as fh:
+            d = pickle.load(fh)
+        sh = cls(sheet_id=d["id"], **kw)
+        sh._sheets, sh._next_id = d["sheets"], d["next_id"]
+        return sh
+
+    # ── API ──
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, index: Optional[int] = None) -> FakeWorksheet:
+        self._request("batch_update")
+        return FakeWorksheet(self, self._add(title, int(rows), int(cols)).props)
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self._request("fetch_sheet_metadata")
+        if not any(s.props["title"] == title for s in self._sheets.values()):
+            raise WorksheetNotFound(title)
+        return FakeWorksheet(self, self._by_title(title).props)
+
+    def worksheets(self, exclude_hidden: bool = False) -> List[FakeWorksheet]:
+        self._request("fetch_sheet_metadata")
+        return [FakeWorksheet(self, s.props) for s in sorted(self._sheets.values(), key=lambda s: s.props["index"])]
+
+    def fetch_sheet_metadata(self, params: Optional[dict] = None) -> dict:
+        self._request("fetch_sheet_metadata")
+        hojas = sorted(self._sheets.values(), key=lambda s: s.props["index"])
+        return {"sheets": [{"properties": json.loads(json.dumps(s.props))} for s in hojas]}
+
+    def batch_update(self, body: dict):
+        self._request("batch_update")
+        replies = []
+        for req in body.get("requests", []):
+            if "addSheet" in req:
+                p = req["addSheet"]["properties"]
+                g = p.get("gridProperties", {})
+                s = self._add(p["title"], g.get("rowCount", 1000), g.get("columnCount", 26))
+                replies.append({"addSheet": {"properties": json.loads(json.dumps(s.props))}})
+                continue
+            if "deleteSheet" in req:
+                del self._sheets[req["deleteSheet"]["sheetId"]]
+                for i, s in enumerate(sorted(self._sheets.values(), key=lambda s: s.props["index"])):
+                    s.props["index"] = i
+            elif "updateSheetProperties" in req:
+                p = req["updateSheetProperties"]["properties"]
+                s = self._sheets[p["sheetId"]]
+                g = p.get("gridProperties", {})
+                if g: s.resize(g.get("rowCount"), g.get("columnCount"))
+                if "title" in p: s.props["title"] = p["title"]
+                if "index" in p:
+                    otras = sorted((o for o in self._sheets.values() if o is not s), key=lambda o: o.props["index"])
+                    otras.insert(min(p["index"], len(otras)), s)
+                    for i, o in enumerate(otras): o.props["index"] = i
+            elif "copyPaste" in req:
+                cp = req["copyPaste"]
+                if cp.get("pasteType", "PASTE_NORMAL") in ("PASTE_NORMAL", "PASTE_VALUES"):
+                    src, dst = cp["source"], cp["destination"]
+                    r1, c1 = src["startRowIndex"] + 1, src["startColumnIndex"] + 1
+                    r2, c2 = src["endRowIndex"], src["endColumnIndex"]
+                    vals = self._sheets[src["sheetId"]].values(r1, c1, r2, c2)
+                    d = self._sheets[dst["sheetId"]]
+                    dr, dc = dst["startRowIndex"] + 1, dst["startColumnIndex"] + 1
+                    d.clear(dr, dc, dr + r2 - r1, dc + c2 - c1)
+                    d.write(dr, dc, vals)
+            else:
+                raise NotImplementedError(f"request no soportado por el fake: {list(req)}")
+            replies.append({})
+        return {"replies": replies}
+
+    def values_batch_update(self, body: Optional[dict] = None):
+        data = (body or {}).get("data", [])
+        self._request("values_batch_update", sum(sum(len(f) for f in d.get("values", [])) for d in data))
+        for d in data:
+            title, a1 = _split_range(d["range"])
+            s = self._by_title(title)
+            r1, c1, _, _ = s.bounds(a1)
+            s.write(r1, c1, d.get("values", []))
+        return {}
+
+    def values_get(self, range_name: str, params: Optional[dict] = None) -> dict:
+        self._request("values_get")
+        title, a1 = _split_range(range_name)
+        s = self._by_title(title)
+        return {"values": s.values(*s.bounds(a1))}
+
+    def values_batch_get(self, ranges: List[str], params: Optional[dict] = None) -> dict:
+        self._request("values_batch_get")
+        out = []
+        for rng in ranges:
+            title, a1 = _split_range(rng)
+            s = self._by_title(title)
+            out.append({"range": rng, "values": s.values(*s.bounds(a1))})
+        return {"valueRanges": out}
+
+class FakeClient:
+    """Lo que el pipeline usa de gspread.Client: abrir libros por URL o por id (_open_spreadsheet, _open_book)."""
+    def __init__(self, *books: FakeSpreadsheet):
+        self.books = {b.id: b for b in books}
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        if key not in self.books:
+            raise SpreadsheetNotFound(key)
+        self.books[key]._request("fetch_sheet_metadata")
+        return self.books[key]
+
+    def open_by_url(self, url: str) -> FakeSpreadsheet:
+        return self.open_by_key(extract_id_from_url(url))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Los seis supermercados servidos desde benchmarks/fixtures/ por servidores locales (uno por
+sitio, como hosts distintos), para correr los scrapers reales sin red:
+  - HTML (stock, superseis, salemma, arete, losjardines): "/" → portada.html, con los enlaces
+    absolutos al sitio real reescritos al servidor local; cualquier otra ruta → categoria.html.
+  - biggie: /api/articles (take/skip/classificationName) paginado desde biggie/articulos.json.
+Latencia y fracción de errores 500 inyectables (LocalSiteServer), iguales para todos los sitios.
+
+    with FixtureSites(latency=0.02, error_rate=0.01) as sitios:
+        pi.SCRAPERS = sitios.scrapers()   # mismas clases del pipeline, apuntando a los servidores
+        pi.main([])
+        sitios.requests()                 # {sitio: requests recibidos}
+"""
+
+from __future__ import annotations
+import contextlib, json, os, sys
+from typing import Callable, Dict
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import pipeline_ingesta as pi  # noqa: E402
+from local_server import LocalSiteServer  # noqa: E402
+from make_fixtures import FIXTURES  # noqa: E402
+
+HTML = {"stock": pi.StockScraper, "superseis": pi.SuperseisScraper, "salemma": pi.SalemmaScraper,
+        "arete": pi.AreteScraper, "losjardines": pi.JardinesScraper}
+SITIOS = list(HTML) + ["biggie"]
+
+def _leer(*partes) -> bytes:
+    with open(os.path.join(FIXTURES, *partes), "rb") as fh:
+        return fh.read()
+
+def html_route(nombre: str, url: Callable[[], str]):
+    """Portada con los enlaces al dominio real apuntando a `url()` (se conoce al levantar el servidor)."""
+    real, cat = HTML[nombre]().base_url.encode(), _leer(nombre, "categoria.html")
+    portada = _leer(nombre, "portada.html")
+    def route(path):
+        if urlparse(path).path in ("", "/"):
+            return 200, portada.replace(real, url().encode()), {}
+        return 200, cat, {}
+    return route
+
+def biggie_route():
+    grupos = json.loads(_leer("biggie", "articulos.json"))
+    def route(path):
+        u = urlparse(path)
+        if u.path != "/api/articles": return None
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        items = grupos.get(q.get("classificationName", ""), [])
+        take, skip = int(q.get("take", 100)), int(q.get("skip", 0))
+        body = json.dumps({"items": items[skip:skip + take], "count": len(items)}).encode()
+        return 200, body, {"Content-Type": "application/json"}
+    return route
+
+class FixtureSites:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        if not os.path.exists(os.path.join(FIXTURES, "biggie", "articulos.json")):
+            sys.exit("Faltan fixtures: python benchmarks/make_fixtures.py")
+        self.servers: Dict[str, LocalSiteServer] = {}
+        for i, nombre in enumerate(SITIOS):
+            route = biggie_route() if nombre == "biggie" else html_route(nombre, lambda n=nombre: self.servers[n].url)
+            self.servers[nombre] = LocalSiteServer(route, latency=latency, error_rate=error_rate, seed=seed + i)
+        self._stack = contextlib.ExitStack()
+
+    def __enter__(self):
+        for srv in self.servers.values(): self._stack.enter_context(srv)
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+
+    def scrapers(self) -> Dict[str, Callable]:
+        """Como pi.SCRAPERS: fábricas de los scrapers reales con base_url / API en el servidor local."""
+        def html(nombre):
+            def crear():
+                sc = HTML[nombre]()
+                sc.base_url = self.servers[nombre].url
+                return sc
+            return crear
+        def biggie():
+            sc = pi.BiggieScraper()
+            sc.API = self.servers["biggie"].url + "/api/articles"
+            return sc
+        return {**{n: html(n) for n in HTML}, "biggie": biggie}
+
+    def requests(self) -> Dict[str, int]:
+        return {n: s.requests for n, s in self.servers.items()}
+
+    def errors(self) -> Dict[str, int]:
+        return {n: s.errors for n, s in self.servers.items()}
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor HTTP local (stand-in de los supermercados) para benchmarks offline.
+  - HTTP/1.1 con keep-alive, para medir reutilización de conexiones.
+  - Latencia inyectable por request y conteo de conexiones TCP abiertas.
+  - conditional=True: manda ETag (hash del cuerpo) y responde 304 a If-None-Match vigentes.
+  - max_inflight=N: sitio frágil; con más de N requests en curso responde 429 + Retry-After.
+  - error_rate=p: fracción de requests que responden 500 (sorteo con semilla fija: reproducible).
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, Optional, Tuple
+import hashlib, random, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# handler(path_con_query) -> (status, body, headers) o None (404)
+Route = Callable[[str], Optional[Tuple[int, bytes, Dict[str, str]]]]
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # backlog amplio: cientos de conexiones simultáneas
+
+    def handle_error(self, request, client_address):
+        # el cliente corta conexiones keep-alive al cerrar la sesión: no es un error del benchmark
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class LocalSiteServer:
+    def __init__(self, route: Route, latency: float = 0.0, conditional: bool = False,
+                 max_inflight: Optional[int] = None, retry_after: float = 1.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.route = route
+        self.latency = latency
+        self.conditional = conditional
+        self.max_inflight = max_inflight
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self._rnd = random.Random(seed)
+        self.connections = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.throttled = 0
+        self.errors = 0
+        self.inflight = self.peak_inflight = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def _handler(self):
+        srv = self
+
+        class H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with srv._lock: srv.connections += 1
+
+            def do_GET(self):
+                with srv._lock:
+                    srv.requests += 1
+                    srv.inflight += 1
+                    srv.peak_inflight = max(srv.peak_inflight, srv.inflight)
+                    saturado = srv.max_inflight is not None and srv.inflight > srv.max_inflight
+                    if saturado: srv.throttled += 1
+                    falla = not saturado and srv.error_rate > 0 and srv._rnd.random() < srv.error_rate
+                    if falla: srv.errors += 1
+                try:
+                    self._responder(saturado, falla)
+                finally:
+                    with srv._lock: srv.inflight -= 1
+
+            def _responder(self, saturado, falla=False):
+                if saturado:
+                    body = b"too many requests"
+                    self.send_response(429)
+                    self.send_header("Retry-After", f"{srv.retry_after:g}")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                if srv.latency: time.sleep(srv.latency)
+                res = (500, b"internal error", {}) if falla else srv.route(self.path)
+                status, body, headers = res if res else (404, b"not found", {})
+                if srv.conditional and status == 200:
+                    etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                    headers = {"ETag": etag, **headers}
+                    if self.headers.get("If-None-Match") == etag:
+                        with srv._lock: srv.not_modified += 1
+                        status, body = 304, b""
+                self.send_response(status)
+                headers = {"Content-Type": "text/html; charset=utf-8", **headers}
+                for k, v in headers.items(): self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *a):  # silencio
+                pass
+
+        return H
+
+    def __enter__(self):
+        self._httpd = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_counters(self):
+        with self._lock:
+            self.connections = self.requests = self.not_modified = self.throttled = self.errors = 0
+            self.peak_inflight = self.inflight
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Genera los fixtures de benchmarks/fixtures/: portada + una página de categoría por sitio HTML y,
+para Biggie, los artículos de cada grupo tal como los devuelve su API (biggie/articulos.json).
+
+Reproducen el marcado que consultan los scrapers (selectores, inputs de Salemma, menús de
+Arete/Los Jardines) dentro de una página completa: <head> con CSS/JS inline, menús,
+footer, comentarios, entidades, &nbsp;, títulos sin precio, productos excluidos, etc.
+Son deterministas; para reemplazarlos por páginas reales usar
+`python benchmarks/bench_html_parsers.py --grabar` (requiere red).
+
+Uso:
+    python benchmarks/make_fixtures.py [--productos 60]
+"""
+
+from __future__ import annotations
+import argparse, json, os, random
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+NOMBRES = [
+    "Leche Entera Trébol 1 L", "LECHE DESCREMADA LACTOLANDA 1L", "Yogur Bebible Frutilla 900 ml",
+    "Queso Paraguay x Kg", "Manteca Doña Angela 200 g", "Crema de Leche 200 ml",
+    "Carne Vacuna Costilla x KG", "Bola de Lomo Premium 1 kg", "Pechuga de Pollo x kg",
+    "Chorizo Parrillero &amp; Morcilla 500 g", "Pan Lactal Bimbo 500 g", "Galletita Rellena 6x100 g",
+    "Prepizza Artesanal x 2 u", "Chipa Almidón 250 gr", "Huevos Blancos 30 U", "Huevos Colorados 12 unidades",
+    "Tomate&nbsp;Perita x kg", "Cebolla Blanca 1 KG", "Limón Sutil x kg", "Banana Nacional 1 kg",
+    "Shampoo Anticaspa 400 ml", "Jabón en Polvo 800 g", "Pañales Talle G x 30", "Huevo de Pascua Kinder 100 g",
+    "Detergente Limón 500 ml", "Agua Mineral 2 L", "Dulce de Leche Trébol 1 kg", "Pollo Entero Congelado",
+]
+
+HEAD = """<!DOCTYPE html>
+<html lang="es">
+<head>
+{meta}<title>{titulo}</title>
+<link rel="stylesheet" href="/assets/app.css">
+<style>{css}</style>
+<script type="application/ld+json">{{"@type":"ItemList","name":"{titulo}"}}</script>
+<script>window.dataLayer=window.dataLayer||[];{js}</script>
+</head>
+"""
+
+def _css(r: random.Random, n: int = 120) -> str:
+    return "".join(f".c{i}{{margin:{r.randint(0, 9)}px;color:#{r.randrange(16**6):06x}}}" for i in range(n))
+
+def _js(r: random.Random, n: int = 60) -> str:
+    # incluye cadenas con los mismos nombres de clase que buscan los scrapers
+    return "".join(f"dataLayer.push({{'event':'imp{i}','cls':'product-item','v':{r.randint(1, 99999)}}});"
+                   for i in range(n))
+
+def _menu(r: random.Random, n: int = 80) -> str:
+    return "".join(f'<li class="menu-item"><a href="/pagina/{i}">Sección {i}</a></li>' for i in range(n))
+
+def _precio(r: random.Random) -> int:
+    return r.randrange(2_500, 95_000, 50)
+
+def _gs(v: int) -> str:
+    return f"Gs. {v:,}".replace(",", ".")
+
+def _footer(r: random.Random) -> str:
+    return ("<footer><!-- product-item product-title-link -->"
+            + "".join(f'<p class="legal">Texto legal {i} — condiciones &amp; políticas</p>' for i in range(30))
+            + "</footer>")
+
+# ───────── Stock / Superseis (misma plataforma) ─────────
+def home_categories(host: str, r: random.Random) -> str:
+    cats = ["carnes", "lacteos", "Panaderia", "huevos", "frutas-y-verduras", "limpieza", "bebidas",
+            "perfumeria", "verduleria", "pescados", "congelados", "almacen"]
+    links = "".join(f'<li><a href="{host}/category/{i}-{c}">{c.title()}</a></li>' for i, c in enumerate(cats))
+    links += '<li><a href="/category/77-LACTEOS-y-derivados?page=1">Lácteos</a></li><li><a>sin href</a></li>'
+    return links
+
+def stock_category(r: random.Random, n: int) -> str:
+    items = []
+    for j in range(n):
+        nm = NOMBRES[j % len(NOMBRES)]
+        p = _precio(r)
+        if j % 11 == 5:  # sin título
+            items.append(f'<div class="product-item"><span class="price">{_gs(p)}</span></div>')
+            continue
+        label = f'<span class="price-label">{_gs(p)}</span>' if j % 3 else '<span class="price-label">Precio:</span>'
+        items.append(
+            f'<div class="product-item col-md-3"><div class="product-image"><a href="/product/{j}">'
+            f'<img src="/img/{j}.jpg" alt="{nm}"></a></div>'
+            f'<h2 class="product-title"><a href="/product/{j}">{nm}</a> <small>{j}</small></h2>'
+            f'{label}<span class="price"><del>{_gs(p + 900)}</del> {_gs(p)}</span>'
+            f'<button class="btn add" data-id="{j}">Agregar</button></div>'
+        )
+    return "".join(items)
+
+def superseis_category(r: random.Random, n: int) -> str:
+    items = []
+    for j in range(n):
+        nm = NOMBRES[(j * 7) % len(NOMBRES)]
+        p = _precio(r)
+        if j % 13 == 4:  # título fuera de un div.product-item (el precio no se encuentra)
+            items.append(f'<a class="product-title-link" href="/p/{j}">{nm}</a>')
+            continue
+        items.append(
+            f'<div class="product-item"><div class="item-box"><div class="picture">'
+            f'<img src="/img/{j}.jpg"></div><div class="details">'
+            f'<h2 class="product-title"><a class="product-title-link" href="/p/{j}">{nm}</a></h2>'
+            f'<div class="prices"><span class="price-label">{_gs(p)}</span></div></div></div></div>'
+        )
+    return "".join(items)
+
+# ───────── Salemma ─────────
+def salemma_category(r: random.Random, n: int) -> str:
+    items = []
+    for j in range(n):
+        nm = NOMBRES[(j * 5) % len(NOMBRES)].replace("&amp;", "&amp;amp;").replace("&nbsp;", " ")
+        p = _precio(r)
+        name_in = f'<input type="hidden" name="name" value="  {nm} ">' if j % 9 else '<input type="hidden" name="name" value="">'
+        price_in = f'<input type="hidden" name="price" value="{p}">' if j % 10 != 3 else ""
+        items.append(
+            f'<div class="product"><form class="productsListForm form-inline" method="post" action="/cart/add">'
+            f'<input type="hidden" name="id" value="{j}">{name_in}{price_in}'
+            f'<div class="title">{nm}</div><span class="price">{_gs(p)}</span>'
+            f'<button type="submit">Comprar</button></form></div>'
+        )
+    return "".join(items)
+
+def salemma_home(r: random.Random) -> str:
+    cats = ["lacteos", "carnes-vacunas", "PANADERIA", "huevos", "frutas", "limpieza", "bebidas", "hortalizas"]
+    return "".join(f'<a href="/categoria/{c}">{c}</a>' for c in cats) + '<a href="https://salemma.example/promo">x</a>'
+
+# ───────── Arete / Los Jardines ─────────
+def arete_home(r: random.Random, menu_id: str) -> str:
+    cats = ["carnes", "lacteos", "panaderia", "huevos", "verduleria", "bebidas", "limpieza", "perfumeria"]
+    lis = "".join(f'<li><a href="catalogo/{i}-{c}?orden=precio">{c}</a></li>' for i, c in enumerate(cats))
+    return (f'<ul id="{menu_id}" class="menu">{lis}</ul>'
+            '<ul class="otros"><li><a href="catalogo/99-carnes-otros">fuera del menú</a></li></ul>')
+
+def arete_category(r: random.Random, n: int) -> str:
+    items = []
+    for j in range(n):
+        nm = NOMBRES[(j * 3) % len(NOMBRES)]
+        p = _precio(r)
+        if j % 4 == 0:
+            price = (f'<span class="price"><del><span class="amount">{_gs(p + 1000)}</span></del>'
+                     f'<ins><span class="amount">{_gs(p)}</span></ins></span>')
+        elif j % 4 == 1:
+            price = f'<span class="price"><span class="woocommerce-Price-amount"><bdi>{_gs(p)}</bdi></span></span>'
+        elif j % 4 == 2:
+            price = f'<div data-price="{p}"></div>'
+        else:
+            price = f'<span class="price"><span class="amount">{_gs(p)}</span></span>'
+        items.append(
+            f'<div class="product type-product instock"><a href="/producto/{j}">'
+            f'<img src="/img/{j}.jpg"><h2 class="ecommercepro-loop-product__title">{nm}</h2></a>'
+            f'{price}<a class="button add_to_cart_button" href="?add={j}">Añadir</a></div>'
+        )
+    return "".join(items)
+
+# ───────── Biggie (API JSON) ─────────
+def biggie_articles(r: random.Random, n: int) -> dict:
+    """Grupo → artículos {name, price} de /api/articles, sin paginar (el servidor local pagina)."""
+    marcas = ["Trébol", "La Fortuna", "Lactolanda", "Bimbo", "Co-op", "Doña Angela"]
+    out = {}
+    for g in ["carniceria", "panaderia", "huevos", "lacteos"]:
+        items = []
+        for j in range(n):
+            nm = NOMBRES[(j * 11 + len(g)) % len(NOMBRES)].replace("&amp;", "&").replace("&nbsp;", " ")
+            precio = _precio(r) if j % 17 != 8 else None  # algunos sin precio
+            items.append({"name": f"{nm} {marcas[j % len(marcas)]} {j}", "price": precio})
+        out[g] = items
+    return out
+
+def page(body: str, titulo: str, r: random.Random, meta: bool = True) -> str:
+    head = HEAD.format(meta='<meta charset="utf-8">\n' if meta else "", titulo=titulo, css=_css(r), js=_js(r))
+    return (head + f'<body><header><nav><ul class="menu">{_menu(r)}</ul></nav></header>'
+            f'<main><div class="products">{body}</div></main>{_footer(r)}</body></html>')
+
+def build(productos: int):
+    r = random.Random(2024)
+    sitios = {
+        "stock": (home_categories("https://www.stock.com.py", r), stock_category(r, productos)),
+        "superseis": (home_categories("", r), superseis_category(r, productos)),
+        "salemma": (salemma_home(r), salemma_category(r, productos)),
+        "arete": (arete_home(r, "departments-menu"), arete_category(r, productos)),
+        "losjardines": (arete_home(r, "menu-departments-menu-1"), arete_category(r, productos)),
+    }
+    os.makedirs(FIXTURES, exist_ok=True)
+    for name, (home, cat) in sitios.items():
+        d = os.path.join(FIXTURES, name)
+        os.makedirs(d, exist_ok=True)
+        meta = name != "salemma"  # una página sin <meta charset>: se detecta desde los bytes
+        for fn, body in (("portada.html", home), ("categoria.html", cat)):
+            with open(os.path.join(d, fn), "wb") as fh:
+                fh.write(page(body, f"{name} {fn}", r, meta=meta).encode("utf-8"))
+        print(f"{name:<12} {os.path.getsize(os.path.join(d, 'categoria.html')) / 1024:>6.1f} KB por categoría")
+    d = os.path.join(FIXTURES, "biggie")
+    os.makedirs(d, exist_ok=True)
+    with open(os.path.join(d, "articulos.json"), "w", encoding="utf-8") as fh:
+        json.dump(biggie_articles(r, productos * 4), fh, ensure_ascii=False)
+    print(f"{'biggie':<12} {os.path.getsize(os.path.join(d, 'articulos.json')) / 1024:>6.1f} KB de artículos (4 grupos)")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--productos", type=int, default=60)
+    build(ap.parse_args().productos)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+/**
+ * Cliente del paquete estático docs/data/ (STATIC_EXPORT_DIR del pipeline), sin backend:
+ *
+ *   const datos = await PreciosData.abrir();              // manifiesto + diccionarios + índice
+ *   datos.productos({ supermercado: 'Stock', texto: 'leche' })  // último precio de cada producto
+ *   await datos.serie('Stock', 'LECHE ENTERA 1 L')         // baja sólo los meses de ese producto
+ *   await datos.mes('2026-07')                             // todas las filas de un mes
+ *
+ * Los archivos (salvo manifest.json) llevan el hash del contenido en el nombre: el navegador y
+ * el CDN pueden cachearlos sin revalidar. manifest.json se pide siempre fresco.
+ */
+const PreciosData = (() => {
+  const base = new URL('data/', document.baseURI);
+  const cache = {};
+
+  const json = (nombre, opts) => fetch(new URL(nombre, base), opts).then((r) => {
+    if (!r.ok) throw new Error(`${nombre}: HTTP ${r.status}`);
+    return r.json();
+  });
+  const archivo = (nombre) => cache[nombre] || (cache[nombre] = json(nombre));
+
+  async function abrir() {
+    const m = await json('manifest.json', { cache: 'no-cache' });
+    const [dic, idx] = await Promise.all([archivo(m.diccionarios), archivo(m.productos)]);
+
+    const fila = (i) => ({
+      Supermercado: dic.s[idx.s[i]], Producto: dic.p[idx.p[i]],
+      Grupo: dic.g[idx.g[i]], Subgrupo: dic.sg[idx.sg[i]],
+      Precio: idx.precio[i], FechaConsulta: idx.fecha[i], meses: idx.meses[i],
+    });
+
+    /** Último precio de cada Supermercado × Producto (filtros opcionales, como en el tablero). */
+    function productos(f = {}) {
+      const texto = (f.texto || '').toLowerCase();
+      const out = [];
+      for (let i = 0; i < idx.p.length; i++) {
+        if (f.supermercado && dic.s[idx.s[i]] !== f.supermercado) continue;
+        if (f.grupo && dic.g[idx.g[i]] !== f.grupo) continue;
+        if (f.subgrupo && dic.sg[idx.sg[i]] !== f.subgrupo) continue;
+        if (texto && !dic.p[idx.p[i]].toLowerCase().includes(texto)) continue;
+        out.push(fila(i));
+      }
+      return out;
+    }
+
+    /** Filas de un mes ('AAAA-MM'): { Supermercado, Producto, Grupo, Subgrupo, FechaConsulta, Precio, precio_unidad }. */
+    async function mes(clave, filtro = null) {
+      const e = m.meses[clave];
+      if (!e) return [];
+      const j = await archivo(e.archivo);
+      const out = [];
+      for (let i = 0; i < j.dia.length; i++) {
+        if (filtro && !filtro(j.s[i], j.p[i])) continue;
+        out.push({
+          Supermercado: dic.s[j.s[i]], Producto: dic.p[j.p[i]], Grupo: dic.g[j.g[i]], Subgrupo: dic.sg[j.sg[i]],
+          FechaConsulta: `${clave}-${String(j.dia[i]).padStart(2, '0')}`, Precio: j.precio[i], precio_unidad: j.pu[i],
+        });
+      }
+      return out;
+    }
+
+    /** Serie diaria de un producto en un supermercado: sólo se bajan los meses en los que aparece. */
+    async function serie(supermercado, producto) {
+      const s = dic.s.indexOf(supermercado), p = dic.p.indexOf(producto);
+      let i = -1;
+      for (let k = 0; k < idx.p.length && i < 0; k++) if (idx.s[k] === s && idx.p[k] === p) i = k;
+      if (i < 0) return [];
+      const partes = await Promise.all(idx.meses[i].map((c) => mes(c, (fs, fp) => fs === s && fp === p)));
+      return [].concat(...partes);
+    }
+
+    return {
+      generado: m.generado, filas: m.filas, meses: Object.keys(m.meses).sort(),
+      supermercados: dic.s.filter(Boolean).sort(), grupos: dic.g.filter(Boolean).sort(),
+      subgrupos: dic.sg.filter(Boolean).sort(), productos, mes, serie,
+    };
+  }
+
+  return { abrir };
+})();
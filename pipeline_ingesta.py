@@ -6,40 +6,85 @@ Robusto ante el límite de 10.000.000 celdas de Google Sheets.
 """
 
 from __future__ import annotations
-from typing import List, Dict, Callable, Set, Optional, Tuple
-import os, sys, glob, re, unicodedata, json
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import urljoin
-
-import numpy as np
-import pandas as pd
+from typing import AsyncIterator, List, Dict, Callable, Iterable, Iterator, Set, Optional, Tuple
+import os, sys, glob, re, unicodedata, json, threading, hashlib, pickle, time, collections, gzip, weakref, contextvars, tempfile
+import bisect, csv, importlib, importlib.util, io, itertools, math, multiprocessing, queue
+from datetime import datetime, timedelta
+from functools import lru_cache, wraps
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from numbers import Real
+from urllib.parse import urljoin, urlparse
+
 import requests
-from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+class _LazyModule:
+    """
+    Dependencia pesada que se importa en el primer acceso a un atributo; desde ahí el global de
+    este módulo apunta al módulo real. Así `scrape` no carga pandas/numpy/gspread/pyarrow e `ingest`
+    no carga aiohttp/bs4/lxml (ver benchmarks/bench_import.py).
+    """
+    def __init__(self, alias: str, name: str):
+        self._alias, self._name = alias, name
+
+    def __getattr__(self, attr):
+        mod = importlib.import_module(self._name)
+        globals()[self._alias] = mod
+        return getattr(mod, attr)
+
+    def __repr__(self):
+        return f"<{self._name}: se importa al usarse>"
+
+def _lazy(alias: str, name: Optional[str] = None, optional: bool = False):
+    """Con `optional`, None si el paquete no está instalado (se averigua sin importarlo)."""
+    name = name or alias
+    if optional and importlib.util.find_spec(name.split(".")[0]) is None:
+        return None
+    return _LazyModule(alias, name)
+
+np = _lazy("np", "numpy")
+pd = _lazy("pd", "pandas")
+sv = _lazy("sv", "soupsieve")
+bs4 = _lazy("bs4")
+asyncio = _lazy("asyncio")
+gspread = _lazy("gspread")
+gspread_dataframe = _lazy("gspread_dataframe")
+aiohttp = _lazy("aiohttp", optional=True)  # opcional: motor HTTP asíncrono (HTTP_ENGINE=async)
+lx_etree = _lazy("lx_etree", "lxml.etree", optional=True)  # opcional: backend HTML en C (HTML_PARSER=lxml)
+lx_html = _lazy("lx_html", "lxml.html", optional=True)
+pa = _lazy("pa", "pyarrow", optional=True)  # opcional: histórico local en Parquet
+pa_ds = _lazy("pa_ds", "pyarrow.dataset", optional=True)
+pq = _lazy("pq", "pyarrow.parquet", optional=True)
+
 # ───────── 0) Entorno (Colab opcional) ─────────
-IS_COLAB = False
-try:
-    from google.colab import drive, auth  # type: ignore
-    IS_COLAB = True
-except Exception:
-    drive = None
-    auth = None
+# Se detecta sin importar google.colab (el kernel de Colab ya lo cargó y define COLAB_RELEASE_TAG);
+# Drive y la autenticación se montan recién al correr main() (_setup_colab), no al importar.
+IS_COLAB = "google.colab" in sys.modules or "COLAB_RELEASE_TAG" in os.environ
 
-if IS_COLAB:
+def _setup_colab(sheets: bool):
+    if not IS_COLAB: return
+    from google.colab import drive, auth  # type: ignore
     drive.mount('/content/drive')
-    auth.authenticate_user()
+    if sheets: auth.authenticate_user()
 
 # ───────── 1) Paths & Constantes ─────────
 OUT_DIR = os.getenv(
     "OUT_DIR",
     "/content/drive/My Drive/preciossuper" if IS_COLAB else os.path.abspath("./data")
-)
-os.makedirs(OUT_DIR, exist_ok=True)
+)  # se crea al correr main()
 
 PATTERN_DAILY = os.path.join(OUT_DIR, "*_canasta_*.csv")
+# Manifiesto de CSVs diarios ya ingeridos (ruta → tamaño, mtime, filas): cada corrida lee sólo los nuevos.
+# Los ya ingeridos de más de COMPACT_AFTER_DAYS días se juntan en COMPACT_DIR/canasta_YYYY-MM.csv.gz.
+MANIFEST_PATH = os.path.join(OUT_DIR, ".manifiesto_csv.json")
+COMPACT_DIR = os.path.join(OUT_DIR, "compactado")
+COMPACT_AFTER_DAYS = int(os.getenv("COMPACT_AFTER_DAYS", "7"))  # <0 = no compactar
+CSV_COLS = ["Supermercado", "CategoríaURL", "Producto", "Precio", "Grupo", "FechaConsulta"]
+# Las filas de cada sitio van al CSV diario (y al enriquecimiento de la ingesta) por lotes de CSV_BATCH_ROWS
+# a medida que el scraper las produce: la memoria no crece con la cantidad de categorías o sitios.
+CSV_BATCH_ROWS = int(os.getenv("CSV_BATCH_ROWS", "10000"))
 
 # Si usas GOOGLE_APPLICATION_CREDENTIALS (ruta) no hace falta tocar CREDS_JSON
 CREDS_JSON = os.getenv(
@@ -51,15 +96,118 @@ SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1plZ1LzHu2W2TrbV7wXPue
 WORKSHEET_NAME  = "precios_supermercados"
 
 MAX_WORKERS, REQ_TIMEOUT = 8, 10
+RETRY_TOTAL, RETRY_BACKOFF = 3, 1.2
+RETRY_STATUS = (429,500,502,503,504)
+HTTP_ENGINE = os.getenv("HTTP_ENGINE", "threads").lower()   # "threads" | "async"
+ASYNC_CONCURRENCY = int(os.getenv("ASYNC_CONCURRENCY", "64"))
+# Límite adaptativo por host (AIMD): arranca en MAX_WORKERS, sube mientras la latencia y los
+# errores se mantienen sanos y corta ante 429/503, errores o latencia creciente.
+ADAPTIVE_LIMIT = os.getenv("ADAPTIVE_LIMIT", "1") not in ("0", "false", "no")
+HOST_MAX_CONCURRENCY = int(os.getenv("HOST_MAX_CONCURRENCY", "64"))
+HOST_RPS = float(os.getenv("HOST_RPS", "0"))  # tope de req/s por host (token bucket); 0 = sin tope fijo
+# Backend HTML: "html.parser" (BeautifulSoup, stdlib) | "lxml" (libxml2 + XPath precompilado, sin
+# árbol de BeautifulSoup). Con HTML_RESTRICT=1, html.parser sólo construye los subárboles que
+# cada scraper consulta (SoupStrainer) en vez de la página completa.
+HTML_PARSER = os.getenv("HTML_PARSER", "html.parser").lower()
+HTML_RESTRICT = os.getenv("HTML_RESTRICT", "0") not in ("0", "false", "no")
+# Scrape por etapas (motor threads): los hilos sólo descargan y dejan los cuerpos en una cola de
+# FETCH_QUEUE_PAGES páginas; el parseo/clasificación corre en PARSE_WORKERS procesos (fuera del GIL),
+# con hasta 2×PARSE_WORKERS páginas en vuelo. 0 = parsea un solo hilo de este proceso (sin pool).
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(max((os.cpu_count() or 1) - 1, 0), 4))))
+FETCH_QUEUE_PAGES = int(os.getenv("FETCH_QUEUE_PAGES", "64"))
+# Corrida de scrape: los sitios van a la vez (SCRAPE_SITES_PARALLEL; 0 = todos) con un presupuesto común
+# de SCRAPE_CONCURRENCY requests en vuelo entre todos (además del límite de cada host) y un plazo de
+# reloj SCRAPE_DEADLINE_S para la corrida entera: al vencer no sale ningún request ni reintento más, lo
+# que falta queda como falla "deadline", las filas ya bajadas se conservan y el sitio se marca
+# incompleto. 0 = sin tope / sin plazo.
+SCRAPE_SITES_PARALLEL = int(os.getenv("SCRAPE_SITES_PARALLEL", "0"))
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "64"))
+SCRAPE_DEADLINE_S = float(os.getenv("SCRAPE_DEADLINE_S", "0"))
+# Circuito por host: BREAKER_FAILURES intentos seguidos fallidos (error de red, timeout o 5xx) lo abren y
+# los requests siguientes a ese host se cortan al instante (falla "circuito_abierto") en vez de gastar
+# timeouts y reintentos; pasados BREAKER_COOLDOWN_S segundos pasa un solo request de prueba
+# (semiabierto): si responde se cierra, si no vuelve a abrirse. 0 = sin circuito.
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_S = float(os.getenv("BREAKER_COOLDOWN_S", "30"))
 KEY_COLS = ["Supermercado", "CategoríaURL", "Producto", "FechaConsulta"]
+TARGET_COLS = [
+    "ID","Supermercado","Producto","Precio","Unidad","Grupo","Subgrupo",
+    "FechaConsulta","unidad_corregido","etiquetaunidad","cantidad_unidades","precio_unidad",
+    "CategoríaURL"
+]
 SHEETS_CELL_LIMIT = 10_000_000  # límite global por libro
+# Dry-run de Sheets (o --dry-run): imprime el plan de escritura y las celdas proyectadas sin escribir
+SHEETS_DRY_RUN = os.getenv("SHEETS_DRY_RUN", "0") not in ("0", "false", "no")
+# Subidas grandes por tramos: filas por request, requests en vuelo y cuota de escritura (req/min;
+# la API da 60 por usuario). El checkpoint (.json + .pkl) permite retomar una subida cortada.
+SHEETS_CHUNK_ROWS = int(os.getenv("SHEETS_CHUNK_ROWS", "20000"))
+SHEETS_UPLOAD_WORKERS = int(os.getenv("SHEETS_UPLOAD_WORKERS", "4"))
+SHEETS_WRITE_RPM = float(os.getenv("SHEETS_WRITE_RPM", "60"))  # 0 = sin ritmo fijo
+SHEETS_CHECKPOINT_PATH = os.path.join(OUT_DIR, ".subida_sheets")
 
-# ───────── 2) Dependencias Google Sheets ─────────
-import gspread
-from gspread_dataframe import set_with_dataframe, get_as_dataframe
-from google.oauth2.service_account import Credentials
-from gspread.utils import rowcol_to_a1
+# Índice persistido de claves (hash 64-bit de KEY_COLS) ya presentes en la hoja
+KEY_INDEX_PATH = os.path.join(OUT_DIR, ".indice_claves")
+
+# Histórico local (fuente de verdad): Parquet particionado por fecha/supermercado.
+# La hoja pasa a ser una proyección acotada a los últimos SHEET_WINDOW_DAYS días.
+HISTORY_DIR = os.getenv("HISTORY_DIR", os.path.join(OUT_DIR, "historico"))
+HISTORY_STORE = os.getenv("HISTORY_STORE", "1") not in ("0", "false", "no")
+SHEET_WINDOW_DAYS = int(os.getenv("SHEET_WINDOW_DAYS", "365"))
+# Hoja en intervalos (SHEET_DELTA=1): en vez de una fila por producto y día, una fila por tramo de
+# días consecutivos en que un producto (Supermercado/CategoríaURL/Producto) no cambió de Precio ni del
+# resto de sus valores, con valid_from/valid_to (inclusive) en lugar de FechaConsulta. expand_intervals()
+# (y readRows_ en Code.gs) rearman la vista diaria. El histórico local sigue siendo diario; no aplica
+# con SHEETS_ROLLOVER. El estado del bloque final de la hoja (intervalos vigentes) va en DELTA_INDEX_PATH.
+SHEET_DELTA = os.getenv("SHEET_DELTA", "0") not in ("0", "false", "no")
+DELTA_KEY_COLS = ["Supermercado", "CategoríaURL", "Producto"]
+DELTA_COLS = [c for c in TARGET_COLS if c != "FechaConsulta"] + ["valid_from", "valid_to"]
+DELTA_INDEX_PATH = os.path.join(OUT_DIR, ".indice_intervalos.pkl")
+# Rollover (SHEETS_ROLLOVER=month|quarter|year): en vez de recortar la proyección al llegar a las
+# 10M celdas, el histórico se reparte en hojas por período (precios_supermercados_2026_Q3, ...) que
+# siguen en libros hermanos (SHEETS_ROLLOVER_BOOKS: URLs separadas por coma, compartidas con la
+# cuenta de servicio) cuando un libro pasa SHEETS_SHARD_FILL del límite. La hoja índice lista cada
+# fragmento con su libro, rango de fechas y filas. Requiere el histórico local.
+SHEETS_ROLLOVER = os.getenv("SHEETS_ROLLOVER", "").lower()  # "" = una sola hoja (ventana + recorte)
+SHEETS_ROLLOVER_BOOKS = [u.strip() for u in os.getenv("SHEETS_ROLLOVER_BOOKS", "").split(",") if u.strip()]
+SHEETS_SHARD_FILL = float(os.getenv("SHEETS_SHARD_FILL", "0.9"))
+SHARD_INDEX_NAME = f"{WORKSHEET_NAME}_indice"
+# Resúmenes para el tablero (Code.gs): hojas chicas precalculadas tras cada ingesta (estadísticas
+# diarias, último precio por producto y combinaciones para los filtros), así el tablero no lee el
+# histórico completo en cada consulta. Se actualizan sólo con los días ingeridos. Requieren el histórico local.
+SUMMARY_SHEETS = os.getenv("SUMMARY_SHEETS", "1") not in ("0", "false", "no")
+DAILY_SUMMARY_NAME = f"{WORKSHEET_NAME}_resumen_diario"
+LATEST_PRICE_NAME = f"{WORKSHEET_NAME}_ultimo_precio"
+FILTERS_NAME = f"{WORKSHEET_NAME}_filtros"
+# Exportación estática para GitHub Pages (p.ej. ./docs/data): JSON columnar por mes con diccionarios
+# e índice de productos, servido por CDN sin backend. Sólo se rehacen los meses de la corrida. Vacío = no exportar.
+STATIC_EXPORT_DIR = os.getenv("STATIC_EXPORT_DIR", "")
+
+# Reporte de la corrida: tiempos por etapa y sitio, métricas HTTP por host (intentos por status,
+# reintentos, bytes, histograma de latencias) y fallas por URL con su motivo. Un JSON por corrida
+# en RUN_REPORT_DIR (se conservan los últimos RUN_REPORT_KEEP; 0 = no guardar) y, si se define
+# PROM_TEXTFILE, las mismas métricas en formato Prometheus (textfile collector de node_exporter).
+RUN_REPORT_DIR = os.getenv("RUN_REPORT_DIR", os.path.join(OUT_DIR, "reportes"))
+RUN_REPORT_KEEP = int(os.getenv("RUN_REPORT_KEEP", "90"))
+PROM_TEXTFILE = os.getenv("PROM_TEXTFILE", "")
+
+# Caché persistente nombre → (excluido, Grupo, Subgrupo, unidades); se invalida sola si cambian las reglas
+ENRICH_CACHE_PATH = os.path.join(OUT_DIR, ".cache_enriquecimiento.pkl")
+ENRICH_CACHE_ENABLED = os.getenv("ENRICH_CACHE", "1") not in ("0", "false", "no")
 
+# Caché HTTP en disco: revalida con If-None-Match / If-Modified-Since y sirve los 304 desde disco
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", os.path.join(OUT_DIR, ".cache_http"))
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE", "1") not in ("0", "false", "no")
+HTTP_CACHE_MAX_AGE_DAYS = 30  # entradas no usadas en este plazo se borran
+# Caché de scraping: URLs de categorías con TTL y filas por huella del cuerpo de cada página
+PAGE_CACHE_PATH = os.path.join(OUT_DIR, ".cache_paginas.pkl")
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE", "1") not in ("0", "false", "no")
+CATEGORY_TTL_HOURS = float(os.getenv("CATEGORY_TTL_HOURS", "24"))  # 0 = redescubrir siempre
+
+# Biggie (API JSON paginada): tamaño de página y páginas en vuelo a la vez (todos los grupos)
+BIGGIE_TAKE = int(os.getenv("BIGGIE_TAKE", "100"))
+BIGGIE_WORKERS = int(os.getenv("BIGGIE_WORKERS", str(HOST_MAX_CONCURRENCY if ADAPTIVE_LIMIT else MAX_WORKERS)))
+
+# ───────── 2) Dependencias Google Sheets ─────────
 def _make_credentials():
     """
     Preferencias:
@@ -67,6 +215,7 @@ def _make_credentials():
       2) GOOGLE_APPLICATION_CREDENTIALS (ruta a archivo)
       3) CREDS_JSON (ruta por defecto si existe)
     """
+    from google.oauth2.service_account import Credentials
     scopes = [
         "https://www.googleapis.com/auth/drive",
         "https://www.googleapis.com/auth/spreadsheets",
@@ -94,122 +243,459 @@ def _make_credentials():
         "- Archivo local CREDS_JSON existente"
     )
 
-def _open_sheet():
-    cred = _make_credentials()
-    gc = gspread.authorize(cred)
-    sh = gc.open_by_url(SPREADSHEET_URL)
+def _rollover_enabled() -> bool:
+    return bool(SHEETS_ROLLOVER) and HISTORY_STORE and pa is not None
+
+@lru_cache(maxsize=None)
+def _gspread_client() -> gspread.Client:
+    return gspread.authorize(_make_credentials())
+
+def _open_spreadsheet():
+    sh = _gspread_client().open_by_url(SPREADSHEET_URL)
     try:
         ws = sh.worksheet(WORKSHEET_NAME)
     except gspread.exceptions.WorksheetNotFound:
+        if _rollover_enabled():  # con rollover la hoja única no hace falta (los datos van a los fragmentos)
+            return sh, None
         ws = sh.add_worksheet(title=WORKSHEET_NAME, rows="1000", cols="60")
+    return sh, ws
 
-    df_prev = get_as_dataframe(ws, dtype=str, header=0, evaluate_formulas=False).dropna(how="all")
-    return sh, ws, df_prev
-
-def _audit_total_cells(sh: gspread.Spreadsheet) -> int:
-    total = 0
-    for w in sh.worksheets():
-        total += (w.row_count * w.col_count)
-    return int(total)
-
-def _fits_without_growth(sh: gspread.Spreadsheet, ws: gspread.Worksheet, need_rows: int, need_cols: int) -> Tuple[bool, str]:
-    """
-    Devuelve (cabe_sin_crecer, motivo).
-    Intenta primero achicar la hoja target para liberar celdas si está sobredimensionada.
-    """
-    curr_rows, curr_cols = ws.row_count, ws.col_count
-    total_cells_before = _audit_total_cells(sh)
-
-    # Si está sobredimensionada, achicamos hasta el tamaño objetivo o el mínimo requerido
-    shrink_rows = min(curr_rows, max(need_rows, 1))
-    shrink_cols = min(curr_cols, max(need_cols, 1))
-    did_shrink = False
-    if shrink_rows < curr_rows or shrink_cols < curr_cols:
-        ws.resize(rows=shrink_rows, cols=shrink_cols)
-        did_shrink = True
-
-    # Recalcula métricas tras el shrink (si lo hubo)
-    curr_rows, curr_cols = ws.row_count, ws.col_count
-    total_now = _audit_total_cells(sh)
-
-    # Si ya tenemos suficientes filas/columnas después del shrink, cabe sin crecer
-    if curr_rows >= need_rows and curr_cols >= need_cols:
-        return True, "Cabe tras compactar hoja destino"
-
-    # Si todavía faltan filas/columnas, calcula si crecer sobrepasaría el límite global
-    add_rows = max(0, need_rows - curr_rows)
-    add_cols = max(0, need_cols - curr_cols)
-
-    # Celdas que se añadirían si aumentamos SOLO filas o SOLO columnas o ambos.
-    # Aumento real al crecer: 
-    # - Si creces filas: add_rows * curr_cols (más, si luego creces columnas)
-    # - Si creces cols : add_cols * need_rows (considerando el alto final)
-    grow_rows_cells = add_rows * curr_cols
-    grow_cols_cells = add_cols * max(need_rows, curr_rows + add_rows)
-
-    projected = total_now + grow_rows_cells + grow_cols_cells
-    if projected <= SHEETS_CELL_LIMIT:
-        return False, "Requiere crecer pero no supera límite (permitido)"
-    else:
-        return False, "Requiere crecer y superaría el límite global"
+def _open_book(key: str) -> gspread.Spreadsheet:
+    """Libro hermano del rollover, por id (mismo cliente que el libro principal)."""
+    return _gspread_client().open_by_key(key)
+
+def _read_history(ws: gspread.Worksheet) -> pd.DataFrame:
+    """Hoja completa como texto; si está en intervalos (SHEET_DELTA), ya expandida a la vista diaria."""
+    with METRICS.stage("lectura_sheets"):
+        df = gspread_dataframe.get_as_dataframe(ws, dtype=str, header=0, evaluate_formulas=False).dropna(how="all")
+    return expand_intervals(df) if "valid_from" in df.columns else df
+
+def _open_sheet():
+    sh, ws = _open_spreadsheet()
+    return sh, ws, _read_history(ws)
+
+def _cell(v):
+    """Criterio de _cellrepr (set_with_dataframe): nulos → "", números como números, el resto
+    como texto; un apóstrofo inicial se duplica (USER_ENTERED se come el primero)."""
+    if isinstance(v, np.generic): v = v.item()
+    if v is None or (isinstance(v, float) and np.isnan(v)) or v is pd.NA or v is pd.NaT:
+        return ""
+    if isinstance(v, Real):
+        return v
+    v = str(v)
+    return "'" + v if v.startswith("'") else v
+
+def _df_to_values(df: pd.DataFrame) -> List[list]:
+    """Filas listas para values.update/batchUpdate, igual que set_with_dataframe. Por columna:
+    las numéricas se convierten en bloque y el texto pasa por _cell una vez por valor distinto."""
+    cols = []
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_numeric_dtype(s.dtype) and not isinstance(s.dtype, pd.CategoricalDtype):
+            cols.append(s.astype(object).where(s.notna(), "").tolist())
+        else:
+            cols.append(_map_unique(s, _cell).astype(object).tolist())
+    return [list(r) for r in zip(*cols)] if cols else [[] for _ in range(len(df))]
+
+class SheetPlan:
+    """
+    Una escritura: tamaño final de la hoja (filas × columnas) y valores desde la fila `start`.
+    Si los valores pasan de SHEETS_CHUNK_ROWS filas se suben por tramos (SheetUpload); con
+    `staging` una reescritura completa va a una hoja aparte cuyos valores pasan a la original al final.
+    """
+    def __init__(self, ws: gspread.Worksheet, size: Tuple[int, int], new_size: Tuple[int, int],
+                 start: int, values: List[list], motivo: str, book_cells: int, staging: bool = False):
+        self.ws, self.size, self.new_size = ws, size, new_size
+        self.start, self.values, self.motivo, self.book_cells = start, values, motivo, book_cells
+        self.staging = staging
+
+    @property
+    def chunks(self) -> int:
+        return max(1, -(-len(self.values) // max(SHEETS_CHUNK_ROWS, 1)))
+
+    def requests(self) -> Tuple[Optional[dict], dict]:
+        """(cuerpo de spreadsheets.batchUpdate o None si el tamaño no cambia, cuerpo de values.batchUpdate)."""
+        resize = None
+        if self.new_size != self.size:
+            resize = {"requests": [_grid_request(self.ws.id, *self.new_size)]}
+        data = {"valueInputOption": "USER_ENTERED",
+                "data": [{"range": gspread.utils.absolute_range_name(self.ws.title, f"A{self.start}"), "values": self.values}]}
+        return resize, data
+
+    def describe(self) -> str:
+        (r0, c0), (r1, c1) = self.size, self.new_size
+        ancho = max((len(v) for v in self.values), default=0)
+        fin = gspread.utils.rowcol_to_a1(self.start + len(self.values) - 1, max(ancho, 1)) if self.values else "-"
+        if self.chunks == 1:
+            modo, n_req = "", 2 if self.new_size != self.size else 1
+        elif self.staging:
+            modo, n_req = f" | {self.chunks} tramos vía hoja staging + copia a la original", self.chunks + 2
+        else:
+            modo, n_req = f" | {self.chunks} tramos en el lugar", self.chunks + (self.new_size != self.size)
+        return (f"[Sheets] Plan '{self.ws.title}': grilla {r0:,}×{c0} → {r1:,}×{c1} | "
+                f"valores A{self.start}:{fin} ({len(self.values):,} filas){modo} | "
+                f"{n_req} request(s) | celdas del libro → {self.book_cells:,}")
+
+def _grid_request(sheet_id: int, rows: int, cols: int) -> dict:
+    return {"updateSheetProperties": {
+        "properties": {"sheetId": sheet_id, "gridProperties": {"rowCount": rows, "columnCount": cols}},
+        "fields": "gridProperties(rowCount,columnCount)"}}
+
+def _set_ws_properties(ws: gspread.Worksheet, **props):
+    """Actualiza la caché de propiedades del objeto gspread (id, tamaño) sin releer metadatos."""
+    cache = getattr(ws, "_properties", None)
+    if cache is None: return
+    grid = {k: props.pop(k) for k in ("rowCount", "columnCount") if k in props}
+    cache.update(props)
+    if grid: cache.setdefault("gridProperties", {}).update(grid)
+
+class SheetsPlanner:
+    """
+    Capacidad y escrituras del libro con UNA lectura de metadatos: fetch_sheet_metadata trae el
+    tamaño de todas las hojas, la verificación (compactar / crecer / recortar) se calcula offline
+    y cada escritura sale en a lo sumo dos requests: spreadsheets.batchUpdate con el tamaño final
+    exacto + values.batchUpdate con los valores (por tramos si es grande: SheetUpload). Los
+    tamaños conocidos se actualizan con cada plan, así que la auditoría final no consulta la API.
+    Con SHEETS_DRY_RUN (o --dry-run) sólo imprime los planes y las celdas proyectadas.
+    """
+    _books: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+    FIELDS = "sheets.properties(sheetId,title,index,gridProperties(rowCount,columnCount))"
+
+    def __init__(self, sh: gspread.Spreadsheet):
+        self.sh = sh
+        with METRICS.stage("lectura_sheets"):
+            meta = sh.fetch_sheet_metadata(params={"fields": self.FIELDS})
+        self.grids: Dict[str, Tuple[int, int]] = {}
+        self.ids: Dict[str, int] = {}
+        self.index: Dict[str, int] = {}
+        for hoja in meta.get("sheets", []):
+            p = hoja["properties"]
+            g = p.get("gridProperties", {})
+            self.grids[p["title"]] = (int(g.get("rowCount", 0)), int(g.get("columnCount", 0)))
+            self.ids[p["title"]] = p.get("sheetId", 0)
+            self.index[p["title"]] = p.get("index", 0)
+
+    @classmethod
+    def of(cls, sh: gspread.Spreadsheet) -> "SheetsPlanner":
+        """Un planificador (y una lectura de metadatos) por libro abierto."""
+        if sh not in cls._books:
+            cls._books[sh] = cls(sh)
+        return cls._books[sh]
+
+    @property
+    def total_cells(self) -> int:
+        return int(sum(r * c for r, c in self.grids.values()))
+
+    def worksheet(self, title: str) -> gspread.Worksheet:
+        """Objeto gspread de una hoja armado con los metadatos ya leídos (sin request)."""
+        rows, cols = self.grids[title]
+        props = {"sheetId": self.ids[title], "title": title, "index": self.index[title],
+                 "gridProperties": {"rowCount": rows, "columnCount": cols}}
+        return gspread.Worksheet(self.sh, props, self.sh.id, self.sh.client)
+
+    def add_sheet(self, title: str, rows: int, cols: int) -> gspread.Worksheet:
+        """Hoja nueva al final del libro, ya con su tamaño (un batchUpdate; en dry-run sólo se registra)."""
+        if SHEETS_DRY_RUN:
+            print(f"[Sheets] (dry-run) Hoja nueva '{title}': {rows:,}×{cols}")
+            sid = -len(self.grids) - 1
+        else:
+            with METRICS.stage("escritura_sheets"):
+                res = self.sh.batch_update({"requests": [{"addSheet": {"properties": {
+                    "title": title, "gridProperties": {"rowCount": rows, "columnCount": cols}}}}]})
+            sid = res["replies"][0]["addSheet"]["properties"]["sheetId"]
+        self.grids[title], self.ids[title], self.index[title] = (rows, cols), sid, len(self.index)
+        return self.worksheet(title)
+
+    def delete_sheets(self, titles: List[str]):
+        """Borra hojas en un solo batchUpdate (en dry-run sólo lo informa)."""
+        titles = [t for t in dict.fromkeys(titles) if t in self.grids]
+        if not titles:
+            return
+        if SHEETS_DRY_RUN:
+            print(f"[Sheets] (dry-run) Se borrarían: {', '.join(titles)}")
+        else:
+            with METRICS.stage("escritura_sheets"):
+                self.sh.batch_update({"requests": [{"deleteSheet": {"sheetId": self.ids[t]}} for t in titles]})
+        for t in titles:
+            del self.grids[t], self.ids[t], self.index[t]
+        for i, t in enumerate(sorted(self.index, key=self.index.get)):
+            self.index[t] = i
+
+    def cells(self, title: str) -> int:
+        r, c = self.grids[title]
+        return r * c
+
+    def capacity(self, title: str, need_rows: int, need_cols: int) -> Tuple[str, int, int]:
+        """
+        (motivo, filas, columnas): tamaño al que puede quedar la hoja para need_rows × need_cols.
+        Si está sobredimensionada se compacta; si falta lugar, crece sólo si el libro no pasa
+        SHEETS_CELL_LIMIT (si no, queda compactada y el llamador recorta o desiste).
+        """
+        rows, cols = self.grids[title]
+        rows, cols = min(rows, max(need_rows, 1)), min(cols, max(need_cols, 1))
+        if rows >= need_rows and cols >= need_cols:
+            return "Cabe tras compactar hoja destino", rows, cols
+        add_rows, add_cols = max(0, need_rows - rows), max(0, need_cols - cols)
+        projected = (self.total_cells - self.cells(title) + rows * cols
+                     + add_rows * cols + add_cols * max(need_rows, rows + add_rows))
+        if projected <= SHEETS_CELL_LIMIT:
+            return "Requiere crecer pero no supera límite (permitido)", max(rows, need_rows), max(cols, need_cols)
+        return "Requiere crecer y superaría el límite global", rows, cols
+
+    def _plan(self, ws, new_size, start, values, motivo, staging=False) -> SheetPlan:
+        size = self.grids[ws.title]
+        book = self.total_cells - self.cells(ws.title) + new_size[0] * new_size[1]
+        return SheetPlan(ws, size, new_size, start, values, motivo, book, staging)
+
+    def plan_write(self, ws: gspread.Worksheet, df: pd.DataFrame) -> Tuple[SheetPlan, pd.DataFrame]:
+        """
+        Reescritura completa (encabezado + df) con la hoja al tamaño exacto de los datos.
+        Si crecer superaría el límite, df se recorta (tail: se conservan las filas más nuevas).
+        Si va por tramos y el libro aguanta las dos copias a la vez, se escribe en staging.
+        Devuelve (plan, df escrito).
+        """
+        nrows, ncols = len(df) + 1, max(len(df.columns), 1)  # +header
+        motivo, rows, cols = self.capacity(ws.title, nrows, ncols)
+        print(f"[Sheets] Verificación de capacidad → {motivo}")
+        if rows < nrows or cols < ncols:
+            keep_n = max(rows - 1, 0)
+            if keep_n < len(df):
+                print(f"[Sheets] ⚠️ Límite global alcanzado. Recortando a {keep_n} filas de datos (+ encabezado) para encajar sin crecer.")
+                df = df.tail(keep_n).reset_index(drop=True)
+            if len(df.columns) > cols:
+                df = df.iloc[:, :cols]
+            nrows, ncols = len(df) + 1, max(len(df.columns), 1)
+        values = [[_cell(c) for c in df.columns]] + _df_to_values(df)
+        staging = len(values) > SHEETS_CHUNK_ROWS and self.total_cells + nrows * ncols <= SHEETS_CELL_LIMIT
+        if len(values) > SHEETS_CHUNK_ROWS and not staging:
+            print("[Sheets] ⚠️ Sin lugar para una hoja staging: la reescritura por tramos será en el lugar")
+        return self._plan(ws, (nrows, ncols), 1, values, motivo, staging), df
+
+    def plan_append(self, ws: gspread.Worksheet, start: int, values: List[list], ncols: int) -> Optional[SheetPlan]:
+        """Filas desde `start` (creciendo lo justo). None si no entran sin pasar el límite."""
+        nrows = start + len(values) - 1
+        motivo, rows, cols = self.capacity(ws.title, nrows, ncols)
+        print(f"[Sheets] Verificación de capacidad → {motivo}")
+        if rows < nrows or cols < ncols:
+            return None
+        return self._plan(ws, (rows, cols), start, values, motivo)
+
+    def execute(self, plan: SheetPlan):
+        """Manda el plan (1–2 requests, o por tramos) o, en dry-run, sólo lo imprime; los tamaños conocidos quedan al día."""
+        if SHEETS_DRY_RUN:
+            print(plan.describe().replace("[Sheets] Plan", "[Sheets] (dry-run) Plan"))
+            self.grids[plan.ws.title] = plan.new_size
+            return
+        if plan.chunks > 1:
+            with METRICS.stage("escritura_sheets"):
+                SheetUpload.start(self, plan).run(plan.ws)
+            return
+        resize, data = plan.requests()
+        with METRICS.stage("escritura_sheets"):
+            if resize is not None:
+                self.sh.batch_update(resize)
+            self.sh.values_batch_update(body=data)
+        _set_ws_properties(plan.ws, rowCount=plan.new_size[0], columnCount=plan.new_size[1])
+        self.grids[plan.ws.title] = plan.new_size
+
+    def resume(self, ws: gspread.Worksheet) -> bool:
+        """Completa la subida que una corrida anterior dejó a medias (checkpoint). True si había una."""
+        up = SheetUpload.load(self)
+        if up is None:
+            return False
+        hechos, total = len(up.state["done"]), up.n_chunks
+        if SHEETS_DRY_RUN:
+            print(f"[Sheets] (dry-run) Subida pendiente a '{up.state['title']}': {hechos}/{total} tramos escritos")
+            return True
+        print(f"[Sheets] Retomando subida cortada a '{up.state['title']}': {hechos}/{total} tramos ya escritos")
+        with METRICS.stage("escritura_sheets"):
+            up.run(ws if ws is not None and ws.title == up.state["title"] else None)
+        return True
+
+class SheetUpload:
+    """
+    Subida de un plan grande por tramos de SHEETS_CHUNK_ROWS filas (un values.batchUpdate cada
+    uno), con SHEETS_UPLOAD_WORKERS en vuelo al ritmo de SHEETS_WRITE_RPM: un HostLimiter propio
+    baja concurrencia y tasa ante 429 y respeta Retry-After; 429/5xx se reintentan.
+    Checkpoint en SHEETS_CHECKPOINT_PATH (.json: destino y tramos escritos; .pkl: valores): si la
+    corrida se corta, la siguiente la retoma (SheetsPlanner.resume) sin resubir lo ya escrito.
+    Con staging la hoja publicada no se toca hasta el final: los tramos van a una hoja aparte y
+    un único batchUpdate copia sus valores a la original y la borra (la original no cambia de gid).
+    """
+    HOST = "sheets.googleapis.com"
+
+    def __init__(self, planner: SheetsPlanner, state: dict, values: List[list]):
+        self.planner, self.state, self.values = planner, state, values
+        self.n_chunks = max(1, -(-len(values) // state["chunk_rows"]))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(cls, planner: SheetsPlanner, plan: SheetPlan) -> "SheetUpload":
+        state = {"spreadsheet": planner.sh.id, "title": plan.ws.title, "sheet_id": plan.ws.id,
+                 "start": plan.start, "size": list(plan.new_size), "chunk_rows": max(SHEETS_CHUNK_ROWS, 1),
+                 "staging": f"{plan.ws.title}__staging" if plan.staging else None, "staging_id": None,
+                 "prepared": False, "done": []}
+        up = cls(planner, state, plan.values)
+        with open(SHEETS_CHECKPOINT_PATH + ".pkl", "wb") as fh:
+            pickle.dump(plan.values, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        up._save()
+        return up
+
+    @classmethod
+    def load(cls, planner: SheetsPlanner) -> Optional["SheetUpload"]:
+        try:
+            with open(SHEETS_CHECKPOINT_PATH + ".json", encoding="utf-8") as fh:
+                state = json.load(fh)
+            with open(SHEETS_CHECKPOINT_PATH + ".pkl", "rb") as fh:
+                values = pickle.load(fh)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+        if state.get("spreadsheet") != planner.sh.id:
+            print("[Sheets] Checkpoint de subida de otro libro → descartado")
+            cls._clear()
+            return None
+        return cls(planner, state, values)
+
+    @staticmethod
+    def _clear():
+        for ext in (".json", ".pkl"):
+            try: os.remove(SHEETS_CHECKPOINT_PATH + ext)
+            except OSError: pass
+
+    def _save(self):
+        tmp = SHEETS_CHECKPOINT_PATH + ".json.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.state, fh)
+        os.replace(tmp, SHEETS_CHECKPOINT_PATH + ".json")
+
+    def _dest(self) -> Tuple[str, int]:
+        st = self.state
+        return (st["staging"], st["staging_id"]) if st["staging"] else (st["title"], st["sheet_id"])
+
+    def _prepare(self):
+        """Hoja staging al tamaño final (o la hoja destino redimensionada); valida un checkpoint viejo."""
+        st, pl = self.state, self.planner
+        rows, cols = st["size"]
+        if st["prepared"]:  # retomando: la hoja donde se escribía tiene que seguir igual
+            title, sid = self._dest()
+            if pl.ids.get(title) == sid and pl.grids.get(title) == (rows, cols):
+                return
+            print("[Sheets] La hoja de la subida cortada cambió → se sube de nuevo completa")
+            st["prepared"], st["done"] = False, []
+        if st["staging"]:
+            reqs = []
+            if st["staging"] in pl.ids:  # resto de una corrida anterior
+                reqs.append({"deleteSheet": {"sheetId": pl.ids[st["staging"]]}})
+            reqs.append({"addSheet": {"properties": {"title": st["staging"],
+                                                     "gridProperties": {"rowCount": rows, "columnCount": cols}}}})
+            res = pl.sh.batch_update({"requests": reqs})
+            st["staging_id"] = res["replies"][-1]["addSheet"]["properties"]["sheetId"]
+            pl.grids[st["staging"]], pl.ids[st["staging"]] = (rows, cols), st["staging_id"]
+        elif pl.grids.get(st["title"]) != (rows, cols):
+            pl.sh.batch_update({"requests": [_grid_request(st["sheet_id"], rows, cols)]})
+            pl.grids[st["title"]] = (rows, cols)
+        st["prepared"] = True
+        self._save()
+
+    def _send(self, i: int, limiter: "HostLimiter"):
+        st = self.state
+        n = st["chunk_rows"]
+        title, _ = self._dest()
+        body = {"valueInputOption": "USER_ENTERED",
+                "data": [{"range": gspread.utils.absolute_range_name(title, f"A{st['start'] + i * n}"),
+                          "values": self.values[i * n:(i + 1) * n]}]}
+        for intento in range(1, RETRY_TOTAL + 2):
+            limiter.acquire()
+            t0 = time.monotonic()
+            try:
+                self.planner.sh.values_batch_update(body=body)
+            except (gspread.exceptions.APIError, requests.exceptions.RequestException) as e:
+                resp = getattr(e, "response", None)
+                status = getattr(resp, "status_code", None)
+                headers = getattr(resp, "headers", None)
+                limiter.release(time.monotonic() - t0, status, headers, error=True)
+                if intento > RETRY_TOTAL or (status is not None and status not in RETRY_STATUS):
+                    raise
+                METRICS.retry(limiter.host)
+                time.sleep(_retry_wait(status or 0, headers, intento))
+                continue
+            limiter.release(time.monotonic() - t0)
+            break
+        with self._lock:
+            st["done"].append(i)
+            self._save()
+
+    def run(self, ws: Optional[gspread.Worksheet] = None):
+        st, pl = self.state, self.planner
+        swapped = (st["staging"] and st["prepared"] and st["staging"] not in pl.ids
+                   and len(set(st["done"])) == self.n_chunks)
+        if swapped:
+            pendientes = []  # la copia ya se hizo (y la staging se borró); sólo faltó borrar el checkpoint
+        else:
+            self._prepare()
+            pendientes = sorted(set(range(self.n_chunks)) - set(st["done"]))
+        t0 = time.perf_counter()
+        limiter = HostLimiter(self.HOST, start=max(SHEETS_UPLOAD_WORKERS, 1), max_limit=max(SHEETS_UPLOAD_WORKERS, 1),
+                              rps=max(SHEETS_WRITE_RPM, 0) / 60, scrape=False)
+        with ThreadPoolExecutor(max_workers=max(SHEETS_UPLOAD_WORKERS, 1)) as ex:
+            futs = [ex.submit(self._send, i, limiter) for i in pendientes]
+            try:
+                for fut in as_completed(futs):
+                    fut.result()
+            except BaseException:
+                for fut in futs: fut.cancel()  # lo escrito queda en el checkpoint para la próxima corrida
+                raise
+        if st["staging"] and not swapped:
+            self._swap()
+        rows, cols = st["size"]
+        if ws is not None:
+            _set_ws_properties(ws, rowCount=rows, columnCount=cols)
+        print(f"[Sheets] Subida por tramos: {len(pendientes)}/{self.n_chunks} tramos de {st['chunk_rows']:,} filas "
+              f"en {time.perf_counter() - t0:.1f} s" + (f" vía '{st['staging']}'" if st["staging"] else ""))
+        if limiter.stats["throttled"] or limiter.stats["errores"]:
+            print(limiter.report())
+        self._clear()
+
+    def _swap(self):
+        """
+        Un batchUpdate: la original toma el tamaño final y los valores de la staging (copyPaste) y la
+        staging se borra. La original conserva gid, formato, protecciones, filtros y rangos con nombre;
+        sólo las filas que no tenía toman el formato de la staging (fechas y números de USER_ENTERED).
+        """
+        st, pl = self.state, self.planner
+        rows, cols = st["size"]
+        orig, (antes, _) = pl.ids[st["title"]], pl.grids[st["title"]]
+        def rango(sid: int, desde: int = 0) -> dict:
+            return {"sheetId": sid, "startRowIndex": desde, "endRowIndex": rows, "startColumnIndex": 0, "endColumnIndex": cols}
+        reqs = [] if pl.grids[st["title"]] == (rows, cols) else [_grid_request(orig, rows, cols)]
+        reqs.append({"copyPaste": {"source": rango(st["staging_id"]), "destination": rango(orig),
+                                   "pasteType": "PASTE_VALUES"}})
+        if rows > antes:
+            reqs.append({"copyPaste": {"source": rango(st["staging_id"], antes), "destination": rango(orig, antes),
+                                       "pasteType": "PASTE_FORMAT"}})
+        reqs.append({"deleteSheet": {"sheetId": st["staging_id"]}})
+        pl.sh.batch_update({"requests": reqs})
+        pl.grids[st["title"]] = pl.grids.pop(st["staging"])
+        del pl.ids[st["staging"]]
 
 def _write_sheet(ws: gspread.Worksheet, sh: gspread.Spreadsheet, df: pd.DataFrame):
     """
-    Escritura robusta:
+    Escritura robusta, planificada offline (SheetsPlanner):
       1) Compacta la hoja al tamaño objetivo si está inflada (reduce celdas).
       2) Si aún no entra y crecer superaría el límite, recorta df (tail) para encajar.
-      3) Limpia SOLO el rango objetivo; escribe con resize=False (no crece de más).
+      3) Tamaño final exacto + valores en dos requests (la grilla queda cubierta: no hace falta limpiar).
     """
     if df is None or df.empty:
         print("No hay datos para escribir.")
-        return
-
-    # Toma sólo columnas presentes (sin None) y asegura al menos 1x1
-    df = df.copy()
-    df = df[[c for c in df.columns if c is not None]]
-    nrows = max(len(df) + 1, 1)  # +header
-    ncols = max(len(df.columns), 1)
-
-    # 1) Intento de "cabe sin crecer" (compactando primero si hace falta)
-    cabe, motivo = _fits_without_growth(sh, ws, nrows, ncols)
-    print(f"[Sheets] Verificación de capacidad → {motivo}")
-
-    if not cabe and "no supera límite" in motivo:
-        # Podemos crecer sin pasar el límite global ⇒ crece de forma mínima
-        curr_rows, curr_cols = ws.row_count, ws.col_count
-        add_r = max(0, nrows - curr_rows)
-        add_c = max(0, ncols - curr_cols)
-        if add_r:
-            ws.add_rows(add_r)
-        if add_c:
-            ws.add_cols(add_c)
-    elif not cabe and "superaría el límite" in motivo:
-        # 2) No podemos crecer. Recortamos DF para que encaje sin aumentar celdas.
-        curr_rows, curr_cols = ws.row_count, ws.col_count
-        target_rows = max(min(nrows, curr_rows), 1)
-        target_cols = max(min(ncols, curr_cols), 1)
-
-        # Mantiene encabezados + (target_rows - 1) últimas filas
-        keep_n = max(target_rows - 1, 0)
-        if keep_n < len(df):
-            print(f"[Sheets] ⚠️ Límite global alcanzado. Recortando a {keep_n} filas de datos (+ encabezado) para encajar sin crecer.")
-            df = df.tail(keep_n).reset_index(drop=True)
-
-        # Si sobran columnas (df>target_cols), recorta columnas derechas
-        if len(df.columns) > target_cols:
-            df = df.iloc[:, :target_cols]
-
-        # Actualiza dimensiones finales de escritura
-        nrows = max(len(df) + 1, 1)
-        ncols = max(len(df.columns), 1)
-
-        # Compacta exactamente al tamaño final (reduce celdas si hace falta)
-        ws.resize(rows=nrows, cols=ncols)
-
-    # 3) Limpia y escribe el rango objetivo exacto
-    rng = f"A1:{rowcol_to_a1(nrows, ncols)}"
-    ws.batch_clear([rng])
-    set_with_dataframe(ws, df, include_index=False, resize=False)
+        return df
+
+    # Toma sólo columnas presentes (sin None); sin copiar si no hace falta
+    if any(c is None for c in df.columns):
+        df = df[[c for c in df.columns if c is not None]]
+    planner = SheetsPlanner.of(sh)
+    plan, df = planner.plan_write(ws, df)
+    planner.execute(plan)
+    return df
 
 # ───────── 3) Texto & Clasificación ─────────
 def strip_accents(txt: str) -> str:
@@ -230,7 +716,7 @@ EXCLUDE_PRODUCT_WORDS = [
 ]
 EXCLUDE_SET: Set[str] = {strip_accents(w) for w in EXCLUDE_PRODUCT_WORDS}
 def is_excluded(name: str) -> bool:
-    return any(tok in EXCLUDE_SET for tok in tokenize(name))
+    return CLASSIFIER.is_excluded(name)
 
 CATEGORY_RULES = [
     {"name":"Carnicería","include":[r"\bcarne\b",r"\bvacuno\b",r"\bcerdo\b",r"\bpollo\b",r"\bpescado\b",
@@ -261,14 +747,7 @@ CATEGORY_RULES = [
 ]
 
 def assign_group(name: str) -> Optional[str]:
-    if not name: return None
-    s = name.lower()
-    for cat in CATEGORY_RULES:
-        if any(re.search(ex, s) for ex in cat.get("exclude", [])):
-            continue
-        if any(re.search(p, s) for p in cat["include"]):
-            return cat["name"]
-    return None
+    return CLASSIFIER.group(name)
 
 SUBGROUP_RULES: Dict[str, List[Tuple[str, str]]] = {
     "Lácteos":[(r"\bleche\b","Leche"),(r"\byogur\b","Yogur"),(r"\bqueso\b","Queso"),
@@ -284,26 +763,132 @@ SUBGROUP_RULES: Dict[str, List[Tuple[str, str]]] = {
     "Verdulería":[(r".*","Hortalizas/Frutas")]
 }
 def assign_subgroup(name: str, group: Optional[str]) -> Optional[str]:
-    if not group or not name: return None
-    rules = SUBGROUP_RULES.get(group, [])
-    s = name.lower()
-    for pat, lbl in rules:
-        if re.search(pat, s):
-            return lbl
-    return None
+    return CLASSIFIER.subgroup(name, group)
+
+# Variantes acentuadas que tokenize()+strip_accents() consideran la misma letra
+_TOKEN_LETTERS = "a-záéíóúñü"
+_ACCENT_VARIANTS = {"a":"[aá]", "e":"[eé]", "i":"[ií]", "o":"[oó]", "u":"[uúü]", "n":"[nñ]"}
+
+def _compile_any(patterns: List[str]) -> Optional[re.Pattern]:
+    """Alternación única equivalente a any(re.search(p, s) for p in patterns)."""
+    if not patterns: return None
+    return re.compile("|".join(f"(?:{p})" for p in patterns))
+
+def _search_mask(rx: Optional[re.Pattern], texts: List[str]) -> np.ndarray:
+    if rx is None: return np.zeros(len(texts), dtype=bool)
+    search = rx.search
+    return np.fromiter((search(t) is not None for t in texts), dtype=bool, count=len(texts))
+
+def _factorize_names(names) -> Tuple[np.ndarray, List[str]]:
+    codes, uniq = pd.factorize(pd.Series(names, dtype=object).fillna("").astype(str), sort=False)
+    return codes, list(uniq)
+
+class ProductClassifier:
+    """
+    CATEGORY_RULES / SUBGROUP_RULES / EXCLUDE_PRODUCT_WORDS precompiladas una sola vez:
+      - exclusión: una regex con todas las palabras (y sus variantes acentuadas) entre
+        límites de token, equivalente a tokenize() + EXCLUDE_SET
+      - grupo/subgrupo: una alternación compilada por regla, evaluada en el mismo orden
+    Los métodos *_series clasifican una Serie entera: cada nombre distinto se evalúa una vez
+    y la cascada de reglas avanza sólo sobre los que todavía no tienen etiqueta.
+    """
+    def __init__(self, category_rules=None, subgroup_rules=None, exclude_words=None):
+        category_rules = CATEGORY_RULES if category_rules is None else category_rules
+        subgroup_rules = SUBGROUP_RULES if subgroup_rules is None else subgroup_rules
+        exclude_words = EXCLUDE_PRODUCT_WORDS if exclude_words is None else exclude_words
+
+        words = sorted({strip_accents(w.lower()) for w in exclude_words}, key=len, reverse=True)
+        body = "|".join("".join(_ACCENT_VARIANTS.get(ch, re.escape(ch)) for ch in w) for w in words)
+        self._excl_re = re.compile(
+            rf"(?<![{_TOKEN_LETTERS}])(?:{body})(?![{_TOKEN_LETTERS}])", re.I
+        ) if words else None
+        self._groups = [(c["name"], _compile_any(c.get("exclude", [])), _compile_any(c["include"]))
+                        for c in category_rules]
+        self._subgroups = {g: [(re.compile(p), lbl) for p, lbl in rules] for g, rules in subgroup_rules.items()}
+
+    # --- un nombre (scrapers) ---
+    def is_excluded(self, name: str) -> bool:
+        return bool(name) and self._excl_re is not None and self._excl_re.search(name) is not None
+
+    def group(self, name: str) -> Optional[str]:
+        if not name: return None
+        s = name.lower()
+        for label, ex, inc in self._groups:
+            if ex is not None and ex.search(s):
+                continue
+            if inc is not None and inc.search(s):
+                return label
+        return None
+
+    def subgroup(self, name: str, group: Optional[str]) -> Optional[str]:
+        if not group or not name: return None
+        s = name.lower()
+        for rx, lbl in self._subgroups.get(group, ()):
+            if rx.search(s):
+                return lbl
+        return None
+
+    # --- Series completas (consolidado) ---
+    def excluded_series(self, names) -> pd.Series:
+        codes, uniq = _factorize_names(names)
+        res = _search_mask(self._excl_re, uniq)
+        return pd.Series(res[codes], index=getattr(names, "index", None))
+
+    def group_series(self, names) -> pd.Series:
+        codes, uniq = _factorize_names(names)
+        low = [u.lower() for u in uniq]
+        out = np.full(len(uniq), None, dtype=object)
+        pending = np.fromiter((bool(u) for u in uniq), dtype=bool, count=len(uniq))
+        for label, ex, inc in self._groups:
+            idx = np.flatnonzero(pending)
+            if not len(idx): break
+            cand = [low[i] for i in idx]
+            hit = idx[_search_mask(inc, cand) & ~_search_mask(ex, cand)]
+            out[hit] = label
+            pending[hit] = False
+        return pd.Series(out[codes], index=getattr(names, "index", None), dtype=object)
+
+    def subgroup_series(self, names, groups) -> pd.Series:
+        names = pd.Series(names, dtype=object)
+        groups = pd.Series(groups, dtype=object, index=names.index)
+        out = np.full(len(names), None, dtype=object)
+        for grp, rules in self._subgroups.items():
+            rows = np.flatnonzero((groups == grp).to_numpy(bool))
+            if not len(rows): continue
+            codes, uniq = _factorize_names(names.iloc[rows])
+            low = [u.lower() for u in uniq]
+            lab = np.full(len(uniq), None, dtype=object)
+            pending = np.fromiter((bool(u) for u in uniq), dtype=bool, count=len(uniq))
+            for rx, lbl in rules:
+                idx = np.flatnonzero(pending)
+                if not len(idx): break
+                hit = idx[_search_mask(rx, [low[i] for i in idx])]
+                lab[hit] = lbl
+                pending[hit] = False
+            out[rows] = lab[codes]
+        return pd.Series(out, index=names.index, dtype=object)
+
+CLASSIFIER = ProductClassifier()
 
 # ───────── 4) Unidades ─────────
 _pack_re = re.compile(
     r"(?:(\d+)\s*[x×]\s*)?(\d+(?:[.,]\d+)?)\s*(kg|kilo|gr|g|l|lt|litros?|ml|cc|cm3|u|unid(?:ad(?:es)?)?|und|uds)\b",
     re.I
 )
+_units_fallback_re = re.compile(r"(\d+)\s*(u|unid(?:ad(?:es)?)?|und|uds)\b", re.I)
+# Mismas regex con el match completo como grupo 0, para Series.str.extract
+_pack_full_re = re.compile(f"({_pack_re.pattern})", re.I)
+_units_fallback_full_re = re.compile(f"({_units_fallback_re.pattern})", re.I)
+_UNIT_ALIASES = {"kilo":"kg","lt":"l","litro":"l","litros":"l","gr":"g","cm3":"ml","cc":"ml",
+                 "unid":"u","unidad":"u","unidades":"u","und":"u","uds":"u"}
+
 def parse_units_from_text(txt: str) -> Tuple[str, str, float]:
     if not txt: return ("","",0.0)
     s = strip_accents(txt.lower())
 
     m = _pack_re.search(s)
     if not m:
-        m2 = re.search(r"(\d+)\s*(u|unid(?:ad(?:es)?)?|und|uds)\b", s, re.I)
+        m2 = _units_fallback_re.search(s)
         if m2:
             n = float(m2.group(1))
             return (m2.group(0), "u", n)
@@ -313,8 +898,7 @@ def parse_units_from_text(txt: str) -> Tuple[str, str, float]:
     cant   = m.group(2)
     unit   = m.group(3).lower()
 
-    unit = {"kilo":"kg","lt":"l","litro":"l","litros":"l","gr":"g","cm3":"ml","cc":"ml",
-            "unid":"u","unidad":"u","unidades":"u","und":"u","uds":"u"}.get(unit, unit)
+    unit = _UNIT_ALIASES.get(unit, unit)
     try:
         val = float(cant.replace(",", "."))
     except:
@@ -333,16 +917,62 @@ def parse_units_from_text(txt: str) -> Tuple[str, str, float]:
 
     return (m.group(0).strip(), etiqueta, round(float(cantidad), 6))
 
-def enrich_unit_cols(df: pd.DataFrame) -> pd.DataFrame:
+def _to_float(col: pd.Series) -> np.ndarray:
+    """float() vectorizado; los dígitos Unicode que acepta la regex y no to_numeric caen a float()."""
+    out = pd.to_numeric(col, errors="coerce").to_numpy(dtype=float, copy=True)
+    for i in np.flatnonzero(np.isnan(out) & col.notna().to_numpy()):
+        out[i] = float(col.iat[i])
+    return out
+
+def parse_units_batch(names) -> pd.DataFrame:
+    """
+    parse_units_from_text para una Serie completa. Cada nombre distinto se normaliza y se
+    parsea una sola vez (Series.str.extract con _pack_re, aritmética en NumPy) y el resultado
+    se replica a todas sus filas. Columnas: Unidad, etiquetaunidad, cantidad_unidades.
+    """
+    codes, uniq = _factorize_names(names)
+    u = pd.Series([strip_accents(x.lower()) for x in uniq], dtype=object)
+    raw = np.full(len(u), "", dtype=object)
+    etq = np.full(len(u), "", dtype=object)
+    qty = np.zeros(len(u), dtype=float)
+
+    m = u.str.extract(_pack_full_re)  # 0: match, 1: n_pack, 2: cantidad, 3: unidad
+    hit = m[0].notna().to_numpy(bool)
+    if hit.any():
+        mh = m[hit]
+        unit = mh[3].str.lower()
+        unit = unit.map(_UNIT_ALIASES).fillna(unit).to_numpy(dtype=object)
+        val = _to_float(mh[2].str.replace(",", ".", regex=False))
+        mult = np.where(mh[1].notna().to_numpy(bool), _to_float(mh[1]), 1.0)
+        val = np.where((unit == "g") | (unit == "ml"), val / 1000.0, val)
+        conds = [(unit == "g") | (unit == "kg"), (unit == "ml") | (unit == "l"), unit == "u"]
+        cantidad = np.select(conds, [mult * val, mult * val, mult * np.where(val > 0, val, 1.0)], 0.0)
+        idx = np.flatnonzero(hit)
+        raw[idx] = mh[0].str.strip().to_numpy(dtype=object)
+        etq[idx] = np.select(conds, ["kg", "l", "u"], "")
+        qty[idx] = [round(float(x), 6) for x in cantidad]  # round() de Python: mismo resultado bit a bit
+
+    miss = ~hit & (u != "").to_numpy(bool)
+    if miss.any():
+        m2 = u[miss].str.extract(_units_fallback_full_re)
+        ok = m2[0].notna().to_numpy(bool)
+        idx = np.flatnonzero(miss)[ok]
+        raw[idx] = m2[0][ok].to_numpy(dtype=object)
+        etq[idx] = "u"
+        qty[idx] = _to_float(m2[1][ok])
+
+    return pd.DataFrame({"Unidad": raw[codes], "etiquetaunidad": etq[codes], "cantidad_unidades": qty[codes]},
+                        index=getattr(names, "index", None))
+
+def enrich_unit_cols(df: pd.DataFrame, units: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """`units` opcional: columnas de parse_units_batch ya calculadas (p.ej. desde la caché)."""
     if "Producto" not in df.columns: return df
-    unidad_raw, etiqueta, cantidad = [], [], []
-    for nombre in df["Producto"].fillna(""):
-        raw, etq, qty = parse_units_from_text(nombre)
-        unidad_raw.append(raw); etiqueta.append(etq); cantidad.append(qty)
-    df["Unidad"] = unidad_raw
-    df["unidad_corregido"] = etiqueta
-    df["etiquetaunidad"] = etiqueta
-    df["cantidad_unidades"] = cantidad
+    if units is None:
+        units = parse_units_batch(df["Producto"])
+    df["Unidad"] = units["Unidad"].array
+    df["unidad_corregido"] = units["etiquetaunidad"].array
+    df["etiquetaunidad"] = units["etiquetaunidad"].array
+    df["cantidad_unidades"] = units["cantidad_unidades"].to_numpy()
 
     df["Precio"] = pd.to_numeric(df.get("Precio"), errors="coerce")
     df["precio_unidad"] = np.where(
@@ -352,350 +982,3361 @@ def enrich_unit_cols(df: pd.DataFrame) -> pd.DataFrame:
     )
     return df
 
-# ───────── 5) HTTP helpers ─────────
+# ───────── 5) Caché de enriquecimiento ─────────
+def _rules_fingerprint() -> str:
+    """Hash de todo lo que determina el enriquecimiento; si cambia, la caché se descarta."""
+    payload = json.dumps([
+        CATEGORY_RULES, SUBGROUP_RULES, EXCLUDE_PRODUCT_WORDS,
+        _pack_re.pattern, _pack_re.flags, _units_fallback_re.pattern, _UNIT_ALIASES,
+    ], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class EnrichmentCache:
+    """
+    nombre normalizado (lower) → (excluido, Grupo, Subgrupo, Unidad, etiquetaunidad, cantidad_unidades).
+    Todas las reglas dependen sólo de name.lower(), así que la clave es exacta.
+    Subgrupo se guarda con el mismo criterio que main(): sobre el Grupo sin acentos.
+    Se carga del disco en el primer uso y se guarda con save(); cuenta hits/misses por nombre.
+    En un proceso del pool de parseo, los classify de cada página se anotan (start_journal /
+    take_journal) y vuelven con sus filas: el proceso principal los suma con merge().
+    """
+    FIELDS = ("excluido", "Grupo", "Subgrupo", "Unidad", "etiquetaunidad", "cantidad_unidades")
+
+    def __init__(self, path: Optional[str] = None, enabled: bool = True):
+        self.path = path or ENRICH_CACHE_PATH
+        self.enabled = enabled
+        self.fingerprint = _rules_fingerprint()
+        self.hits = self.misses = 0
+        self._map: Optional[Dict[str, tuple]] = None
+        self._dirty = False
+        self._journal: Optional[Dict[str, list]] = None  # clave → [valor, llamadas] (proceso del pool)
+        self._lock = threading.Lock()
+
+    def _data(self) -> Dict[str, tuple]:
+        if self._map is None:
+            with self._lock:
+                if self._map is None:
+                    self._map = self._load()
+        return self._map
+
+    def _load(self) -> Dict[str, tuple]:
+        if not self.enabled: return {}
+        try:
+            with open(self.path, "rb") as fh:
+                blob = pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return {}
+        if not isinstance(blob, dict) or blob.get("reglas") != self.fingerprint:
+            print("[Caché] Reglas cambiaron → caché de enriquecimiento descartada")
+            return {}
+        return blob.get("items", {})
+
+    def save(self):
+        if not (self.enabled and self._dirty and self._map is not None): return
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump({"reglas": self.fingerprint, "items": self._map}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    @staticmethod
+    def _compute(keys: List[str]) -> List[tuple]:
+        names = pd.Series(keys, dtype=object)
+        excl = CLASSIFIER.excluded_series(names).to_numpy()
+        grupos = CLASSIFIER.group_series(names)
+        sub = CLASSIFIER.subgroup_series(names, grupos.map(lambda g: strip_accents(g) if g else g))
+        units = parse_units_batch(names)
+        return list(zip(excl.tolist(), grupos.tolist(), sub.tolist(), units["Unidad"].tolist(),
+                        units["etiquetaunidad"].tolist(), units["cantidad_unidades"].tolist()))
+
+    @staticmethod
+    def _compute_one(key: str) -> tuple:
+        g = CLASSIFIER.group(key)
+        raw, etq, qty = parse_units_from_text(key)
+        return (CLASSIFIER.is_excluded(key), g, CLASSIFIER.subgroup(key, strip_accents(g) if g else g), raw, etq, qty)
+
+    def classify(self, name: str) -> Tuple[bool, Optional[str]]:
+        """(excluido, Grupo) para un nombre (camino de los scrapers)."""
+        key = (name or "").lower()
+        d = self._data()
+        val = d.get(key)
+        if val is None:
+            val = self._compute_one(key)
+        if self._journal is not None:
+            self._journal.setdefault(key, [val, 0])[1] += 1
+        with self._lock:
+            if key in d:
+                self.hits += 1
+            else:
+                d[key] = val
+                self.misses += 1
+                self._dirty = True
+        return val[0], val[1]
+
+    def start_journal(self):
+        self._journal = {}
+
+    def take_journal(self) -> Dict[str, list]:
+        journal, self._journal = self._journal or {}, None
+        return journal
+
+    def merge(self, journal: Dict[str, list]):
+        """Suma los classify de un proceso del pool como si se hubieran hecho acá: mismos hits/misses y nombres nuevos."""
+        if not journal: return
+        d = self._data()
+        with self._lock:
+            for key, (val, n) in journal.items():
+                if key not in d:
+                    d[key] = val
+                    self.misses += 1
+                    self._dirty = True
+                    n -= 1
+                self.hits += n
+
+    def lookup(self, names) -> pd.DataFrame:
+        """Campos FIELDS por fila para una Serie de nombres; sólo calcula los nombres no vistos."""
+        codes, uniq = _factorize_names(names)
+        keys = [u.lower() for u in uniq]
+        d = self._data()
+        vals = [d.get(k) for k in keys]
+        faltan = [i for i, v in enumerate(vals) if v is None]
+        if faltan:
+            nuevos = self._compute([keys[i] for i in faltan])
+            with self._lock:
+                for i, v in zip(faltan, nuevos):
+                    vals[i] = d[keys[i]] = v
+                self._dirty = True
+        self.hits += len(keys) - len(faltan)
+        self.misses += len(faltan)
+        cols = list(zip(*vals)) if vals else [()] * len(self.FIELDS)
+        index = getattr(names, "index", None)
+        out = {}
+        for f, c in zip(self.FIELDS, cols):
+            if f in ("excluido", "cantidad_unidades"):
+                out[f] = np.asarray(c, dtype=bool if f == "excluido" else float)[codes]
+            else:  # texto: diccionario (valores por nombre distinto) + códigos por fila, sin objetos por fila
+                vcodes, cats = pd.factorize(np.asarray(c, dtype=object))
+                out[f] = pd.Categorical.from_codes(vcodes[codes] if len(c) else codes, categories=cats)
+        return pd.DataFrame(out, index=index)
+
+    def report(self) -> str:
+        total = self.hits + self.misses
+        rate = (100.0 * self.hits / total) if total else 0.0
+        return f"[Caché] enriquecimiento: {self.hits:,} hits / {self.misses:,} misses ({rate:.1f}% hit) | {len(self._map or {}):,} nombres"
+
+ENRICH_CACHE = EnrichmentCache(enabled=ENRICH_CACHE_ENABLED)
+
+# ───────── 6) HTTP helpers ─────────
 def norm_price(val) -> float:
     if isinstance(val, (int, float)): return float(val)
     txt = re.sub(r"[^\d,\.]", "", str(val)).replace(".", "").replace(",", ".")
     try: return float(txt)
     except ValueError: return 0.0
 
-def _first_price(node: BeautifulSoup, sels: List[str] = None) -> float:
-    sels = sels or ["span.price ins span.amount","span.price > span.amount",
-                    "span.woocommerce-Price-amount","span.amount","bdi","[data-price]"]
-    for s in sels:
-        el = node.select_one(s)
-        if el:
-            p = norm_price(el.get_text() or el.get("data-price",""))
-            if p > 0: return p
-    return 0.0
+# --- Backends HTML: las mismas consultas CSS sobre BeautifulSoup (soupsieve) o lxml (XPath) ---
+_LX_SKIP = ("script", "style", "template")  # bs4.get_text() tampoco incluye su texto
 
-def _build_session() -> requests.Session:
-    # Compatibilidad urllib3 (allowed_methods vs method_whitelist)
-    try:
-        retry = Retry(
-            total=3, backoff_factor=1.2,
-            status_forcelist=(429,500,502,503,504),
-            allowed_methods=frozenset(["GET","HEAD"]),
-            raise_on_status=False
-        )
-    except TypeError:
-        retry = Retry(
-            total=3, backoff_factor=1.2,
-            status_forcelist=(429,500,502,503,504),
-            method_whitelist=frozenset(["GET","HEAD"]),  # fallback
-            raise_on_status=False
-        )
-    ad = HTTPAdapter(max_retries=retry)
-    s = requests.Session()
-    s.headers["User-Agent"] = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                               "AppleWebKit/537.36 (KHTML, like Gecko) "
-                               "Chrome/123 Safari/537.36")
-    s.trust_env = True  # respeta proxies del runner si existen
-    s.mount("http://", ad); s.mount("https://", ad)
-    return s
+@lru_cache(maxsize=None)
+def _css(selector: str) -> "sv.SoupSieve":
+    """Selector CSS compilado una sola vez y reutilizado en todas las páginas."""
+    return sv.compile(selector)
 
-# ───────── 6) Scrapers ─────────
-KEYWORDS_SUPER = (
-    "carn", "carne", "carnes", "vacuno", "pollo", "cerdo", "pescado",
-    "pan", "panader", "galleta", "pizza", "chipa",
-    "huevo", "huevos",
-    "lacteo", "lacteos", "leche", "yogur", "queso", "manteca", "crema",
-    "verduler", "frutas", "verduras", "hortalizas"
-)
+_CSS_STEP = re.compile(r"^(?P<tag>[\w-]+|\*)?(?P<rest>(?:[.#][\w-]+|\[[^\]]+\])*)$")
+_CSS_PART = re.compile(r"([.#])([\w-]+)|\[\s*([\w-]+)\s*(?:([*^]?=)\s*[\"']?([^\"'\]]*)[\"']?\s*)?\]")
 
-class HtmlSiteScraper:
-    def __init__(self, name, base):
-        self.name = name
-        self.base_url = base.rstrip("/")
-        self.session = _build_session()
+def _css_to_xpath(selector: str, axis: str = "descendant") -> str:
+    """Traduce el subconjunto CSS que usan los scrapers (tag, .clase, #id, [attr], [attr=v],
+    [attr*=v], [attr^=v], descendiente y '>') a XPath con la semántica de soupsieve:
+    el sujeto se busca en `axis` y los compuestos previos se exigen como ancestros."""
+    tokens = re.split(r"\s*(>)\s*|\s+", selector.strip())
+    expr, comb = None, None
+    for tok in tokens:
+        if tok is None or tok == "": continue
+        if tok == ">": comb = ">"; continue
+        m = _CSS_STEP.match(tok)
+        if not m: raise ValueError(f"selector CSS no soportado: {selector!r}")
+        preds = []
+        for dot, name, attr, op, val in _CSS_PART.findall(m.group("rest")):
+            if dot == ".": preds.append(f"contains(concat(' ',normalize-space(@class),' '),' {name} ')")
+            elif dot == "#": preds.append(f"@id='{name}'")
+            elif not op: preds.append(f"@{attr}")
+            elif op == "=": preds.append(f"@{attr}='{val}'")
+            elif op == "*=": preds.append(f"contains(@{attr},'{val}')")
+            else: preds.append(f"starts-with(@{attr},'{val}')")
+        step = (m.group("tag") or "*").lower() + "".join(f"[{p}]" for p in preds)
+        if expr is not None:
+            step += f"[{'parent' if comb == '>' else 'ancestor'}::{expr}]"
+        expr, comb = step, None
+    return f"{axis}::{expr}" + ("[1]" if axis == "ancestor" else "")
 
-    def category_urls(self):  raise NotImplementedError
-    def parse_category(self, url): raise NotImplementedError
+@lru_cache(maxsize=None)
+def _xpath(selector: str, axis: str = "descendant"):
+    """XPath compilado (lxml) equivalente al selector CSS."""
+    return lx_etree.XPath(_css_to_xpath(selector, axis))
 
-    def scrape(self):
-        urls = self.category_urls()
-        if not urls: return []
-        fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        out = []
-        with ThreadPoolExecutor(MAX_WORKERS) as pool:
-            futs = {pool.submit(self.parse_category, u): u for u in urls}
-            for f in as_completed(futs):
-                try:
-                    for row in f.result():
-                        row["FechaConsulta"] = fecha
-                        out.append(row)
-                except Exception:
-                    # Continúa con otras categorías si alguna falla
-                    pass
-        return out
+def _class_re(*names: str) -> re.Pattern:
+    """Coincide con cualquiera de las clases en un atributo class con varias
+    (al parsear, SoupStrainer puede ver el atributo como un único string)."""
+    return re.compile(r"(?:^|\s)(?:%s)(?:\s|$)" % "|".join(map(re.escape, names)))
 
-    def save_csv(self, rows):
-        if not rows: return
-        fn = f"{self.name}_canasta_{datetime.now():%Y%m%d_%H%M%S}.csv"
-        pd.DataFrame(rows).to_csv(os.path.join(OUT_DIR, fn), index=False)
+class _Only:
+    """SoupStrainer diferido: se construye (importando bs4) recién la primera vez que se parsea con él."""
+    def __init__(self, *args, **kw):
+        self.args, self.kw, self._strainer = args, kw, None
 
-class StockScraper(HtmlSiteScraper):
-    def __init__(self): super().__init__("stock","https://www.stock.com.py")
-    def category_urls(self):
-        try:
-            r = self.session.get(self.base_url, timeout=REQ_TIMEOUT); r.raise_for_status()
-        except Exception:
-            return []
-        soup = BeautifulSoup(r.text, "html.parser")
-        urls = set()
-        for a in soup.select('a[href*="/category/"]'):
-            href = a.get("href","").lower()
-            if any(k in href for k in KEYWORDS_SUPER):
-                urls.add(urljoin(self.base_url, a["href"]))
-        return list(urls)
-    def parse_category(self, url):
-        try:
-            r = self.session.get(url, timeout=REQ_TIMEOUT); r.raise_for_status()
-        except Exception:
-            return []
-        soup = BeautifulSoup(r.content, "html.parser")
-        rows=[]
-        for p in soup.select("div.product-item"):
-            nm = p.select_one("h2.product-title")
-            if not nm: continue
-            nombre = nm.get_text(" ", strip=True)
-            if is_excluded(nombre): continue
-            grupo = assign_group(nombre)
-            if not grupo: continue
-            precio = _first_price(p, ["span.price-label", "span.price"])
-            rows.append({"Supermercado":"Stock","CategoríaURL":url,
-                         "Producto":nombre.upper(),"Precio":precio,"Grupo":grupo})
-        return rows
+    def get(self) -> "bs4.SoupStrainer":
+        if self._strainer is None: self._strainer = bs4.SoupStrainer(*self.args, **self.kw)
+        return self._strainer
 
-class SuperseisScraper(HtmlSiteScraper):
-    def __init__(self): super().__init__("superseis","https://www.superseis.com.py")
-    def category_urls(self):
-        try:
-            r = self.session.get(self.base_url, timeout=REQ_TIMEOUT); r.raise_for_status()
-        except Exception:
-            return []
-        soup = BeautifulSoup(r.text, "html.parser")
-        urls=set()
-        for a in soup.select('a[href*="/category/"]'):
-            href = a.get("href","").lower()
-            if any(k in href for k in KEYWORDS_SUPER):
-                urls.add(urljoin(self.base_url, a["href"]))
-        return list(urls)
-    def parse_category(self, url):
-        try:
-            r = self.session.get(url, timeout=REQ_TIMEOUT); r.raise_for_status()
-        except Exception:
-            return []
-        soup = BeautifulSoup(r.content, "html.parser")
-        rows=[]
-        for a in soup.select("a.product-title-link"):
-            nombre = a.get_text(" ", strip=True)
-            if is_excluded(nombre): continue
-            grupo = assign_group(nombre)
-            if not grupo: continue
-            cont = a.find_parent("div", class_="product-item") or a
-            precio = _first_price(cont, ["span.price-label","span.price"])
-            rows.append({"Supermercado":"Superseis","CategoríaURL":url,
-                         "Producto":nombre.upper(),"Precio":precio,"Grupo":grupo})
-        return rows
+def _use_lxml() -> bool:
+    return HTML_PARSER == "lxml" and lx_html is not None  # sin lxml: html.parser, mismo resultado
 
-class SalemmaScraper(HtmlSiteScraper):
-    def __init__(self): super().__init__("salemma","https://www.salemmaonline.com.py")
-    def category_urls(self):
-        try:
-            r = self.session.get(self.base_url, timeout=REQ_TIMEOUT); r.raise_for_status()
-        except Exception:
-            return []
-        soup = BeautifulSoup(r.text, "html.parser")
-        urls=set()
-        for a in soup.find_all("a", href=True):
-            href = a["href"].lower()
-            if any(k in href for k in KEYWORDS_SUPER):
-                urls.add(urljoin(self.base_url, a["href"]))
-        return list(urls)
-    def parse_category(self, url):
-        try:
-            r = self.session.get(url, timeout=REQ_TIMEOUT); r.raise_for_status()
-        except Exception:
-            return []
-        soup = BeautifulSoup(r.content, "html.parser")
-        rows=[]
-        for f in soup.select("form.productsListForm"):
-            nm = f.find("input", {"name":"name"})
-            nombre = (nm.get("value","") if nm else "").strip()
-            if not nombre: continue
-            if is_excluded(nombre): continue
-            grupo = assign_group(nombre)
-            if not grupo: continue
-            pr = f.find("input", {"name":"price"})
-            precio = norm_price(pr.get("value","") if pr else "")
-            rows.append({"Supermercado":"Salemma","CategoríaURL":url,
-                         "Producto":nombre.upper(),"Precio":precio,"Grupo":grupo})
-        return rows
+def _parse_html(markup, only: Optional[_Only] = None):
+    """
+    Árbol de la página según HTML_PARSER:
+      - html.parser: BeautifulSoup; con HTML_RESTRICT=1 sólo los subárboles de `only`.
+      - lxml: árbol de libxml2 (en C); las consultas XPath sólo materializan los nodos pedidos.
+    El texto se decodifica como lo hace bs4 (BOM, <meta charset>, detección) en ambos casos.
+    """
+    if not _use_lxml():
+        return bs4.BeautifulSoup(markup, "html.parser", parse_only=only.get() if HTML_RESTRICT and only else None)
+    if isinstance(markup, bytes):
+        markup = bs4.UnicodeDammit(markup, is_html=True).unicode_markup or ""
+    try:
+        return lx_html.document_fromstring(markup.encode("utf-8"), parser=lx_html.HTMLParser(encoding="utf-8"))
+    except (lx_etree.ParserError, ValueError):
+        return lx_html.document_fromstring(b"<html></html>")  # documento vacío
 
-class AreteScraper(HtmlSiteScraper):
-    def __init__(self): super().__init__("arete","https://www.arete.com.py")
-    def category_urls(self):
-        try:
-            r = self.session.get(self.base_url, timeout=REQ_TIMEOUT); r.raise_for_status()
-        except Exception:
-            return []
-        soup = BeautifulSoup(r.text, "html.parser")
-        urls=set()
-        for sel in ("#departments-menu","#menu-departments-menu-1"):
-            for a in soup.select(f'{sel} a[href^="catalogo/"]'):
-                href = a["href"].split("?")[0].lower()
-                if any(k in href for k in KEYWORDS_SUPER):
-                    urls.add(urljoin(self.base_url+"/", a["href"]))
-        return list(urls)
-    def parse_category(self, url):
-        try:
-            r = self.session.get(url, timeout=REQ_TIMEOUT); r.raise_for_status()
-        except Exception:
-            return []
-        soup = BeautifulSoup(r.content, "html.parser")
-        rows=[]
-        for p in soup.select("div.product"):
-            nm = p.select_one("h2.ecommercepro-loop-product__title")
-            if not nm: continue
-            nombre = nm.get_text(" ", strip=True)
-            if is_excluded(nombre): continue
-            grupo = assign_group(nombre)
-            if not grupo: continue
-            precio = _first_price(p)
-            rows.append({"Supermercado":"Arete","CategoríaURL":url,
-                         "Producto":nombre.upper(),"Precio":precio,"Grupo":grupo})
-        return rows
+def _is_lx(node) -> bool:
+    et = sys.modules.get("lxml.etree")  # si lxml no se importó, el nodo no puede ser suyo
+    return et is not None and isinstance(node, et._Element)
 
-class JardinesScraper(AreteScraper):
-    def __init__(self):
-        super().__init__()
-        self.name = "losjardines"
-        self.base_url = "https://losjardinesonline.com.py"
+def _select(node, selector: str) -> list:
+    return _xpath(selector)(node) if _is_lx(node) else _css(selector).select(node)
 
-# Biggie API
-class BiggieScraper:
-    name, API, TAKE = "biggie","https://api.app.biggie.com.py/api/articles",100
-    GROUPS = ["carniceria","panaderia","huevos","lacteos"]
-    session = _build_session()
-    def fetch_group(self, grp):
-        rows, skip = [], 0
-        while True:
-            try:
-                js = self.session.get(self.API, params=dict(
-                    take=self.TAKE, skip=skip, classificationName=grp
-                ), timeout=REQ_TIMEOUT).json()
-            except Exception:
-                break
-            for it in js.get("items", []):
-                nombre = it.get("name", "")
-                if is_excluded(nombre): continue
-                grupo = assign_group(nombre) or grp.capitalize()
-                rows.append({"Supermercado":"Biggie","CategoríaURL":grp,
-                             "Producto":nombre.upper(),
-                             "Precio":norm_price(it.get("price",0)),
-                             "Grupo":grupo})
-            skip += self.TAKE
-            if skip >= js.get("count", 0): break
-        return rows
-    def scrape(self):
-        fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        rows=[]
-        for g in self.GROUPS:
-            for item in self.fetch_group(g):
-                item["FechaConsulta"]=fecha
-                rows.append(item)
-        return rows
-    def save_csv(self, rows):
-        if not rows: return
-        fn = f"biggie_canasta_{datetime.now():%Y%m%d_%H%M%S}.csv"
-        pd.DataFrame(rows).to_csv(os.path.join(OUT_DIR, fn), index=False)
+def _select_one(node, selector: str):
+    if _is_lx(node):
+        res = _xpath(selector)(node)
+        return res[0] if res else None
+    return _css(selector).select_one(node)
 
-# ───────── 7) Gestor de sitios ─────────
-SCRAPERS: Dict[str, Callable] = {
-    "stock":StockScraper, "superseis":SuperseisScraper, "salemma":SalemmaScraper,
-    "arete":AreteScraper, "losjardines":JardinesScraper, "biggie":BiggieScraper
-}
+def _closest(node, selector: str):
+    """Ancestro más cercano que cumple el selector (como find_parent)."""
+    if _is_lx(node):
+        res = _xpath(selector, "ancestor")(node)
+        return res[0] if res else None
+    sel = _css(selector)
+    for p in node.parents:
+        if isinstance(p, bs4.BeautifulSoup): break
+        if sel.match(p): return p
+    return None
 
-def _parse_args(argv=None):
-    if argv is None: return list(SCRAPERS)
-    if any(a in ("-h","--help") for a in argv):
-        print("Uso: python pipeline_ingesta.py [sitio1 sitio2 …]"); sys.exit(0)
-    sel = [a for a in argv if a in SCRAPERS]
-    return sel or list(SCRAPERS)
+def _lx_strings(el):
+    if el.text: yield el.text
+    for ch in el:
+        if isinstance(ch.tag, str) and ch.tag not in _LX_SKIP:  # comentarios/PI: sólo su cola
+            yield from _lx_strings(ch)
+        if ch.tail: yield ch.tail
 
-# ───────── 8) Orquestador ─────────
-def main(argv=None):
-    objetivos = _parse_args(argv if argv is not None else sys.argv[1:])
-    registros = []
-    for k in objetivos:
-        sc = SCRAPERS[k]()
-        filas = sc.scrape()
-        sc.save_csv(filas)
-        registros.extend(filas)
-        print(f"• {k:<12}: {len(filas):>5} filas")
+def _text(node, sep: str = "", strip: bool = False) -> str:
+    """get_text() de bs4, también para nodos lxml."""
+    if not _is_lx(node): return node.get_text(sep, strip=strip)
+    parts = _lx_strings(node)
+    if strip: parts = [t for t in (t.strip() for t in parts) if t]
+    return sep.join(parts)
 
-    if not registros:
-        print("Sin datos nuevos.")
-        return 0
+PRICE_SELECTORS = ("span.price ins span.amount","span.price > span.amount",
+                   "span.woocommerce-Price-amount","span.amount","bdi","[data-price]")
 
-    # Concatena CSVs diarios (si existen) o usa los registros en memoria
-    csvs = glob.glob(PATTERN_DAILY)
-    if csvs:
-        df_all = pd.concat([pd.read_csv(f, dtype=str) for f in csvs], ignore_index=True, sort=False)
-    else:
-        df_all = pd.DataFrame(registros)
+def _first_price(node, sels: List[str] = None) -> float:
+    for s in sels or PRICE_SELECTORS:
+        el = _select_one(node, s)
+        if el is not None:
+            p = norm_price(_text(el) or el.get("data-price",""))
+            if p > 0: return p
+    return 0.0
 
-    # Normalizaciones
-    if "Grupo" in df_all.columns:
-        df_all["Grupo"]  = df_all["Grupo"].map(strip_accents).fillna("")
-    df_all["Precio"] = pd.to_numeric(df_all.get("Precio"), errors="coerce")
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+              "AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/123 Safari/537.36")
 
-    # Enriquecimiento
-    df_all["Subgrupo"] = [assign_subgroup(n, g) for n, g in zip(df_all.get("Producto",""), df_all.get("Grupo",""))]
-    df_all = enrich_unit_cols(df_all)
+class HttpCache:
+    """
+    Caché HTTP en disco para GET: un archivo por URL en HTTP_CACHE_DIR con cuerpo, ETag y
+    Last-Modified. Cada request se revalida (If-None-Match / If-Modified-Since) y un 304 se
+    sirve desde disco como 200: no se confía en max-age porque los precios cambian en el día.
+    Cuenta por sitio requests, revalidaciones y bytes bajados / ahorrados.
+    """
+    KEEP = ("Content-Type", "ETag", "Last-Modified")
 
-    # Abre hoja y trae histórico existente
-    sh, ws, df_prev = _open_sheet()
-    target_cols = [
-        "ID","Supermercado","Producto","Precio","Unidad","Grupo","Subgrupo",
-        "FechaConsulta","unidad_corregido","etiquetaunidad","cantidad_unidades","precio_unidad",
-        "CategoríaURL"
-    ]
-    for c in target_cols:
-        if c not in df_all.columns:  df_all[c]  = np.nan
-        if c not in df_prev.columns: df_prev[c] = np.nan
+    def __init__(self, path: Optional[str] = None, enabled: bool = True):
+        self.path = path or HTTP_CACHE_DIR
+        self.enabled = enabled
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
 
-    base = pd.concat([df_prev[target_cols], df_all[target_cols]], ignore_index=True, sort=False)
+    def _file(self, url: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".pkl")
 
-    # Orden y de-duplicación
-    base["FechaConsulta"] = pd.to_datetime(base["FechaConsulta"], errors="coerce")
-    base.sort_values("FechaConsulta", inplace=True)
+    def lookup(self, url: str) -> Optional[dict]:
+        if not self.enabled: return None
+        try:
+            with open(self._file(url), "rb") as fh:
+                entry = pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+        return entry if isinstance(entry, dict) and entry.get("url") == url else None
 
-    # Para clave por día, dejamos sólo la fecha (no hora)
-    base["FechaConsulta"] = base["FechaConsulta"].dt.strftime("%Y-%m-%d")
+    @staticmethod
+    def validators(entry: Optional[dict]) -> Dict[str, str]:
+        h = {}
+        if entry and entry.get("ETag"): h["If-None-Match"] = entry["ETag"]
+        if entry and entry.get("Last-Modified"): h["If-Modified-Since"] = entry["Last-Modified"]
+        return h
 
-    # Garantiza claves
-    for k in KEY_COLS:
-        if k not in base.columns:
-            base[k] = ""
+    def store(self, url: str, headers, body: bytes):
+        # sin validadores no hay forma de revalidar; no-store se respeta
+        if not self.enabled or not (headers.get("ETag") or headers.get("Last-Modified")): return
+        if "no-store" in (headers.get("Cache-Control") or "").lower(): return
+        entry = {k: headers.get(k) for k in self.KEEP}
+        entry.update(url=url, body=body)
+        fn = self._file(url)
+        os.makedirs(self.path, exist_ok=True)
+        tmp = f"{fn}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(entry, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fn)
 
-    base.drop_duplicates(KEY_COLS, keep="first", inplace=True)
+    def revalidated(self, url: str, label: str, entry: dict):
+        """Registra un 304 servido desde disco y marca la entrada como usada."""
+        try: os.utime(self._file(url))
+        except OSError: pass
+        self.count(label, saved=len(entry["body"]), hit=True)
 
-    # ID secuencial
-    if "ID" in base.columns:
-        base.drop(columns=["ID"], inplace=True, errors="ignore")
-    base.insert(0, "ID", range(1, len(base) + 1))
+    def count(self, label: str, downloaded: int = 0, saved: int = 0, hit: bool = False):
+        with self._lock:
+            st = self.stats.setdefault(label, {"requests": 0, "hits": 0, "bajados": 0, "ahorrados": 0})
+            st["requests"] += 1; st["hits"] += hit
+            st["bajados"] += downloaded; st["ahorrados"] += saved
 
-    # Redondeos amables
-    base["Precio"] = pd.to_numeric(base["Precio"], errors="coerce").round(2)
-    base["cantidad_unidades"] = pd.to_numeric(base["cantidad_unidades"], errors="coerce").round(3)
-    base["precio_unidad"] = pd.to_numeric(base["precio_unidad"], errors="coerce").round(3)
+    def prune(self, max_age_days: float = HTTP_CACHE_MAX_AGE_DAYS):
+        if not (self.enabled and os.path.isdir(self.path)): return
+        limite = datetime.now().timestamp() - max_age_days * 86400
+        for fn in glob.glob(os.path.join(self.path, "*.pkl")):
+            try:
+                if os.path.getmtime(fn) < limite: os.remove(fn)
+            except OSError:
+                pass
 
-    # --- Escritura robusta (sin exceder 10M celdas) ---
-    _write_sheet(ws, sh, base[target_cols])
-    total_cells = _audit_total_cells(sh)
-    print(f"✅ Hoja '{WORKSHEET_NAME}' actualizada: {len(base)} filas totales | Celdas del libro: {total_cells:,}")
+    def report(self, label: str) -> str:
+        st = self.stats.get(label)
+        if not st or not st["requests"]: return ""
+        rate = 100.0 * st["hits"] / st["requests"]
+        return (f"HTTP {st['hits']}/{st['requests']} revalidadas ({rate:.0f}% hit), "
+                f"{st['bajados'] / 1e6:.2f} MB bajados, {st['ahorrados'] / 1e6:.2f} MB ahorrados")
+
+HTTP_CACHE = HttpCache(enabled=HTTP_CACHE_ENABLED)
+
+class DeadlineExceeded(Exception):
+    """El plazo de la corrida de scrape (SCRAPE_DEADLINE_S) venció: el request no se hizo (o se cortó)."""
+
+class CircuitOpen(Exception):
+    """El circuito del host está abierto (sitio caído): el request se cortó sin salir."""
+
+def _failure_reason(e: BaseException) -> str:
+    """Motivo corto y agrupable de una falla: http_404, timeout, conexion, deadline, circuito_abierto o el tipo de excepción."""
+    if isinstance(e, DeadlineExceeded): return "deadline"
+    if isinstance(e, CircuitOpen): return "circuito_abierto"
+    resp = getattr(e, "response", None)
+    if isinstance(e, requests.HTTPError) and resp is not None: return f"http_{resp.status_code}"
+    if isinstance(e, (requests.Timeout, asyncio.TimeoutError)): return "timeout"
+    if isinstance(e, requests.ConnectionError) or (aiohttp is not None and isinstance(e, aiohttp.ClientConnectionError)):
+        return "conexion"
+    return type(e).__name__
+
+class RunMetrics:
+    """
+    Métricas de una corrida para el reporte del final de main() (JSON y, opcional, Prometheus):
+      - etapas: segundos y llamadas por (etapa, sitio). Las etapas de un sitio corren en varios
+        hilos/corrutinas (y los sitios, a la vez): sus segundos suman el trabajo de todos, no el
+        tiempo de reloj; el de reloj del scrape es la etapa "scrape" de la corrida.
+      - hosts: intentos por status, reintentos, bytes bajados e histograma de latencias por intento.
+      - fallas: URL, etapa, motivo y detalle de cada categoría/página perdida (el scrape sigue con las demás).
+      - circuito: por host, veces que se abrió el circuito (sitio caído) y requests cortados sin salir.
+      - incompletos: sitios cortados por el plazo de la corrida, con cuántas URLs les quedaron sin bajar.
+    Una etapa anidada en sí misma (p.ej. execute → SheetUpload.run) se cuenta una sola vez.
+    """
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # latencia por intento (s); + ∞
+    EN_HILOS = {"sitio", "categorias", "descarga", "parseo", "csv"}  # suman el trabajo de todos los hilos / sitios
+    MAX_FAILURES = 500  # URLs que se guardan; los conteos por motivo son completos
+    _activas: contextvars.ContextVar = contextvars.ContextVar("etapas_activas", default=frozenset())
+
+    def __init__(self):
+        self.inicio = datetime.now()
+        self.t0 = time.perf_counter()
+        self.etapas: Dict[Tuple[str, str], List[float]] = {}  # (etapa, sitio) → [segundos, llamadas]
+        self.hosts: Dict[str, dict] = {}
+        self.sitios: Dict[str, int] = {}  # sitio → filas scrapeadas
+        self.pipelines: Dict[str, dict] = {}  # sitio → esperas de red/CPU del scrape por etapas (PagePipeline)
+        self.incompletos: Dict[str, int] = {}  # sitio → URLs que quedaron sin bajar al vencer el plazo
+        self.fallas: List[dict] = []
+        self.motivos = collections.Counter()  # (sitio, etapa, motivo) → fallas
+        self.datos: Dict[str, object] = {}  # resumen de la corrida (filas, CSV, resultado de la ingesta…)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, etapa: str, sitio: str = ""):
+        activas = self._activas.get()
+        if (etapa, sitio) in activas:
+            yield
+            return
+        token = self._activas.set(activas | {(etapa, sitio)})
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._activas.reset(token)
+            self.add_stage(etapa, time.perf_counter() - t0, sitio)
+
+    def add_stage(self, etapa: str, segundos: float, sitio: str = ""):
+        with self._lock:
+            e = self.etapas.setdefault((etapa, sitio), [0.0, 0])
+            e[0] += segundos
+            e[1] += 1
+
+    def _host(self, host: str) -> dict:
+        h = self.hosts.get(host)
+        if h is None:
+            h = self.hosts[host] = {"intentos": 0, "reintentos": 0, "sin_respuesta": 0, "bytes": 0,
+                                    "aperturas": 0, "cortados": 0, "status": collections.Counter(), "latencias": []}
+        return h
+
+    def request(self, host: str, latency: float, status: Optional[int] = None, error: bool = False):
+        """Un intento HTTP (lo registra HostLimiter.release): su status, o sin respuesta si falló la red."""
+        with self._lock:
+            h = self._host(host)
+            h["intentos"] += 1
+            h["latencias"].append(latency)
+            if status is not None: h["status"][str(status)] += 1
+            elif error: h["sin_respuesta"] += 1
+
+    def retry(self, host: str):
+        with self._lock: self._host(host)["reintentos"] += 1
+
+    def downloaded(self, host: str, n: int):
+        with self._lock: self._host(host)["bytes"] += n
+
+    def circuit(self, host: str, abierto: bool = False):
+        """El circuito del host se abrió (`abierto`) o cortó un request sin dejarlo salir."""
+        with self._lock: self._host(host)["aperturas" if abierto else "cortados"] += 1
+
+    def failure(self, sitio: str, url: str, etapa: str, motivo):
+        """Una categoría/página que se pierde: `motivo` es la excepción (motivo corto + detalle) o un texto corto."""
+        detalle = None
+        if isinstance(motivo, BaseException):
+            detalle, motivo = f"{type(motivo).__name__}: {motivo}"[:200], _failure_reason(motivo)
+        with self._lock:
+            self.motivos[(sitio, etapa, motivo)] += 1
+            if len(self.fallas) < self.MAX_FAILURES:
+                self.fallas.append({"sitio": sitio, "etapa": etapa, "url": url, "motivo": motivo,
+                                    **({"detalle": detalle} if detalle else {})})
+
+    def site(self, sitio: str, filas: int):
+        with self._lock: self.sitios[sitio] = filas
+
+    def pipeline(self, sitio: str, datos: dict):
+        with self._lock: self.pipelines[sitio] = datos
+
+    def losses(self, sitio: str, motivo: str) -> int:
+        """URLs del sitio perdidas por `motivo` ("deadline": plazo de la corrida; "circuito_abierto": sitio caído)."""
+        with self._lock:
+            return sum(n for (s, _, m), n in self.motivos.items() if s == sitio and m == motivo)
+
+    def incomplete(self, sitio: str, perdidas: int):
+        with self._lock: self.incompletos[sitio] = perdidas
+
+    @classmethod
+    def _latencies(cls, lat: List[float]) -> dict:
+        if not lat: return {}
+        s = sorted(map(float, lat))  # sin numpy: el subcomando scrape no lo importa
+        pct = {f"p{p}": round(s[min(len(s) - 1, int(len(s) * p / 100))], 4) for p in (50, 90, 99)}
+        le = [bisect.bisect_right(s, b) for b in cls.BUCKETS]  # acumulado, como los buckets `le` de Prometheus
+        return {**pct, "max": round(s[-1], 4), "suma": round(math.fsum(s), 4),
+                "buckets": {f"{b:g}": int(n) for b, n in zip(cls.BUCKETS, le)}}
+
+    def report(self, resultado: str = "ok", **extra) -> dict:
+        with self._lock:
+            etapas = [{"etapa": e, "sitio": s, "segundos": round(v[0], 3), "llamadas": v[1]}
+                      for (e, s), v in sorted(self.etapas.items())]
+            hosts = {h: {"intentos": v["intentos"], "reintentos": v["reintentos"],
+                         "status": dict(sorted(v["status"].items())), "sin_respuesta": v["sin_respuesta"],
+                         "throttled": v["status"]["429"] + v["status"]["503"], "bytes": v["bytes"],
+                         **({"circuito": {"aperturas": v["aperturas"], "cortados": v["cortados"]}}
+                            if v["aperturas"] or v["cortados"] else {}),
+                         "latencia_s": self._latencies(v["latencias"])}
+                     for h, v in sorted(self.hosts.items())}
+            fallas_sitio, cortadas = collections.Counter(), collections.Counter()
+            for (s, _, m), n in self.motivos.items():
+                fallas_sitio[s] += n
+                if m == "circuito_abierto": cortadas[s] += n
+            sitios = {s: {"filas": n, "segundos": round(self.etapas.get(("sitio", s), [0.0])[0], 3),
+                          "fallas": fallas_sitio[s], "completo": s not in self.incompletos,
+                          **({"sin_bajar": self.incompletos[s]} if s in self.incompletos else {}),
+                          **({"cortadas_por_circuito": cortadas[s]} if cortadas[s] else {}),
+                          **({"pipeline": self.pipelines[s]} if s in self.pipelines else {})}
+                      for s, n in self.sitios.items()}
+            motivos = [{"sitio": s, "etapa": e, "motivo": m, "fallas": n}
+                       for (s, e, m), n in sorted(self.motivos.items())]
+            fallas = list(self.fallas)
+        return {"version": 1, "inicio": self.inicio.isoformat(timespec="seconds"),
+                "duracion_s": round(time.perf_counter() - self.t0, 3), "resultado": resultado,
+                **self.datos, **extra, "sitios": sitios, "etapas": etapas, "hosts": hosts,
+                "fallas_por_motivo": motivos, "fallas": fallas}
+
+    @staticmethod
+    def prometheus(rep: dict, prefix: str = "preciossuper") -> str:
+        """El reporte como gauges de Prometheus (formato texto): una foto de la última corrida."""
+        def lab(**kw):
+            esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in kw.items()) + "}"
+        out = []
+        def gauge(nombre, ayuda, muestras):
+            out.extend([f"# HELP {prefix}_{nombre} {ayuda}", f"# TYPE {prefix}_{nombre} gauge"])
+            out.extend(f"{prefix}_{nombre}{l} {v:g}" for l, v in muestras)
+        gauge("run_timestamp_seconds", "Inicio de la corrida (epoch)",
+              [("", datetime.fromisoformat(rep["inicio"]).timestamp())])
+        gauge("run_duration_seconds", "Duración total de la corrida", [("", rep["duracion_s"])])
+        gauge("run_success", "1 si la corrida terminó bien", [("", float(rep["resultado"] == "ok"))])
+        if rep.get("pico_rss_mb") is not None:
+            gauge("run_peak_rss_megabytes", "Pico de memoria residente", [("", rep["pico_rss_mb"])])
+        gauge("stage_seconds", "Segundos por etapa y sitio (suma de hilos)",
+              [(lab(etapa=e["etapa"], sitio=e["sitio"]), e["segundos"]) for e in rep["etapas"]])
+        gauge("site_rows", "Filas scrapeadas por sitio", [(lab(sitio=s), v["filas"]) for s, v in rep["sitios"].items()])
+        gauge("site_complete", "1 si el sitio terminó antes del plazo de la corrida",
+              [(lab(sitio=s), float(v["completo"])) for s, v in rep["sitios"].items()])
+        gauge("site_failures", "Categorías/páginas perdidas por motivo",
+              [(lab(sitio=f["sitio"], etapa=f["etapa"], motivo=f["motivo"]), f["fallas"]) for f in rep["fallas_por_motivo"]])
+        hosts = rep["hosts"].items()
+        gauge("http_attempts", "Intentos HTTP por status (sin_respuesta = error de red)",
+              [(lab(host=h, status=st), n) for h, v in hosts
+               for st, n in [*v["status"].items(), ("sin_respuesta", v["sin_respuesta"])] if n])
+        gauge("http_retries", "Reintentos por host", [(lab(host=h), v["reintentos"]) for h, v in hosts])
+        gauge("http_bytes", "Bytes descargados por host", [(lab(host=h), v["bytes"]) for h, v in hosts])
+        gauge("circuit_opens", "Veces que se abrió el circuito del host",
+              [(lab(host=h), v.get("circuito", {}).get("aperturas", 0)) for h, v in hosts])
+        gauge("http_short_circuited", "Requests cortados por el circuito abierto del host",
+              [(lab(host=h), v.get("circuito", {}).get("cortados", 0)) for h, v in hosts])
+        out.extend([f"# HELP {prefix}_http_latency_seconds Latencia por intento", f"# TYPE {prefix}_http_latency_seconds histogram"])
+        for h, v in hosts:
+            lat = v["latencia_s"]
+            if not lat: continue
+            out.extend(f"{prefix}_http_latency_seconds_bucket{lab(host=h, le=le)} {n}" for le, n in lat["buckets"].items())
+            out.append(f"{prefix}_http_latency_seconds_bucket{lab(host=h, le='+Inf')} {v['intentos']}")
+            out.append(f"{prefix}_http_latency_seconds_sum{lab(host=h)} {lat['suma']:g}")
+            out.append(f"{prefix}_http_latency_seconds_count{lab(host=h)} {v['intentos']}")
+        return "\n".join(out) + "\n"
+
+    def summary(self, rep: dict) -> str:
+        """Una línea para el log: etapas más lentas (de reloj), intentos HTTP y fallas por motivo."""
+        total = collections.Counter()
+        for e in rep["etapas"]:
+            if e["etapa"] not in self.EN_HILOS: total[e["etapa"]] += e["segundos"]
+        lentas = ", ".join(f"{e} {s:.1f} s" for e, s in total.most_common(4))
+        req = sum(v["intentos"] for v in rep["hosts"].values())
+        motivos = collections.Counter()
+        for f in rep["fallas_por_motivo"]: motivos[f["motivo"]] += f["fallas"]
+        fallas = ", ".join(f"{m}×{n}" for m, n in motivos.most_common(3))
+        incompletos = [s for s, v in rep["sitios"].items() if not v["completo"]]
+        caidos = [h for h, v in rep["hosts"].items() if v.get("circuito", {}).get("aperturas")]
+        return (f"[Métricas] {rep['duracion_s']:.1f} s | etapas: {lentas or '—'} | {req} intentos HTTP"
+                f" | fallas: {sum(motivos.values())}" + (f" ({fallas})" if fallas else "")
+                + (f" | incompletos por plazo: {', '.join(incompletos)}" if incompletos else "")
+                + (f" | circuito abierto: {', '.join(caidos)}" if caidos else ""))
+
+METRICS = RunMetrics()  # se reemplaza al comenzar cada main()
+
+def _timed(etapa: str):
+    """Decorador: cuenta cada llamada en `etapa` de las métricas de la corrida en curso."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*a, **kw):
+            with METRICS.stage(etapa):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+class CircuitBreaker:
+    """
+    Circuito de un host (lo lleva su HostLimiter), para no gastar timeouts y reintentos en un sitio caído:
+      - cerrado: pasa todo; fallas seguidas (error de red, timeout o 5xx que no sea un 503 con
+        Retry-After) en `failures` URLs distintas lo abren: los reintentos de una misma URL cuentan
+        una vez, así una o dos categorías rotas no cortan un host que sigue respondiendo.
+      - abierto: cada request se corta al instante con CircuitOpen, también los que esperaban cupo.
+      - semiabierto: pasados `cooldown` segundos sale un solo request de prueba; si responde (cualquier
+        status sano, también un 404) se cierra, si falla vuelve a abrirse por otros `cooldown` segundos.
+    Con failures=0 nunca se abre.
+    """
+    def __init__(self, host: str, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN_S):
+        self.host, self.failures, self.cooldown = host, max(0, int(failures)), max(0.0, cooldown)
+        self.state = "cerrado"
+        self.seguidas = 0
+        self._urls: Set[str] = set()  # URLs que fallaron desde la última respuesta sana
+        self.reopen_at = 0.0
+        self.probing = False
+        self.stats = {"aperturas": 0, "cortados": 0}
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """Abierto o semiabierto: no tiene sentido reintentar."""
+        return self.state != "cerrado"
+
+    def _cut(self) -> CircuitOpen:
+        with self._lock:
+            self.stats["cortados"] += 1
+            falta = max(0.0, self.reopen_at - time.monotonic())
+        METRICS.circuit(self.host)
+        return CircuitOpen(f"{self.host}: circuito abierto tras fallas seguidas en {self.seguidas} URLs"
+                           + (f" (prueba en {falta:.0f} s)" if falta else " (prueba en curso)"))
+
+    def allow(self) -> bool:
+        """Deja salir un request (True si es la prueba del semiabierto) o lo corta con CircuitOpen."""
+        with self._lock:
+            if self.state == "cerrado": return False
+            if not self.probing and time.monotonic() >= self.reopen_at:
+                self.state, self.probing = "semiabierto", True
+                return True
+        raise self._cut()
+
+    def check(self, prueba: bool = False):
+        """Para los que esperan cupo: si el circuito se abrió mientras tanto, se cortan (salvo la prueba)."""
+        if not prueba and self.state != "cerrado": raise self._cut()
+
+    def abandon(self):
+        """La prueba no llegó a salir (plazo, cupo cancelado): el próximo request la reemplaza."""
+        with self._lock: self.probing = False
+
+    def record(self, ok: bool, motivo: str = "", url: Optional[str] = None) -> bool:
+        """Resultado de un intento que salió: uno sano cierra el circuito; las fallas seguidas lo abren (→ True)."""
+        with self._lock:
+            antes = self.state
+            if ok:
+                self.state, self.seguidas, self.probing = "cerrado", 0, False
+                self._urls.clear()
+                if antes == "cerrado": return False
+                msg = f"[Circuito] {self.host}: cerrado, el host volvió a responder"
+            else:
+                if url is None or url not in self._urls:
+                    self.seguidas += 1
+                    if url is not None: self._urls.add(url)
+                if antes == "abierto" or (antes == "cerrado" and not (self.failures and self.seguidas >= self.failures)):
+                    return False
+                self.state, self.probing, self.reopen_at = "abierto", False, time.monotonic() + self.cooldown
+                if antes == "cerrado": self.stats["aperturas"] += 1
+                msg = (f"[Circuito] {self.host}: abierto tras fallas seguidas en {self.seguidas} URLs ({motivo}); "
+                       f"se cortan sus requests, prueba en {self.cooldown:.0f} s"
+                       if antes == "cerrado" else f"[Circuito] {self.host}: falló la prueba ({motivo}), sigue abierto")
+        if antes == "cerrado" and not ok: METRICS.circuit(self.host, abierto=True)
+        print(msg)
+        return not ok
+
+    def report(self) -> str:
+        st = self.stats
+        if not st["aperturas"]: return ""
+        return f"circuito abierto {st['aperturas']}× ({st['cortados']} req cortados), final {self.state}"
+
+class HostLimiter:
+    """
+    Concurrencia adaptativa (AIMD) + token bucket de req/s para un host.
+      - Arranque lento: +1 por respuesta sana (duplica por ventana) hasta el primer corte;
+        después +1 por ventana (≈ `limit` respuestas). Tope: HOST_MAX_CONCURRENCY.
+      - 429/503: el límite y la tasa se cortan a la mitad; Retry-After frena al host entero.
+      - Errores, 5xx o latencia > LAT_FACTOR × la mejor observada: límite × DECREASE.
+      - Como mucho un corte por ventana de latencia: una ráfaga de 429 cuenta como una señal.
+    Sin ADAPTIVE_LIMIT queda fijo en `start` (sólo aplica Retry-After y HOST_RPS).
+    Cada intento pasa además por el CircuitBreaker del host (`breaker`): abierto, acquire lo corta.
+    Las esperas de cupo respetan el plazo de la corrida de scrape (SCRAPE_BUDGET); con scrape=False
+    (la subida a Sheets) el limitador no lo consulta ni corta por circuito (reintenta SheetUpload).
+    Sirve a hilos (acquire) y a corrutinas (acquire_async).
+    """
+    LAT_FACTOR, DECREASE, BACKOFF = 2.5, 0.75, 0.5
+
+    def __init__(self, host: str, start: int = MAX_WORKERS, max_limit: int = HOST_MAX_CONCURRENCY,
+                 rps: float = HOST_RPS, adaptive: bool = True, scrape: bool = True):
+        self.host = host
+        self._sin_plazo = None if scrape else ScrapeBudget()
+        self.adaptive = adaptive
+        self.limit = float(start)
+        self.max_limit = float(max(start, max_limit) if adaptive else start)
+        self.max_rate = float(rps) or None  # None: sin tope hasta que el host pida frenar
+        self.rate = self.max_rate
+        self.tokens, self.t_tokens = (self.rate or 0.0), time.monotonic()
+        self.inflight = 0
+        self.blocked_until = 0.0
+        self.ewma = self.base = None
+        self.last_cut, self.slow_start = 0.0, adaptive
+        self.stats = {"requests": 0, "throttled": 0, "errores": 0, "retry_after": 0.0,
+                      "min": self.limit, "max": self.limit}
+        self._cond = threading.Condition()
+        self._waiters = collections.deque()  # (loop, future) de corrutinas esperando cupo
+        self.breaker = CircuitBreaker(host, failures=BREAKER_FAILURES if scrape else 0)
+
+    def _budget(self) -> "ScrapeBudget":
+        return SCRAPE_BUDGET if self._sin_plazo is None else self._sin_plazo
+
+    def _try_acquire(self, now: float) -> Optional[float]:
+        """0.0 si tomó cupo; segundos a esperar (Retry-After / token bucket); None si no hay cupo."""
+        if now < self.blocked_until: return self.blocked_until - now
+        if self.inflight >= max(1, int(self.limit)): return None
+        if self.rate:
+            self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.t_tokens) * self.rate)
+            self.t_tokens = now
+            if self.tokens < 1.0: return (1.0 - self.tokens) / self.rate
+            self.tokens -= 1.0
+        self.inflight += 1
+        self.stats["requests"] += 1
+        return 0.0
+
+    def acquire(self):
+        """Espera cupo; CircuitOpen si el circuito está (o se abre) abierto, DeadlineExceeded si vence el plazo."""
+        prueba = self.breaker.allow()
+        try:
+            with self._cond:
+                while True:
+                    self.breaker.check(prueba)
+                    wait = self._try_acquire(time.monotonic())
+                    if wait == 0.0: return
+                    self._budget().check()
+                    self._cond.wait(self._budget().timeout(wait))  # None: hasta que se libere un cupo (o el plazo)
+        except BaseException:
+            if prueba: self.breaker.abandon()
+            raise
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        prueba = self.breaker.allow()
+        try:
+            while True:
+                fut = None
+                with self._cond:
+                    self.breaker.check(prueba)
+                    wait = self._try_acquire(time.monotonic())
+                    if wait == 0.0: return
+                    self._budget().check()
+                    if wait is None:
+                        fut = loop.create_future()
+                        self._waiters.append((loop, fut))
+                if fut is not None: await asyncio.wait([fut], timeout=self._budget().timeout(None))
+                else: await asyncio.sleep(self._budget().timeout(wait))
+        except BaseException:
+            if prueba: self.breaker.abandon()
+            raise
+
+    def cancel(self):
+        """Devuelve un cupo tomado con acquire que no llegó a usarse (no cuenta como request)."""
+        with self._cond:
+            self.inflight -= 1
+            self.stats["requests"] -= 1
+            self._wake(1)
+        self.breaker.abandon()
+
+    def _wake(self, n: Optional[int] = None):
+        """Despierta a `n` de los que esperan cupo (hilos y corrutinas); None: a todos."""
+        if n is None: self._cond.notify_all()
+        else: self._cond.notify(n)
+        for _ in range(len(self._waiters) if n is None else min(n, len(self._waiters))):
+            loop, fut = self._waiters.popleft()
+            loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+
+    def _cut(self, now: float, latency: float, factor: float, throttled: bool = False):
+        window = self.ewma if self.ewma is not None else latency
+        if not self.adaptive or now - self.last_cut < window: return
+        antes, self.last_cut, self.slow_start = self.limit, now, False
+        self.limit = max(1.0, self.limit * factor)
+        if throttled:
+            # tasa sostenible con el nuevo límite (Little: concurrencia / latencia)
+            actual = self.limit / max(self.ewma or 1.0, 1e-3)
+            self.rate = max(0.5, min(self.rate or actual, actual))
+            self.tokens, self.t_tokens = min(self.tokens, 1.0), now
+            print(f"[Límite] {self.host}: 429/503 → concurrencia {antes:.0f} → {self.limit:.0f}, {self.rate:.1f} req/s")
+
+    def release(self, latency: float, status: Optional[int] = None, headers=None, error: bool = False,
+                url: Optional[str] = None):
+        now = time.monotonic()
+        METRICS.request(self.host, latency, status, error)
+        with self._cond:
+            self.inflight -= 1
+            if status in (429, 503):
+                self.stats["throttled"] += 1
+                wait = _retry_after(headers)
+                if wait:
+                    self.stats["retry_after"] += max(0.0, now + wait - max(now, self.blocked_until))
+                    self.blocked_until = max(self.blocked_until, now + wait)
+                self._cut(now, latency, self.BACKOFF, throttled=True)
+            elif error or (status is not None and status >= 500):
+                self.stats["errores"] += 1
+                self._cut(now, latency, self.DECREASE)
+            else:
+                self.ewma = latency if self.ewma is None else 0.8 * self.ewma + 0.2 * latency
+                self.base = self.ewma if self.base is None else min(self.base, self.ewma)
+                if self.ewma > self.LAT_FACTOR * self.base:
+                    self._cut(now, latency, self.DECREASE)
+                elif self.adaptive:
+                    self.limit = min(self.max_limit, self.limit + (1.0 if self.slow_start else 1.0 / self.limit))
+                    if self.rate:  # recupera la tasa ~10% por ventana; sin tope fijo deja de aplicar
+                        self.rate *= 1.0 + 0.1 / self.limit
+                        if self.max_rate: self.rate = min(self.rate, self.max_rate)
+                        elif self.ewma and self.rate > 4 * self.limit / self.ewma: self.rate = None
+            self.stats["min"] = min(self.stats["min"], self.limit)
+            self.stats["max"] = max(self.stats["max"], self.limit)
+            self._wake(max(1, int(self.limit) - self.inflight))
+        caido = error or (status is not None and status >= 500 and not (status == 503 and _retry_after(headers)))
+        if self.breaker.record(not caido, "sin respuesta" if error else f"http_{status}", url):
+            with self._cond: self._wake()  # se abrió: los que esperan cupo se cortan ya
+
+    def report(self) -> str:
+        st = self.stats
+        rate = f", {self.rate:.1f} req/s" if self.rate else ""
+        return (f"[Límite] {self.host}: concurrencia final {self.limit:.0f} (rango {st['min']:.0f}–{st['max']:.0f}){rate}"
+                f" | {st['requests']} req, {st['throttled']}× 429/503, {st['errores']} errores"
+                + (f", {st['retry_after']:.1f} s en Retry-After" if st["retry_after"] else "")
+                + (f" | {self.breaker.report()}" if self.breaker.stats["aperturas"] else ""))
+
+class HostLimits:
+    """Un HostLimiter por host, compartido por todas las sesiones y el motor async."""
+    def __init__(self):
+        self._by_host: Dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> HostLimiter:
+        host = urlparse(url).netloc or url
+        with self._lock:
+            lim = self._by_host.get(host)
+            if lim is None:
+                lim = self._by_host[host] = HostLimiter(host, adaptive=ADAPTIVE_LIMIT)
+            return lim
+
+    def report(self) -> List[str]:
+        return [lim.report() for lim in self._by_host.values() if lim.stats["requests"]]
+
+HOST_LIMITS = HostLimits()
+
+class ScrapeBudget:
+    """
+    Presupuesto de la corrida de scrape, compartido por todos los sitios (_scrape_sites lo arma):
+      - a lo sumo `slots` intentos HTTP en vuelo entre todos los hosts; se toma después del cupo del
+        host, así un host frenado (Retry-After, límite bajo) no retiene cupos que otro sitio usaría;
+      - un plazo de reloj: vencido, check() corta los requests nuevos, los reintentos y las esperas de
+        cupo, y timeout() recorta el de cada request al tiempo que queda.
+    Sin tope ni plazo (`ScrapeBudget()`, el de fuera de una corrida) no frena nada.
+    """
+    def __init__(self, slots: int = 0, deadline_s: float = 0.0):
+        self.slots = max(0, int(slots))
+        self._sem = threading.BoundedSemaphore(self.slots) if self.slots else None
+        self.t_end = time.monotonic() + deadline_s if deadline_s > 0 else None
+        self.en_vuelo = self.pico = 0
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()  # (loop, future) de corrutinas esperando cupo
+
+    def remaining(self) -> Optional[float]:
+        return None if self.t_end is None else self.t_end - time.monotonic()
+
+    def expired(self) -> bool:
+        r = self.remaining()
+        return r is not None and r <= 0
+
+    def fits(self, seconds: float) -> bool:
+        """¿Entra una espera de `seconds` antes del plazo?"""
+        r = self.remaining()
+        return r is None or seconds < r
+
+    def check(self):
+        if self.expired(): raise DeadlineExceeded("venció el plazo de la corrida (SCRAPE_DEADLINE_S)")
+
+    def timeout(self, seconds: Optional[float]) -> Optional[float]:
+        """`seconds` recortado al tiempo que queda (None = sin límite)."""
+        r = self.remaining()
+        if r is None: return seconds
+        return max(0.01, r if seconds is None else min(seconds, r))
+
+    def acquire(self):
+        self.check()
+        if self._sem is not None:
+            while not self._sem.acquire(timeout=self.timeout(0.25)): self.check()
+        self._count(1)
+
+    async def acquire_async(self):
+        """Como acquire, pero la corrutina espera a que release() la despierte (sin sondear)."""
+        self.check()
+        if self._sem is not None:
+            loop = asyncio.get_running_loop()
+            while True:
+                with self._lock:  # intento y registro juntos: un release en el medio no se pierde
+                    if self._sem.acquire(blocking=False): break
+                    fut = loop.create_future()
+                    self._waiters.append((loop, fut))
+                try:
+                    await asyncio.wait([fut], timeout=self.timeout(None))
+                except BaseException:  # cancelada: si ya la habían despertado, el aviso pasa a la siguiente
+                    with self._lock:
+                        if (loop, fut) in self._waiters: self._waiters.remove((loop, fut))
+                        elif fut.done(): self._wake()
+                    raise
+                with self._lock:
+                    if (loop, fut) in self._waiters: self._waiters.remove((loop, fut))  # venció el plazo esperando
+                self.check()
+        self._count(1)
+
+    def release(self):
+        self._count(-1)
+        if self._sem is not None:
+            with self._lock:
+                self._sem.release()
+                self._wake()
+
+    def _wake(self):
+        """Despierta a la corrutina que espera hace más (con self._lock tomado)."""
+        if self._waiters:
+            loop, fut = self._waiters.popleft()
+            loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+
+    def _count(self, n: int):
+        with self._lock:
+            self.en_vuelo += n
+            self.pico = max(self.pico, self.en_vuelo)
+
+SCRAPE_BUDGET = ScrapeBudget()  # se reemplaza al comenzar cada scrape (_scrape_sites)
+
+def _take_slots(lim: HostLimiter):
+    """Cupo del host y después el de la corrida; si vence el plazo esperando, no queda nada tomado."""
+    lim.acquire()
+    try:
+        SCRAPE_BUDGET.acquire()
+    except BaseException:
+        lim.cancel()
+        raise
+
+def _deadline_error(e: BaseException, url: str) -> BaseException:
+    """Un timeout/corte de red después del plazo es culpa del plazo (el request salió recortado)."""
+    if SCRAPE_BUDGET.expired() and not isinstance(e, DeadlineExceeded):
+        return DeadlineExceeded(f"{url}: cortado por el plazo de la corrida ({_failure_reason(e)})")
+    return e
+
+def _retry_wait(status: int, headers, n_retry: int) -> float:
+    """Espera antes de reintentar un RETRY_STATUS; con Retry-After en 429/503 ya frena HostLimiter."""
+    if status in (429, 503) and _retry_after(headers) is not None: return 0.0
+    wait = _retry_after(headers) if status == 413 else None
+    return wait if wait is not None else _retry_backoff(n_retry)
+
+def _thread_workers() -> int:
+    """Hilos por sitio: con límite adaptativo, el tope lo pone HostLimiter y no el pool."""
+    return max(MAX_WORKERS, HOST_MAX_CONCURRENCY) if ADAPTIVE_LIMIT else MAX_WORKERS
+
+class AdaptiveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter que pasa cada intento por el HostLimiter del host (límite y circuito) y por el
+    presupuesto de la corrida (SCRAPE_BUDGET: cupo global y plazo). Los reintentos se hacen acá y
+    no en urllib3 (GET/HEAD: errores de red y timeouts; todos: RETRY_STATUS), así cada intento
+    ajusta el límite y cuenta para el circuito. Si el circuito se abrió, el reintento se corta con
+    CircuitOpen (la URL queda como cortada por el circuito); si la espera no entra antes del plazo
+    vuelve la última respuesta (o el último error).
+    """
+    def send(self, request, **kw):
+        lim = HOST_LIMITS.get(request.url)
+        n_retry = 0
+        while True:
+            _take_slots(lim)
+            if isinstance(kw.get("timeout"), (int, float)): kw["timeout"] = SCRAPE_BUDGET.timeout(kw["timeout"])
+            t0 = time.monotonic()
+            try:
+                resp = super().send(request, **kw)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                lim.release(time.monotonic() - t0, error=True, url=request.url)
+                SCRAPE_BUDGET.release()
+                if (request.method not in ("GET", "HEAD") or n_retry >= RETRY_TOTAL
+                        or not SCRAPE_BUDGET.fits(_retry_backoff(n_retry + 1))):
+                    raise _deadline_error(e, request.url)
+                lim.breaker.check()  # abierto: CircuitOpen en vez del último error
+                n_retry += 1
+                METRICS.retry(lim.host)
+                time.sleep(_retry_backoff(n_retry))
+                continue
+            except BaseException as e:
+                lim.release(time.monotonic() - t0, error=True, url=request.url)
+                SCRAPE_BUDGET.release()
+                raise _deadline_error(e, request.url)
+            lim.release(time.monotonic() - t0, resp.status_code, resp.headers, url=request.url)
+            SCRAPE_BUDGET.release()
+            espera = _retry_wait(resp.status_code, resp.headers, n_retry + 1)
+            if resp.status_code not in RETRY_STATUS or n_retry >= RETRY_TOTAL or not SCRAPE_BUDGET.fits(espera):
+                return resp
+            resp.close()
+            lim.breaker.check()  # abierto: CircuitOpen en vez de la última respuesta
+            n_retry += 1
+            METRICS.retry(lim.host)
+            time.sleep(espera)
+
+class CachingAdapter(AdaptiveAdapter):
+    """HTTPAdapter que revalida los GET contra HTTP_CACHE y convierte los 304 en 200 desde disco."""
+    def __init__(self, cache: HttpCache, label: Optional[str] = None, **kw):
+        super().__init__(**kw)
+        self.cache, self.label = cache, label
+
+    def send(self, request, stream=False, **kw):
+        host = urlparse(request.url).netloc
+        if request.method != "GET" or stream or not self.cache.enabled:
+            resp = super().send(request, stream=stream, **kw)
+            if not stream: METRICS.downloaded(host, len(resp.content))
+            return resp
+        entry = self.cache.lookup(request.url)
+        request.headers.update(HttpCache.validators(entry))
+        resp = super().send(request, stream=stream, **kw)
+        label = self.label or host
+        METRICS.downloaded(host, len(resp.content))
+        if resp.status_code == 304 and entry:
+            self.cache.revalidated(request.url, label, entry)
+            resp.status_code, resp.reason, resp._content = 200, "OK", entry["body"]
+            if entry.get("Content-Type"): resp.headers["Content-Type"] = entry["Content-Type"]
+            resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+            return resp
+        if resp.status_code == 200:
+            self.cache.store(request.url, resp.headers, resp.content)
+        self.cache.count(label, downloaded=len(resp.content))
+        return resp
+
+def _build_session(pool_size: Optional[int] = None, label: Optional[str] = None) -> requests.Session:
+    # Sin reintentos en urllib3: los hace AdaptiveAdapter (cada intento ajusta el límite y cuenta para el circuito)
+    retry = Retry(0, read=False)
+    # Pool por host del tamaño de la concurrencia: evita abrir/cerrar conexiones bajo carga
+    pool_size = pool_size or _thread_workers()
+    # `label` agrupa las estadísticas de la caché HTTP por sitio
+    ad = CachingAdapter(HTTP_CACHE, label, max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    s = requests.Session()
+    s.headers["User-Agent"] = USER_AGENT
+    s.trust_env = True  # respeta proxies del runner si existen
+    s.mount("http://", ad); s.mount("https://", ad)
+    return s
+
+class SessionPool:
+    """
+    Pool de requests.Session para usar desde varios hilos: cada hilo toma una sesión en
+    exclusiva y la devuelve al terminar (requests.Session no garantiza ser thread-safe).
+    Las sesiones se crean a demanda, hasta `size`, y conservan su keep-alive entre usos.
+    Uso: `with pool.session() as s: s.get(...)`
+    """
+    def __init__(self, size: int = MAX_WORKERS, label: Optional[str] = None):
+        self.size = max(1, int(size))
+        self.label = label
+        self._free: List[requests.Session] = []
+        self._created = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def session(self):
+        with self._cond:
+            while not self._free and self._created >= self.size:
+                self._cond.wait()
+            s = self._free.pop() if self._free else None
+            if s is None: self._created += 1
+        if s is None:
+            s = _build_session(pool_size=1, label=self.label)
+        try:
+            yield s
+        finally:
+            with self._cond:
+                self._free.append(s)
+                self._cond.notify()
+
+def _retry_backoff(n_retry: int) -> float:
+    """Misma fórmula que urllib3 Retry: 0, 2·f, 4·f, … (el primer reintento no espera)."""
+    if n_retry <= 1: return 0.0
+    return min(Retry.DEFAULT_BACKOFF_MAX, RETRY_BACKOFF * (2 ** (n_retry - 1)))
+
+def _retry_after(headers) -> Optional[float]:
+    """Segundos indicados por Retry-After (entero o fecha HTTP), si vienen."""
+    val = (headers or {}).get("Retry-After")
+    if not val: return None
+    try:
+        return max(0.0, float(val))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        when = parsedate_to_datetime(val)
+        return max(0.0, (when - datetime.now(when.tzinfo)).total_seconds())
+    except Exception:
+        return None
+
+def _decode_body(body: bytes, headers) -> str:
+    enc = requests.utils.get_encoding_from_headers(dict(headers or {})) or "utf-8"
+    try:
+        return body.decode(enc, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+class AsyncFetcher:
+    """
+    Motor HTTP asyncio (aiohttp) alternativo al ThreadPoolExecutor + requests.
+      - Un único connector con pool keep-alive por host dimensionado a la concurrencia.
+      - Mismos reintentos que AdaptiveAdapter: RETRY_TOTAL intentos extra sobre errores de
+        conexión y RETRY_STATUS, backoff exponencial y Retry-After; ninguno con el circuito abierto.
+      - Cada intento pasa por el HostLimiter del host (límite y circuito) y por SCRAPE_BUDGET (como el motor threads).
+      - Como raise_on_status=False, al agotar reintentos devuelve la última respuesta.
+      - Misma revalidación contra HTTP_CACHE que CachingAdapter (304 → 200 desde disco).
+    Uso: `async with AsyncFetcher() as f: status, body, headers = await f.get(url)`
+    """
+    def __init__(self, concurrency: int = ASYNC_CONCURRENCY, timeout: float = REQ_TIMEOUT):
+        if aiohttp is None:
+            raise RuntimeError("HTTP_ENGINE=async requiere 'aiohttp' (pip install aiohttp)")
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.session = None
+
+    async def __aenter__(self):
+        conn = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency,
+                                    keepalive_timeout=30, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=conn, headers={"User-Agent": USER_AGENT}, trust_env=True,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def get(self, url: str, params: Optional[dict] = None, label: Optional[str] = None):
+        key = requests.Request("GET", url, params=params).prepare().url  # misma clave que requests
+        entry = HTTP_CACHE.lookup(key)
+        label = label or urlparse(key).netloc
+        lim = HOST_LIMITS.get(key)
+        n_retry = 0
+        while True:
+            await lim.acquire_async()
+            try:
+                await SCRAPE_BUDGET.acquire_async()
+            except BaseException:
+                lim.cancel()
+                raise
+            t0 = time.monotonic()
+            try:
+                async with self.session.get(url, params=params, headers=HttpCache.validators(entry),
+                                            timeout=aiohttp.ClientTimeout(total=SCRAPE_BUDGET.timeout(self.timeout))) as resp:
+                    status, headers, body = resp.status, resp.headers, await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                lim.release(time.monotonic() - t0, error=True, url=key)
+                SCRAPE_BUDGET.release()
+                if n_retry >= RETRY_TOTAL or not SCRAPE_BUDGET.fits(_retry_backoff(n_retry + 1)):
+                    raise _deadline_error(e, key)
+                lim.breaker.check()  # abierto: CircuitOpen en vez del último error
+                n_retry += 1
+                METRICS.retry(lim.host)
+                await asyncio.sleep(_retry_backoff(n_retry))
+                continue
+            except BaseException:
+                lim.release(time.monotonic() - t0, error=True, url=key)
+                SCRAPE_BUDGET.release()
+                raise
+            lim.release(time.monotonic() - t0, status, headers, url=key)
+            SCRAPE_BUDGET.release()
+            METRICS.downloaded(lim.host, len(body))
+            espera = _retry_wait(status, headers, n_retry + 1)
+            if status in RETRY_STATUS and n_retry < RETRY_TOTAL and SCRAPE_BUDGET.fits(espera):
+                lim.breaker.check()  # abierto: CircuitOpen en vez de la última respuesta
+                n_retry += 1
+                METRICS.retry(lim.host)
+                await asyncio.sleep(espera)
+                continue
+            if status == 304 and entry:
+                HTTP_CACHE.revalidated(key, label, entry)
+                return 200, entry["body"], {"Content-Type": entry.get("Content-Type") or ""}
+            if status == 200:
+                HTTP_CACHE.store(key, headers, body)
+            HTTP_CACHE.count(label, downloaded=len(body))
+            return status, body, headers
+
+def _iter_async(agen_fn: Callable[[], AsyncIterator[List[Dict]]]) -> Iterator[Dict]:
+    """
+    Filas de un generador asíncrono (listas de filas) desde código síncrono. Corre en un hilo con su
+    propio loop (también funciona si ya hay uno activo, p.ej. Colab/Jupyter) y cada lista pasa por una
+    cola de FETCH_QUEUE_PAGES: si el consumidor se atrasa, el loop deja de juntar resultados.
+    """
+    cola: "queue.Queue" = queue.Queue(max(FETCH_QUEUE_PAGES, 1))
+    parar, fin, err = threading.Event(), object(), []
+    async def bombear():
+        agen = agen_fn()
+        try:
+            async for rows in agen:
+                while not parar.is_set():
+                    try:
+                        cola.put_nowait(rows); break
+                    except queue.Full:
+                        await asyncio.sleep(0.01)
+                if parar.is_set(): break
+        finally:
+            await agen.aclose()
+    def hilo():
+        try: asyncio.run(bombear())
+        except BaseException as e: err.append(e)
+        while not parar.is_set():
+            try:
+                cola.put(fin, timeout=0.05); break
+            except queue.Full:
+                pass
+    t = threading.Thread(target=hilo, name="motor-async", daemon=True); t.start()
+    try:
+        while True:
+            rows = cola.get()
+            if rows is fin: break
+            yield from rows
+    finally:
+        parar.set(); t.join()
+    if err: raise err[0]
+
+# ───────── 7) Scrapers ─────────
+KEYWORDS_SUPER = (
+    "carn", "carne", "carnes", "vacuno", "pollo", "cerdo", "pescado",
+    "pan", "panader", "galleta", "pizza", "chipa",
+    "huevo", "huevos",
+    "lacteo", "lacteos", "leche", "yogur", "queso", "manteca", "crema",
+    "verduler", "frutas", "verduras", "hortalizas"
+)
+
+class ScrapeCache:
+    """
+    Caché de scraping persistida en PAGE_CACHE_PATH:
+      - categorías: portada → URLs de categorías descubiertas, válidas CATEGORY_TTL_HOURS.
+      - páginas: URL → (huella del cuerpo, timestamp, filas). Si el cuerpo no cambió se
+        reutilizan las filas ya extraídas sin volver a parsear (aunque el server no mande ETag).
+    La huella incluye el scraper; si cambian las reglas de clasificación se descarta todo.
+    """
+    VERSION = 1           # subir si cambia la extracción de filas de algún scraper
+    MAX_AGE_DAYS = 30     # páginas no vistas en este plazo se descartan al guardar
+
+    def __init__(self, path: Optional[str] = None, enabled: bool = True):
+        self.path = path or PAGE_CACHE_PATH
+        self.enabled = enabled
+        self.fingerprint = f"{_rules_fingerprint()}:{self.VERSION}"
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._data: Optional[dict] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _blob(self) -> dict:
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self._load()
+        return self._data
+
+    def _load(self) -> dict:
+        vacio = {"categorias": {}, "paginas": {}}
+        if not self.enabled: return vacio
+        try:
+            with open(self.path, "rb") as fh:
+                blob = pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return vacio
+        if not isinstance(blob, dict) or blob.get("reglas") != self.fingerprint:
+            return vacio
+        return {"categorias": blob.get("categorias", {}), "paginas": blob.get("paginas", {})}
+
+    def save(self):
+        if not (self.enabled and self._dirty and self._data is not None): return
+        limite = datetime.now().timestamp() - self.MAX_AGE_DAYS * 86400
+        with self._lock:
+            paginas = {u: v for u, v in self._data["paginas"].items() if v[1] >= limite}
+            blob = {"reglas": self.fingerprint, "categorias": self._data["categorias"], "paginas": paginas}
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(blob, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def _count(self, site: str, campo: str):
+        with self._lock:
+            st = self.stats.setdefault(site, {"paginas": 0, "reutilizadas": 0, "categorias_ttl": 0})
+            st[campo] += 1
+
+    def categories(self, site: str, home: str) -> Optional[List[str]]:
+        """URLs de categorías de `home` si se descubrieron hace menos de CATEGORY_TTL_HOURS."""
+        if not self.enabled or CATEGORY_TTL_HOURS <= 0: return None
+        hit = self._blob()["categorias"].get(home)
+        if not hit or datetime.now().timestamp() - hit[0] > CATEGORY_TTL_HOURS * 3600: return None
+        self._count(site, "categorias_ttl")
+        return list(hit[1])
+
+    def set_categories(self, home: str, urls: List[str]):
+        if not (self.enabled and urls): return
+        d = self._blob()
+        with self._lock:
+            d["categorias"][home] = (datetime.now().timestamp(), list(urls))
+            self._dirty = True
+
+    def lookup(self, scraper, url: str, content: bytes) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """(huella, filas) si el cuerpo no cambió desde la última vez; (huella, None) si hay que parsearlo."""
+        if not self.enabled: return None, None
+        huella = hashlib.blake2b(content, digest_size=16, person=type(scraper).__name__[:16].encode()).hexdigest()
+        d = self._blob()
+        hit = d["paginas"].get(url)
+        self._count(scraper.name, "paginas")
+        if not (hit and hit[0] == huella): return huella, None
+        self._count(scraper.name, "reutilizadas")
+        return huella, self.store(url, huella, hit[2])
+
+    def store(self, url: str, huella: Optional[str], rows: List[Dict]) -> List[Dict]:
+        """Guarda las filas extraídas de una página; devuelve copias (el scraper agrega FechaConsulta)."""
+        if huella is None: return rows
+        d = self._blob()
+        with self._lock:
+            d["paginas"][url] = (huella, datetime.now().timestamp(), rows)
+            self._dirty = True
+        return [dict(r) for r in rows]
+
+    def rows(self, scraper, url: str, content: bytes) -> List[Dict]:
+        """Filas de una página de categoría: reutilizadas si el cuerpo no cambió, si no extract_rows()."""
+        huella, rows = self.lookup(scraper, url, content)
+        return rows if rows is not None else self.store(url, huella, scraper.extract_rows(url, content))
+
+    def report(self, site: str) -> str:
+        st = self.stats.get(site)
+        if not st: return ""
+        txt = f"{st['reutilizadas']}/{st['paginas']} páginas sin re-parsear"
+        return txt + (" | categorías desde caché (TTL)" if st["categorias_ttl"] else "")
+
+SCRAPE_CACHE = ScrapeCache(enabled=PAGE_CACHE_ENABLED)
+
+def _cache_report(site: str) -> str:
+    return " | ".join(t for t in (HTTP_CACHE.report(site), SCRAPE_CACHE.report(site)) if t)
+
+def _pipeline_report(site: str) -> str:
+    p = METRICS.pipelines.get(site)
+    if not p: return ""
+    return (f"esperó red {p['espera_red_s']:.1f} s / parseo {p['espera_cpu_s']:.1f} s "
+            f"({p['procesos'] or 'sin'} procesos) → limita {'la CPU' if p['limita'] == 'cpu' else 'la red'}")
+
+# --- Scrape por etapas: descarga (hilos) → parseo (procesos) → merge ---
+_PARSE_POOL: Optional[ProcessPoolExecutor] = None
+_PARSE_POOL_LOCK = threading.Lock()  # los sitios corren a la vez: un solo pool para todos
+
+def _init_parse_worker(parser: str, restrict: bool):
+    """Cada proceso del pool usa el mismo backend HTML que el proceso principal."""
+    global HTML_PARSER, HTML_RESTRICT
+    HTML_PARSER, HTML_RESTRICT = parser, restrict
+
+def _extract_in_worker(cls, name: str, base_url: str, url: str,
+                       content: bytes) -> Tuple[List[Dict], float, Dict[str, list]]:
+    """En un proceso del pool: extract_rows sin sesión HTTP; devuelve (filas, segundos de parseo, y
+    los nombres que clasificó, para ENRICH_CACHE.merge: la caché del proceso no se guarda)."""
+    sc = cls.__new__(cls)
+    sc.name, sc.base_url = name, base_url
+    t0 = time.perf_counter()
+    ENRICH_CACHE.start_journal()
+    try:
+        rows = sc.extract_rows(url, content)
+    finally:
+        journal = ENRICH_CACHE.take_journal()
+    return rows, time.perf_counter() - t0, journal
+
+def _parse_pool() -> Optional[ProcessPoolExecutor]:
+    """Pool compartido por todos los sitios de la corrida (None con PARSE_WORKERS=0). Con forkserver
+    no se forkea un proceso con hilos de descarga vivos y este módulo se importa una sola vez."""
+    global _PARSE_POOL
+    if PARSE_WORKERS <= 0: return None
+    with _PARSE_POOL_LOCK:
+        if _PARSE_POOL is None:
+            metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            ctx = multiprocessing.get_context(metodo)
+            if metodo == "forkserver": ctx.set_forkserver_preload(["__main__", __name__])
+            _PARSE_POOL = ProcessPoolExecutor(PARSE_WORKERS, mp_context=ctx,
+                                              initializer=_init_parse_worker, initargs=(HTML_PARSER, HTML_RESTRICT))
+            for _ in range(PARSE_WORKERS): _PARSE_POOL.submit(int)  # arrancan mientras se descarga la portada
+        return _PARSE_POOL
+
+def _close_parse_pool():
+    global _PARSE_POOL
+    if _PARSE_POOL is not None:
+        _PARSE_POOL.shutdown()
+        _PARSE_POOL = None
+
+class PagePipeline:
+    """
+    Scrape de las categorías de un sitio en tres etapas que se solapan:
+      1) E/S: hilos (_thread_workers) que sólo descargan; cada cuerpo va a una cola acotada
+         (FETCH_QUEUE_PAGES): si el parseo no da abasto, la descarga espera.
+      2) CPU: extract_rows en el pool de procesos (a lo sumo 2×PARSE_WORKERS páginas en vuelo) o,
+         con PARSE_WORKERS=0, en este hilo. Las páginas sin cambios salen de SCRAPE_CACHE.
+      3) Merge: estampa FechaConsulta y entrega las filas apenas salen (stream() es un generador).
+    El hilo que consume mide cuánto esperó páginas (red) y cuánto esperó al parseo (CPU): eso
+    dice qué limita al sitio y queda en el reporte de la corrida.
+    """
+    def __init__(self, scraper: "HtmlSiteScraper", fecha: str):
+        self.sc, self.fecha = scraper, fecha
+        self.pool = _parse_pool()
+        self.en_vuelo: Dict[object, Tuple[str, Optional[str]]] = {}
+        self.out: List[Dict] = []  # filas listas que todavía no se entregaron
+        self.espera_red = self.espera_cpu = 0.0
+        self.paginas = self.cola_max = 0
+
+    def stream(self, urls: List[str]) -> Iterator[Dict]:
+        cola: "queue.Queue[Tuple[str, Optional[bytes]]]" = queue.Queue(max(FETCH_QUEUE_PAGES, 1))
+        parar = threading.Event()
+        def fetch(u):
+            body = None
+            try:
+                if not parar.is_set(): body = self.sc.fetch_category(u)
+            except Exception as e:
+                METRICS.failure(self.sc.name, u, "descarga", e)
+            finally:
+                cola.put((u, body))  # siempre una entrada por URL: el consumidor las cuenta
+        t_inicio = time.perf_counter()
+        descargas = ThreadPoolExecutor(_thread_workers())
+        futs = [descargas.submit(fetch, u) for u in urls]
+        try:
+            for _ in urls:
+                self.cola_max = max(self.cola_max, cola.qsize())
+                t0 = time.perf_counter()
+                url, body = cola.get()
+                self.espera_red += time.perf_counter() - t0
+                if body is not None: self._parse(url, body)
+                yield from self._drain()
+            t0 = time.perf_counter()
+            while self.en_vuelo:
+                self._collect()
+                yield from self._drain()
+            self.espera_cpu += time.perf_counter() - t0
+            self._stats(time.perf_counter() - t_inicio)
+        finally:  # también si el consumidor corta antes: las descargas en curso terminan sin quedar trabadas en la cola
+            parar.set()
+            descargas.shutdown(wait=False, cancel_futures=True)
+            while not all(f.done() for f in futs):
+                try: cola.get(timeout=0.05)
+                except queue.Empty: pass
+            for f in self.en_vuelo: f.cancel()
+
+    def _drain(self) -> List[Dict]:
+        out, self.out = self.out, []
+        return out
+
+    def _parse(self, url: str, body: bytes):
+        self.paginas += 1
+        huella, rows = SCRAPE_CACHE.lookup(self.sc, url, body)
+        if rows is not None:
+            return self._merge(rows)
+        if self.pool is None:
+            t0 = time.perf_counter()
+            try:
+                rows = self.sc.extract_rows(url, body)
+            except Exception as e:
+                METRICS.failure(self.sc.name, url, "parseo", e)
+                return
+            finally:
+                dt = time.perf_counter() - t0
+                self.espera_cpu += dt
+                METRICS.add_stage("parseo", dt, self.sc.name)
+            return self._merge(SCRAPE_CACHE.store(url, huella, rows))
+        t0 = time.perf_counter()
+        while len(self.en_vuelo) >= 2 * PARSE_WORKERS: self._collect()
+        self.espera_cpu += time.perf_counter() - t0
+        fut = self.pool.submit(_extract_in_worker, type(self.sc), self.sc.name, self.sc.base_url, url, body)
+        self.en_vuelo[fut] = (url, huella)
+
+    def _collect(self):
+        """Espera al menos una página del pool y junta sus filas."""
+        listos, _ = wait(self.en_vuelo, return_when=FIRST_COMPLETED)
+        for f in listos:
+            url, huella = self.en_vuelo.pop(f)
+            try:
+                rows, dt, journal = f.result()
+            except Exception as e:  # incluye BrokenProcessPool: la página se pierde y queda en el reporte
+                METRICS.failure(self.sc.name, url, "parseo", e)
+                continue
+            METRICS.add_stage("parseo", dt, self.sc.name)
+            ENRICH_CACHE.merge(journal)
+            self._merge(SCRAPE_CACHE.store(url, huella, rows))
+
+    def _merge(self, rows: List[Dict]):
+        for row in rows:
+            row["FechaConsulta"] = self.fecha
+            self.out.append(row)
+
+    def _stats(self, total: float):
+        limita = "cpu" if self.espera_cpu > self.espera_red else "red"
+        METRICS.pipeline(self.sc.name, {"paginas": self.paginas, "procesos": PARSE_WORKERS,
+                                        "espera_red_s": round(self.espera_red, 3),
+                                        "espera_cpu_s": round(self.espera_cpu, 3),
+                                        "cola_max": self.cola_max, "total_s": round(total, 3), "limita": limita})
+
+class HtmlSiteScraper:
+    """
+    Cada sitio implementa sólo la extracción sobre el HTML ya descargado:
+      - extract_category_urls(html) → URLs de categorías desde la portada
+      - extract_rows(url, content)  → filas de una página de categoría
+    La descarga la hace el motor elegido (HTTP_ENGINE): threads (requests) o async (aiohttp).
+    HOME_ONLY / LIST_ONLY delimitan qué parte de cada página se parsea con HTML_RESTRICT=1.
+    """
+    HOME_ONLY: Optional[_Only] = None
+    LIST_ONLY: Optional[_Only] = None
+
+    def __init__(self, name, base):
+        self.name = name
+        self.base_url = base.rstrip("/")
+        self.session = _build_session(label=name)
+
+    def extract_category_urls(self, html: str) -> List[str]: raise NotImplementedError
+    def extract_rows(self, url: str, content: bytes) -> List[Dict]: raise NotImplementedError
+
+    def category_urls(self):
+        urls = SCRAPE_CACHE.categories(self.name, self.base_url)
+        if urls is not None: return urls
+        with METRICS.stage("categorias", self.name):
+            try:
+                r = self.session.get(self.base_url, timeout=REQ_TIMEOUT); r.raise_for_status()
+            except Exception as e:
+                METRICS.failure(self.name, self.base_url, "categorias", e)
+                return []
+            urls = self.extract_category_urls(r.text)
+        if not urls: METRICS.failure(self.name, self.base_url, "categorias", "sin_categorias")
+        SCRAPE_CACHE.set_categories(self.base_url, urls)
+        return urls
+
+    def fetch_category(self, url) -> Optional[bytes]:
+        """Sólo la descarga (etapa de E/S): el cuerpo crudo, o None si se perdió."""
+        try:
+            with METRICS.stage("descarga", self.name):
+                r = self.session.get(url, timeout=REQ_TIMEOUT); r.raise_for_status()
+        except Exception as e:
+            METRICS.failure(self.name, url, "descarga", e)
+            return None
+        return r.content
+
+    def parse_category(self, url):
+        content = self.fetch_category(url)
+        if content is None: return []
+        with METRICS.stage("parseo", self.name):
+            return SCRAPE_CACHE.rows(self, url, content)
+
+    def stream(self) -> Iterator[Dict]:
+        """Filas del sitio a medida que se parsean: nadie junta la lista completa."""
+        if HTTP_ENGINE == "async":
+            if aiohttp is not None:
+                yield from _iter_async(self.stream_async)
+                return
+            print(f"[{self.name}] aiohttp no instalado; usando motor threads")
+        urls = self.category_urls()
+        if urls:
+            yield from PagePipeline(self, datetime.now().strftime("%Y-%m-%d %H:%M:%S")).stream(urls)
+
+    def scrape(self) -> List[Dict]:
+        return list(self.stream())
+
+    def csv_name(self) -> str:
+        return f"{self.name}_canasta_{datetime.now():%Y%m%d_%H%M%S}.csv"
+
+    # --- Motor asyncio ---
+    async def category_urls_async(self, fetcher: AsyncFetcher) -> List[str]:
+        urls = SCRAPE_CACHE.categories(self.name, self.base_url)
+        if urls is not None: return urls
+        with METRICS.stage("categorias", self.name):
+            try:
+                status, body, headers = await fetcher.get(self.base_url, label=self.name)
+            except Exception as e:
+                METRICS.failure(self.name, self.base_url, "categorias", e)
+                return []
+            if status >= 400:
+                METRICS.failure(self.name, self.base_url, "categorias", f"http_{status}")
+                return []
+            urls = self.extract_category_urls(_decode_body(body, headers))
+        if not urls: METRICS.failure(self.name, self.base_url, "categorias", "sin_categorias")
+        SCRAPE_CACHE.set_categories(self.base_url, urls)
+        return urls
+
+    async def parse_category_async(self, fetcher: AsyncFetcher, url: str) -> List[Dict]:
+        try:
+            with METRICS.stage("descarga", self.name):
+                status, body, _ = await fetcher.get(url, label=self.name)
+        except Exception as e:
+            METRICS.failure(self.name, url, "descarga", e)
+            return []
+        if status >= 400:
+            METRICS.failure(self.name, url, "descarga", f"http_{status}")
+            return []
+        with METRICS.stage("parseo", self.name):
+            return SCRAPE_CACHE.rows(self, url, body)
+
+    async def stream_async(self, fetcher: Optional[AsyncFetcher] = None) -> AsyncIterator[List[Dict]]:
+        """Como stream() pero con cientos de requests en vuelo sobre un solo hilo: entrega las filas de
+        cada categoría al terminar. Si se pasa `fetcher`, comparte su pool de conexiones con otros sitios."""
+        if fetcher is None:
+            async with AsyncFetcher() as f:
+                async for rows in self.stream_async(f): yield rows
+            return
+        urls = await self.category_urls_async(fetcher)
+        if not urls: return
+        fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        async def una(url):
+            try:
+                return await self.parse_category_async(fetcher, url)
+            except Exception as e:  # igual que el path con threads
+                METRICS.failure(self.name, url, "parseo", e)
+                return []
+        tareas = [asyncio.ensure_future(una(u)) for u in urls]
+        try:
+            for sig in asyncio.as_completed(tareas):
+                rows = await sig
+                for row in rows: row["FechaConsulta"] = fecha
+                if rows: yield rows
+        finally:
+            for t in tareas: t.cancel()
+
+    async def scrape_async(self, fetcher: Optional[AsyncFetcher] = None) -> List[Dict]:
+        return [row async for rows in self.stream_async(fetcher) for row in rows]
+
+class StockScraper(HtmlSiteScraper):
+    HOME_ONLY = _Only("a", href=True)
+    LIST_ONLY = _Only("div", class_=_class_re("product-item"))
+    def __init__(self): super().__init__("stock","https://www.stock.com.py")
+    def extract_category_urls(self, html):
+        doc = _parse_html(html, self.HOME_ONLY)
+        urls = set()
+        for a in _select(doc, 'a[href*="/category/"]'):
+            href = a.get("href","").lower()
+            if any(k in href for k in KEYWORDS_SUPER):
+                urls.add(urljoin(self.base_url, a.get("href")))
+        return list(urls)
+    def extract_rows(self, url, content):
+        doc = _parse_html(content, self.LIST_ONLY)
+        rows=[]
+        for p in _select(doc, "div.product-item"):
+            nm = _select_one(p, "h2.product-title")
+            if nm is None: continue
+            nombre = _text(nm, " ", strip=True)
+            excluido, grupo = ENRICH_CACHE.classify(nombre)
+            if excluido or not grupo: continue
+            precio = _first_price(p, ["span.price-label", "span.price"])
+            rows.append({"Supermercado":"Stock","CategoríaURL":url,
+                         "Producto":nombre.upper(),"Precio":precio,"Grupo":grupo})
+        return rows
+
+class SuperseisScraper(HtmlSiteScraper):
+    HOME_ONLY = _Only("a", href=True)
+    # el precio está en el div.product-item contenedor; los títulos sueltos también cuentan
+    LIST_ONLY = _Only(["div", "a"], class_=_class_re("product-item", "product-title-link"))
+    def __init__(self): super().__init__("superseis","https://www.superseis.com.py")
+    def extract_category_urls(self, html):
+        doc = _parse_html(html, self.HOME_ONLY)
+        urls=set()
+        for a in _select(doc, 'a[href*="/category/"]'):
+            href = a.get("href","").lower()
+            if any(k in href for k in KEYWORDS_SUPER):
+                urls.add(urljoin(self.base_url, a.get("href")))
+        return list(urls)
+    def extract_rows(self, url, content):
+        doc = _parse_html(content, self.LIST_ONLY)
+        rows=[]
+        for a in _select(doc, "a.product-title-link"):
+            nombre = _text(a, " ", strip=True)
+            excluido, grupo = ENRICH_CACHE.classify(nombre)
+            if excluido or not grupo: continue
+            cont = _closest(a, "div.product-item")
+            precio = _first_price(a if cont is None else cont, ["span.price-label","span.price"])
+            rows.append({"Supermercado":"Superseis","CategoríaURL":url,
+                         "Producto":nombre.upper(),"Precio":precio,"Grupo":grupo})
+        return rows
+
+class SalemmaScraper(HtmlSiteScraper):
+    HOME_ONLY = _Only("a", href=True)
+    LIST_ONLY = _Only("form", class_=_class_re("productsListForm"))
+    def __init__(self): super().__init__("salemma","https://www.salemmaonline.com.py")
+    def extract_category_urls(self, html):
+        doc = _parse_html(html, self.HOME_ONLY)
+        urls=set()
+        for a in _select(doc, "a[href]"):
+            href = a.get("href").lower()
+            if any(k in href for k in KEYWORDS_SUPER):
+                urls.add(urljoin(self.base_url, a.get("href")))
+        return list(urls)
+    def extract_rows(self, url, content):
+        doc = _parse_html(content, self.LIST_ONLY)
+        rows=[]
+        for f in _select(doc, "form.productsListForm"):
+            nm = _select_one(f, 'input[name="name"]')
+            nombre = (nm.get("value","") if nm is not None else "").strip()
+            if not nombre: continue
+            excluido, grupo = ENRICH_CACHE.classify(nombre)
+            if excluido or not grupo: continue
+            pr = _select_one(f, 'input[name="price"]')
+            precio = norm_price(pr.get("value","") if pr is not None else "")
+            rows.append({"Supermercado":"Salemma","CategoríaURL":url,
+                         "Producto":nombre.upper(),"Precio":precio,"Grupo":grupo})
+        return rows
+
+class AreteScraper(HtmlSiteScraper):
+    HOME_ONLY = _Only(id=["departments-menu", "menu-departments-menu-1"])
+    LIST_ONLY = _Only("div", class_=_class_re("product"))
+    def __init__(self, name="arete", base="https://www.arete.com.py"): super().__init__(name, base)
+    def extract_category_urls(self, html):
+        doc = _parse_html(html, self.HOME_ONLY)
+        urls=set()
+        for sel in ("#departments-menu","#menu-departments-menu-1"):
+            for a in _select(doc, f'{sel} a[href^="catalogo/"]'):
+                href = a.get("href").split("?")[0].lower()
+                if any(k in href for k in KEYWORDS_SUPER):
+                    urls.add(urljoin(self.base_url+"/", a.get("href")))
+        return list(urls)
+    def extract_rows(self, url, content):
+        doc = _parse_html(content, self.LIST_ONLY)
+        rows=[]
+        for p in _select(doc, "div.product"):
+            nm = _select_one(p, "h2.ecommercepro-loop-product__title")
+            if nm is None: continue
+            nombre = _text(nm, " ", strip=True)
+            excluido, grupo = ENRICH_CACHE.classify(nombre)
+            if excluido or not grupo: continue
+            precio = _first_price(p)
+            rows.append({"Supermercado":"Arete","CategoríaURL":url,
+                         "Producto":nombre.upper(),"Precio":precio,"Grupo":grupo})
+        return rows
+
+class JardinesScraper(AreteScraper):
+    def __init__(self): super().__init__("losjardines", "https://losjardinesonline.com.py")
+
+# Biggie API
+def _done(valor) -> Future:
+    """Future ya resuelto (la primera página de cada grupo de Biggie se pide antes que el resto)."""
+    f: Future = Future()
+    f.set_result(valor)
+    return f
+
+class BiggieScraper:
+    """
+    API JSON paginada por `skip`/`take`. Se pide la primera página de cada grupo para conocer
+    `count` y el resto de las páginas de todos los grupos va en paralelo (BIGGIE_WORKERS en
+    vuelo). Las filas se arman en orden de página con el mismo corte que el recorrido
+    secuencial: primera página fallida o `skip >= count`.
+    """
+    name, API = "biggie","https://api.app.biggie.com.py/api/articles"
+    TAKE, WORKERS = BIGGIE_TAKE, BIGGIE_WORKERS
+    GROUPS = ["carniceria","panaderia","huevos","lacteos"]
+    sessions = SessionPool(BIGGIE_WORKERS, label="biggie")  # compartido por instancias, seguro entre hilos
+
+    def fetch_page(self, grp, skip) -> Optional[dict]:
+        try:
+            with METRICS.stage("descarga", self.name), self.sessions.session() as s:
+                r = s.get(self.API, params=dict(
+                    take=self.TAKE, skip=skip, classificationName=grp
+                ), timeout=REQ_TIMEOUT)
+                r.raise_for_status()  # un 5xx con cuerpo JSON no es "grupo vacío"
+                return r.json()
+        except Exception as e:
+            METRICS.failure(self.name, f"{grp}?skip={skip}", "descarga", e)
+            return None
+
+    def page_rows(self, grp, js) -> List[Dict]:
+        rows = []
+        for it in js.get("items", []):
+            nombre = it.get("name", "")
+            excluido, grupo = ENRICH_CACHE.classify(nombre)
+            if excluido: continue
+            grupo = grupo or grp.capitalize()
+            rows.append({"Supermercado":"Biggie","CategoríaURL":grp,
+                         "Producto":nombre.upper(),
+                         "Precio":norm_price(it.get("price",0)),
+                         "Grupo":grupo})
+        return rows
+
+    def fetch_group(self, grp, pages: Optional[Dict[int, Future]] = None) -> Iterator[Dict]:
+        """Filas del grupo página por página; `pages` (skip → Future del JSON, None si falló) trae
+        las ya pedidas y las que falten se piden acá. Cada página se suelta al convertirla en filas."""
+        pages = pages or {}
+        skip = 0
+        while True:
+            js = pages.pop(skip).result() if skip in pages else self.fetch_page(grp, skip)
+            if js is None: break
+            with METRICS.stage("parseo", self.name):
+                rows = self.page_rows(grp, js)
+            yield from rows
+            skip += self.TAKE
+            if skip >= js.get("count", 0): break
+
+    def _remaining_skips(self, js) -> range:
+        try:
+            return range(self.TAKE, int(js.get("count", 0) or 0), self.TAKE)
+        except (AttributeError, TypeError, ValueError):
+            return range(0)  # respuesta rara: fetch_group la trata igual que el recorrido secuencial
+
+    def stream(self) -> Iterator[Dict]:
+        """Filas en orden de grupo y página; cada página se entrega apenas llega (el resto sigue bajando)."""
+        fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            primeras = list(pool.map(lambda g: self.fetch_page(g, 0), self.GROUPS))
+            pages: Dict[str, Dict[int, Future]] = {}
+            for g, js in zip(self.GROUPS, primeras):
+                pages[g] = {0: _done(js)}
+                if js is not None:
+                    pages[g].update((skip, pool.submit(self.fetch_page, g, skip)) for skip in self._remaining_skips(js))
+            try:
+                for g in self.GROUPS:
+                    for item in self.fetch_group(g, pages[g]):
+                        item["FechaConsulta"] = fecha
+                        yield item
+            finally:  # el consumidor cortó antes: no se bajan las páginas que faltan
+                for f in itertools.chain.from_iterable(p.values() for p in pages.values()): f.cancel()
+
+    def scrape(self) -> List[Dict]:
+        return list(self.stream())
+
+    def csv_name(self) -> str:
+        return f"biggie_canasta_{datetime.now():%Y%m%d_%H%M%S}.csv"
+
+# ───────── 8) Gestor de sitios ─────────
+SCRAPERS: Dict[str, Callable] = {
+    "stock":StockScraper, "superseis":SuperseisScraper, "salemma":SalemmaScraper,
+    "arete":AreteScraper, "losjardines":JardinesScraper, "biggie":BiggieScraper
+}
+FLAGS = ("--full-rebuild", "--reprocess", "--dry-run")
+COMANDOS = ("scrape", "ingest", "all")
+
+def _parse_args(argv=None):
+    if argv is None: return "all", list(SCRAPERS), set()
+    if any(a in ("-h","--help") for a in argv):
+        print("Uso: python pipeline_ingesta.py [scrape|ingest|all] [sitio1 sitio2 …] [--full-rebuild] [--reprocess] [--dry-run]\n"
+              "  scrape          sólo scrapea los sitios y escribe sus CSV diarios (sin pandas ni Sheets)\n"
+              "  ingest          sólo ingiere los CSV pendientes del manifiesto (de uno o varios scrape)\n"
+              "  all             scrape + ingesta en el mismo proceso (por defecto)\n"
+              "  --full-rebuild  relee toda la hoja, de-duplica y la reescribe completa\n"
+              "                  (por defecto sólo se agregan al final las filas nuevas)\n"
+              "  --reprocess     re-enriquece todos los CSV (compactados y sueltos) con las reglas\n"
+              "                  vigentes y reemplaza esas filas en el histórico y la hoja\n"
+              "  --dry-run       no escribe en Sheets: imprime el plan (tamaño, rango, requests) y las\n"
+              "                  celdas proyectadas del libro (= SHEETS_DRY_RUN=1)"); sys.exit(0)
+    comando = next((a for a in argv if a in COMANDOS), "all")
+    flags = {a for a in argv if a in FLAGS}
+    sel = [a for a in argv if a in SCRAPERS]
+    return comando, (sel or list(SCRAPERS)), flags
+
+# ───────── 9) Ingesta a Sheets ─────────
+# Columnas de texto muy repetidas: en la consolidación viajan como category (diccionario + códigos)
+DICT_COLS = ["Supermercado", "CategoríaURL", "Grupo", "Subgrupo", "Unidad", "unidad_corregido", "etiquetaunidad"]
+
+def _compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    conv = {c: "category" for c in DICT_COLS if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype)}
+    return df.astype(conv) if conv else df
+
+def _map_unique(s: pd.Series, fn: Callable) -> pd.Series:
+    """fn aplicada una vez por valor distinto (no por fila); nulos → "". Resultado categórico."""
+    codes, uniq = pd.factorize(s)
+    vals = np.array([fn(v) for v in uniq] + [""], dtype=object)
+    codes2, cats = pd.factorize(vals)
+    return pd.Series(pd.Categorical.from_codes(codes2[np.where(codes < 0, len(uniq), codes)], categories=cats),
+                     index=s.index)
+
+def _day_keys(fechas: pd.Series) -> pd.Categorical:
+    """Fechas → 'YYYY-MM-DD' categórica: un strftime por día distinto, no por fila (NaT → NaN)."""
+    codes, dias = pd.factorize(fechas.to_numpy("datetime64[D]"))
+    return pd.Categorical.from_codes(codes, categories=np.datetime_as_string(np.asarray(dias, "datetime64[D]"), unit="D"))
+
+def _parse_fecha(s: pd.Series) -> pd.Series:
+    """ISO (con o sin hora) en modo vectorizado; el resto (p.ej. '17/10/2026' de Sheets) uno a uno."""
+    d = pd.to_datetime(s, format="ISO8601", errors="coerce")
+    miss = d.isna() & s.notna()
+    if miss.any():
+        d[miss] = pd.to_datetime(s[miss], format="mixed", dayfirst=True, errors="coerce")
+    return d
+
+@_timed("dedupe")
+def _finalize_base(base: pd.DataFrame) -> pd.DataFrame:
+    """
+    Orden por fecha, clave diaria, de-duplicación por KEY_COLS y redondeos (sin ID).
+    No modifica `base`: devuelve un frame nuevo y compacto (DICT_COLS y FechaConsulta
+    'YYYY-MM-DD' categóricas) con una sola copia de las filas que sobreviven.
+    """
+    fechas = _parse_fecha(base["FechaConsulta"])
+    base = base.drop(columns=["ID"], errors="ignore")
+    base["FechaConsulta"] = _day_keys(fechas)  # clave por día: sólo la fecha (no hora)
+
+    # Garantiza claves
+    for k in KEY_COLS:
+        if k not in base.columns:
+            base[k] = ""
+
+    # Orden estable por fecha/hora (ante igual fecha/hora gana lo que ya estaba en la hoja) y
+    # de-duplicación por el hash 64-bit de KEY_COLS en vez de comparar cuatro columnas de texto
+    orden = np.argsort(fechas.to_numpy("datetime64[ns]"), kind="stable")
+    orden = orden[~pd.Series(_key_hashes(base)[orden]).duplicated().to_numpy()]
+    base = _compact_frame(base.take(orden))
+
+    # Redondeos amables
+    base["Precio"] = pd.to_numeric(base["Precio"], errors="coerce").round(2)
+    base["cantidad_unidades"] = pd.to_numeric(base["cantidad_unidades"], errors="coerce").round(3)
+    base["precio_unidad"] = pd.to_numeric(base["precio_unidad"], errors="coerce").round(3)
+    return base
+
+def _key_hashes(df: pd.DataFrame, cols: List[str] = KEY_COLS) -> np.ndarray:
+    """
+    Hash 64-bit estable de `cols` (KEY_COLS, con FechaConsulta ya normalizada a YYYY-MM-DD).
+    Cada columna se hashea como diccionario (texto de los valores distintos + códigos):
+    mismo resultado que hashear el texto fila por fila, sin materializarlo.
+    """
+    vacia = pd.Series("", index=df.index, dtype=object)
+    k = pd.DataFrame({c: _map_unique(df[c] if c in df.columns else vacia, str) for c in cols})
+    return pd.util.hash_pandas_object(k, index=False).to_numpy(np.uint64)
+
+class SheetKeyIndex:
+    """
+    Índice local de lo que ya está en la hoja: hashes de KEY_COLS, nº de filas de datos y último ID.
+    Se persiste en OUT_DIR (KEY_INDEX_PATH .npy + .json). Si falta o no coincide con la hoja
+    (runner nuevo, edición manual), se reconstruye leyendo sólo las columnas clave.
+    """
+    def __init__(self, keys: np.ndarray, rows: int, last_id: int):
+        self.keys = np.unique(np.asarray(keys, dtype=np.uint64))
+        self.rows, self.last_id = int(rows), int(last_id)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        return np.isin(hashes, self.keys, assume_unique=False)
+
+    def add(self, hashes: np.ndarray, last_id: int):
+        self.keys = np.union1d(self.keys, np.asarray(hashes, dtype=np.uint64))
+        self.rows += len(hashes)
+        self.last_id = int(last_id)
+
+    def save(self, path: Optional[str] = None):
+        if SHEETS_DRY_RUN:  # la hoja no se escribió: el índice tampoco cambia
+            return
+        path = path or KEY_INDEX_PATH
+        np.save(path + ".npy", self.keys)
+        with open(path + ".json", "w", encoding="utf-8") as fh:
+            json.dump({"spreadsheet": SPREADSHEET_URL, "worksheet": WORKSHEET_NAME,
+                       "rows": self.rows, "last_id": self.last_id}, fh)
+        try: os.remove(DELTA_INDEX_PATH)  # la hoja es diaria: el estado de intervalos (SHEET_DELTA) ya no vale
+        except OSError: pass
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> Optional["SheetKeyIndex"]:
+        path = path or KEY_INDEX_PATH
+        try:
+            with open(path + ".json", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            if (meta.get("spreadsheet"), meta.get("worksheet")) != (SPREADSHEET_URL, WORKSHEET_NAME):
+                return None
+            return cls(np.load(path + ".npy"), meta["rows"], meta["last_id"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @classmethod
+    def from_frame(cls, base: pd.DataFrame) -> "SheetKeyIndex":
+        ids = pd.to_numeric(base["ID"], errors="coerce") if "ID" in base.columns else pd.Series(dtype=float)
+        return cls(_key_hashes(base), len(base), int(ids.max()) if ids.notna().any() else len(base))
+
+    @classmethod
+    @_timed("lectura_sheets")
+    def from_sheet(cls, ws: gspread.Worksheet) -> Optional["SheetKeyIndex"]:
+        """Lee sólo ID + KEY_COLS. None si la hoja no tiene el layout de TARGET_COLS (⇒ rebuild)."""
+        header = ws.row_values(1)
+        if not header:
+            return cls(np.empty(0, np.uint64), 0, 0)
+        if header[:len(TARGET_COLS)] != TARGET_COLS:
+            return None
+        cols = ["ID"] + KEY_COLS
+        letters = [gspread.utils.rowcol_to_a1(1, header.index(c) + 1)[:-1] for c in cols]
+        resp = ws.spreadsheet.values_batch_get(
+            [f"'{ws.title}'!{L}2:{L}" for L in letters],
+            params={"valueRenderOption": "FORMULA", "dateTimeRenderOption": "FORMATTED_STRING"},
+        )
+        vals = [[r[0] if r else None for r in vr.get("values", [])] for vr in resp.get("valueRanges", [])]
+        n = max((len(v) for v in vals), default=0)
+        df = pd.DataFrame({c: pd.Series(v + [None] * (n - len(v)), dtype=object) for c, v in zip(cols, vals)})
+        df = df.replace("", None)
+        df["FechaConsulta"] = _day_keys(_parse_fecha(df["FechaConsulta"]))
+        return cls.from_frame(df)
+
+    @_timed("lectura_sheets")
+    def matches(self, ws: gspread.Worksheet) -> bool:
+        """Chequeo barato (1 request): la última fila de datos tiene last_id y la siguiente está vacía."""
+        got = ws.get(f"A{self.rows + 1}:A{self.rows + 2}", value_render_option="UNFORMATTED_VALUE")
+        if len(got) != 1 or not got[0]:
+            return False
+        if self.rows == 0:
+            return str(got[0][0]) == "ID"
+        try:
+            return float(got[0][0]) == float(self.last_id)
+        except (TypeError, ValueError):
+            return False
+
+def _prepare_new(df_all: pd.DataFrame) -> pd.DataFrame:
+    """TARGET_COLS (las que falten, NaN) con DICT_COLS categóricas."""
+    return _compact_frame(df_all.reindex(columns=TARGET_COLS))
+
+def _ingest_full(sh: gspread.Spreadsheet, ws: gspread.Worksheet, df_new: pd.DataFrame,
+                 prefer_new: bool = False, drop: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Camino clásico: lee todo el histórico, concatena, de-duplica, renumera ID y reescribe.
+    Ante claves repetidas gana la hoja; con prefer_new (--reprocess) gana el lote y se
+    quitan las claves de `drop`.
+    """
+    df_prev = _read_history(ws)
+    for c in TARGET_COLS:
+        if c not in df_prev.columns: df_prev[c] = np.nan
+
+    if prefer_new:
+        nuevo = _finalize_base(df_new)
+        prev = _finalize_base(df_prev[TARGET_COLS])
+        fuera = np.concatenate([_key_hashes(nuevo), _key_hashes(drop) if drop is not None else np.empty(0, np.uint64)])
+        base = pd.concat([prev[~np.isin(_key_hashes(prev), fuera)], nuevo], ignore_index=True, sort=False)
+        base.sort_values("FechaConsulta", kind="mergesort", inplace=True)
+    else:
+        base = pd.concat([df_prev[TARGET_COLS], df_new], ignore_index=True, sort=False)
+        base = _finalize_base(base)
+
+    # ID secuencial
+    base.insert(0, "ID", range(1, len(base) + 1))
+
+    # --- Escritura robusta (sin exceder 10M celdas) ---
+    written = _write_sheet(ws, sh, base[TARGET_COLS])
+    SheetKeyIndex.from_frame(written if written is not None else base).save()
+    return base
+
+def _load_sheet_index(ws: gspread.Worksheet) -> Optional[SheetKeyIndex]:
+    idx = SheetKeyIndex.load()
+    if idx is None or not idx.matches(ws):
+        print("[Sheets] Índice de claves ausente o desactualizado → reconstruyendo desde la hoja (sólo columnas clave)")
+        idx = SheetKeyIndex.from_sheet(ws)
+        if idx is None:
+            print("[Sheets] Encabezados distintos a TARGET_COLS → se hará reconstrucción completa")
+    return idx
+
+def _append_rows(sh: gspread.Spreadsheet, ws: gspread.Worksheet, idx: SheetKeyIndex,
+                 nuevos: pd.DataFrame, hashes: np.ndarray) -> bool:
+    """Escribe `nuevos` (ya con ID) debajo de la última fila. False si no entra sin pasar el límite."""
+    if nuevos.empty:
+        idx.save()
+        return True
+    values = _df_to_values(nuevos[TARGET_COLS])
+    start = idx.rows + 2
+    if idx.rows == 0:
+        values, start = [TARGET_COLS] + values, 1
+    planner = SheetsPlanner.of(sh)
+    plan = planner.plan_append(ws, start, values, len(TARGET_COLS))
+    if plan is None:
+        return False
+    planner.execute(plan)
+
+    idx.add(hashes, int(nuevos["ID"].max()))
+    idx.save()
+    return True
+
+def _ingest_incremental(sh: gspread.Spreadsheet, ws: gspread.Worksheet, df_new: pd.DataFrame) -> Optional[int]:
+    """
+    Agrega al final sólo las filas cuya clave no está en la hoja; los ID siguen desde el último.
+    Devuelve cuántas filas agregó, o None si hace falta --full-rebuild (layout distinto o sin lugar).
+    """
+    idx = _load_sheet_index(ws)
+    if idx is None:
+        return None
+
+    nuevos = _finalize_base(df_new)  # no modifica df_new
+    hashes = _key_hashes(nuevos)
+    keep = ~idx.contains(hashes)
+    nuevos, hashes = nuevos[keep], hashes[keep]
+    nuevos.insert(0, "ID", range(idx.last_id + 1, idx.last_id + 1 + len(nuevos)))
+    return len(nuevos) if _append_rows(sh, ws, idx, nuevos, hashes) else None
+
+# ───────── 10) Histórico local (Parquet) ─────────
+class HistoryStore:
+    """
+    Histórico completo en Parquet (zstd, tipado), particionado estilo Hive:
+        HISTORY_DIR/fecha=YYYY-MM-DD/supermercado=<Nombre>/part-<run>-<i>.parquet
+    Como KEY_COLS incluye el día, de-duplicar un lote sólo lee las particiones
+    de los días presentes en ese lote, sin importar el tamaño del histórico.
+    Con SHEETS_DRY_RUN lo que se escribe queda en memoria (las lecturas lo ven igual)
+    y el disco no cambia: ni particiones ni _meta.json (last_id).
+    """
+    SCHEMA = PARTITION = None  # esquemas de Arrow: se arman en el primer HistoryStore (pyarrow es diferido)
+
+    @classmethod
+    def _schemas(cls):
+        if cls.SCHEMA is not None: return
+        cls.SCHEMA = pa.schema([
+            ("ID", pa.int64()), ("Supermercado", pa.string()), ("Producto", pa.string()),
+            ("Precio", pa.float64()), ("Unidad", pa.string()), ("Grupo", pa.string()),
+            ("Subgrupo", pa.string()), ("FechaConsulta", pa.date32()),
+            ("unidad_corregido", pa.string()), ("etiquetaunidad", pa.string()),
+            ("cantidad_unidades", pa.float64()), ("precio_unidad", pa.float64()),
+            ("CategoríaURL", pa.string()),
+        ])
+        cls.PARTITION = pa.schema([("fecha", pa.string()), ("supermercado", pa.string())])
+
+    def __init__(self, root: Optional[str] = None):
+        if pa is None:
+            raise RuntimeError("El histórico local requiere 'pyarrow' (pip install pyarrow)")
+        self._schemas()
+        self.root = root or HISTORY_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self._meta_path = os.path.join(self.root, "_meta.json")
+        self.dry_run = SHEETS_DRY_RUN
+        self._overlay: List = []      # dry-run: tablas de Arrow escritas en esta corrida
+        self._hidden: Set[str] = set()  # dry-run: días del disco que replace() reescribió en memoria
+        self._meta = self._load_meta()
+
+    # --- metadatos ---
+    def _load_meta(self) -> Dict[str, int]:
+        try:
+            with open(self._meta_path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            pass
+        ids = self._scan(columns=["ID"])["ID"]
+        return {"last_id": int(ids.max()) if len(ids) else 0, "rows": int(len(ids))}
+
+    def _save_meta(self):
+        if self.dry_run: return
+        with open(self._meta_path, "w", encoding="utf-8") as fh:
+            json.dump(self._meta, fh)
+
+    @property
+    def last_id(self) -> int: return int(self._meta["last_id"])
+    @property
+    def rows(self) -> int: return int(self._meta["rows"])
+    @property
+    def empty(self) -> bool: return self.rows == 0
+
+    # --- lectura ---
+    def _dataset(self):
+        part = pa_ds.partitioning(self.PARTITION, flavor="hive")
+        return pa_ds.dataset(self.root, schema=pa.unify_schemas([self.SCHEMA, self.PARTITION]),
+                             format="parquet", partitioning=part)
+
+    def _scan(self, columns: Optional[List[str]] = None, filter=None) -> pd.DataFrame:
+        columns, disco = columns or TARGET_COLS, filter
+        if self._hidden:
+            oculto = ~pa_ds.field("fecha").isin(sorted(self._hidden))
+            disco = oculto if filter is None else (filter & oculto)
+        tbl = self._dataset().to_table(columns=columns, filter=disco)
+        if self._overlay:
+            tbl = pa.concat_tables([tbl, pa_ds.dataset(self._overlay).to_table(columns=columns, filter=filter)])
+        df = tbl.to_pandas(date_as_object=False)
+        if "FechaConsulta" in df.columns:
+            df["FechaConsulta"] = pd.to_datetime(df["FechaConsulta"]).dt.strftime("%Y-%m-%d")
+        return df
+
+    def read(self, since: Optional[str] = None, until: Optional[str] = None,
+             supermercados: Optional[List[str]] = None, columns: Optional[List[str]] = None,
+             after_id: Optional[int] = None) -> pd.DataFrame:
+        """Consulta por rango de días (YYYY-MM-DD, inclusivo), supermercados e ID > after_id; poda particiones."""
+        f = None
+        def _and(a, b): return b if a is None else (a & b)
+        if since: f = _and(f, pa_ds.field("fecha") >= since)
+        if until: f = _and(f, pa_ds.field("fecha") <= until)
+        if supermercados: f = _and(f, pa_ds.field("supermercado").isin(list(supermercados)))
+        if after_id is not None: f = _and(f, pa_ds.field("ID") > after_id)
+        df = self._scan(columns=columns, filter=f)
+        if "ID" in df.columns:
+            df = df.sort_values("ID", kind="mergesort").reset_index(drop=True)
+        return df
+
+    def existing_keys(self, days: List[str]) -> np.ndarray:
+        if not days or self.empty:
+            return np.empty(0, np.uint64)
+        return _key_hashes(self._scan(columns=KEY_COLS, filter=pa_ds.field("fecha").isin(days)))
+
+    # --- escritura ---
+    def _write(self, df: pd.DataFrame):
+        if df.empty: return
+        df = df.reindex(columns=TARGET_COLS)
+        cols = {}
+        for f in self.SCHEMA:
+            col = df[f.name]
+            if pa.types.is_date32(f.type):
+                col = pd.to_datetime(col, format="%Y-%m-%d", errors="coerce").to_numpy("datetime64[D]")
+            elif pa.types.is_floating(f.type) or pa.types.is_integer(f.type):
+                col = pd.to_numeric(col, errors="coerce")
+            else:
+                col = col.astype(object).where(col.notna(), None).map(lambda v: v if v is None else str(v))
+            cols[f.name] = pa.array(col, type=f.type, from_pandas=True)
+        cols["fecha"] = pa.array(df["FechaConsulta"].astype(str).tolist(), pa.string())
+        cols["supermercado"] = pa.array(df["Supermercado"].astype(object).fillna("").astype(str).tolist(), pa.string())
+        tbl = pa.table(cols)
+        if self.dry_run:
+            self._overlay.append(tbl)
+        else:
+            run = f"{datetime.now():%Y%m%d_%H%M%S}-{os.urandom(4).hex()}"
+            pa_ds.write_dataset(
+                tbl, self.root, format="parquet",
+                partitioning=pa_ds.partitioning(self.PARTITION, flavor="hive"),
+                basename_template=f"part-{run}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+                file_options=pa_ds.ParquetFileFormat().make_write_options(compression="zstd"),
+            )
+        self._meta["rows"] = self.rows + len(df)
+        self._meta["last_id"] = max(self.last_id, int(pd.to_numeric(df["ID"]).max()))
+        self._save_meta()
+
+    @_timed("historico")
+    def append(self, base: pd.DataFrame) -> pd.DataFrame:
+        """
+        `base` viene de _finalize_base (fecha diaria, sin ID). Guarda sólo las claves que
+        no existían, con ID continuando desde last_id, y devuelve esas filas.
+        """
+        base = base[base["FechaConsulta"].notna()]
+        hashes = _key_hashes(base)
+        existing = self.existing_keys(base["FechaConsulta"].unique().tolist())
+        nuevos = base[~np.isin(hashes, existing)].copy()
+        nuevos.insert(0, "ID", range(self.last_id + 1, self.last_id + 1 + len(nuevos)))
+        self._write(nuevos)
+        return nuevos
+
+    @_timed("historico")
+    def seed(self, df_prev: pd.DataFrame):
+        """Carga inicial desde la hoja existente, conservando sus ID."""
+        ids = pd.to_numeric(df_prev.get("ID"), errors="coerce")
+        base = _finalize_base(df_prev.reindex(columns=TARGET_COLS))
+        base = base[base["FechaConsulta"].notna()]
+        ids = ids.loc[base.index] if ids is not None else None
+        if ids is None or ids.isna().any() or ids.duplicated().any():
+            ids = pd.Series(range(1, len(base) + 1), index=base.index)
+        base.insert(0, "ID", ids.astype("int64"))
+        self._write(base.sort_values("ID", kind="mergesort"))
+
+    @_timed("historico")
+    def replace(self, base: pd.DataFrame, drop: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Reprocesamiento (--reprocess): reescribe los días presentes en `base` con sus filas.
+        Las claves que ya estaban conservan su ID, las nuevas siguen desde last_id, las de
+        `drop` (ahora excluidas) se borran y el resto del store (p.ej. cargado desde la hoja)
+        queda como estaba.
+        """
+        base = base[base["FechaConsulta"].notna()].copy()
+        drop = drop if drop is not None else base.iloc[0:0]
+        days = sorted(set(base["FechaConsulta"]) | set(drop["FechaConsulta"].dropna()))
+        if not days: return base
+        prev = (self._scan(columns=TARGET_COLS, filter=pa_ds.field("fecha").isin(days))
+                if not self.empty else pd.DataFrame(columns=TARGET_COLS))
+        n_prev = len(prev)  # todas las filas de esos días salen del store, duplicadas o no
+        # Un replace cortado deja claves duplicadas en esos días: queda la de menor ID
+        prev = prev.sort_values("ID", kind="mergesort")
+        h_prev, h_new = _key_hashes(prev), _key_hashes(base)
+        unicas = ~pd.Series(h_prev).duplicated().to_numpy()
+        prev, h_prev = prev[unicas], h_prev[unicas]
+        pos = pd.Index(h_prev).get_indexer(h_new)
+        ids = np.empty(len(base), np.int64)
+        ids[pos >= 0] = prev["ID"].to_numpy(np.int64)[pos[pos >= 0]]
+        ids[pos < 0] = np.arange(self.last_id + 1, self.last_id + 1 + int((pos < 0).sum()))
+        base.insert(0, "ID", ids)
+        viejos = [f for d in days
+                  for f in glob.glob(os.path.join(self.root, f"fecha={d}", "**", "*.parquet"), recursive=True)]
+        self._meta["rows"] = self.rows - n_prev
+        resto = prev[~np.isin(h_prev, np.concatenate([h_new, _key_hashes(drop)]))]
+        if self.dry_run:  # lo previo de esos días (disco u overlay) deja de verse; el disco queda igual
+            self._hidden.update(days)
+            fuera = ~pa_ds.field("fecha").isin(days)
+            self._overlay = [pa_ds.dataset(t).to_table(filter=fuera) for t in self._overlay]
+            viejos = []
+        self._write(pd.concat([resto, base[TARGET_COLS]], ignore_index=True).sort_values("ID", kind="mergesort"))
+        for f in viejos:  # después de escribir: un corte a mitad deja duplicados, no huecos
+            os.remove(f)
+        return base
+
+def _sheet_projection(sh: gspread.Spreadsheet, ws: gspread.Worksheet, store: HistoryStore) -> pd.DataFrame:
+    """Últimos SHEET_WINDOW_DAYS días del histórico (en intervalos con SHEET_DELTA), recortado por días
+    completos (de FechaConsulta, o de valid_to) si no entra en el libro."""
+    since = None
+    if SHEET_WINDOW_DAYS > 0:
+        since = (datetime.now() - timedelta(days=SHEET_WINDOW_DAYS)).strftime("%Y-%m-%d")
+    df = store.read(since=since)
+    cols, dia = TARGET_COLS, "FechaConsulta"
+    if SHEET_DELTA:
+        df, cols, dia = encode_intervals(df), DELTA_COLS, "valid_to"
+
+    planner = SheetsPlanner.of(sh)
+    others = planner.total_cells - planner.cells(ws.title)
+    max_rows = max((SHEETS_CELL_LIMIT - others) // len(cols) - 1, 0)
+    if len(df) > max_rows:
+        por_dia = df.groupby(dia).size().sort_index(ascending=False).cumsum()
+        dias = por_dia[por_dia <= max_rows].index
+        print(f"[Sheets] Proyección limitada a {len(dias)} días ({por_dia[por_dia <= max_rows].max() if len(dias) else 0} filas) "
+              f"para no superar {SHEETS_CELL_LIMIT:,} celdas; el histórico completo sigue en {store.root}")
+        df = df[df[dia].isin(dias)].reset_index(drop=True)
+    return df
+
+# --- Hoja en intervalos (SHEET_DELTA) ---
+_DELTA_VALUE_COLS = [c for c in TARGET_COLS if c not in DELTA_KEY_COLS + ["ID", "FechaConsulta"]]
+
+def encode_intervals(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vista diaria (TARGET_COLS, FechaConsulta 'YYYY-MM-DD') → intervalos (DELTA_COLS): una fila por
+    tramo de días consecutivos en que un producto mantuvo todos sus valores, con los del primer día
+    (también su ID) y valid_from/valid_to. Orden (valid_to, ID): los vigentes quedan al final.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=DELTA_COLS)
+    dia = pd.to_datetime(df["FechaConsulta"].astype(str), format="%Y-%m-%d").to_numpy("datetime64[D]")
+    clave, valores = _key_hashes(df, DELTA_KEY_COLS), _key_hashes(df, _DELTA_VALUE_COLS)
+    orden = np.lexsort((dia, clave))
+    c, v, d = clave[orden], valores[orden], dia[orden]
+    corte = np.ones(len(orden), bool)  # arranca un tramo: otro producto, otros valores o un día salteado
+    corte[1:] = (c[1:] != c[:-1]) | (v[1:] != v[:-1]) | (d[1:] - d[:-1] != np.timedelta64(1, "D"))
+    inicio = np.flatnonzero(corte)
+    fin = np.r_[inicio[1:], len(orden)] - 1
+    out = df.iloc[orden[inicio]].reset_index(drop=True)
+    out["valid_from"] = np.datetime_as_string(d[inicio], unit="D")
+    out["valid_to"] = np.datetime_as_string(d[fin], unit="D")
+    return out.reindex(columns=DELTA_COLS).sort_values(["valid_to", "ID"], kind="mergesort", ignore_index=True)
+
+def expand_intervals(df: pd.DataFrame, since: Optional[str] = None, until: Optional[str] = None) -> pd.DataFrame:
+    """
+    Inversa de encode_intervals: una fila (TARGET_COLS) por día de [valid_from, valid_to], ordenadas
+    por día e ID; el ID es el del intervalo en todos sus días. since/until ('YYYY-MM-DD', inclusive)
+    acotan los días sin expandir el resto. Acepta las fechas como las devuelve Sheets.
+    """
+    desde = _parse_fecha(df["valid_from"]).to_numpy("datetime64[D]")
+    hasta = _parse_fecha(df["valid_to"]).to_numpy("datetime64[D]")
+    if since: desde = np.maximum(desde, np.datetime64(since, "D"))
+    if until: hasta = np.minimum(hasta, np.datetime64(until, "D"))
+    n = np.where(np.isnat(desde) | np.isnat(hasta), 0, (hasta - desde).astype(np.int64) + 1).clip(0)
+    fila = np.repeat(np.arange(len(df)), n)
+    dias = desde[fila] + (np.arange(len(fila)) - np.repeat(np.cumsum(n) - n, n)).astype("timedelta64[D]")
+    ids = pd.to_numeric(df["ID"], errors="coerce").to_numpy(float)[fila]
+    orden = np.lexsort((ids, dias))
+    out = df.iloc[fila[orden]].drop(columns=["valid_from", "valid_to"]).reset_index(drop=True)
+    out["FechaConsulta"] = _day_keys(pd.Series(dias[orden]))
+    return out.reindex(columns=TARGET_COLS)
+
+class DeltaSheetIndex:
+    """
+    Estado local de la hoja en intervalos: filas de datos, ID de la última fila, último ID del
+    histórico ya proyectado, último día (`hasta`) y los intervalos vigentes (valid_to == hasta), que
+    son el bloque final de la hoja. Se persiste en DELTA_INDEX_PATH; reemplaza al índice de claves
+    (uno u otro según el formato de la hoja, nunca los dos).
+    """
+    def __init__(self, rows: int, last_id: int, store_id: int, hasta: str, vigentes: pd.DataFrame):
+        self.rows, self.last_id, self.store_id, self.hasta = int(rows), int(last_id), int(store_id), hasta
+        self.vigentes = vigentes.reset_index(drop=True)
+
+    matches = SheetKeyIndex.matches  # mismo chequeo barato: última fila con last_id y la siguiente vacía
+
+    def save(self):
+        if SHEETS_DRY_RUN: return
+        with open(DELTA_INDEX_PATH + ".tmp", "wb") as fh:
+            pickle.dump({"spreadsheet": SPREADSHEET_URL, "worksheet": WORKSHEET_NAME, "rows": self.rows,
+                         "last_id": self.last_id, "store_id": self.store_id, "hasta": self.hasta,
+                         "vigentes": self.vigentes}, fh)
+        os.replace(DELTA_INDEX_PATH + ".tmp", DELTA_INDEX_PATH)
+        for ext in (".npy", ".json"):  # el índice de claves describe la hoja diaria: ya no vale
+            try: os.remove(KEY_INDEX_PATH + ext)
+            except OSError: pass
+
+    @classmethod
+    def load(cls) -> Optional["DeltaSheetIndex"]:
+        try:
+            with open(DELTA_INDEX_PATH, "rb") as fh:
+                st = pickle.load(fh)
+            if (st["spreadsheet"], st["worksheet"]) != (SPREADSHEET_URL, WORKSHEET_NAME):
+                return None
+            return cls(st["rows"], st["last_id"], st["store_id"], st["hasta"], st["vigentes"])
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+            return None
+
+    @classmethod
+    def from_frame(cls, intervalos: pd.DataFrame, store_id: int) -> "DeltaSheetIndex":
+        if intervalos.empty:
+            return cls(0, 0, store_id, "", pd.DataFrame(columns=DELTA_COLS))
+        hasta = str(intervalos["valid_to"].max())
+        return cls(len(intervalos), int(intervalos["ID"].iloc[-1]), store_id, hasta,
+                   intervalos[intervalos["valid_to"] == hasta][DELTA_COLS])
+
+def _append_intervals(sh: gspread.Spreadsheet, ws: gspread.Worksheet, idx: DeltaSheetIndex,
+                      nuevos: pd.DataFrame, store_id: int) -> bool:
+    """
+    Días nuevos (filas diarias recién guardadas en el histórico, con ID) sobre la hoja en intervalos.
+    Sólo se reescribe desde el bloque de vigentes: los que siguen al día siguiente con los mismos
+    valores se extienden (mismo ID y valid_from), el resto queda cerrado en su lugar y los tramos
+    nuevos van detrás, en el mismo orden que daría regenerar. False si el lote trae días no posteriores
+    a `hasta` o no entra sin pasar el límite (⇒ se regenera).
+    """
+    if nuevos.empty:
+        idx.store_id = store_id
+        idx.save()
+        return True
+    nuevos = encode_intervals(nuevos)
+    if idx.hasta and nuevos["valid_from"].min() <= idx.hasta:
+        return False
+    vig = idx.vigentes
+    if len(vig):
+        siguiente = str(np.datetime64(idx.hasta, "D") + 1)
+        cols = DELTA_KEY_COLS + _DELTA_VALUE_COLS
+        pos = pd.Index(_key_hashes(vig, cols)).get_indexer(_key_hashes(nuevos, cols))
+        sigue = (pos >= 0) & (nuevos["valid_from"] == siguiente).to_numpy()
+        for c in ("ID", "valid_from"):
+            nuevos.loc[sigue, c] = vig[c].astype(nuevos[c].dtype).to_numpy()[pos[sigue]]
+        cerrados = vig.drop(index=pos[sigue])
+        nuevos = pd.concat([cerrados, nuevos], ignore_index=True).sort_values(["valid_to", "ID"], kind="mergesort",
+                                                                              ignore_index=True)
+    values = _df_to_values(nuevos[DELTA_COLS])
+    start = idx.rows - len(vig) + 2
+    if idx.rows == 0:
+        values, start = [DELTA_COLS] + values, 1
+    planner = SheetsPlanner.of(sh)
+    plan = planner.plan_append(ws, start, values, len(DELTA_COLS))
+    if plan is None:
+        return False
+    planner.execute(plan)
+    nuevo_idx = DeltaSheetIndex.from_frame(nuevos, store_id)
+    nuevo_idx.rows = idx.rows - len(vig) + len(nuevos)
+    nuevo_idx.save()
+    return True
+
+def _seed_store(store: HistoryStore, df_prev: pd.DataFrame, origen: str, ventana: bool = False):
+    """Carga inicial del store vacío. Con `ventana` el origen es la hoja, que puede ser una proyección
+    recortada a SHEET_WINDOW_DAYS días: lo anterior no está ahí y sólo vuelve restaurando el store."""
+    if not df_prev.empty:
+        print(f"[Histórico] Store vacío → carga inicial desde {origen} ({len(df_prev)} filas)")
+        if ventana and SHEET_WINDOW_DAYS > 0:
+            print(f"[Histórico] ⚠️ Si {origen} ya estaba recortada a {SHEET_WINDOW_DAYS} días, lo anterior no se "
+                  f"recupera desde ahí: restaurá {store.root} (en Actions, data/historico del repo)")
+        store.seed(df_prev)
+
+def _update_store(store: HistoryStore, df_new: pd.DataFrame, reprocess: bool = False,
+                  drop: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Lote al store (nuevas claves, o reemplazo con reprocess); devuelve esas filas con su ID."""
+    if reprocess:
+        filas = store.replace(_finalize_base(df_new), drop)
+        print(f"[Histórico] {len(filas)} filas reprocesadas | total {store.rows:,} en {store.root}"
+              f"{' (dry-run: en memoria, el disco no cambia)' if store.dry_run else ''}")
+        return filas
+    nuevos = store.append(_finalize_base(df_new))
+    print(f"[Histórico] {len(nuevos)} filas nuevas | total {store.rows:,} en {store.root}"
+          f"{' (dry-run: en memoria, el disco no cambia)' if store.dry_run else ''}")
+    return nuevos
+
+def _ingest_with_store(sh: gspread.Spreadsheet, ws: gspread.Worksheet, df_new: pd.DataFrame,
+                       store: HistoryStore, full_rebuild: bool = False, reprocess: bool = False,
+                       drop: Optional[pd.DataFrame] = None) -> str:
+    """
+    El histórico local decide qué filas son nuevas (y sus ID). La hoja se mantiene como
+    proyección: si está sincronizada (su último ID = el del store antes del lote) sólo se
+    agregan las filas nuevas; si no, o si no entran, se regenera desde el store.
+    Con SHEET_DELTA la hoja va en intervalos y, sincronizada, sólo se reescribe su bloque de vigentes.
+    Con reprocess el lote reemplaza sus claves en el store (y `drop` se borra); la hoja se regenera.
+    """
+    if store.empty:
+        _seed_store(store, _read_history(ws), "la hoja", ventana=True)
+
+    prev_last = store.last_id
+    nuevos = _update_store(store, df_new, reprocess, drop)
+    full_rebuild = full_rebuild or reprocess
+
+    if not full_rebuild and SHEET_DELTA:
+        idx = DeltaSheetIndex.load()
+        if idx is not None and idx.store_id == prev_last and idx.matches(ws) and \
+                _append_intervals(sh, ws, idx, nuevos, store.last_id):
+            return f"{len(nuevos)} filas nuevas → bloque de intervalos vigentes reescrito"
+    elif not full_rebuild:
+        idx = _load_sheet_index(ws)
+        if idx is not None and idx.last_id == prev_last and \
+                _append_rows(sh, ws, idx, nuevos, _key_hashes(nuevos)):
+            return f"{len(nuevos)} filas nuevas agregadas"
+
+    proj = _sheet_projection(sh, ws, store)
+    if SHEET_DELTA:
+        written = _write_sheet(ws, sh, proj[DELTA_COLS])
+        if written is not None:
+            DeltaSheetIndex.from_frame(written, store.last_id).save()
+        return f"regenerada desde el histórico local: {len(proj)} intervalos"
+    written = _write_sheet(ws, sh, proj[TARGET_COLS])
+    if written is not None:
+        SheetKeyIndex.from_frame(written).save()
+    return f"regenerada desde el histórico local: {len(proj)} filas"
+
+# --- Rollover: fragmentos por período + hoja índice ---
+def _shard_period(dia: str) -> str:
+    """'YYYY-MM-DD' → período del fragmento según SHEETS_ROLLOVER: '2026_10', '2026_Q4' o '2026'."""
+    y, m = dia[:4], int(dia[5:7])
+    if SHEETS_ROLLOVER == "month": return f"{y}_{m:02d}"
+    if SHEETS_ROLLOVER == "quarter": return f"{y}_Q{(m - 1) // 3 + 1}"
+    if SHEETS_ROLLOVER == "year": return y
+    raise ValueError(f"SHEETS_ROLLOVER debe ser month, quarter o year (no {SHEETS_ROLLOVER!r})")
+
+def _period_days(periodo: str) -> Tuple[str, str]:
+    """Período → (primer día, último día) para HistoryStore.read (comparación de texto: '-31' cubre todo mes)."""
+    y, _, p = periodo.partition("_")
+    if not p: return f"{y}-01-01", f"{y}-12-31"
+    if p.startswith("Q"):
+        q = int(p[1:])
+        return f"{y}-{3 * q - 2:02d}-01", f"{y}-{3 * q:02d}-31"
+    return f"{y}-{p}-01", f"{y}-{p}-31"
+
+def _shard_title(periodo: str, n: int) -> str:
+    return f"{WORKSHEET_NAME}_{periodo}" + (f"_{n}" if n > 1 else "")
+
+def _sheet_day(v) -> str:
+    """Fecha leída con SERIAL_NUMBER (días desde 1899-12-30) o como texto ISO → 'YYYY-MM-DD'."""
+    if isinstance(v, Real) and not isinstance(v, bool):
+        return (datetime(1899, 12, 30) + timedelta(days=float(v))).strftime("%Y-%m-%d")
+    return str(v)[:10]
+
+class ShardIndex:
+    """
+    Hoja índice del rollover (SHARD_INDEX_NAME, en el libro principal): un fragmento por fila
+    con hoja, libro (id), período, rango de fechas, filas e IDs. El pipeline sabe por ella dónde
+    agregar sin abrir cada hoja; el tablero, qué fragmentos leer para un rango de fechas.
+    """
+    HEADER = ["Hoja", "Libro", "Periodo", "Desde", "Hasta", "Filas", "PrimerID", "UltimoID"]
+
+    def __init__(self, entries: List[dict]):
+        self.entries = entries
+
+    @classmethod
+    @_timed("lectura_sheets")
+    def load(cls, sh: gspread.Spreadsheet) -> "ShardIndex":
+        if SHARD_INDEX_NAME not in SheetsPlanner.of(sh).grids:
+            return cls([])
+        vals = sh.values_get(gspread.utils.absolute_range_name(SHARD_INDEX_NAME), params={
+            "valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "SERIAL_NUMBER"}).get("values", [])
+        if not vals or vals[0][:len(cls.HEADER)] != cls.HEADER:
+            return cls([])
+        entries = []
+        for fila in vals[1:]:
+            e = dict(zip(cls.HEADER, fila + [""] * (len(cls.HEADER) - len(fila))))
+            try:
+                entries.append({**e, "Hoja": str(e["Hoja"]), "Libro": str(e["Libro"]), "Periodo": str(e["Periodo"]),
+                                "Desde": _sheet_day(e["Desde"]), "Hasta": _sheet_day(e["Hasta"]),
+                                **{k: int(e[k]) for k in ("Filas", "PrimerID", "UltimoID")}})
+            except (TypeError, ValueError):
+                return cls([])  # índice editado a mano: se regenera todo desde el store
+        return cls(entries)
+
+    @property
+    def last_id(self) -> int:
+        return max((e["UltimoID"] for e in self.entries), default=0)
+
+    @property
+    def periods(self) -> List[str]:
+        return list(dict.fromkeys(e["Periodo"] for e in self.entries))
+
+    def of(self, periodo: str) -> List[dict]:
+        return [e for e in self.entries if e["Periodo"] == periodo]
+
+    def set(self, periodo: str, entradas: List[dict]):
+        self.entries = sorted([e for e in self.entries if e["Periodo"] != periodo] + entradas,
+                              key=lambda e: (e["Periodo"], e["PrimerID"]))
+
+    def save(self, sh: gspread.Spreadsheet):
+        pl = SheetsPlanner.of(sh)
+        df = pd.DataFrame(self.entries, columns=self.HEADER)
+        if df.empty:
+            pl.delete_sheets([SHARD_INDEX_NAME])
+            return
+        ws = (pl.worksheet(SHARD_INDEX_NAME) if SHARD_INDEX_NAME in pl.grids
+              else pl.add_sheet(SHARD_INDEX_NAME, len(df) + 1, len(self.HEADER)))
+        _write_sheet(ws, sh, df)
+
+class ShardedSheets:
+    """
+    Proyección del histórico en fragmentos (SHEETS_ROLLOVER): una hoja por período en el libro
+    principal o en los hermanos de SHEETS_ROLLOVER_BOOKS (_2, _3, ... si un período no entra en
+    un libro), más la hoja índice. Ninguna fila se recorta: cuando un libro llega a
+    SHEETS_SHARD_FILL del límite de celdas el fragmento sigue en el siguiente con lugar.
+    Cada corrida agrega sólo a los fragmentos de los períodos con filas nuevas (el activo).
+    """
+    def __init__(self, sh: gspread.Spreadsheet, store: HistoryStore):
+        self.sh, self.store = sh, store
+        self.keys = list(dict.fromkeys([sh.id] + [gspread.utils.extract_id_from_url(u) for u in SHEETS_ROLLOVER_BOOKS]))
+        self._books: Dict[str, gspread.Spreadsheet] = {sh.id: sh}
+        self.index = ShardIndex.load(sh)
+        self.touched: List[str] = []
+
+    def book(self, key: str) -> gspread.Spreadsheet:
+        if key not in self._books:
+            self._books[key] = _open_book(key)
+        return self._books[key]
+
+    def room(self, key: str, title: Optional[str] = None) -> int:
+        """Filas (encabezado incluido) que puede tener `title` (o una hoja nueva) sin pasar SHEETS_SHARD_FILL."""
+        pl = SheetsPlanner.of(self.book(key))
+        usadas = pl.total_cells - (pl.cells(title) if title in pl.grids else 0)
+        return max(int(SHEETS_CELL_LIMIT * SHEETS_SHARD_FILL) - usadas, 0) // len(TARGET_COLS)
+
+    def free_rows(self, liberar: List[Tuple[str, str]]) -> int:
+        """Filas de datos que entran en todos los libros si se liberan las hojas `liberar` (libro, título)."""
+        total = 0
+        for key in self.keys:
+            pl = SheetsPlanner.of(self.book(key))
+            usadas = pl.total_cells - sum(pl.cells(t) for k, t in set(liberar) if k == key and t in pl.grids)
+            total += max(max(int(SHEETS_CELL_LIMIT * SHEETS_SHARD_FILL) - usadas, 0) // len(TARGET_COLS) - 1, 0)
+        return total
+
+    def _pick(self, filas: int) -> str:
+        """Primer libro donde entran `filas`; si ninguno, el de más lugar."""
+        mejor, lugar = None, 0
+        for key in self.keys:
+            r = self.room(key) - 1
+            if r >= filas: return key
+            if r > lugar: mejor, lugar = key, r
+        if mejor is None:
+            raise RuntimeError("[Rollover] Sin lugar en ningún libro: agregá otro libro a SHEETS_ROLLOVER_BOOKS "
+                               "(compartido con la cuenta de servicio)")
+        return mejor
+
+    @staticmethod
+    def _entry(title: str, key: str, periodo: str, df: pd.DataFrame) -> dict:
+        fechas, ids = df["FechaConsulta"].astype(str), pd.to_numeric(df["ID"])
+        return {"Hoja": title, "Libro": key, "Periodo": periodo, "Desde": fechas.min(), "Hasta": fechas.max(),
+                "Filas": len(df), "PrimerID": int(ids.min()), "UltimoID": int(ids.max())}
+
+    @_timed("lectura_sheets")
+    def _matches(self, e: dict) -> bool:
+        """Chequeo barato (1 request) de que el fragmento sigue como lo dejó el índice."""
+        book = self.book(e["Libro"])
+        if e["Hoja"] not in SheetsPlanner.of(book).grids:
+            return False
+        got = book.values_get(gspread.utils.absolute_range_name(e["Hoja"], f"A{e['Filas'] + 1}:A{e['Filas'] + 2}"),
+                              params={"valueRenderOption": "UNFORMATTED_VALUE"}).get("values", [])
+        try:
+            return len(got) == 1 and bool(got[0]) and float(got[0][0]) == float(e["UltimoID"])
+        except (TypeError, ValueError):
+            return False
+
+    def _place(self, periodo: str, df: pd.DataFrame, n: int, viejos: List[dict]) -> List[dict]:
+        """Reescribe `df` desde el fragmento n del período (reusando las hojas de `viejos` si hay lugar)."""
+        entradas, pos = [], 0
+        while pos < len(df):
+            e = viejos[n - 1] if n <= len(viejos) else None
+            key, title = (e["Libro"], e["Hoja"]) if e else (None, _shard_title(periodo, n))
+            cap = self.room(key, title) - 1 if e else 0
+            if cap <= 0:
+                key = self._pick(len(df) - pos)
+                cap = self.room(key, title) - 1
+            parte = df.iloc[pos:pos + cap]
+            pl = SheetsPlanner.of(self.book(key))
+            ws = pl.worksheet(title) if title in pl.grids else pl.add_sheet(title, len(parte) + 1, len(TARGET_COLS))
+            _write_sheet(ws, self.book(key), parte[TARGET_COLS])
+            entradas.append(self._entry(title, key, periodo, parte))
+            self.touched.append(title)
+            pos, n = pos + len(parte), n + 1
+        return entradas
+
+    def rebuild(self, periodo: str, vacio: bool = False):
+        """Regenera el período completo desde el store (o lo quita, con vacio); los fragmentos que sobran se borran."""
+        viejos = self.index.of(periodo)
+        df = self.store.read(*_period_days(periodo)) if not vacio else pd.DataFrame(columns=TARGET_COLS)
+        entradas = self._place(periodo, df, 1, viejos)
+        quedan = {(e["Libro"], e["Hoja"]) for e in entradas}
+        for key in dict.fromkeys(e["Libro"] for e in viejos):
+            SheetsPlanner.of(self.book(key)).delete_sheets(
+                [e["Hoja"] for e in viejos if e["Libro"] == key and (key, e["Hoja"]) not in quedan])
+        self.index.set(periodo, entradas)
+
+    def append(self, periodo: str, nuevas: pd.DataFrame):
+        """Agrega al último fragmento del período lo que entre y el resto a fragmentos nuevos."""
+        viejos = self.index.of(periodo)
+        if not viejos or not self._matches(viejos[-1]):
+            if viejos: print(f"[Rollover] '{viejos[-1]['Hoja']}' no coincide con el índice → se regenera el período")
+            return self.rebuild(periodo)
+        e = viejos[-1]
+        n = max(min(len(nuevas), self.room(e["Libro"], e["Hoja"]) - 1 - e["Filas"]), 0)
+        if n:
+            pl = SheetsPlanner.of(self.book(e["Libro"]))
+            plan = pl.plan_append(pl.worksheet(e["Hoja"]), e["Filas"] + 2, _df_to_values(nuevas.iloc[:n][TARGET_COLS]),
+                                  len(TARGET_COLS))
+            pl.execute(plan)
+            nueva = self._entry(e["Hoja"], e["Libro"], periodo, nuevas.iloc[:n])
+            e.update(Desde=min(e["Desde"], nueva["Desde"]), Hasta=max(e["Hasta"], nueva["Hasta"]),
+                     Filas=e["Filas"] + n, UltimoID=max(e["UltimoID"], nueva["UltimoID"]))
+            self.touched.append(e["Hoja"])
+        resto = self._place(periodo, nuevas.iloc[n:], len(viejos) + 1, []) if n < len(nuevas) else []
+        self.index.set(periodo, viejos + resto)
+
+def _ingest_rollover(sh: gspread.Spreadsheet, ws: Optional[gspread.Worksheet], df_new: pd.DataFrame,
+                     store: HistoryStore, full_rebuild: bool = False, reprocess: bool = False,
+                     drop: Optional[pd.DataFrame] = None) -> str:
+    """
+    Como _ingest_with_store, pero la proyección son los fragmentos de ShardedSheets: las filas
+    del store con ID mayor al último del índice van a los fragmentos de su período (normalmente
+    sólo el activo). Sin índice, con --full-rebuild/--reprocess, si el índice va adelantado al
+    store o si cambió SHEETS_ROLLOVER, se regeneran todos los períodos. La hoja única anterior
+    se borra una vez que sus filas quedaron en los fragmentos.
+    """
+    shards = ShardedSheets(sh, store)
+    if store.empty and shards.index.entries:  # runner nuevo: la copia está en los fragmentos
+        _seed_store(store, pd.concat([_read_history(shards.book(e["Libro"]).worksheet(e["Hoja"]))
+                                      for e in shards.index.entries], ignore_index=True), "los fragmentos")
+    elif store.empty and ws is not None:
+        _seed_store(store, _read_history(ws), "la hoja", ventana=True)
+    _update_store(store, df_new, reprocess, drop)
+
+    idx = shards.index
+    todo = (full_rebuild or reprocess or not idx.entries or idx.last_id > store.last_id
+            or any(_shard_period(e["Desde"]) != e["Periodo"] for e in idx.entries))
+    migrar = ws is not None and WORKSHEET_NAME in SheetsPlanner.of(sh).grids
+    if todo:
+        dias = store.read(columns=["FechaConsulta"])["FechaConsulta"].unique()
+        validos = set(map(_shard_period, dias))
+        # Antes de tocar nada: ¿entra todo el histórico, liberando los fragmentos actuales (y la hoja única)?
+        fragmentos = [(e["Libro"], e["Hoja"]) for e in idx.entries]
+        unica = [(sh.id, WORKSHEET_NAME)] if migrar else []
+        hace_falta = store.rows + len(validos) + len(shards.keys)  # + encabezados
+        if shards.free_rows(fragmentos) < hace_falta:
+            lugar = shards.free_rows(fragmentos + unica)
+            if lugar < hace_falta:
+                raise RuntimeError(f"[Rollover] El histórico ({store.rows:,} filas) no entra en {len(shards.keys)} libro(s) "
+                                   f"(lugar para {lugar:,}): agregá libros a SHEETS_ROLLOVER_BOOKS")
+            print(f"[Rollover] Sin lugar para los fragmentos junto a la hoja única: se borra '{WORKSHEET_NAME}' "
+                  "antes (sus filas ya están en el histórico local)")
+            SheetsPlanner.of(sh).delete_sheets([WORKSHEET_NAME])
+        print(f"[Rollover] Regenerando {len(validos)} período(s) desde el histórico local")
+        for p in sorted(set(idx.periods) - validos) + sorted(validos):  # primero se liberan los que ya no van
+            shards.rebuild(p, vacio=p not in validos)
+    else:
+        pendientes = store.read(after_id=idx.last_id)
+        if not pendientes.empty:
+            por_periodo = _map_unique(pendientes["FechaConsulta"], _shard_period).to_numpy(object)
+            for p in sorted(set(por_periodo)):
+                shards.append(p, pendientes[por_periodo == p].reset_index(drop=True))
+    shards.index.save(sh)
+
+    if migrar and WORKSHEET_NAME in SheetsPlanner.of(sh).grids and shards.index.entries:
+        print(f"[Rollover] Hoja única '{WORKSHEET_NAME}' migrada a {len(shards.index.entries)} fragmento(s) → se borra")
+        SheetsPlanner.of(sh).delete_sheets([WORKSHEET_NAME])
+    hojas = list(dict.fromkeys(shards.touched))
+    return (f"{'regenerados' if todo else 'actualizados'} {len(hojas)} fragmento(s)"
+            + (f" ({', '.join(hojas[:4])}{', …' if len(hojas) > 4 else ''})" if hojas else "")
+            + f" | índice: {len(shards.index.entries)} fragmentos, {sum(e['Filas'] for e in shards.index.entries):,} filas")
+
+# --- Resúmenes para el tablero ---
+SUMMARY_KEYS = ["FechaConsulta", "Supermercado", "Grupo", "Subgrupo"]
+SUMMARY_COLS = SUMMARY_KEYS + ["Productos", "PrecioPromedio", "PrecioUnidadMin", "PrecioUnidadMediana", "PrecioUnidadMax"]
+LATEST_COLS = ["Supermercado", "Producto", "Grupo", "Subgrupo", "Precio", "Unidad", "precio_unidad", "FechaConsulta"]
+FILTER_COLS = ["Supermercado", "Grupo", "Subgrupo", "Productos"]
+
+def _text_cols(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    """Columnas de texto sin nulos ("" en su lugar), convertidas una vez por valor distinto."""
+    return df.assign(**{c: _map_unique(df[c], str).astype(str) for c in cols})
+
+def _daily_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Por día × Supermercado × Grupo × Subgrupo: productos con precio, Precio promedio y mín/mediana/máx de precio_unidad."""
+    df = _text_cols(df, SUMMARY_KEYS)
+    g = df.groupby(SUMMARY_KEYS, sort=True)
+    pu = g["precio_unidad"]
+    return pd.DataFrame({"Productos": g["Precio"].count(), "PrecioPromedio": g["Precio"].mean().round(2),
+                         "PrecioUnidadMin": pu.min(), "PrecioUnidadMediana": pu.median().round(3),
+                         "PrecioUnidadMax": pu.max()}).reset_index()
+
+def _latest_prices(df: pd.DataFrame) -> pd.DataFrame:
+    """Última fila de cada Supermercado × Producto por FechaConsulta (a igual día gana la que viene después)."""
+    df = _text_cols(df.reindex(columns=LATEST_COLS), ["Supermercado", "Producto", "Grupo", "Subgrupo", "Unidad", "FechaConsulta"])
+    df = df.take(np.argsort(df["FechaConsulta"].to_numpy(), kind="stable"))
+    df = df[~df.duplicated(["Supermercado", "Producto"], keep="last")]
+    return df.sort_values(["Supermercado", "Producto"], kind="mergesort", ignore_index=True)
+
+def _filter_lists(latest: pd.DataFrame) -> pd.DataFrame:
+    """Combinaciones Supermercado × Grupo × Subgrupo con cuántos productos tienen (para filtros en cascada)."""
+    return latest.groupby(FILTER_COLS[:3], sort=True).size().rename("Productos").reset_index()
+
+class DashboardSummaries:
+    """
+    Hojas precalculadas para el tablero, en el libro principal:
+      - DAILY_SUMMARY_NAME: SUMMARY_COLS por día × Supermercado × Grupo × Subgrupo, ordenada por día;
+      - LATEST_PRICE_NAME: último precio de cada producto de cada supermercado;
+      - FILTERS_NAME: combinaciones para los filtros, con la cantidad de productos.
+    Incremental: del histórico se leen sólo los días desde el más viejo de la corrida (normalmente
+    el de hoy). El resumen diario se reescribe desde la primera fila de ese día (un append si es
+    nuevo), el último precio se funde con la hoja actual y los filtros se escriben si cambiaron.
+    Lo necesario de las tres hojas se lee en un solo values.batchGet.
+    """
+    SOURCE = ["ID"] + LATEST_COLS
+
+    def __init__(self, sh: gspread.Spreadsheet, store: HistoryStore):
+        self.sh, self.store, self.pl = sh, store, SheetsPlanner.of(sh)
+
+    @_timed("lectura_sheets")
+    def _read(self) -> Optional[Tuple[np.ndarray, pd.DataFrame, pd.DataFrame]]:
+        """(día de cada fila del resumen diario, último precio, filtros) o None si falta una hoja o cambió su formato."""
+        if any(t not in self.pl.grids for t in (DAILY_SUMMARY_NAME, LATEST_PRICE_NAME, FILTERS_NAME)):
+            return None
+        rangos = [gspread.utils.absolute_range_name(DAILY_SUMMARY_NAME, "1:1"), gspread.utils.absolute_range_name(DAILY_SUMMARY_NAME, "A2:A"),
+                  gspread.utils.absolute_range_name(LATEST_PRICE_NAME), gspread.utils.absolute_range_name(FILTERS_NAME)]
+        res = self.sh.values_batch_get(rangos, params={"valueRenderOption": "UNFORMATTED_VALUE",
+                                                        "dateTimeRenderOption": "SERIAL_NUMBER"})
+        cab, dias, ultimo, filtros = [r.get("values", []) for r in res.get("valueRanges", [])]
+        if (cab[:1] != [SUMMARY_COLS] or ultimo[:1] != [LATEST_COLS] or filtros[:1] != [FILTER_COLS]
+                or any(not f for f in dias)):
+            return None
+        dias = np.array([_sheet_day(f[0]) for f in dias], dtype=object)
+        if len(dias) > 1 and not (dias[1:] >= dias[:-1]).all():
+            return None  # reordenada a mano: se recalcula todo
+
+        def frame(vals, cols):
+            df = pd.DataFrame([f + [""] * (len(cols) - len(f)) for f in vals[1:]], columns=cols, dtype=object)
+            return df.replace("", np.nan)
+        ultimo = frame(ultimo, LATEST_COLS)
+        ultimo["FechaConsulta"] = ultimo["FechaConsulta"].map(_sheet_day)
+        for c in ("Precio", "precio_unidad"):
+            ultimo[c] = pd.to_numeric(ultimo[c], errors="coerce")
+        filtros = _text_cols(frame(filtros, FILTER_COLS), FILTER_COLS[:3])
+        filtros["Productos"] = pd.to_numeric(filtros["Productos"], errors="coerce").fillna(0).astype(int)
+        return dias, ultimo, filtros
+
+    def _sheet(self, title: str, rows: int, cols: int) -> gspread.Worksheet:
+        return self.pl.worksheet(title) if title in self.pl.grids else self.pl.add_sheet(title, rows, cols)
+
+    def update(self, dias: List[str], completo: bool = False) -> str:
+        """Recalcula con los días `dias` (todo si `completo`, o si faltan las hojas) y escribe sólo lo que cambió."""
+        previo = None if completo or not dias else self._read()
+        if previo is None:
+            df = self.store.read(columns=self.SOURCE)
+            diario, ultimo, filtros_prev, start = _daily_summary(df), _latest_prices(df), None, 2
+        else:
+            filas, ultimo_prev, filtros_prev = previo
+            desde = min(dias)
+            df = self.store.read(since=desde, columns=self.SOURCE)
+            diario, ultimo = _daily_summary(df), _latest_prices(pd.concat([ultimo_prev, df], ignore_index=True))
+            start = 2 + int(np.searchsorted(filas, desde, side="left"))
+        del df
+
+        if start == 2:
+            _write_sheet(self._sheet(DAILY_SUMMARY_NAME, len(diario) + 1, len(SUMMARY_COLS)), self.sh, diario)
+        elif not diario.empty:
+            plan = self.pl.plan_append(self.pl.worksheet(DAILY_SUMMARY_NAME), start, _df_to_values(diario),
+                                       len(SUMMARY_COLS))
+            if plan is None:
+                print(f"[Resúmenes] ⚠️ '{DAILY_SUMMARY_NAME}' no entra en el límite de celdas: queda sin estos días")
+            else:
+                self.pl.execute(plan)
+        _write_sheet(self._sheet(LATEST_PRICE_NAME, len(ultimo) + 1, len(LATEST_COLS)), self.sh, ultimo[LATEST_COLS])
+        filtros = _filter_lists(ultimo)
+        igual = filtros_prev is not None and filtros_prev.equals(filtros)
+        if not igual:
+            _write_sheet(self._sheet(FILTERS_NAME, len(filtros) + 1, len(FILTER_COLS)), self.sh, filtros)
+        return (f"[Resúmenes] {'recalculados' if previo is None else 'actualizados'}: diario {len(diario):,} filas "
+                f"desde la fila {start} | último precio {len(ultimo):,} productos | "
+                f"filtros {len(filtros):,} combinaciones{' (sin cambios)' if igual else ''}")
+
+# --- Exportación estática (GitHub Pages) ---
+def _json_nums(s: pd.Series) -> list:
+    """Números para JSON: enteros sin '.0' y nulos como null (ahorra bytes antes del gzip)."""
+    return [None if v != v else (int(v) if v.is_integer() else v) for v in s.to_numpy(float).tolist()]
+
+class StaticExport:
+    """
+    Paquete estático del histórico en STATIC_EXPORT_DIR, para servir desde GitHub Pages/CDN:
+        manifest.json                 versión, meses (archivo, filas, desde, hasta) y archivos vigentes
+        diccionarios.<hash>.json      Supermercado/Grupo/Subgrupo/Producto → código (posición en la lista)
+        productos.<hash>.json         índice columnar por Supermercado × Producto: grupo, subgrupo,
+                                      último precio y fecha, y meses en los que aparece
+        AAAA-MM.<hash>.json           un mes, columnar: dia, s, p, g, sg (códigos), precio, pu
+    Los nombres llevan el hash del contenido (cacheables sin vencimiento); sólo manifest.json cambia
+    de contenido con el mismo nombre. Los diccionarios sólo crecen, así que los meses ya exportados
+    siguen válidos: cada corrida rehace sólo los meses de sus días, más índice y manifiesto.
+    """
+    VERSION = 1
+    DICT_COLS = {"s": "Supermercado", "g": "Grupo", "sg": "Subgrupo", "p": "Producto"}
+    SOURCE = ["Supermercado", "Producto", "Grupo", "Subgrupo", "Precio", "precio_unidad", "FechaConsulta"]
+    _ARCHIVO = re.compile(r"^(\d{4}-\d{2}|diccionarios|productos)\.[0-9a-f]{10}\.json$")
+
+    def __init__(self, store: HistoryStore, root: Optional[str] = None):
+        self.store, self.root = store, root or STATIC_EXPORT_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest = self._load("manifest.json") or {}
+
+    def _load(self, nombre: Optional[str]) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.root, nombre), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, TypeError, ValueError):
+            return None
+
+    def _dump(self, obj: dict, base: str) -> str:
+        data = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+        nombre = f"{base}.{hashlib.sha1(data).hexdigest()[:10]}.json"
+        path = os.path.join(self.root, nombre)
+        if not os.path.exists(path):
+            with open(path + ".tmp", "wb") as fh:
+                fh.write(data)
+            os.replace(path + ".tmp", path)
+        return nombre
+
+    def _vigente(self) -> bool:
+        m = self.manifest
+        archivos = [m.get("diccionarios"), m.get("productos")] + [e.get("archivo") for e in m.get("meses", {}).values()]
+        return m.get("version") == self.VERSION and all(a and os.path.exists(os.path.join(self.root, a)) for a in archivos)
+
+    def _encode(self, col: str, s: pd.Series) -> np.ndarray:
+        """Códigos de `s` en el diccionario de `col` (agregando los valores nuevos al final)."""
+        lista, pos = self.dicts[col], self._pos[col]
+        cat = _map_unique(s, str)
+        for v in cat.cat.categories:
+            if v not in pos:
+                pos[v] = len(lista)
+                lista.append(v)
+        return np.array([pos[v] for v in cat.cat.categories], dtype=np.int64)[cat.cat.codes.to_numpy()]
+
+    def update(self, dias: List[str], completo: bool = False) -> str:
+        """Rehace los meses de `dias` (todos si `completo` o si el paquete falta o es de otra versión)."""
+        completo = completo or not self._vigente()
+        if completo:
+            meses = sorted({d[:7] for d in self.store.read(columns=["FechaConsulta"])["FechaConsulta"].unique()})
+            self.dicts = {c: [] for c in self.DICT_COLS}
+            prod: Dict[Tuple[int, int], list] = {}
+            info: Dict[str, dict] = {}
+        else:
+            meses = sorted({d[:7] for d in dias})
+            self.dicts = self._load(self.manifest["diccionarios"])
+            idx = self._load(self.manifest["productos"])
+            prod = {(s, p): [g, sg, pr, f, set(ms)] for s, p, g, sg, pr, f, ms in
+                    zip(*(idx[k] for k in ("s", "p", "g", "sg", "precio", "fecha", "meses")))}
+            info = dict(self.manifest["meses"])
+        self._pos = {c: {v: i for i, v in enumerate(lista)} for c, lista in self.dicts.items()}
+
+        filas = 0
+        for mes in meses:
+            df = self.store.read(since=f"{mes}-01", until=f"{mes}-31", columns=self.SOURCE)
+            for e in prod.values(): e[4].discard(mes)  # el mes se rehace entero (p.ej. tras --reprocess)
+            if df.empty:
+                info.pop(mes, None)
+                continue
+            cod = {k: self._encode(k, df[c]) for k, c in self.DICT_COLS.items()}
+            dia = df["FechaConsulta"].str.slice(8, 10).astype(int).to_numpy()
+            orden = np.lexsort((dia, cod["p"], cod["s"]))  # la serie de cada producto queda contigua
+            df, dia, cod = df.iloc[orden], dia[orden], {k: v[orden] for k, v in cod.items()}
+            info[mes] = {"archivo": self._dump({"mes": mes, "dia": dia.tolist(), **{k: v.tolist() for k, v in cod.items()},
+                                                "precio": _json_nums(df["Precio"]), "pu": _json_nums(df["precio_unidad"])}, mes),
+                         "filas": len(df), "desde": df["FechaConsulta"].min(), "hasta": df["FechaConsulta"].max()}
+            filas += len(df)
+            # Último registro de cada Supermercado × Producto en el mes (por día; orden estable)
+            ult = np.flatnonzero(np.r_[(cod["s"][1:] != cod["s"][:-1]) | (cod["p"][1:] != cod["p"][:-1]), True])
+            fechas, precios = df["FechaConsulta"].to_numpy()[ult], _json_nums(df["Precio"].iloc[ult])
+            for s, p, g, sg, pr, f in zip(cod["s"][ult].tolist(), cod["p"][ult].tolist(), cod["g"][ult].tolist(),
+                                          cod["sg"][ult].tolist(), precios, fechas.tolist()):
+                e = prod.setdefault((s, p), [g, sg, pr, f, set()])
+                e[4].add(mes)
+                if f >= e[3]: e[:4] = [g, sg, pr, f]
+        prod = {k: e for k, e in prod.items() if e[4]}
+
+        claves = sorted(prod)
+        indice = {"s": [k[0] for k in claves], "p": [k[1] for k in claves],
+                  **{c: [prod[k][i] for k in claves] for i, c in enumerate(["g", "sg", "precio", "fecha"])},
+                  "meses": [sorted(prod[k][4]) for k in claves]}
+        self.manifest = {"version": self.VERSION, "generado": datetime.now().isoformat(timespec="seconds"),
+                         "filas": sum(e["filas"] for e in info.values()),
+                         "diccionarios": self._dump(self.dicts, "diccionarios"),
+                         "productos": self._dump(indice, "productos"), "meses": dict(sorted(info.items()))}
+        tmp = os.path.join(self.root, "manifest.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.manifest, fh, ensure_ascii=False, indent=1)
+        os.replace(tmp, os.path.join(self.root, "manifest.json"))
+
+        vigentes = {self.manifest["diccionarios"], self.manifest["productos"]} | {e["archivo"] for e in info.values()}
+        for f in os.listdir(self.root):  # versiones anteriores (sólo archivos propios del paquete)
+            if self._ARCHIVO.match(f) and f not in vigentes:
+                os.remove(os.path.join(self.root, f))
+        return (f"[Export] {'regenerado' if completo else 'actualizado'} {self.root}: {len(meses)} mes(es), "
+                f"{filas:,} filas | {len(claves):,} productos en el índice | {len(info)} meses en total")
+
+# ───────── 11) CSVs diarios: manifiesto + compactación ─────────
+class IngestManifest:
+    """
+    CSVs diarios ya ingeridos: ruta relativa a OUT_DIR → {size, mtime, rows}, más la huella de
+    reglas con la que se enriqueció el histórico. Cada corrida lee sólo los CSV nuevos o
+    modificados (pending) y los registra con commit() una vez ingeridos. compact() junta los
+    ya ingeridos de más de COMPACT_AFTER_DAYS días en COMPACT_DIR/canasta_YYYY-MM.csv.gz
+    (un miembro gzip por lote, sin reescribir lo anterior) y borra los originales.
+    """
+    _DAY = re.compile(r"_canasta_(\d{8})_\d{6}\.csv$")
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or MANIFEST_PATH
+        self.files: Dict[str, dict] = {}
+        self.rules: Optional[str] = None
+        self._staged: Dict[str, dict] = {}
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                blob = json.load(fh)
+            self.files, self.rules = blob.get("files", {}), blob.get("rules")
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"rules": self.rules, "files": self.files}, fh, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _stat(rel: str) -> dict:
+        st = os.stat(os.path.join(OUT_DIR, rel))
+        return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+    def _current(self, rel: str) -> bool:
+        e = self.files.get(rel)
+        return e is not None and {"size": e["size"], "mtime": e["mtime"]} == self._stat(rel)
+
+    def sources(self) -> List[str]:
+        """Todos los CSV en disco (particiones compactadas primero), relativos a OUT_DIR."""
+        parts = sorted(glob.glob(os.path.join(COMPACT_DIR, "canasta_*.csv.gz")))
+        return [os.path.relpath(p, OUT_DIR) for p in parts + sorted(glob.glob(PATTERN_DAILY))]
+
+    def pending(self, reprocess: bool = False) -> List[str]:
+        return [rel for rel in self.sources() if reprocess or not self._current(rel)]
+
+    def read(self, rels: List[str], stage: bool = True) -> pd.DataFrame:
+        """Concatena los CSV (dtype=str, DICT_COLS categóricas); con stage deja su estado listo para commit()."""
+        frames = []
+        for rel in rels:
+            st = self._stat(rel)
+            try:
+                df = pd.read_csv(os.path.join(OUT_DIR, rel), dtype=str)
+            except pd.errors.EmptyDataError:
+                df = pd.DataFrame(columns=CSV_COLS)
+            if stage: self._staged[rel] = {**st, "rows": len(df)}
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=CSV_COLS)
+        return _compact_frame(pd.concat(frames, ignore_index=True, sort=False))
+
+    def stage(self, rel: str, rows: int):
+        """Un CSV que no hace falta leer (DailyCsvWriter lo enriqueció al escribirlo): queda listo para commit()."""
+        self._staged[rel] = {**self._stat(rel), "rows": rows}
+
+    def commit(self, rules: str):
+        """Registra lo leído como ingerido y olvida los archivos que ya no existen."""
+        self.files.update(self._staged)
+        self._staged = {}
+        self.files = {rel: e for rel, e in self.files.items() if os.path.exists(os.path.join(OUT_DIR, rel))}
+        self.rules = rules
+        self.save()
+
+    def compact(self, now: Optional[datetime] = None) -> str:
+        if COMPACT_AFTER_DAYS < 0: return ""
+        limite = ((now or datetime.now()) - timedelta(days=COMPACT_AFTER_DAYS)).strftime("%Y%m%d")
+        por_mes: Dict[str, List[str]] = {}
+        for rel in sorted(self.files):
+            m = self._DAY.search(rel)
+            if m is None or os.path.dirname(rel) or m.group(1) >= limite: continue
+            if os.path.exists(os.path.join(OUT_DIR, rel)) and self._current(rel):
+                por_mes.setdefault(f"{m.group(1)[:4]}-{m.group(1)[4:6]}", []).append(rel)
+        if not por_mes: return ""
+        os.makedirs(COMPACT_DIR, exist_ok=True)
+        for mes, rels in sorted(por_mes.items()):
+            df = self.read(rels, stage=False).reindex(columns=CSV_COLS)
+            part = os.path.relpath(os.path.join(COMPACT_DIR, f"canasta_{mes}.csv.gz"), OUT_DIR)
+            nueva = not os.path.exists(os.path.join(OUT_DIR, part))
+            with open(os.path.join(OUT_DIR, part), "ab") as fh:
+                fh.write(gzip.compress(df.to_csv(index=False, header=nueva).encode("utf-8"), mtime=0))
+            filas = (0 if nueva else self.files.get(part, {}).get("rows", 0)) + len(df)
+            self.files[part] = {**self._stat(part), "rows": filas}
+            for rel in rels:
+                os.remove(os.path.join(OUT_DIR, rel))
+                self.files.pop(rel, None)
+        self.save()
+        n = sum(len(r) for r in por_mes.values())
+        return f"[Compactación] {n} CSV → {', '.join(f'canasta_{m}.csv.gz' for m in sorted(por_mes))}"
+
+class DailyCsvWriter:
+    """
+    CSV diario de un sitio escrito por lotes de CSV_BATCH_ROWS filas mientras el scraper las produce.
+    Con `enrich`, cada lote se relee del mismo texto que va al archivo (idéntico a lo que leería
+    IngestManifest.read), se enriquece en el momento y espera en disco (pickle en un directorio
+    temporal) hasta que la ingesta lo pide con take_frames(): mientras dura el scrape la memoria
+    queda acotada por lote, el CSV queda registrado en el manifiesto sin volver a leerlo y nunca se
+    junta la lista de filas del sitio. Una clave que aparece recién en un lote posterior amplía el
+    encabezado (como pd.DataFrame sobre todas las filas). Sin filas no se crea el archivo (como
+    antes). El texto se arma con el módulo csv (mismo formato que DataFrame.to_csv): sin `enrich`
+    (subcomando scrape) pandas ni siquiera se importa.
+    """
+    def __init__(self, manifest: IngestManifest, name: str, site: str = "", enrich: bool = True):
+        self.manifest, self.rel, self.site, self.enrich = manifest, name, site, enrich
+        self.rows = 0
+        self._cols: Optional[List[str]] = None
+        self._spool: List[str] = []
+        self._spool_dir: Optional[tempfile.TemporaryDirectory] = None
+
+    def write(self, rows: Iterable[Dict]) -> int:
+        it = iter(rows)
+        while True:
+            lote = list(itertools.islice(it, max(CSV_BATCH_ROWS, 1)))
+            if not lote: break
+            self._write_batch(lote)
+        if self.rows and self.enrich:
+            self.manifest.stage(self.rel, self.rows)
+        return self.rows
+
+    @staticmethod
+    def _cell(v):
+        return None if v is None or (isinstance(v, float) and v != v) else v  # nulos/NaN → celda vacía
+
+    def take_frames(self) -> Iterator[pd.DataFrame]:
+        """Lotes enriquecidos en el orden en que se escribieron; cada uno sale del disco al entregarse."""
+        spool, self._spool = self._spool, []
+        for path in spool:
+            df = pd.read_pickle(path)
+            os.remove(path)
+            yield df
+        if self._spool_dir is not None:
+            self._spool_dir.cleanup()
+            self._spool_dir = None
+
+    def _widen(self, extra: List[str]):
+        """Claves nuevas en un lote posterior: reescribe el CSV con el encabezado ampliado y celdas vacías."""
+        path = os.path.join(OUT_DIR, self.rel)
+        with open(path, encoding="utf-8", newline="") as src, \
+                open(path + ".tmp", "w", encoding="utf-8", newline="") as dst:
+            filas = csv.reader(src)
+            next(filas)
+            w = csv.writer(dst, lineterminator=os.linesep)
+            w.writerow(self._cols + extra)
+            w.writerows(f + [None] * len(extra) for f in filas)
+        os.replace(path + ".tmp", path)
+        self._cols += extra
+
+    def _write_batch(self, lote: List[Dict]):
+        with METRICS.stage("csv", self.site):
+            nuevo = self._cols is None  # columnas en orden de aparición, como pd.DataFrame
+            claves = list(dict.fromkeys(k for r in lote for k in r))
+            if nuevo:
+                self._cols = claves
+            elif any(k not in self._cols for k in claves):
+                self._widen([k for k in claves if k not in self._cols])
+            cols = self._cols
+            buf = io.StringIO()
+            w = csv.writer(buf, lineterminator=os.linesep)
+            if nuevo: w.writerow(cols)
+            w.writerows([self._cell(r.get(c)) for c in cols] for r in lote)
+            txt = buf.getvalue()
+            with open(os.path.join(OUT_DIR, self.rel), "w" if nuevo else "a", encoding="utf-8", newline="") as fh:
+                fh.write(txt)
+            self.rows += len(lote)
+            if not self.enrich: return
+            df = pd.read_csv(io.StringIO(txt), dtype=str, **({} if nuevo else {"header": None, "names": cols}))
+        df = _enrich_frame(_compact_frame(df))[0]
+        if self._spool_dir is None:
+            self._spool_dir = tempfile.TemporaryDirectory(prefix="lotes_")
+        path = os.path.join(self._spool_dir.name, f"{len(self._spool):05d}.pkl")
+        df.to_pickle(path, protocol=pickle.HIGHEST_PROTOCOL)
+        self._spool.append(path)
+
+# ───────── 12) Orquestador ─────────
+def _peak_rss_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso (MB); None donde no hay `resource` (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1024 / (1024 if sys.platform == "darwin" else 1)  # macOS informa bytes
+
+def _enrich_frame(df_all: pd.DataFrame, reprocess: bool = False) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """
+    Normaliza y enriquece las filas de los CSV (desde la caché; sólo los nombres nuevos pasan
+    por las regex). Devuelve (df_new con TARGET_COLS compacto, claves descartadas por
+    --reprocess o None). Grupo se normaliza una vez por valor distinto, no por fila.
+    """
+    if "Grupo" in df_all.columns:
+        df_all["Grupo"] = _map_unique(df_all["Grupo"], lambda g: strip_accents(str(g)))
+    df_all["Precio"] = pd.to_numeric(df_all.get("Precio"), errors="coerce")
+
+    with METRICS.stage("clasificacion"):
+        enr = ENRICH_CACHE.lookup(df_all["Producto"])
+    grupo_csv = df_all["Grupo"].to_numpy(object) if "Grupo" in df_all.columns else np.full(len(df_all), "", object)
+    grupo_enr = _map_unique(enr["Grupo"], strip_accents).to_numpy(object)
+    descartadas = None
+    if reprocess:  # exclusión y Grupo se fijaron al scrapear: se recalculan con las reglas vigentes
+        keep = ~enr["excluido"].astype(bool).to_numpy()
+        descartadas = df_all.loc[~keep, KEY_COLS].copy()
+        descartadas["FechaConsulta"] = _day_keys(_parse_fecha(descartadas["FechaConsulta"]))
+        df_all, enr, grupo_enr = df_all[keep].copy(), enr[keep], grupo_enr[keep]
+        grupo_csv = np.where(grupo_enr != "", grupo_enr, grupo_csv[keep])
+        df_all["Grupo"] = pd.Categorical(grupo_csv)
+    df_all["Subgrupo"] = enr["Subgrupo"].to_numpy()
+    otro = grupo_csv != grupo_enr
+    if otro.any():  # p.ej. Biggie con grupo de respaldo: se calcula con el Grupo del CSV
+        with METRICS.stage("clasificacion"):
+            df_all.loc[otro, "Subgrupo"] = CLASSIFIER.subgroup_series(
+                df_all["Producto"][otro], pd.Series(grupo_csv[otro], index=df_all.index[otro])).to_numpy()
+    with METRICS.stage("unidades"):
+        df_all = enrich_unit_cols(df_all, units=enr)
+    return _prepare_new(df_all), descartadas
+
+def _write_run_report(resultado: str) -> Optional[str]:
+    """Reporte de la corrida: JSON en RUN_REPORT_DIR (rota a los últimos RUN_REPORT_KEEP) y, con PROM_TEXTFILE,
+    las métricas en formato Prometheus. Se escribe también si la corrida falla. Devuelve la ruta del JSON."""
+    rep = METRICS.report(resultado, pico_rss_mb=_peak_rss_mb())
+    ruta = None
+    try:  # el reporte nunca tapa el resultado (ni el error) de la corrida
+        if RUN_REPORT_KEEP > 0:
+            os.makedirs(RUN_REPORT_DIR, exist_ok=True)
+            ruta = os.path.join(RUN_REPORT_DIR, f"corrida_{METRICS.inicio:%Y%m%d_%H%M%S}.json")
+            with open(ruta + ".tmp", "w", encoding="utf-8") as fh:
+                json.dump(rep, fh, ensure_ascii=False, indent=1)
+            os.replace(ruta + ".tmp", ruta)
+            for viejo in sorted(glob.glob(os.path.join(RUN_REPORT_DIR, "corrida_*.json")))[:-RUN_REPORT_KEEP]:
+                os.remove(viejo)
+        if PROM_TEXTFILE:  # node_exporter lee el directorio: se reemplaza entero, nunca queda a medias
+            with open(PROM_TEXTFILE + ".tmp", "w", encoding="utf-8") as fh:
+                fh.write(RunMetrics.prometheus(rep))
+            os.replace(PROM_TEXTFILE + ".tmp", PROM_TEXTFILE)
+    except OSError as e:
+        print(f"[Métricas] No se pudo guardar el reporte: {e}")
+    print(METRICS.summary(rep) + (f" | reporte: {ruta}" if ruta else ""))
+    return ruta
+
+def main(argv=None):
+    global METRICS, HOST_LIMITS
+    comando, objetivos, flags = _parse_args(argv if argv is not None else sys.argv[1:])
+    _setup_colab(sheets=comando != "scrape")
+    os.makedirs(OUT_DIR, exist_ok=True)
+    METRICS = RunMetrics()
+    HOST_LIMITS = HostLimits()  # límites y circuitos son de la corrida: uno abierto no pasa a la siguiente
+    resultado = "ok"
+    try:
+        return _run(comando, objetivos, flags)
+    except BaseException as e:
+        resultado = f"error: {type(e).__name__}: {e}"
+        raise
+    finally:
+        _close_parse_pool()
+        _write_run_report(resultado)
+
+def _run(comando: str, objetivos: List[str], flags: Set[str]) -> int:
+    """Una corrida: scrape → CSV → enriquecimiento → histórico/Sheets → resúmenes y exportación.
+    `scrape` se queda en los CSV; `ingest` arranca de los CSV pendientes del manifiesto."""
+    global SHEETS_DRY_RUN
+    if SHEETS_ROLLOVER not in ("", "month", "quarter", "year"):
+        raise ValueError(f"SHEETS_ROLLOVER debe ser month, quarter o year (no {SHEETS_ROLLOVER!r})")
+    SHEETS_DRY_RUN = SHEETS_DRY_RUN or "--dry-run" in flags
+    reprocess = "--reprocess" in flags
+    manifest = IngestManifest()
+    escritores = []
+    if comando != "ingest":
+        escritores = _scrape_sites(objetivos, manifest, enrich=comando == "all" and not reprocess)
+    if comando == "scrape":
+        print(f"[Manifiesto] {sum(1 for w in escritores if w.rows)} CSV escritos: quedan pendientes para `ingest`")
+        print(ENRICH_CACHE.report())
+        return 0
+    return _ingest(manifest, escritores, flags)
+
+def _scrape_sites(objetivos: List[str], manifest: IngestManifest, enrich: bool) -> List[DailyCsvWriter]:
+    """
+    Scrapea los sitios a la vez (SCRAPE_SITES_PARALLEL), cada uno a su CSV diario, bajo un mismo
+    presupuesto (SCRAPE_BUDGET: requests en vuelo entre todos y plazo de la corrida): un sitio lento
+    o colgado no demora a los demás y la corrida termina en el plazo. Un sitio cortado por el plazo
+    conserva sus filas y queda marcado incompleto. Con `enrich`, las filas van por lotes al CSV y al
+    enriquecimiento mientras el sitio sigue scrapeando: ninguna etapa junta la lista completa.
+    Los escritores vuelven en el orden de `objetivos`.
+    """
+    global SCRAPE_BUDGET
+    def sitio(k: str) -> DailyCsvWriter:
+        sc = SCRAPERS[k]()
+        w = DailyCsvWriter(manifest, sc.csv_name(), site=k, enrich=enrich)
+        with METRICS.stage("sitio", k):
+            filas = w.write(sc.stream())
+        METRICS.site(k, filas)
+        perdidas, cortadas = METRICS.losses(k, "deadline"), METRICS.losses(k, "circuito_abierto")
+        if perdidas: METRICS.incomplete(k, perdidas)
+        extra = " | ".join(t for t in (_cache_report(k), _pipeline_report(k)) if t)
+        if perdidas: extra = f"⏱ INCOMPLETO: {perdidas} URLs sin bajar al vencer el plazo" + (f" | {extra}" if extra else "")
+        if cortadas:
+            extra = (f"⚡ {'CAÍDO' if not filas else 'circuito abierto'}: {cortadas} URLs cortadas sin salir"
+                     + (f" | {extra}" if extra else ""))
+        print(f"• {k:<12}: {filas:>5} filas" + (f" | {extra}" if extra else ""))
+        return w
+    SCRAPE_BUDGET = ScrapeBudget(SCRAPE_CONCURRENCY, SCRAPE_DEADLINE_S)
+    try:
+        paralelo = SCRAPE_SITES_PARALLEL if SCRAPE_SITES_PARALLEL > 0 else len(objetivos)
+        with METRICS.stage("scrape"), ThreadPoolExecutor(max(1, min(paralelo, len(objetivos))),
+                                                         thread_name_prefix="sitio") as pool:
+            escritores = [f.result() for f in [pool.submit(sitio, k) for k in objetivos]]
+        incompletos = sorted(METRICS.incompletos)
+        METRICS.datos["scrape"] = {"sitios_a_la_vez": paralelo, "tope": SCRAPE_BUDGET.slots, "pico_en_vuelo": SCRAPE_BUDGET.pico,
+                                   "plazo_s": SCRAPE_DEADLINE_S, "incompletos": incompletos}
+        print(f"[Corrida] {len(objetivos)} sitios, hasta {paralelo} a la vez | pico de {SCRAPE_BUDGET.pico} requests "
+              f"en vuelo (tope {SCRAPE_BUDGET.slots or '—'})"
+              + (f" | plazo {SCRAPE_DEADLINE_S:.0f} s: incompletos {', '.join(incompletos)}" if incompletos else ""))
+        _close_parse_pool()
+        SCRAPE_CACHE.save()
+        ENRICH_CACHE.save()  # los nombres clasificados al scrapear (también en los procesos de parseo)
+        HTTP_CACHE.prune()
+        for linea in HOST_LIMITS.report(): print(linea)
+        return escritores
+    finally:
+        SCRAPE_BUDGET = ScrapeBudget()  # el plazo es del scrape: la ingesta que sigue (modo all) no lo hereda
+
+def _ingest(manifest: IngestManifest, escritores: List[DailyCsvWriter], flags: Set[str]) -> int:
+    reprocess = "--reprocess" in flags
+    # Los lotes esperaron en disco durante el scrape; la ingesta sí junta el total de la corrida
+    # (de-duplicar y proyectar la hoja lo necesitan entero), ya enriquecido y compacto.
+    lotes = [df for w in escritores for df in w.take_frames()]
+    escritos = {w.rel for w in escritores if w.rows and w.enrich}
+    # Además, los CSV diarios que el manifiesto no registra como ingeridos (o todos con --reprocess)
+    fuentes = [rel for rel in manifest.pending(reprocess) if rel not in escritos]
+    if not lotes and not fuentes:
+        ENRICH_CACHE.save()
+        print("Sin datos nuevos.")
+        return 0
+    if manifest.rules and manifest.rules != ENRICH_CACHE.fingerprint and not reprocess:
+        print("[Manifiesto] Las reglas de enriquecimiento cambiaron desde la última ingesta: "
+              "los CSV ya ingeridos conservan el enriquecimiento anterior (--reprocess lo regenera)")
+    previos, descartadas, leidas = [], None, sum(map(len, lotes))
+    if fuentes:  # los de disco van primero: son de corridas anteriores
+        with METRICS.stage("lectura_csv"):
+            df_all = manifest.read(fuentes)
+        leidas += len(df_all)
+        df_new, descartadas = _enrich_frame(df_all, reprocess)
+        previos = [df_new]
+        del df_all
+    df_new = _compact_frame(pd.concat(previos + lotes, ignore_index=True, sort=False)) if lotes else previos[0]
+    del lotes, previos
+    METRICS.datos.update(csv_ingeridos=len(fuentes) + len(escritos), filas_leidas=leidas)
+    print(f"[Manifiesto] {len(escritos)} CSV de esta corrida + {len(fuentes)} de {len(manifest.sources())} "
+          f"pendientes en disco a ingerir ({leidas:,} filas)" + (" | reproceso completo" if reprocess else ""))
+    ENRICH_CACHE.save()
+
+    sh, ws = _open_spreadsheet()
+    SheetsPlanner.of(sh).resume(ws)  # subida por tramos que quedó a medias en una corrida anterior
+    if SHEETS_ROLLOVER and not _rollover_enabled():
+        print("[Rollover] SHEETS_ROLLOVER requiere el histórico local (HISTORY_STORE=1 + pyarrow) → hoja única")
+    store = HistoryStore() if HISTORY_STORE and pa is not None else None
+    if SHEET_DELTA and (store is None or _rollover_enabled()):
+        print("[Intervalos] SHEET_DELTA requiere el histórico local y no aplica con SHEETS_ROLLOVER → hoja diaria")
+    dias = list(_day_keys(_parse_fecha(df_new["FechaConsulta"])).categories)  # días de esta corrida (resúmenes)
+    with METRICS.stage("ingesta"):
+        if _rollover_enabled():
+            resumen = _ingest_rollover(sh, ws, df_new, store, "--full-rebuild" in flags, reprocess, descartadas)
+        elif store is not None:
+            resumen = _ingest_with_store(sh, ws, df_new, store, "--full-rebuild" in flags, reprocess, descartadas)
+        else:
+            agregadas = None
+            if "--full-rebuild" not in flags and not reprocess:
+                agregadas = _ingest_incremental(sh, ws, df_new)
+            if agregadas is None:
+                base = _ingest_full(sh, ws, df_new, prefer_new=reprocess, drop=descartadas)
+                resumen = f"{len(base)} filas totales (reescritura completa)"
+            else:
+                resumen = f"{agregadas} filas nuevas agregadas"
+    METRICS.datos["ingesta"] = resumen
+    if SUMMARY_SHEETS and store is not None:
+        with METRICS.stage("resumenes"):
+            print(DashboardSummaries(sh, store).update(dias, completo="--full-rebuild" in flags or reprocess))
+    elif SUMMARY_SHEETS:
+        print("[Resúmenes] Requieren el histórico local (HISTORY_STORE=1 + pyarrow) → el tablero lee los datos completos")
+    if STATIC_EXPORT_DIR and store is None:
+        print("[Export] STATIC_EXPORT_DIR requiere el histórico local (HISTORY_STORE=1 + pyarrow) → no se exporta")
+    elif STATIC_EXPORT_DIR and not SHEETS_DRY_RUN:
+        with METRICS.stage("export"):
+            print(StaticExport(store).update(dias, completo="--full-rebuild" in flags or reprocess))
+
+    total_cells = SheetsPlanner.of(sh).total_cells  # tamaños ya conocidos por el planificador: sin requests
+    destino = f"Fragmentos de '{WORKSHEET_NAME}'" if _rollover_enabled() else f"Hoja '{WORKSHEET_NAME}'"
+    print(f"✅ {destino} {'(dry-run, sin escribir)' if SHEETS_DRY_RUN else 'actualizada'}: "
+          f"{resumen} | Celdas del libro{' proyectadas' if SHEETS_DRY_RUN else ''}: {total_cells:,}")
+    print(ENRICH_CACHE.report())
+    pico = _peak_rss_mb()
+    if pico is not None: print(f"[Memoria] pico RSS del proceso: {pico:,.0f} MB")
+
+    # Recién ahora (ingesta exitosa) los CSV quedan registrados; luego se compactan los viejos
+    if SHEETS_DRY_RUN:
+        print("[Manifiesto] dry-run: los CSV quedan pendientes para la próxima corrida")
+        return 0
+    manifest.commit(ENRICH_CACHE.fingerprint if reprocess or manifest.rules is None else manifest.rules)
+    compactados = manifest.compact()
+    if compactados: print(compactados)
     return 0
 
 if __name__ == "__main__":